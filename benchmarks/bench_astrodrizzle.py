@@ -0,0 +1,164 @@
+"""
+Benchmarks for the AstroDrizzle processing steps on synthetic ACS/WFC,
+WFC3/IR and WFPC2 exposures (see `benchmarks.synthetic`).
+
+Each benchmark runs the steps that precede the timed one in ``setup``, so
+that only the step itself is measured. Results are stored by ``asv`` and
+two commits can be compared with, e.g.::
+
+    asv continuous main HEAD -b bench_astrodrizzle
+    asv compare main HEAD
+
+``time_*`` benchmarks record the wall time, ``peakmem_*`` the peak resident
+memory of the process and ``track_*_throughput`` the number of input pixels
+processed per second (in Mpix/s).
+
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from stsci.tools import teal
+
+from drizzlepac import (
+    ablot,
+    adrizzle,
+    createMedian,
+    drizCR,
+    processInput,
+    sky,
+    staticMask,
+    util,
+)
+
+from .synthetic import INSTRUMENTS, write_inputs
+
+
+def _configobj(filenames):
+    configobj = teal.load('astrodrizzle', defaults=True)
+    configobj['input'] = ','.join(filenames)
+    configobj['output'] = 'bench'
+    configobj['in_memory'] = True
+    configobj['num_cores'] = 1
+    configobj['build'] = True
+    configobj['STATE OF INPUT FILES']['preserve'] = False
+    return configobj
+
+
+class _AstroDrizzleStep:
+    params = tuple(INSTRUMENTS)
+    param_names = ('instrument',)
+    number = 1
+    repeat = 3
+    timeout = 1200
+
+    def setup_cache(self):
+        # The inputs are written once and shared by all the step benchmarks
+        inputs = {}
+        for instrument in INSTRUMENTS:
+            path = os.path.abspath(instrument)
+            os.makedirs(path, exist_ok=True)
+            inputs[instrument] = write_inputs(instrument, path)
+        return inputs
+
+    def setup(self, inputs, instrument):
+        # Steps update the headers of the inputs: work on copies.
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp(prefix='drizzlepac_bench_')
+        shutil.copytree(os.path.dirname(inputs[instrument][0]), self.tmpdir,
+                        dirs_exist_ok=True)
+        os.chdir(self.tmpdir)
+
+        self.configobj = _configobj(
+            [os.path.basename(f) for f in inputs[instrument]]
+        )
+        self.imgs, self.outwcs = processInput.setCommonInput(self.configobj)
+        self.npix = sum(
+            chip.image_shape[0] * chip.image_shape[1]
+            for img in self.imgs
+            for chip in (img[img.scienceExt, k]
+                         for k in range(1, img._numchips + 1))
+        )
+        self.prepare()
+
+    def teardown(self, inputs, instrument):
+        for img in self.imgs:
+            img.clean()
+            img.close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def prepare(self):
+        pass
+
+    def run(self):
+        raise NotImplementedError
+
+    def time_step(self, inputs, instrument):
+        self.run()
+
+    def peakmem_step(self, inputs, instrument):
+        self.run()
+
+    def track_step_throughput(self, inputs, instrument):
+        t0 = time.perf_counter()
+        self.run()
+        return self.npix / (time.perf_counter() - t0) / 1e6
+
+    track_step_throughput.unit = 'Mpix/s'
+
+
+class StaticMask(_AstroDrizzleStep):
+    def run(self):
+        staticMask.createStaticMask(self.imgs, self.configobj)
+
+
+class Sky(_AstroDrizzleStep):
+    def prepare(self):
+        staticMask.createStaticMask(self.imgs, self.configobj)
+
+    def run(self):
+        sky.subtractSky(self.imgs, self.configobj)
+
+
+class Median(_AstroDrizzleStep):
+    def prepare(self):
+        configobj = self.configobj
+        staticMask.createStaticMask(self.imgs, configobj)
+        sky.subtractSky(self.imgs, configobj)
+        adrizzle.drizSeparate(self.imgs, self.outwcs, configobj)
+
+        # same parameters as set up by createMedian.createMedian:
+        self.paramDict = configobj[
+            util.getSectionName(configobj, createMedian.STEP_NUM)
+        ]
+        self.paramDict['proc_unit'] = configobj['proc_unit']
+        self.paramDict['num_cores'] = configobj['num_cores']
+        self.paramDict['compress'] = configobj[
+            util.getSectionName(configobj, adrizzle.STEP_NUM_SINGLE)
+        ]['driz_sep_compress']
+
+    def run(self):
+        createMedian._median(self.imgs, self.paramDict)
+
+
+class DrizCR(_AstroDrizzleStep):
+    def prepare(self):
+        configobj = self.configobj
+        staticMask.createStaticMask(self.imgs, configobj)
+        sky.subtractSky(self.imgs, configobj)
+        adrizzle.drizSeparate(self.imgs, self.outwcs, configobj)
+        createMedian.createMedian(self.imgs, configobj)
+        ablot.runBlot(self.imgs, self.outwcs, configobj)
+
+        # same parameters as set up by drizCR.rundrizCR:
+        self.paramDict = configobj[
+            util.getSectionName(configobj, drizCR.STEP_NUM)
+        ]
+        self.paramDict['crbit'] = configobj['crbit']
+        self.paramDict['inmemory'] = True
+
+    def run(self):
+        for img in self.imgs:
+            drizCR._driz_cr(img, img.virtualOutputs, self.paramDict)
@@ -0,0 +1,136 @@
+"""
+Benchmarks for the drizzle (``cdriz.tdriz``) and blot (``cdriz.tblot``)
+kernels on single chips shaped like ACS/WFC, WFC3/IR and WFPC2 data.
+
+The input chip is rotated with respect to the output frame so that its
+pixels do not line up with the output pixels. Pixel maps are computed in
+``setup`` and are not part of the timings.
+
+"""
+import time
+
+import numpy as np
+
+from drizzlepac import cdriz, wcs_functions
+
+from .synthetic import INSTRUMENTS, make_wcs
+
+KERNELS = ['square', 'point', 'turbo', 'gaussian', 'lanczos3']
+# 'spline3' is not implemented by tblot
+INTERPOLANTS = ['nearest', 'linear', 'poly3', 'poly5', 'sinc', 'lan3', 'lan5']
+
+
+def _make_chip(instrument, seed=0):
+    """ Return the science data of a chip of ``instrument``, the pixel map
+    from the chip to a rotated output frame and the output shape.
+    """
+    pars = INSTRUMENTS[instrument]
+    shape = pars['shape']
+    rng = np.random.default_rng(seed)
+    sci = rng.normal(100.0, 10.0, shape).astype(np.float32)
+
+    size = int(np.ceil(np.hypot(*shape))) + 8
+    chip_wcs = make_wcs(shape, pars['scale'])
+    out_wcs = make_wcs((size, size), pars['scale'], rotation=15.0)
+    pixmap = wcs_functions.calc_pixmap(chip_wcs, out_wcs, shape, stepsize=10)
+    return sci, pixmap, (size, size)
+
+
+class Drizzle:
+    params = (list(INSTRUMENTS), KERNELS)
+    param_names = ('instrument', 'kernel')
+    timeout = 600
+
+    def setup(self, instrument, kernel):
+        self.sci, self.pixmap, out_shape = _make_chip(instrument)
+        self.wht = np.ones_like(self.sci)
+        self.outsci = np.zeros(out_shape, dtype=np.float32)
+        self.outwht = np.zeros(out_shape, dtype=np.float32)
+        self.outctx = np.zeros(out_shape, dtype=np.int32)
+
+    def _tdriz(self, kernel):
+        cdriz.tdriz(
+            self.sci, self.wht, self.outsci, self.outwht, self.outctx,
+            1, 0, 1, 1, self.sci.shape[0], 1.0, 1.0, 1.0, 'center', 1.0,
+            kernel, 'cps', 1.0, 1.0, 'INDEF', 0, 0, 1, self.pixmap
+        )
+
+    def time_tdriz(self, instrument, kernel):
+        self._tdriz(kernel)
+
+    def peakmem_tdriz(self, instrument, kernel):
+        self._tdriz(kernel)
+
+    def track_tdriz_throughput(self, instrument, kernel):
+        t0 = time.perf_counter()
+        self._tdriz(kernel)
+        return self.sci.size / (time.perf_counter() - t0) / 1e6
+
+    track_tdriz_throughput.unit = 'Mpix/s'
+
+
+class Blot:
+    params = (list(INSTRUMENTS), INTERPOLANTS)
+    param_names = ('instrument', 'interpolant')
+    timeout = 600
+
+    def setup(self, instrument, interpolant):
+        sci, self.pixmap, out_shape = _make_chip(instrument)
+        rng = np.random.default_rng(1)
+        self.source = rng.normal(100.0, 10.0, out_shape).astype(np.float32)
+        self.blotted = np.zeros(sci.shape, dtype=np.float32)
+
+    def _tblot(self, interpolant):
+        ny, nx = self.source.shape
+        cdriz.tblot(
+            self.source, self.blotted, 1, nx, 1, ny, 1.0, 1.0, 1.0, 1.0,
+            'center', interpolant, 1.0, 0.0, 1.0, 1, self.pixmap
+        )
+
+    def time_tblot(self, instrument, interpolant):
+        self._tblot(interpolant)
+
+    def peakmem_tblot(self, instrument, interpolant):
+        self._tblot(interpolant)
+
+    def track_tblot_throughput(self, instrument, interpolant):
+        t0 = time.perf_counter()
+        self._tblot(interpolant)
+        return self.blotted.size / (time.perf_counter() - t0) / 1e6
+
+    track_tblot_throughput.unit = 'Mpix/s'
+
+
+class SquareKernel:
+    """ The square kernel on an ACS/WFC chip, with and without shrinking
+    the input pixels, onto output pixels finer than, as large as and
+    coarser than the input ones.
+    """
+    params = ([1.0, 0.8], [0.5, 1.0, 2.0])
+    param_names = ('pixfrac', 'scale')
+    timeout = 600
+
+    def setup(self, pixfrac, scale):
+        pars = INSTRUMENTS['acs_wfc']
+        shape = pars['shape']
+        rng = np.random.default_rng(0)
+        self.sci = rng.normal(100.0, 10.0, shape).astype(np.float32)
+        self.wht = np.ones_like(self.sci)
+
+        size = int(np.ceil(np.hypot(*shape) / scale)) + 8
+        chip_wcs = make_wcs(shape, pars['scale'])
+        out_wcs = make_wcs((size, size), scale * pars['scale'],
+                           rotation=15.0)
+        self.pixmap = wcs_functions.calc_pixmap(chip_wcs, out_wcs, shape,
+                                                stepsize=10)
+        self.outsci = np.zeros((size, size), dtype=np.float32)
+        self.outwht = np.zeros((size, size), dtype=np.float32)
+        self.outctx = np.zeros((size, size), dtype=np.int32)
+
+    def time_tdriz(self, pixfrac, scale):
+        cdriz.tdriz(
+            self.sci, self.wht, self.outsci, self.outwht, self.outctx,
+            1, 0, 1, 1, self.sci.shape[0], scale, 1.0, 1.0, 'center',
+            pixfrac, 'square', 'cps', 1.0, 1.0, 'INDEF', 0, 0, 1,
+            self.pixmap
+        )
@@ -0,0 +1,31 @@
+"""
+Benchmarks for the cosmic-ray detection done by ``drizCR``.
+"""
+import numpy as np
+
+from drizzlepac import quickDeriv
+from drizzlepac.drizCR import _driz_cr_mask
+
+
+class DrizCRMask:
+    params = ([1, 3], [0, 3])
+    param_names = ('grow', 'ctegrow')
+
+    def setup(self, grow, ctegrow):
+        rng = np.random.default_rng(0)
+        shape = (2048, 4096)
+        self.blot = rng.normal(100.0, 10.0, shape).astype(np.float32)
+        self.image = self.blot + rng.normal(0, 12.0, shape).astype(np.float32)
+        self.image[rng.random(shape) < 0.01] += 500
+        self.deriv = quickDeriv.qderiv(self.blot)
+
+    def time_qderiv(self, grow, ctegrow):
+        quickDeriv.qderiv(self.blot)
+
+    def time_cr_mask(self, grow, ctegrow):
+        _driz_cr_mask(self.image, self.blot, self.deriv, gain=1.0, rn=3.0,
+                      backg=10.0, snr=(3.5, 3.0), scale=(1.2, 0.7),
+                      grow=grow, ctegrow=ctegrow, cte_dir=1)
+
+    def peakmem_cr_mask(self, grow, ctegrow):
+        self.time_cr_mask(grow, ctegrow)
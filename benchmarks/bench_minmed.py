@@ -0,0 +1,70 @@
+"""
+Benchmarks for the ``minmed`` combination used by ``createMedian``.
+
+Run with ``asv run`` (or ``asv continuous main HEAD`` to compare two commits),
+or directly as a script for a quick timing and peak memory report::
+
+    python benchmarks/bench_minmed.py
+
+"""
+import time
+import tracemalloc
+
+import numpy as np
+
+from drizzlepac.minmed import min_med
+
+
+def make_stack(nimages=5, shape=(2048, 2048), masked=True, seed=0):
+    """ Create a synthetic stack of background-dominated images with
+    cosmic-ray hits, along with weights and (optionally) bad pixel masks.
+    """
+    rng = np.random.default_rng(seed)
+    images = []
+    weights = []
+    masks = [] if masked else None
+    for k in range(nimages):
+        img = rng.normal(100.0, 10.0, size=shape).astype(np.float32)
+        crs = rng.random(shape) < 0.01
+        img[crs] += rng.uniform(100, 5000, size=np.count_nonzero(crs))
+        images.append(img)
+        weights.append(np.full(shape, 500.0, dtype=np.float32))
+        if masked:
+            masks.append(rng.random(shape) < 0.02)
+    return {
+        'images': images,
+        'weight_images': weights,
+        'readnoise_list': [3.0] * nimages,
+        'exptime_list': [500.0] * nimages,
+        'background_values': [50.0] * nimages,
+        'weight_masks': masks,
+    }
+
+
+class MinMed:
+    params = ([3, 5], [False, True], [0, 1])
+    param_names = ('nimages', 'masked', 'combine_grow')
+    timeout = 300
+
+    def setup(self, nimages, masked, combine_grow):
+        self.kwargs = make_stack(nimages=nimages, masked=masked)
+
+    def time_min_med(self, nimages, masked, combine_grow):
+        min_med(combine_grow=combine_grow, **self.kwargs)
+
+    def peakmem_min_med(self, nimages, masked, combine_grow):
+        min_med(combine_grow=combine_grow, **self.kwargs)
+
+
+if __name__ == '__main__':
+    for masked in (False, True):
+        kwargs = make_stack(masked=masked)
+        npix = kwargs['images'][0].size * len(kwargs['images'])
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        min_med(combine_grow=1, **kwargs)
+        dt = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"masked={masked!s:5}: {dt:6.2f} s  {npix / dt / 1e6:7.1f} Mpix/s  "
+              f"peak {peak / 2**20:6.0f} MiB")
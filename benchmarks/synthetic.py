@@ -0,0 +1,181 @@
+"""
+Synthetic HST-like inputs for the benchmarks.
+
+`write_inputs` creates a set of dithered, calibrated (``_flt.fits``-like)
+exposures shaped like ACS/WFC, WFC3/IR or WFPC2 data, with a sky
+background, read noise, a few stars and cosmic-ray hits. The headers hold
+just enough keywords for `~drizzlepac.processInput.setCommonInput` to build
+the instrument-specific image objects, so the AstroDrizzle steps run
+exactly as on real data, without the need for reference files or network
+access.
+
+"""
+import os
+
+import numpy as np
+from astropy import wcs
+from astropy.io import fits
+
+__all__ = ['INSTRUMENTS', 'make_wcs', 'write_inputs']
+
+# Chip layout, plate scale, units and detector parameters of each instrument
+INSTRUMENTS = {
+    'acs_wfc': {
+        'shape': (2048, 4096), 'nchips': 2, 'scale': 0.05,
+        'bunit': 'ELECTRONS',
+        'primary': {
+            'INSTRUME': 'ACS', 'DETECTOR': 'WFC', 'CCDAMP': 'ABCD',
+            'ATODGNA': 2.0, 'ATODGNB': 2.0, 'ATODGNC': 2.0, 'ATODGND': 2.0,
+            'READNSEA': 4.0, 'READNSEB': 4.0, 'READNSEC': 4.0,
+            'READNSED': 4.0, 'FILTER1': 'F606W', 'FILTER2': 'CLEAR2L',
+            'APERTURE': 'WFC', 'PHOTMODE': 'ACS WFC1 F606W',
+        },
+    },
+    'wfc3_ir': {
+        'shape': (1014, 1014), 'nchips': 1, 'scale': 0.128,
+        'bunit': 'ELECTRONS/S',
+        'primary': {
+            'INSTRUME': 'WFC3', 'DETECTOR': 'IR', 'CCDAMP': 'ABCD',
+            'ATODGNA': 2.5, 'ATODGNB': 2.5, 'ATODGNC': 2.5, 'ATODGND': 2.5,
+            'READNSEA': 20.0, 'READNSEB': 20.0, 'READNSEC': 20.0,
+            'READNSED': 20.0, 'FILTER': 'F160W', 'APERTURE': 'IR',
+            'SAMP_SEQ': 'SPARS100', 'NSAMP': 14, 'PHOTMODE': 'WFC3 IR F160W',
+        },
+    },
+    'wfpc2': {
+        'shape': (800, 800), 'nchips': 4, 'scale': 0.1, 'bunit': 'COUNTS',
+        'primary': {
+            'INSTRUME': 'WFPC2', 'ATODGAIN': 7.0, 'FILTNAM1': 'F555W',
+            'FILTNAM2': '', 'MODE': 'FULL', 'SERIALS': 'OFF',
+            'PHOTMODE': 'WFPC2,1,A2D7,F555W,,CAL',
+        },
+    },
+}
+
+
+def make_wcs(shape, scale, crpix_offset=(0.0, 0.0), crval=(150.1, 2.2),
+             rotation=0.0):
+    """ Return a TAN `~astropy.wcs.WCS` for an image of the given shape and
+    plate scale (in arcsec) centered on ``crval``.
+    """
+    w = wcs.WCS(naxis=2)
+    w.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+    w.wcs.crpix = [shape[1] / 2 + crpix_offset[0],
+                   shape[0] / 2 + crpix_offset[1]]
+    w.wcs.crval = crval
+    c, s = np.cos(np.deg2rad(rotation)), np.sin(np.deg2rad(rotation))
+    w.wcs.cd = scale / 3600.0 * np.array([[-c, s], [s, c]])
+    w.pixel_shape = shape[::-1]
+    return w
+
+
+def _wcs_header(w):
+    hdr = w.to_header()
+    for key in list(hdr):
+        if key.startswith(('PC', 'CDELT')):
+            del hdr[key]
+    for i in range(2):
+        for j in range(2):
+            hdr[f'CD{i + 1}_{j + 1}'] = w.wcs.cd[i, j]
+    return hdr
+
+
+def _simulate(shape, rng, sky, exptime, in_rate):
+    """ Background, noise, stars and cosmic rays, in electrons. """
+    data = rng.normal(sky * exptime, np.sqrt(sky * exptime) + 4.0,
+                      size=shape).astype(np.float32)
+    ny, nx = shape
+    nstars = max(shape[0] * shape[1] // 20000, 1)
+    ys = rng.integers(3, ny - 3, nstars)
+    xs = rng.integers(3, nx - 3, nstars)
+    fluxes = rng.uniform(500.0, 20000.0, nstars).astype(np.float32)
+    for dy, dx, frac in [(0, 0, 0.4), (-1, 0, 0.15), (1, 0, 0.15),
+                         (0, -1, 0.15), (0, 1, 0.15)]:
+        np.add.at(data, (ys + dy, xs + dx), frac * fluxes)
+    crs = rng.random(shape) < 0.005
+    data[crs] += rng.uniform(200.0, 5000.0, np.count_nonzero(crs))
+    if in_rate:
+        data /= exptime
+    return data
+
+
+def write_inputs(instrument, path='.', nexp=3, seed=0, shape=None):
+    """ Write ``nexp`` dithered exposures of ``instrument`` (a key of
+    `INSTRUMENTS`) to ``path`` and return the list of the names of the
+    science files. ``shape`` overrides the shape of the chips of the
+    instrument.
+    """
+    pars = INSTRUMENTS[instrument]
+    nchips = pars['nchips']
+    if shape is None:
+        shape = pars['shape']
+    rng = np.random.default_rng(seed)
+    exptime = 500.0
+    filenames = []
+
+    for k in range(nexp):
+        rootname = f'bench{k}'
+        dither = (2.5 * k + 0.3, 1.5 * k + 0.6)
+
+        phdu = fits.PrimaryHDU()
+        phdu.header.update(
+            TELESCOP='HST', ROOTNAME=rootname, EXPNAME=rootname,
+            EXPTIME=exptime, TEXPTIME=exptime, DARKTIME=exptime,
+            EXPSTART=55000.0 + 0.01 * k, EXPEND=55000.006 + 0.01 * k,
+            DATE_OBS='2010-01-01', TIME_OBS='00:00:00', EXPFLAG='NORMAL',
+            PA_V3=0.0, SUBARRAY=False, BINAXIS1=1, BINAXIS2=1,
+            FLASHDUR=0.0, FLSHCORR='OMIT', MEANDARK=0.0,
+            PHOTFLAM=1e-19, PHOTPLAM=6000.0, PHOTZPT=-21.1,
+            NEXTEND=3 * nchips, **pars['primary']
+        )
+        hdus = [phdu]
+
+        for chip in range(1, nchips + 1):
+            # chips are laid out next to each other along y
+            w = make_wcs(shape, pars['scale'], crval=(150.1, 2.2),
+                         crpix_offset=(dither[0],
+                                       dither[1] - (chip - 1) * shape[0]))
+            hdr = _wcs_header(w)
+            hdr.update(
+                BUNIT=pars['bunit'], CCDCHIP=chip, LTV1=0.0, LTV2=0.0,
+                LTM1_1=1.0, LTM2_2=1.0, ORIENTAT=0.0, VAFACTOR=1.0,
+                EXPNAME=rootname, SAMPTIME=exptime, MEANDARK=0.0,
+                MDRIZSKY=0.0, INHERIT=True, NGOODPIX=shape[0] * shape[1]
+            )
+            if instrument == 'wfpc2':
+                hdr['DETECTOR'] = chip
+
+            sci = _simulate(shape, rng, sky=0.5, exptime=exptime,
+                            in_rate=pars['bunit'].endswith('/S'))
+            if pars['bunit'] == 'COUNTS':
+                sci /= pars['primary']['ATODGAIN']
+            extensions = [
+                ('SCI', sci),
+                ('ERR', np.ones(shape, dtype=np.float32)),
+                ('DQ', np.zeros(shape, dtype=np.int16)),
+            ]
+            if instrument == 'wfc3_ir':
+                extensions += [
+                    ('SAMP', np.full(shape, 14, dtype=np.int16)),
+                    ('TIME', np.full(shape, exptime, dtype=np.float32)),
+                ]
+            for extname, data in extensions:
+                hdu = fits.ImageHDU(data, header=hdr.copy(), name=extname)
+                hdu.header['EXTVER'] = chip
+                hdus.append(hdu)
+
+        if instrument == 'wfpc2':
+            # WFPC2 data come as (c0m) science and (c1m) DQ files
+            filename = os.path.join(path, f'{rootname}_c0m.fits')
+            dq_hdus = [hdu for hdu in hdus[1:] if hdu.name == 'DQ']
+            hdus = [hdu for hdu in hdus if hdu.name in ('PRIMARY', 'SCI')]
+            phdu.header['NEXTEND'] = nchips
+            fits.HDUList([phdu.copy()] + dq_hdus).writeto(
+                os.path.join(path, f'{rootname}_c1m.fits'), overwrite=True
+            )
+        else:
+            filename = os.path.join(path, f'{rootname}_flt.fits')
+        fits.HDUList(hdus).writeto(filename, overwrite=True)
+        filenames.append(filename)
+
+    return filenames
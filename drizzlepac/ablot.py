@@ -124,6 +124,11 @@ def blot(
         speeds up the computation significantly when ``stepsize`` >> 1 at the expense
         of interpolation errors for intermediate pixels.
 
+    stepsize_tolerance : float (Default Value = None)
+        Maximum interpolation error (in pixels) allowed for the ``stepsize``
+        grid. Grid cells where the error is larger are recursively halved. If
+        `None`, a uniform grid is used.
+
     addsky : bool (Default Value = Yes)
         Add back a sky value using the ``MDRIZSKY`` value from the header.
         If 'Yes' (``True``), the ``blot_skyval`` parameter is ignored.
@@ -307,7 +312,9 @@ def run(configObj, wcsmap=None):
     # perform blotting operation now
     _outsci = do_blot(_insci, source_wcs, out_wcs, _expin, coeffs=configObj['coeffs'],
                     interp=configObj['interpol'], sinscl=configObj['sinscl'],
-            stepsize=configObj['stepsize'], wcsmap=wcsmap)
+            stepsize=configObj['stepsize'],
+            stepsize_tolerance=configObj.get('stepsize_tolerance'),
+            wcsmap=wcsmap)
     # create output with proper units and exptime-scaling
     if scale_pars["out_units"] == "counts":
         if scale_pars["expout"] == "input":
@@ -416,7 +423,9 @@ def buildBlotParamDict(configObj):
                 'blot_sinscl':configObj[blot_name]['blot_sinscl'],
                 'blot_addsky':configObj[blot_name]['blot_addsky'],
                 'blot_skyval':configObj[blot_name]['blot_skyval'],
-                'coeffs':configObj['coeffs']}
+                'coeffs':configObj['coeffs'],
+                'stepsize':configObj['stepsize'],
+                'stepsize_tolerance':configObj.get('stepsize_tolerance')}
     return paramDict
 
 
@@ -477,7 +486,8 @@ def run_blot(imageObjectList, output_wcs, paramDict, wcsmap=wcs_functions.WCSMap
 
     for img in imageObjectList:
 
-        for chip in img.returnAllChips(extname=img.scienceExt):
+        chips = img.returnAllChips(extname=img.scienceExt)
+        for chip in util.iter_chip_usage(PROCSTEPS_NAME, chips):
             log.debug(f'Blot: creating blotted image: {chip.outputNames["data"]}')
 
             #### Check to see what names need to be included here for use in _hdrlist
@@ -519,7 +529,9 @@ def run_blot(imageObjectList, output_wcs, paramDict, wcsmap=wcs_functions.WCSMap
                 coeffs=paramDict["coeffs"],
                 interp=paramDict["blot_interp"],
                 sinscl=paramDict["blot_sinscl"],
+                stepsize=paramDict.get("stepsize", 10),
                 wcsmap=wcsmap,
+                stepsize_tolerance=paramDict.get("stepsize_tolerance"),
             )
             # Apply sky subtraction and unit conversion to blotted array to
             # match un-modified input array
@@ -570,6 +582,8 @@ def do_blot(
     sinscl=1.0,
     stepsize=10,
     wcsmap=None,
+    pixmap=None,
+    stepsize_tolerance=None,
 ):
     """Core functionality of performing the 'blot' operation to create a single
     blotted image from a single source image.
@@ -606,6 +620,15 @@ def do_blot(
         Custom mapping class to use to provide transformation from
         drizzled to blotted WCS.  Default will be to use
         `~drizzlepac.wcs_functions.WCSMap`.
+    pixmap
+        Precomputed ``(ny, nx, 2)`` pixel map from the blotted image frame
+        to the source image frame, as returned by
+        `~drizzlepac.wcs_functions.calc_pixmap`. When not provided, it is
+        computed once for the whole image from ``stepsize`` or ``wcsmap``.
+    stepsize_tolerance
+        Maximum interpolation error (in source image pixels) of the
+        ``stepsize`` grid. Grid cells with larger errors are subdivided.
+        By default, a uniform grid is used.
 
     """
     _outsci = np.zeros(blot_wcs.array_shape, dtype=np.float32)
@@ -629,30 +652,28 @@ def do_blot(
         blot_wcs.cpdis2 = None
         blot_wcs.det2im = None
 
-    if wcsmap is None and cdriz is not None:
+    if pixmap is not None:
+        log.debug('Using precomputed pixel map...')
+    elif wcsmap is None and cdriz is not None:
         """
         Use default C mapping function.
         """
         log.debug('Using default C-based coordinate transformation...')
-        mapping = cdriz.DefaultWCSMapping(
-            blot_wcs,
-            source_wcs,
-            blot_wcs.pixel_shape[0],
-            blot_wcs.pixel_shape[1],
-            stepsize,
+        pixmap = wcs_functions.calc_pixmap(
+            blot_wcs, source_wcs, shape=_outsci.shape, stepsize=stepsize,
+            tolerance=stepsize_tolerance
         )
-        pix_ratio = source_wcs.pscale / wcslin.pscale
     else:
         #
         ##Using the Python class for the WCS-based transformation
         #
-        # Use user provided mapping function
+        # Use user provided mapping function, evaluated for all pixels at once
         log.debug('Using coordinate transformation defined by user...')
         if wcsmap is None:
             wcsmap = wcs_functions.WCSMap
         wmap = wcsmap(blot_wcs, source_wcs)
-        mapping = wmap.forward
-        pix_ratio = source_wcs.pscale / wcslin.pscale
+        pixmap = wcs_functions.calc_pixmap_from_mapping(wmap.forward, _outsci.shape)
+    pix_ratio = source_wcs.pscale / wcslin.pscale
 
     t = cdriz.tblot(
         source,
@@ -671,8 +692,8 @@ def do_blot(
         misval,
         sinscl,
         1,
-        mapping,
+        pixmap,
     )
-    del mapping
+    del pixmap
 
     return _outsci
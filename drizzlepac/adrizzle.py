@@ -37,14 +37,19 @@ and orientation, if any have been specified at all.
 import os
 import copy
 import time
+import shutil
 import logging
+import tempfile
+import warnings
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from . import util
 import numpy as np
 from astropy.io import fits
 from astropy.utils import deprecated
 from astropy.utils.decorators import deprecated_renamed_argument
 from stsci.tools import fileutil, mputil
-from . import outputimage, wcs_functions
+from . import context, outputimage, sharedmem, wcs_functions
 import stwcs
 from stwcs import distortion
 
@@ -68,6 +73,9 @@ __all__ = [
     "run_driz",
     "run_driz_img",
     "run_driz_chip",
+    "run_driz_threaded",
+    "run_driz_tiled",
+    "plan_driz",
 ]
 
 __taskname__ = "adrizzle"
@@ -499,6 +507,7 @@ def run(configObj, wcsmap=None):
         kernel=configObj["kernel"],
         fillval=scale_pars["fillval"],
         stepsize=configObj["stepsize"],
+        stepsize_tolerance=configObj.get("stepsize_tolerance"),
         wcsmap=None,
     )
 
@@ -697,6 +706,7 @@ def drizFinal(imageObjectList, output_wcs, configObj,
             build = paramDict["build"]
         # Record whether or not intermediate files should be deleted when finished
         paramDict["clean"] = configObj["STATE OF INPUT FILES"]["clean"]
+        paramDict["num_cores"] = configObj.get("num_cores")
 
         paramDict["logfile"] = logfile
 
@@ -774,6 +784,7 @@ def buildDrizParamDict(configObj, single=True):
     paramDict = {
         "build": configObj["build"],
         "stepsize": configObj["stepsize"],
+        "stepsize_tolerance": configObj.get("stepsize_tolerance"),
         "coeffs": configObj["coeffs"],
         "wcskey": configObj["wcskey"],
     }
@@ -818,6 +829,7 @@ def _setDefaults(configObj={}):
         "build": True,
         "single": True,
         "stepsize": 10,
+        "stepsize_tolerance": None,
         "in_units": "cps",
         "wt_scl": 1.0,
         "pixfrac": 1.0,
@@ -884,6 +896,9 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
         Expected keys include ``build``, ``stepsize``, ``coeffs``, ``wcskey``,
         ``pixfrac``, ``kernel``, ``wt_scl``, ``bits``, ``fillval``, ``maskval``,
         and drizzle-step-specific values such as ``units`` and ``num_cores``.
+        When ``incremental`` is set, the inputs of the final-combination
+        step get drizzled into the existing final product, if any, skipping
+        the inputs already drizzled into it.
     single : bool
         ``True`` when executing the separate-drizzle step, ``False`` for the
         final-combination step.
@@ -918,10 +933,32 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
 
     outwcs = copy.deepcopy(output_wcs)
 
+    # In incremental mode only the inputs that are not in the existing
+    # final product yet get drizzled, on top of that product.
+    prior = None
+    if not single and paramDict.get("incremental"):
+        prior = _read_prior_product(imageObjectList[0], output_wcs, paramDict, build)
+    if prior is not None:
+        new_images = _select_new_images(imageObjectList, prior)
+        # Inputs already in the product are not drizzled again, but their
+        # cosmic rays still need to be flagged in their DQ arrays.
+        updateInputDQ(
+            [img for img in imageObjectList if img not in new_images],
+            paramDict["crbit"],
+        )
+        imageObjectList = new_images
+        if not imageObjectList:
+            log.info(
+                f"All inputs were already drizzled into {prior['filename']}; "
+                "leaving it as-is."
+            )
+            return
+
     # Check for existance of output file.
     if (
         not single
         and build
+        and prior is None
         and fileutil.findFile(imageObjectList[0].outputNames["outFinal"])
     ):
         log.info("Removing previous output product...")
@@ -931,15 +968,6 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
     log.info("Running Drizzle to create output frame with WCS of: ")
     output_wcs.printwcs()
 
-    # Will we be running in parallel?
-    pool_size = util.get_pool_size(paramDict.get("num_cores"), len(imageObjectList))
-    run_parallel = single and pool_size > 1
-    if run_parallel:
-        log.info(f"Executing {pool_size:d} parallel workers")
-    else:
-        if single:  # not yet an option for final drizzle, msg would confuse
-            log.info("Executing serially")
-
     # Set parameters for each input and run drizzle on it here.
     #
     # Perform drizzling...
@@ -949,6 +977,29 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
         numctx += img._nmembers
     _numctx = {"all": numctx}
 
+    # Find which chips overlap the output, and where, before reading any data
+    plan = plan_driz(imageObjectList, outwcs, paramDict, wcsmap)
+    noverlap = sum(bbox is not None for bbox in plan.values())
+
+    # Will we be running in parallel?  Separate drizzle runs one process per
+    # image, while final drizzle runs threads on bands of output rows.
+    if single:
+        pool_size = util.get_pool_size(paramDict.get("num_cores"), len(imageObjectList))
+    elif noverlap:
+        pool_size = util.get_pool_size(
+            paramDict.get("num_cores"), output_wcs.array_shape[0]
+        )
+    else:
+        pool_size = 1
+    run_parallel = single and pool_size > 1
+    run_threaded = not single and pool_size > 1
+    if run_parallel:
+        log.info(f"Executing {pool_size:d} parallel workers")
+    elif run_threaded:
+        log.info(f"Executing {pool_size:d} parallel drizzle threads")
+    else:
+        log.info("Executing serially")
+
     #            if single:
     # Determine how many chips make up each single image
     for img in imageObjectList:
@@ -960,12 +1011,33 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
                 _numctx[plsingle] = 1
 
     # Compute how many planes will be needed for the context image.
-    _nplanes = int((_numctx["all"] - 1) / 32) + 1
+    uniqid_base = 0 if prior is None else prior["ndrizim"]
+    _nplanes = int((_numctx["all"] + uniqid_base - 1) / 32) + 1
     # For single drizzling or when context is turned off,
     # minimize to 1 plane only...
     if single or imageObjectList[0][1].outputNames["outContext"] in [None, "", " "]:
         _nplanes = 1
 
+    # The context of final products can be kept as an index into a table
+    # of the distinct contexts instead (see drizzlepac.context)
+    compact_ctx = (
+        not single
+        and paramDict.get("context_format", "planes") == "compact"
+        and imageObjectList[0][1].outputNames["outContext"] not in [None, "", " "]
+    )
+    if compact_ctx and paramDict.get("memory_budget"):
+        log.warning(
+            "Compact context images are not available for tiled drizzling; "
+            "writing out context planes instead."
+        )
+        compact_ctx = False
+    if prior is not None and paramDict.get("memory_budget"):
+        log.warning(
+            "Incremental drizzling is not available for tiled drizzling; "
+            "drizzling the whole output in memory instead."
+        )
+        paramDict["memory_budget"] = None
+
     #
     # An image buffer needs to be setup for converting the input
     # arrays (sci and wht) from FITS format to native format
@@ -981,10 +1053,55 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
         _outsci = np.empty(output_wcs.array_shape, dtype=np.float32)
         _outsci.fill(maskval)
         _outwht = np.zeros(output_wcs.array_shape, dtype=np.float32)
-        # initialize context to 3-D array but only pass appropriate plane to drizzle as needed
-        _outctx = np.zeros((_nplanes,) + output_wcs.array_shape, dtype=np.int32)
+        if compact_ctx:
+            _outctx = context.ContextIndex(output_wcs.array_shape, _nplanes)
+        else:
+            # initialize context to 3-D array but only pass appropriate plane
+            # to drizzle as needed
+            _outctx = np.zeros((_nplanes,) + output_wcs.array_shape, dtype=np.int32)
         _hdrlist = []
 
+    if prior is not None:
+        _outctx = _load_prior_product(
+            prior, imageObjectList, paramDict, _nplanes, _outsci, _outwht, _outctx
+        )
+
+    if not single and paramDict.get("memory_budget"):
+        run_driz_tiled(
+            imageObjectList,
+            output_wcs,
+            outwcs,
+            paramDict,
+            build,
+            _versions,
+            _nplanes,
+            wcsmap,
+            pool_size,
+            plan,
+        )
+        return
+
+    if run_threaded:
+        run_driz_threaded(
+            imageObjectList,
+            output_wcs,
+            outwcs,
+            paramDict,
+            build,
+            _versions,
+            _nplanes,
+            _outsci,
+            _outwht,
+            _outctx,
+            _hdrlist,
+            wcsmap,
+            pool_size,
+            plan,
+            prior=prior,
+        )
+        del _outsci, _outwht, _outctx, _hdrlist
+        return
+
     # Keep track of how many chips have been processed
     # For single case, this will determine when to close
     # one product and open the next.
@@ -999,6 +1116,7 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
     # Work on each image
     #
     subprocs = []
+    shared = None
     for img in imageObjectList:
 
         chiplist = img.returnAllChips(extname=img.scienceExt)
@@ -1020,20 +1138,23 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
 
         # Work each image, possibly in parallel
         if run_parallel:
-            # use multiprocessing.Manager only if in parallel and in memory
             mp_ctx = multiprocessing.get_context("fork")
 
+            # parallelize run_driz_img (currently for separate drizzle only);
+            # in-memory products are handed back through shared memory.
             if img.inmemory:
-                manager = mp_ctx.Manager()
-                dproxy = manager.dict(img.virtualOutputs)  # copy & wrap it in proxy
-                img.virtualOutputs = dproxy
+                if shared is None:
+                    shared = sharedmem.SharedOutputs()
+                target = shared.run
+                args = (str(len(subprocs)), img, run_driz_img)
+            else:
+                target = run_driz_img
+                args = (img,)
 
-            # parallelize run_driz_img (currently for separate drizzle only)
             p = mp_ctx.Process(
-                target=run_driz_img,
+                target=target,
                 name="adrizzle.run_driz_img()",  # for err msgs
-                args=(
-                    img,
+                args=args + (
                     chiplist,
                     output_wcs,
                     outwcs,
@@ -1051,6 +1172,7 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
                     None,
                     None,
                     wcsmap,
+                    plan,
                 ),
             )
             subprocs.append(p)
@@ -1075,6 +1197,8 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
                 _outctx,
                 _hdrlist,
                 wcsmap,
+                plan,
+                prior=prior,
             )
 
         # Increment/reset master chip counter
@@ -1084,12 +1208,528 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
 
     # do the join if we spawned tasks
     if run_parallel:
-        mputil.launch_and_wait(subprocs, pool_size)  # blocks till all done
+        try:
+            mputil.launch_and_wait(subprocs, pool_size)  # blocks till all done
+            if shared is not None:
+                for k, img in enumerate(imageObjectList):
+                    img.saveVirtualOutputs(shared.collect(str(k)))
+        finally:
+            if shared is not None:
+                shared.close()
 
     del _outsci, _outwht, _outctx, _hdrlist
     # have looped over each img/chip
 
 
+def plan_driz(imageObjectList, outwcs, paramDict, wcsmap=None):
+    """Find the part of the output that each chip drizzles onto.
+
+    The footprint of each chip on the output is computed from the WCS of
+    its edge pixels (see :py:func:`~drizzlepac.wcs_functions.calc_output_bbox`),
+    grown by the reach of the drizzle kernel, before any pixel data is read.
+    Chips that do not overlap the output at all can then be skipped
+    entirely, while the others only need to be drizzled onto their bounding
+    box.  This matters most for outputs (sky cells, custom mosaics) that
+    are covered by only a few of the input chips.
+
+    Returns a dictionary mapping the name of each chip
+    (``chip.outputNames["data"]``) to its ``(xmin, xmax, ymin, ymax)``
+    bounding box on the output (0-based, half-open ranges) or to `None` when
+    the chip does not overlap the output.  Chips drizzled with a custom
+    ``wcsmap`` are planned onto the whole output.
+    """
+    ny, nx = outwcs.array_shape
+    plan = {}
+    npix = npix_skipped = 0
+    for img in imageObjectList:
+        for chip in img.returnAllChips(extname=img.scienceExt):
+            shape = chip.image_shape
+            if wcsmap is None:
+                pix_ratio = outwcs.pscale / chip.wcslin_pscale
+                bbox = wcs_functions.calc_output_bbox(
+                    chip.wcs, outwcs, shape=shape,
+                    margin=_kernel_margin(paramDict, pix_ratio)
+                )
+            else:
+                bbox = (0, nx, 0, ny)
+
+            name = chip.outputNames["data"]
+            plan[name] = bbox
+            npix += shape[0] * shape[1]
+            if bbox is None:
+                npix_skipped += shape[0] * shape[1]
+                log.debug(f"-Drizzle plan: {name} does not overlap the output")
+            else:
+                log.debug(
+                    f"-Drizzle plan: {name} onto output "
+                    f"[{bbox[0]:d}:{bbox[1]:d}, {bbox[2]:d}:{bbox[3]:d}]"
+                )
+
+    nskipped = sum(bbox is None for bbox in plan.values())
+    log.info(
+        f"Drizzle plan: {len(plan) - nskipped:d} of {len(plan):d} chip(s) "
+        f"({(npix - npix_skipped) / 1e6:.2f} of {npix / 1e6:.2f} Mpix) "
+        f"overlap the output; skipping {nskipped:d} chip(s)"
+    )
+    return plan
+
+
+def _kernel_margin(paramDict, pix_ratio):
+    """Reach of the drizzle kernel around an input pixel, in output pixels.
+
+    Includes an extra two output pixels to account for the pixel corners
+    and the interpolation of the pixel map.
+    """
+    return np.ceil(max(3.0 * paramDict["pixfrac"], 1.2) / pix_ratio) + 2
+
+
+def _get_planned_bbox(plan, chip):
+    """Return ``(overlaps, bbox)`` for ``chip`` according to ``plan``.
+
+    ``bbox`` is `None` when there is no plan for the chip, in which case it
+    is drizzled onto the whole output.
+    """
+    if plan is None or chip.outputNames["data"] not in plan:
+        return True, None
+    bbox = plan[chip.outputNames["data"]]
+    return bbox is not None, bbox
+
+
+def run_driz_threaded(
+    imageObjectList,
+    output_wcs,
+    outwcs,
+    paramDict,
+    build,
+    _versions,
+    _nplanes,
+    _outsci,
+    _outwht,
+    _outctx,
+    _hdrlist,
+    wcsmap,
+    pool_size,
+    plan=None,
+    prior=None,
+):
+    """Drizzle all chips of all images onto a single output with threads.
+
+    The output is split into ``pool_size`` bands of rows, each owned by one
+    thread, which drizzles onto its band the input rows of every chip that
+    land there.  ``cdriz.tdriz`` releases the GIL while drizzling, so the
+    threads run truly in parallel, straight onto the output arrays: no
+    thread ever writes to the rows of another one and every band adds the
+    chips in input order, so the result is the same as drizzling serially,
+    without any additional copy of the output arrays.
+
+    Chips are read, masked and mapped onto the output once each, in input
+    order, by the calling thread while the bands drizzle the previous chip,
+    so that no more than two chips are held in memory at any time.  Chips that do not overlap the output according to
+    ``plan`` (see :py:func:`plan_driz`) are not read at all.
+
+    See :py:func:`run_driz` for a description of the parameters.
+    """
+    ny, nx = _outsci.shape
+    compact_ctx = isinstance(_outctx, context.ContextIndex)
+
+    tasks = []
+    template = []
+    for img in imageObjectList:
+        for chip in img.returnAllChips(extname=img.scienceExt):
+            tasks.append((img, chip))
+            template.append(chip.outputNames["data"])
+
+    nbands = max(1, min(pool_size, ny))
+    bands = [(k * ny // nbands, (k + 1) * ny // nbands) for k in range(nbands)]
+
+    chips = {}  # chips mapped onto the output and not drizzled by all bands
+    ndone = [0] * nbands  # number of chips each band is done with
+    abort = threading.Event()
+    cond = threading.Condition()
+
+    def _drizzle_band(band):
+        y0, y1 = bands[band]
+        try:
+            for k in range(len(tasks)):
+                with cond:
+                    cond.wait_for(lambda k=k: k in chips or abort.is_set())
+                    if abort.is_set():
+                        return
+                    chipinfo = chips[k]
+                if chipinfo is not None:
+                    _drizzle_chip_rows(chipinfo, outwcs, paramDict, _outsci,
+                                       _outwht, _outctx, y0, y1)
+                with cond:
+                    ndone[band] = k + 1
+                    cond.notify_all()
+        finally:
+            # never leave the calling thread waiting for a failed band
+            with cond:
+                ndone[band] = len(tasks)
+                cond.notify_all()
+
+    def _release_chips():
+        # Drop the chips all bands are done with; compact context images
+        # get the pixels each chip landed on added in input order.
+        for k in sorted(k for k in chips if k < min(ndone)):
+            chipinfo = chips.pop(k)
+            if chipinfo is not None and compact_ctx:
+                wx0, wx1, wy0, _ = chipinfo["window"]
+                _outctx.add(
+                    chipinfo["ctx_uniqid"],
+                    chipinfo["ctx"][:, wx0:wx1] != 0,
+                    origin=(wx0, wy0),
+                )
+
+    results = []
+    with ThreadPoolExecutor(max_workers=nbands) as executor:
+        futures = [executor.submit(_drizzle_band, band) for band in range(nbands)]
+        dispatched = False
+        try:
+            for k, (img, chip) in enumerate(tasks):
+                with cond:
+                    cond.wait_for(lambda k=k: k - min(ndone) < 2)
+                    _release_chips()
+                if any(f.done() for f in futures):
+                    break  # a band failed; its error is raised below
+
+                overlap, bbox = _get_planned_bbox(plan, chip)
+                if overlap:
+                    with util.chip_usage(PROCSTEPS_NAME_FINAL, chip.outputNames["data"]):
+                        chipinfo = _map_driz_chip(
+                            img, chip, outwcs, paramDict, wcsmap,
+                            _get_uniqid(k, _nplanes, prior), bbox=bbox
+                        )
+                    if compact_ctx:
+                        _add_chip_context_window(chipinfo, ny, nx)
+                    _bunit = chipinfo["bunit"]
+                else:
+                    log.info(f"-Skipping drizzle input: {chip.outputNames['data']}")
+                    _skip_driz_chip(img, chip, paramDict, False)
+                    chipinfo = None
+                    _bunit = _get_driz_bunit(chip, paramDict)
+                results.append(
+                    (_get_driz_outputvals(img, chip, paramDict, cdriz.TDRIZ_VERSION),
+                     _bunit)
+                )
+                with cond:
+                    chips[k] = chipinfo
+                    cond.notify_all()
+            else:
+                dispatched = True
+        finally:
+            if not dispatched:
+                # stop the bands waiting for chips that will never come
+                abort.set()
+                with cond:
+                    cond.notify_all()
+        for f in futures:
+            f.result()
+
+    with cond:
+        _release_chips()
+
+    # Header values are recorded in input order
+    for outputvals, _ in results:
+        _hdrlist.append(outputvals)
+
+    img, chip = tasks[-1]
+    _write_driz_product(
+        img,
+        chip,
+        output_wcs,
+        template,
+        paramDict,
+        False,
+        build,
+        _versions,
+        results[-1][1],
+        _outsci,
+        _outwht,
+        _outctx,
+        _hdrlist,
+        prior=prior,
+    )
+
+
+def _add_chip_context_window(chipinfo, ny, nx):
+    """Set up the single-bit context array of a chip drizzled by row bands
+    onto a compact context image: it covers the full width of the output
+    rows of the chip bounding box, ``chipinfo["window"]`` being the
+    ``(xmin, xmax, ymin, ymax)`` window of the output it is added to.
+    """
+    bbox = chipinfo["bbox"]
+    window = (0, nx, 0, ny) if bbox is None else (
+        max(bbox[0], 0), min(bbox[1], nx), max(bbox[2], 0), min(bbox[3], ny)
+    )
+    chipinfo["window"] = window
+    chipinfo["ctx"] = np.zeros(
+        (max(window[3] - window[2], 0), nx), dtype=np.int32
+    )
+    chipinfo["ctx_uniqid"] = chipinfo["uniqid"]
+
+
+def _drizzle_chip_rows(chipinfo, outwcs, paramDict, outsci, outwht, outctx, y0, y1,
+                       out_origin=None):
+    """Drizzle the input rows of a chip mapped with :py:func:`_map_driz_chip`
+    that land on output rows ``y0`` to ``y1 - 1``.
+
+    ``outsci``, ``outwht`` and ``outctx`` are either the whole output arrays
+    or, when ``out_origin`` is given, just the tile of the output starting at
+    ``out_origin``.  A compact context image is replaced by the single-bit
+    context array of the chip (see :py:func:`_add_chip_context_window`).
+    """
+    c = chipinfo
+    bbox = c.get("bbox")
+    if bbox is not None:
+        y0 = max(y0, bbox[2])
+        y1 = min(y1, bbox[3])
+    if y1 <= y0:
+        return
+
+    # Input rows that can land on these rows, plus one more row on
+    # each side so pixel corners are still interpolated
+    rows = np.flatnonzero(
+        (c["row_ymax"] >= y0 + 1 - c["margin"])
+        & (c["row_ymin"] <= y1 + c["margin"])
+    )
+    if rows.size == 0:
+        return
+    r0 = max(rows[0] - 1, 0)
+    r1 = min(rows[-1] + 2, c["sci"].shape[0])
+
+    uniqid = c["uniqid"]
+    if out_origin is None:
+        # rows of the whole output arrays
+        sci, wht = outsci[y0:y1], outwht[y0:y1]
+        if isinstance(outctx, context.ContextIndex):
+            wy0 = c["window"][2]
+            ctx = c["ctx"][y0 - wy0:y1 - wy0]
+            uniqid = 1
+        else:
+            ctx = outctx[:, y0:y1]
+        out_origin = (0, y0)
+    else:
+        sci, wht, ctx = outsci, outwht, outctx
+
+    do_driz(
+        c["sci"],
+        c["chip"].wcs,
+        c["wht"],
+        outwcs,
+        sci,
+        wht,
+        ctx,
+        1.0,
+        "cps",
+        c["chip"]._wtscl,
+        wcslin_pscale=c["chip"].wcslin_pscale,
+        uniqid=uniqid,
+        pixfrac=paramDict["pixfrac"],
+        kernel=paramDict["kernel"],
+        fillval=paramDict["fillval"],
+        pixmap=c["pixmap"],
+        report_misses=False,
+        bbox=bbox,
+        in_bbox=(0, c["sci"].shape[1], r0, r1),
+        out_origin=out_origin,
+    )
+
+
+def run_driz_tiled(
+    imageObjectList,
+    output_wcs,
+    outwcs,
+    paramDict,
+    build,
+    _versions,
+    _nplanes,
+    wcsmap,
+    pool_size,
+    plan=None,
+):
+    """Drizzle all chips onto the final output one tile at a time.
+
+    The output is split into strips of full-width rows, sized so that
+    the output science, weight and context arrays for ``pool_size`` strips
+    plus the working arrays of one input chip fit in
+    ``paramDict["memory_budget"]`` megabytes.  The output FITS file(s) are
+    created on disk up-front and each strip is written straight into them
+    through a memory map as soon as it has been drizzled, so the full
+    output arrays are never held in memory.
+
+    Every chip is read and prepared only once: its science and weight
+    arrays and its pixel map are spilled to scratch files which are
+    memory-mapped back to drizzle the input rows that overlap each strip.
+    Chips that do not overlap the output according to ``plan`` (see
+    :py:func:`plan_driz`) are not read at all.
+
+    See :py:func:`run_driz` for a description of the parameters.
+    """
+    maskval = interpret_maskval(paramDict)
+    fillval = paramDict["fillval"]
+    ny, nx = output_wcs.array_shape
+
+    outname = imageObjectList[0].outputNames["outFinal"]
+    scratch_dir = tempfile.mkdtemp(
+        prefix="driz_tiles_", dir=os.path.dirname(os.path.abspath(outname))
+    )
+    try:
+        # Read and prepare each chip once, keeping only row bounds in memory
+        chips = []
+        template = []
+        _hdrlist = []
+        for img in imageObjectList:
+            for chip in img.returnAllChips(extname=img.scienceExt):
+                _uniqid = _get_uniqid(len(template), _nplanes)
+                template.append(chip.outputNames["data"])
+                if _get_planned_bbox(plan, chip)[0]:
+                    chips.append(
+                        _spill_driz_chip(
+                            img, chip, outwcs, paramDict, wcsmap, scratch_dir,
+                            _uniqid
+                        )
+                    )
+                else:
+                    _skip_driz_chip(img, chip, paramDict, False)
+                _hdrlist.append(
+                    _get_driz_outputvals(img, chip, paramDict, cdriz.TDRIZ_VERSION)
+                )
+
+        # Size the strips to fit in the memory budget
+        budget = float(paramDict["memory_budget"]) * 1024**2
+        chip_bytes = max(
+            [c["pixmap"].nbytes + 2 * c["sci"].nbytes for c in chips], default=0
+        )
+        row_bytes = nx * (8 + 4 * _nplanes) * pool_size
+        if budget < chip_bytes + row_bytes:
+            log.warning(
+                f"Memory budget of {paramDict['memory_budget']} MB is too small "
+                "to drizzle even a single output row; using 1-row tiles."
+            )
+        tile_rows = int(max(1, min(ny, (budget - chip_bytes) // row_bytes)))
+        tiles = [(y0, min(y0 + tile_rows, ny)) for y0 in range(0, ny, tile_rows)]
+        log.info(
+            f"Drizzling {ny:d}x{nx:d} output in {len(tiles):d} tile(s) of "
+            f"{tile_rows:d} rows"
+        )
+
+        # Build the product headers and create the output file(s) on disk
+        img = imageObjectList[-1]
+        chip = img.returnAllChips(extname=img.scienceExt)[-1]
+        _bunit = _scale_driz_output(
+            np.zeros(1, dtype=np.float32), img, chip, paramDict, False,
+            _get_driz_bunit(chip, paramDict)
+        )
+        img.inmemory = False
+        _outimg = outputimage.OutputImage(
+            _hdrlist, paramDict, build=build, wcs=output_wcs, single=False
+        )
+        _outimg.set_bunit(_bunit)
+        _outimg.set_units(paramDict["units"])
+        outarrs = _outimg.createFITS(
+            template,
+            output_wcs.array_shape,
+            nplanes=_nplanes,
+            versions=_versions,
+            rules_file=paramDict["rules_file"],
+            logfile=paramDict["logfile"],
+        )
+        del _outimg
+
+        def _drizzle_tile(tile):
+            y0, y1 = tile
+            _outsci = np.full((y1 - y0, nx), maskval, dtype=np.float32)
+            _outwht = np.zeros((y1 - y0, nx), dtype=np.float32)
+            _outctx = np.zeros((_nplanes, y1 - y0, nx), dtype=np.int32)
+
+            for c in chips:
+                _drizzle_chip_rows(c, outwcs, paramDict, _outsci, _outwht,
+                                   _outctx, y0, y1, out_origin=(0, y0))
+
+            # Drizzling any chip fills all empty output pixels
+            if not util.is_blank(fillval):
+                _outsci[_outwht == 0] = float(fillval)
+
+            _scale_driz_output(_outsci, img, chip, paramDict, False, _bunit)
+            outarrs["SCI"][y0:y1] = _outsci
+            outarrs["WHT"][y0:y1] = _outwht
+            if "CTX" in outarrs:
+                outarrs["CTX"][:, y0:y1] = _outctx
+
+        if pool_size > 1:
+            with ThreadPoolExecutor(max_workers=pool_size) as executor:
+                list(executor.map(_drizzle_tile, tiles))
+        else:
+            for tile in tiles:
+                _drizzle_tile(tile)
+
+        for arr in outarrs.values():
+            arr.flush()
+        del outarrs
+
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+def _map_driz_chip(img, chip, outwcs, paramDict, wcsmap, uniqid, bbox=None):
+    """Prepare a chip to be drizzled onto parts of the output.
+
+    Returns a dictionary with the chip, its science array (already divided
+    by the exposure time), weight array and pixel map, the range of output
+    rows (1-based) spanned by each input row and the reach of the kernel
+    around each input pixel, used by :py:func:`_drizzle_chip_rows`.
+    """
+    _insci, _inwht, _expin, _in_units, _bunit = _prepare_driz_chip(
+        img, chip, outwcs, paramDict, False
+    )
+    _insci = _insci.astype(np.float32)
+    if _in_units != "cps":
+        # tdriz divides the input by the exposure time in-place; do it here
+        # once since the same input rows may be drizzled onto several tiles.
+        np.multiply(_insci, np.float32(1.0) / np.float32(_expin), _insci)
+
+    pixmap = _get_driz_pixmap(
+        chip.wcs, outwcs, _insci.shape, stepsize=paramDict["stepsize"],
+        stepsize_tolerance=paramDict.get("stepsize_tolerance"), wcsmap=wcsmap
+    )
+    with warnings.catch_warnings():
+        # rows mapping entirely off the sky give NaN bounds and never overlap
+        warnings.simplefilter("ignore", RuntimeWarning)
+        row_ymin = np.nanmin(pixmap[..., 1], axis=1)
+        row_ymax = np.nanmax(pixmap[..., 1], axis=1)
+
+    return {
+        "img": img,
+        "chip": chip,
+        "uniqid": uniqid,
+        "bbox": bbox,
+        "bunit": _bunit,
+        "sci": _insci,
+        "wht": _inwht,
+        "pixmap": pixmap,
+        "row_ymin": row_ymin,
+        "row_ymax": row_ymax,
+        # Reach of the kernel around each input pixel center, in output pixels
+        "margin": _kernel_margin(paramDict, outwcs.pscale / chip.wcslin_pscale),
+    }
+
+
+def _spill_driz_chip(img, chip, outwcs, paramDict, wcsmap, scratch_dir, uniqid):
+    """Prepare a chip for tiled drizzling and save its arrays to scratch files.
+
+    Returns the dictionary of :py:func:`_map_driz_chip`, with memory-mapped
+    science, weight and pixel map arrays.
+    """
+    chipinfo = _map_driz_chip(img, chip, outwcs, paramDict, wcsmap, uniqid)
+    root = os.path.join(scratch_dir, f"chip{uniqid:d}_{id(chip):x}")
+    for key in ["sci", "wht", "pixmap"]:
+        np.save(f"{root}_{key}.npy", chipinfo[key])
+        chipinfo[key] = np.load(f"{root}_{key}.npy", mmap_mode="r")
+
+    return chipinfo
+
+
 #
 # Still to check:
 #    - why have both output_wcs and outwcs?
@@ -1114,6 +1754,8 @@ def run_driz_img(
     _outctx,
     _hdrlist,
     wcsmap,
+    plan=None,
+    prior=None,
 ):
     """Perform the drizzle operation on a single image.
     This is separated out from :py:func:`run_driz` so as to keep together
@@ -1147,26 +1789,31 @@ def run_driz_img(
         #                 str(doWrite)+', here='+str(here))
 
         # run_driz_chip
-        run_driz_chip(
-            img,
-            chip,
-            output_wcs,
-            outwcs,
-            template,
-            paramDict,
-            single,
-            doWrite,
-            build,
-            _versions,
-            _numctx,
-            _nplanes,
-            chipIdxCopy,
-            _outsci,
-            _outwht,
-            _outctx,
-            _hdrlist,
-            wcsmap,
-        )
+        overlap, bbox = _get_planned_bbox(plan, chip)
+        with util.chip_usage(_driz_step_name(single), chip.outputNames["data"]):
+            run_driz_chip(
+                img,
+                chip,
+                output_wcs,
+                outwcs,
+                template,
+                paramDict,
+                single,
+                doWrite,
+                build,
+                _versions,
+                _numctx,
+                _nplanes,
+                chipIdxCopy,
+                _outsci,
+                _outwht,
+                _outctx,
+                _hdrlist,
+                wcsmap,
+                overlap=overlap,
+                bbox=bbox,
+                prior=prior,
+            )
 
         # Increment chip counter (also done outside of this function)
         chipIdxCopy += 1
@@ -1208,86 +1855,182 @@ def run_driz_chip(
     _outctx,
     _hdrlist,
     wcsmap,
+    overlap=True,
+    bbox=None,
+    prior=None,
 ):
     """Perform the drizzle operation on a single chip.
     This is separated out from ``run_driz_img`` so as to keep together
     the entirety of the code which is inside the loop over
     chips.  See the ``run_driz`` code for more documentation.
+
+    When ``overlap`` is `False` the chip is known not to overlap the output
+    and is not read at all; otherwise it is drizzled onto the ``bbox`` part
+    of the output only (see :py:func:`plan_driz`).
     """
     global time_pre_all, time_driz_all, time_post_all, time_write_all
 
     epoch = time.time()
 
-    # Look for sky-subtracted product
-    if os.path.exists(chip.outputNames["outSky"]):
-        chipextn = "[" + chip.header["extname"] + "," + str(chip.header["extver"]) + "]"
-        _expname = chip.outputNames["outSky"] + chipextn
+    if overlap:
+        _insci, _inwht, _expin, _in_units, _bunit = _prepare_driz_chip(
+            img, chip, outwcs, paramDict, single
+        )
     else:
-        # If sky-subtracted product does not exist, use regular input
-        _expname = chip.outputNames["data"]
-    log.info(f"-Drizzle input: {_expname}")
-
-    # Open the SCI image
-    _handle = fileutil.openImage(_expname, mode="readonly", memmap=False)
-    _sciext = _handle[chip.header["extname"], chip.header["extver"]]
+        log.info(f"-Skipping drizzle input: {chip.outputNames['data']}")
+        _skip_driz_chip(img, chip, paramDict, single)
+        _bunit = _get_driz_bunit(chip, paramDict)
 
-    # Apply sky subtraction and unit conversion to input array
-    if chip.computedSky is None:
-        _insci = _sciext.data
+    time_pre = time.time() - epoch
+    epoch = time.time()
+    # New interface to performing the drizzle operation on a single chip/image
+    if overlap:
+        _vers = do_driz(
+            _insci,
+            chip.wcs,
+            _inwht,
+            outwcs,
+            _outsci,
+            _outwht,
+            _outctx,
+            _expin,
+            _in_units,
+            chip._wtscl,
+            wcslin_pscale=chip.wcslin_pscale,
+            uniqid=_get_uniqid(_numchips, _nplanes, prior),
+            pixfrac=paramDict["pixfrac"],
+            kernel=paramDict["kernel"],
+            fillval=paramDict["fillval"],
+            stepsize=paramDict["stepsize"],
+            stepsize_tolerance=paramDict.get("stepsize_tolerance"),
+            wcsmap=wcsmap,
+            bbox=bbox,
+        )
     else:
-        log.info(f"Applying sky value of {chip.computedSky:0.6f} to {_expname}")
-        _insci = _sciext.data - chip.computedSky
-    # If input SCI image is still integer format (RAW files)
-    # transform it to float32 for all subsequent operations
-    # needed for numpy >=1.12.x
-    if np.issubdtype(_insci[0, 0], np.int16):
-        _insci = _insci.astype(np.float32)
-
-    _insci *= chip._effGain
+        _vers = cdriz.TDRIZ_VERSION
+    time_driz = time.time() - epoch
+    epoch = time.time()
 
-    # Set additional parameters needed by 'drizzle'
-    _in_units = chip.in_units.lower()
-    if _in_units == "cps":
-        _expin = 1.0
-    else:
-        _expin = chip._exptime
+    _hdrlist.append(_get_driz_outputvals(img, chip, paramDict, _vers))
+    time_post = time.time() - epoch
+    epoch = time.time()
 
-    ####
-    #
-    # Put the units keyword handling in the imageObject class
-    #
-    ####
-    # Determine output value of BUNITS
-    # and make sure it is not specified as 'ergs/cm...'
-    _bunit = chip._bunit
+    if doWrite:
+        _write_driz_product(
+            img,
+            chip,
+            output_wcs,
+            template,
+            paramDict,
+            single,
+            build,
+            _versions,
+            _bunit,
+            _outsci,
+            _outwht,
+            _outctx,
+            _hdrlist,
+            prior=prior,
+        )
 
-    _bindx = _bunit.find("/")
+    # this is after the doWrite
+    time_write = time.time() - epoch
+    if False and not single:  # turn off all this perf reporting for now
+        time_pre_all.append(time_pre)
+        time_driz_all.append(time_driz)
+        time_post_all.append(time_post)
+        time_write_all.append(time_write)
 
-    if paramDict["units"] == "cps":
-        # If BUNIT value does not specify count rate already...
-        if _bindx < 1:
-            # ... append '/SEC' to value
-            _bunit += "/S"
-        else:
-            # reset _bunit here to None so it does not
-            #    overwrite what is already in header
-            _bunit = None
-    else:
-        if _bindx > 0:
-            # remove '/S'
-            _bunit = _bunit[:_bindx]
-        else:
-            # reset _bunit here to None so it does not
-            #    overwrite what is already in header
-            _bunit = None
+        log.info(f"chip time pre-drizzling:  {time_pre:6.3f}")
+        log.info(f"chip time drizzling:      {time_driz:6.3f}")
+        log.info(f"chip time post-drizzling: {time_post:6.3f}")
+        log.info(f"chip time writing output: {time_write:6.3f}")
 
-    _uniqid = _numchips + 1
-    if _nplanes == 1:
+        if doWrite:
+            tot_pre = sum(time_pre_all)
+            tot_driz = sum(time_driz_all)
+            tot_post = sum(time_post_all)
+            tot_write = sum(time_write_all)
+            tot = tot_pre + tot_driz + tot_post + tot_write
+            log.info(
+                f"chip total pre-drizzling: {tot_pre:6.3f} "
+                f"({100.0 * tot_pre / tot:4.1f}%)")
+            log.info(
+                f"chip total drizzling: {tot_driz:6.3f} "
+                f"({100.0 * tot_driz / tot:4.1f}%)")
+            log.info(
+                f"chip total post-drizzling: {tot_post:6.3f} "
+                f"({100.0 * tot_post / tot:4.1f}%)")
+            log.info(
+                f"chip total writing output: {tot_write:6.3f} "
+                f"({100.0 * tot_write / tot:4.1f}%)")
+
+
+def _driz_step_name(single):
+    """Return the name of the separate or final drizzle step."""
+    return PROCSTEPS_NAME_SINGLE if single else PROCSTEPS_NAME_FINAL
+
+
+def _get_uniqid(chip_index, nplanes, prior=None):
+    """Return the context bit ID ``tdriz`` uses for the chip at ``chip_index``.
+
+    Chips drizzled into a ``prior`` product (see :py:func:`_read_prior_product`)
+    are numbered after the inputs already in it.
+    """
+    _uniqid = chip_index + 1
+    if prior is not None:
+        _uniqid += prior["ndrizim"]
+    if nplanes == 1:
         # We need to reset what gets passed to TDRIZ
         # when only 1 context image plane gets generated
         # to prevent overflow problems with trying to access
         # planes that weren't created for large numbers of inputs.
         _uniqid = ((_uniqid - 1) % 32) + 1
+    return _uniqid
+
+
+def _prepare_driz_chip(img, chip, outwcs, paramDict, single):
+    """Read a chip and build the science and weight arrays passed to ``do_driz``.
+
+    Returns the sky-subtracted, gain-scaled science array, the weight
+    array, the exposure time and units to pass to ``tdriz`` and the
+    ``BUNIT`` value for the output product (``None`` to leave it as-is).
+    """
+    # Look for sky-subtracted product
+    if os.path.exists(chip.outputNames["outSky"]):
+        chipextn = "[" + chip.header["extname"] + "," + str(chip.header["extver"]) + "]"
+        _expname = chip.outputNames["outSky"] + chipextn
+    else:
+        # If sky-subtracted product does not exist, use regular input
+        _expname = chip.outputNames["data"]
+    log.info(f"-Drizzle input: {_expname}")
+
+    # Open the SCI image
+    _handle = fileutil.openImage(_expname, mode="readonly", memmap=False)
+    _sciext = _handle[chip.header["extname"], chip.header["extver"]]
+
+    # Apply sky subtraction and unit conversion to input array
+    if chip.computedSky is None:
+        _insci = _sciext.data
+    else:
+        log.info(f"Applying sky value of {chip.computedSky:0.6f} to {_expname}")
+        _insci = _sciext.data - chip.computedSky
+    # If input SCI image is still integer format (RAW files)
+    # transform it to float32 for all subsequent operations
+    # needed for numpy >=1.12.x
+    if np.issubdtype(_insci[0, 0], np.int16):
+        _insci = _insci.astype(np.float32)
+
+    _insci *= chip._effGain
+
+    # Set additional parameters needed by 'drizzle'
+    _in_units = chip.in_units.lower()
+    if _in_units == "cps":
+        _expin = 1.0
+    else:
+        _expin = chip._exptime
+
+    _bunit = _get_driz_bunit(chip, paramDict)
 
     # Select which mask needs to be read in for drizzling
     ####
@@ -1368,31 +2111,73 @@ def run_driz_chip(
             del pimg
             log.info(f"Writing out mask file: {_outmaskname}")
 
-    time_pre = time.time() - epoch
-    epoch = time.time()
-    # New interface to performing the drizzle operation on a single chip/image
-    _vers = do_driz(
-        _insci,
-        chip.wcs,
-        _inwht,
-        outwcs,
-        _outsci,
-        _outwht,
-        _outctx,
-        _expin,
-        _in_units,
-        chip._wtscl,
-        wcslin_pscale=chip.wcslin_pscale,
-        uniqid=_uniqid,
-        pixfrac=paramDict["pixfrac"],
-        kernel=paramDict["kernel"],
-        fillval=paramDict["fillval"],
-        stepsize=paramDict["stepsize"],
-        wcsmap=wcsmap,
-    )
-    time_driz = time.time() - epoch
-    epoch = time.time()
+    return _insci, _inwht, _expin, _in_units, _bunit
+
+
+def _get_driz_bunit(chip, paramDict):
+    """Return the ``BUNIT`` value of the output product (`None` to leave it as-is)."""
+    ####
+    #
+    # Put the units keyword handling in the imageObject class
+    #
+    ####
+    # Determine output value of BUNITS
+    # and make sure it is not specified as 'ergs/cm...'
+    _bunit = chip._bunit
+
+    _bindx = _bunit.find("/")
+
+    if paramDict["units"] == "cps":
+        # If BUNIT value does not specify count rate already...
+        if _bindx < 1:
+            # ... append '/SEC' to value
+            _bunit += "/S"
+        else:
+            # reset _bunit here to None so it does not
+            #    overwrite what is already in header
+            _bunit = None
+    else:
+        if _bindx > 0:
+            # remove '/S'
+            _bunit = _bunit[:_bindx]
+        else:
+            # reset _bunit here to None so it does not
+            #    overwrite what is already in header
+            _bunit = None
+
+    return _bunit
 
+
+def _skip_driz_chip(img, chip, paramDict, single):
+    """Do the bookkeeping of ``_prepare_driz_chip`` for a chip that is not
+    drizzled because it does not overlap the output.
+    """
+    if not single:
+        _update_chip_dq(img, chip, paramDict["crbit"])
+
+    img.set_wtscl(chip._chip, paramDict["wt_scl"])
+
+
+def _update_chip_dq(img, chip, crbit):
+    """Flag the pixels of the CR mask of a chip in its input DQ array."""
+    crMaskName = chip.outputNames["crmaskImage"]
+    if img.inmemory and crMaskName in img.virtualOutputs:
+        crMaskName = img.virtualOutputs[crMaskName]
+    updateInputDQArray(chip.dqfile, chip.dq_extn, chip._chip, crMaskName, crbit)
+
+
+def updateInputDQ(imageObjectList, crbit):
+    """Flag the cosmic rays found for all the chips of ``imageObjectList``
+    in their input DQ arrays, as the final drizzle does, when the final
+    drizzle itself does not need to be run again.
+    """
+    for img in imageObjectList:
+        for chip in img.returnAllChips(extname=img.scienceExt):
+            _update_chip_dq(img, chip, crbit)
+
+
+def _get_driz_outputvals(img, chip, paramDict, _vers):
+    """Build the header values recorded for a drizzled chip."""
     # Set up information for generating output FITS image
     # ### Check to see what names need to be included here for use in _hdrlist
     chip.outputNames["driz_version"] = _vers
@@ -1410,103 +2195,268 @@ def run_driz_chip(
 
     outputvals["wt_scl_val"] = chip._wtscl
 
-    _hdrlist.append(outputvals)
-    time_post = time.time() - epoch
-    epoch = time.time()
+    return outputvals
 
-    if doWrite:
-        ###########################
-        #
-        #   IMPLEMENTATION REQUIREMENT:
-        #
-        # Need to implement scaling of the output image
-        # from 'cps' to 'counts' in the case where 'units'
-        # was set to 'counts'... 21-Mar-2005
-        #
-        ###########################
-
-        # Convert output data from electrons/sec to counts/sec as specified
-        native_units = img.native_units
-        if (
-            paramDict["proc_unit"].lower() == "native"
-            and native_units.lower()[:6] == "counts"
-        ):
-            np.divide(_outsci, chip._gain, _outsci)
-            _bunit = native_units.lower()
-            if paramDict["units"] == "counts":
-                indx = _bunit.find("/")
-                if indx > 0:
-                    _bunit = _bunit[:indx]
-
-        # record IDCSCALE for output to product header
-        paramDict["idcscale"] = chip.wcs.idcscale
-        # If output units were set to 'counts', rescale the array in-place
+
+def _write_driz_product(
+    img,
+    chip,
+    output_wcs,
+    template,
+    paramDict,
+    single,
+    build,
+    _versions,
+    _bunit,
+    _outsci,
+    _outwht,
+    _outctx,
+    _hdrlist,
+    prior=None,
+):
+    """Scale the drizzled arrays to the requested units and write them out.
+
+    ``img`` and ``chip`` are the last image and chip drizzled into this product.
+    The provenance of the inputs of a ``prior`` product the new inputs were
+    drizzled into (see :py:func:`_read_prior_product`) is carried over.
+    """
+    ###########################
+    #
+    #   IMPLEMENTATION REQUIREMENT:
+    #
+    # Need to implement scaling of the output image
+    # from 'cps' to 'counts' in the case where 'units'
+    # was set to 'counts'... 21-Mar-2005
+    #
+    ###########################
+
+    # Chips drizzled onto part of the output only fill empty pixels there
+    if not util.is_blank(paramDict["fillval"]):
+        _outsci[_outwht == 0] = float(paramDict["fillval"])
+
+    _bunit = _scale_driz_output(_outsci, img, chip, paramDict, single, _bunit)
+    #
+    # Write output arrays to FITS file(s)
+    #
+    if not single:
+        img.inmemory = False
+
+    _outimg = outputimage.OutputImage(
+        _hdrlist, paramDict, build=build, wcs=output_wcs, single=single
+    )
+    _outimg.set_bunit(_bunit)
+    _outimg.set_units(paramDict["units"])
+    if prior is not None:
+        _outimg.set_prior_product(prior["header"], hdrtab=prior["hdrtab"])
+    outimgs = _outimg.writeFITS(
+        template,
+        _outsci,
+        _outwht,
+        ctxarr=_outctx,
+        versions=_versions,
+        virtual=img.inmemory,
+        rules_file=paramDict["rules_file"],
+        logfile=paramDict["logfile"],
+    )
+    del _outimg
+
+    # update imageObject with product in memory
+    if single:
+        img.saveVirtualOutputs(outimgs)
+
+
+def _scale_driz_output(_outsci, img, chip, paramDict, single, _bunit):
+    """Convert the drizzled science array to the output units in-place.
+
+    Returns the ``BUNIT`` value for the product.
+    """
+    # Convert output data from electrons/sec to counts/sec as specified
+    native_units = img.native_units
+    if (
+        paramDict["proc_unit"].lower() == "native"
+        and native_units.lower()[:6] == "counts"
+    ):
+        np.divide(_outsci, chip._gain, _outsci)
+        _bunit = native_units.lower()
         if paramDict["units"] == "counts":
-            # determine what exposure time needs to be used
-            # to rescale the product.
-            if single:
-                _expscale = chip._exptime
-            else:
-                _expscale = img.outputValues["texptime"]
-            np.multiply(_outsci, _expscale, _outsci)
-        #
-        # Write output arrays to FITS file(s)
-        #
-        if not single:
-            img.inmemory = False
+            indx = _bunit.find("/")
+            if indx > 0:
+                _bunit = _bunit[:indx]
+
+    # record IDCSCALE for output to product header
+    paramDict["idcscale"] = chip.wcs.idcscale
+    # If output units were set to 'counts', rescale the array in-place
+    if paramDict["units"] == "counts":
+        # determine what exposure time needs to be used
+        # to rescale the product.
+        if single:
+            _expscale = chip._exptime
+        else:
+            _expscale = img.outputValues["texptime"]
+        np.multiply(_outsci, _expscale, _outsci)
 
-        _outimg = outputimage.OutputImage(
-            _hdrlist, paramDict, build=build, wcs=output_wcs, single=single
-        )
-        _outimg.set_bunit(_bunit)
-        _outimg.set_units(paramDict["units"])
-        outimgs = _outimg.writeFITS(
-            template,
-            _outsci,
-            _outwht,
-            ctxarr=_outctx,
-            versions=_versions,
-            virtual=img.inmemory,
-            rules_file=paramDict["rules_file"],
-            logfile=paramDict["logfile"],
+    return _bunit
+
+
+def _unscale_driz_output(_outsci, img, chip, paramDict, texptime):
+    """Convert a science array written out by :py:func:`_scale_driz_output`
+    back to the units drizzle works in, in-place.
+
+    ``texptime`` is the total exposure time the array was scaled with.
+    """
+    if paramDict["units"] == "counts":
+        np.divide(_outsci, texptime, _outsci)
+    if (
+        paramDict["proc_unit"].lower() == "native"
+        and img.native_units.lower()[:6] == "counts"
+    ):
+        np.multiply(_outsci, chip._gain, _outsci)
+
+
+def _read_prior_product(img, output_wcs, paramDict, build):
+    """Read the existing final product that new inputs get drizzled into.
+
+    Returns `None` when there is no such product yet.  Otherwise, returns a
+    dictionary with the name (``'filename'``), provenance header
+    (``'header'``), header table (``'hdrtab'``, `None` if missing), science
+    and weight arrays (``'sci'`` and ``'wht'``, as written out) of the
+    product, the name of the file holding its context image (``'ctxfile'``,
+    `None` if missing), the number (``'ndrizim'``) and names
+    (``'inputs'``) of the inputs already drizzled into it, and their total
+    exposure time (``'texptime'``, ``'expstart'`` and ``'expend'``).
+
+    Raises `ValueError` when the product does not have the output WCS or was
+    drizzled with a different kernel, ``pixfrac``, units or fill value.
+    """
+    names = img.outputNames
+    filename = names["outFinal"] if build else names["outSci"]
+    if not os.path.exists(filename):
+        log.info(f"No final product {filename} yet: drizzling all inputs")
+        return None
+    log.info(f"Drizzling new inputs into existing final product: {filename}")
+
+    with fits.open(filename, memmap=False) as hdul:
+        if build:
+            scihdu = hdul["SCI"]
+            header = hdul[0].header.copy()
+            wht = hdul["WHT"].data
+            ctxfile = filename if hdul["CTX"].data is not None else None
+        else:
+            scihdu = next(h for h in hdul if h.is_image and h.data is not None)
+            header = scihdu.header.copy()
+            wht = fits.getdata(names["outWeight"], memmap=False)
+            ctxfile = names["outContext"]
+            if util.is_blank(ctxfile) or not os.path.exists(ctxfile):
+                ctxfile = None
+        sci = scihdu.data.astype(np.float32)
+        scihdr = scihdu.header.copy()
+        hdrtab = hdul["HDRTAB"].copy() if "HDRTAB" in hdul else None
+
+    # New inputs can only be drizzled onto the same grid...
+    ref = output_wcs.wcs
+    prior_cd = [[scihdr.get("CD1_1", np.nan), scihdr.get("CD1_2", np.nan)],
+                [scihdr.get("CD2_1", np.nan), scihdr.get("CD2_2", np.nan)]]
+    if not (
+        sci.shape == tuple(output_wcs.array_shape)
+        and np.allclose([scihdr.get("CRVAL1", np.nan), scihdr.get("CRVAL2", np.nan)],
+                        ref.crval, rtol=0, atol=1e-10)
+        and np.allclose([scihdr.get("CRPIX1", np.nan), scihdr.get("CRPIX2", np.nan)],
+                        ref.crpix, rtol=0, atol=1e-6)
+        and np.allclose(prior_cd, ref.cd, rtol=1e-9, atol=0)
+    ):
+        raise ValueError(
+            f"The WCS of {filename} does not match the output WCS; new inputs "
+            "can not be drizzled into it."
         )
-        del _outimg
 
-        # update imageObject with product in memory
-        if single:
-            img.saveVirtualOutputs(outimgs)
+    # ... with the same drizzle parameters
+    for key, par in [("KERN", "kernel"), ("PIXF", "pixfrac"),
+                     ("OUUN", "units"), ("FVAL", "fillval")]:
+        value = header.get(f"D001{key}")
+        if _driz_par_str(value) != _driz_par_str(paramDict[par]):
+            raise ValueError(
+                f"{filename} was drizzled with {par}={value}, not "
+                f"{paramDict[par]}; new inputs can not be drizzled into it."
+            )
 
-    # this is after the doWrite
-    time_write = time.time() - epoch
-    if False and not single:  # turn off all this perf reporting for now
-        time_pre_all.append(time_pre)
-        time_driz_all.append(time_driz)
-        time_post_all.append(time_post)
-        time_write_all.append(time_write)
+    ndrizim = header.get("NDRIZIM", 0)
+    return {
+        "filename": filename,
+        "header": header,
+        "hdrtab": hdrtab,
+        "sci": sci,
+        "wht": wht,
+        "ctxfile": ctxfile,
+        "ndrizim": ndrizim,
+        "inputs": {header.get(f"D{k:03d}DATA") for k in range(1, ndrizim + 1)},
+        "texptime": header.get("TEXPTIME", header.get("EXPTIME", 0.0)),
+        "expstart": header.get("EXPSTART"),
+        "expend": header.get("EXPEND"),
+    }
 
-        log.info(f"chip time pre-drizzling:  {time_pre:6.3f}")
-        log.info(f"chip time drizzling:      {time_driz:6.3f}")
-        log.info(f"chip time post-drizzling: {time_post:6.3f}")
-        log.info(f"chip time writing output: {time_write:6.3f}")
 
-        if doWrite:
-            tot_pre = sum(time_pre_all)
-            tot_driz = sum(time_driz_all)
-            tot_post = sum(time_post_all)
-            tot_write = sum(time_write_all)
-            tot = tot_pre + tot_driz + tot_post + tot_write
-            log.info(
-                f"chip total pre-drizzling: {tot_pre:6.3f} "
-                f"({100.0 * tot_pre / tot:4.1f}%)")
-            log.info(
-                f"chip total drizzling: {tot_driz:6.3f} "
-                f"({100.0 * tot_driz / tot:4.1f}%)")
-            log.info(
-                f"chip total post-drizzling: {tot_post:6.3f} "
-                f"({100.0 * tot_post / tot:4.1f}%)")
+def _driz_par_str(value):
+    """Normalize a drizzle parameter value for comparison."""
+    if util.is_blank(value) or str(value).strip().upper() == "INDEF":
+        return "indef"
+    try:
+        return repr(float(value))
+    except ValueError:
+        return str(value).strip().lower()
+
+
+def _select_new_images(imageObjectList, prior):
+    """Return the images that have not been drizzled into ``prior`` yet."""
+    new_images = []
+    for img in imageObjectList:
+        chips = img.returnAllChips(extname=img.scienceExt)
+        if any(chip.outputNames["data"] in prior["inputs"] for chip in chips):
             log.info(
-                f"chip total writing output: {tot_write:6.3f} "
-                f"({100.0 * tot_write / tot:4.1f}%)")
+                f"-Skipping drizzle input {img._filename}: already drizzled "
+                f"into {prior['filename']}"
+            )
+        else:
+            new_images.append(img)
+    return new_images
+
+
+def _load_prior_product(prior, imageObjectList, paramDict, nplanes,
+                        _outsci, _outwht, _outctx):
+    """Start the final drizzle from the arrays of the ``prior`` product.
+
+    The science, weight and (if requested) context arrays of the product
+    are copied into ``_outsci``, ``_outwht`` and ``_outctx``, and the exposure
+    time of the product is added to that of the new inputs in their
+    ``outputValues``.  Returns the context image, which is replaced when it
+    is compact.
+    """
+    img = imageObjectList[-1]
+    chip = img.returnAllChips(extname=img.scienceExt)[-1]
+    _outsci[...] = prior["sci"]
+    _unscale_driz_output(_outsci, img, chip, paramDict, prior["texptime"])
+    _outwht[...] = prior["wht"]
+
+    if not util.is_blank(img.outputNames["outContext"]):
+        if prior["ctxfile"] is None:
+            raise ValueError(
+                f"{prior['filename']} has no context image to drizzle new "
+                "inputs into."
+            )
+        if isinstance(_outctx, context.ContextIndex):
+            _outctx = context.read_context_index(prior["ctxfile"], nplanes=nplanes)
+        else:
+            planes = context.read_context(prior["ctxfile"])
+            _outctx[: planes.shape[0]] = planes
+
+    texptime, expstart, expend = util.compute_texptime(imageObjectList)
+    for img in imageObjectList:
+        img.outputValues["texptime"] = prior["texptime"] + texptime
+        if prior["expstart"] is not None:
+            img.outputValues["texpstart"] = min(prior["expstart"], expstart)
+        if prior["expend"] is not None:
+            img.outputValues["texpend"] = max(prior["expend"], expend)
+
+    return _outctx
 
 
 def do_driz(
@@ -1527,6 +2477,13 @@ def do_driz(
     fillval="INDEF",
     stepsize=10,
     wcsmap=None,
+    pixmap=None,
+    report_misses=True,
+    stepsize_tolerance=None,
+    bbox=None,
+    in_bbox=None,
+    out_origin=(0, 0),
+    lut_resolution=None,
 ):
     """
     Core routine for performing 'drizzle' operation on a single input image
@@ -1534,6 +2491,44 @@ def do_driz(
     of filenames.
     File handling (input and output) will be performed by calling routine.
 
+    The input to output pixel mapping is evaluated once for the whole chip
+    as a ``(ny, nx, 2)`` pixel map (see
+    :py:func:`~drizzlepac.wcs_functions.calc_pixmap`) which ``cdriz.tdriz``
+    reads directly, without calling back into Python. A precomputed
+    ``pixmap`` can be provided to skip this step; otherwise it is computed
+    with WCSLIB on a grid of ``stepsize`` pixels (refined where needed to
+    keep the interpolation error below ``stepsize_tolerance`` output
+    pixels, if set) or, when a custom ``wcsmap`` class is given, by
+    evaluating its ``forward`` method in bulk.
+
+    Set ``report_misses`` to `False` to not warn about input pixels falling
+    outside the output array, e.g. when drizzling onto a tile of a larger
+    output.
+
+    When the ``(xmin, xmax, ymin, ymax)`` bounding box of the input on the
+    output (0-based, half-open ranges, see :py:func:`plan_driz`) is given as
+    ``bbox``, ``cdriz.tdriz`` only resamples onto (and reads and writes the
+    output arrays within) that sub-window of the output.  Empty output
+    pixels are then filled with ``fillval`` within ``bbox`` only.
+    Likewise, only the input pixels within ``in_bbox`` are drizzled when
+    it is given.
+
+    The output arrays may hold just a tile of the output frame, e.g. of a
+    mosaic shared by several workers: ``out_origin`` is the ``(x, y)``
+    position of their first pixel in the output frame, in which ``bbox``
+    and the pixel map are expressed.
+
+    ``outcon`` can also be a compact context image
+    (:py:class:`~drizzlepac.context.ContextIndex`) of the same shape as the
+    output arrays, which the input is then added to.
+
+    The gaussian and lanczos kernels look their weights up in a table of
+    the kernel profile, shared by all chips, with ``lut_resolution``
+    samples per unit of the kernel coordinate (by default 256 for the
+    gaussian kernel, with an error below ``1 / (32 * lut_resolution**4)``
+    of the peak weight, and 100 for the lanczos kernels, as in earlier
+    releases).
+
     """
     # Insure that the fillval parameter gets properly interpreted for use with tdriz
     if util.is_blank(fillval):
@@ -1546,49 +2541,64 @@ def do_driz(
     else:
         expscale = expin
 
-    # Compute what plane of the context image this input would
-    # correspond to:
-    planeid = int((uniqid - 1) / 32)
-
-    # Check if the context image has this many planes
-    if outcon.ndim == 3:
-        nplanes = outcon.shape[0]
-    elif outcon.ndim == 2:
-        nplanes = 1
+    if isinstance(outcon, context.ContextIndex):
+        # The context array is set up below, once the window is known
+        outctx = None
     else:
-        nplanes = 0
+        # Compute what plane of the context image this input would
+        # correspond to:
+        planeid = int((uniqid - 1) / 32)
+
+        # Check if the context image has this many planes
+        if outcon.ndim == 3:
+            nplanes = outcon.shape[0]
+        elif outcon.ndim == 2:
+            nplanes = 1
+        else:
+            nplanes = 0
 
-    if nplanes <= planeid:
-        raise IndexError("Not enough planes in drizzle context image")
+        if nplanes <= planeid:
+            raise IndexError("Not enough planes in drizzle context image")
 
-    # Alias context image to the requested plane if 3d
-    if outcon.ndim == 2:
-        outctx = outcon
-    else:
-        outctx = outcon[planeid]
+        # Alias context image to the requested plane if 3d
+        if outcon.ndim == 2:
+            outctx = outcon
+        else:
+            outctx = outcon[planeid]
 
     pix_ratio = output_wcs.pscale / wcslin_pscale
 
-    if wcsmap is None and cdriz is not None:
-        log.info("Using WCSLIB-based coordinate transformation...")
-        log.info(f"stepsize = {stepsize}")
-        mapping = cdriz.DefaultWCSMapping(
-            input_wcs,
-            output_wcs,
-            input_wcs.pixel_shape[0],
-            input_wcs.pixel_shape[1],
-            stepsize,
-        )
+    if pixmap is not None:
+        log.debug("Using precomputed pixel map...")
     else:
-        #
-        # # Using the Python class for the WCS-based transformation
-        #
-        # Use user provided mapping function
-        log.info("Using coordinate transformation defined by user...")
-        if wcsmap is None:
-            wcsmap = wcs_functions.WCSMap
-        wmap = wcsmap(input_wcs, output_wcs)
-        mapping = wmap.forward
+        pixmap = _get_driz_pixmap(
+            input_wcs, output_wcs, insci.shape, stepsize=stepsize,
+            stepsize_tolerance=stepsize_tolerance, wcsmap=wcsmap
+        )
+
+    # Sub-windows are passed to tdriz as 1-based, inclusive ranges
+    out_window = None if bbox is None else (
+        bbox[0] + 1, bbox[1], bbox[2] + 1, bbox[3]
+    )
+    in_window = None if in_bbox is None else (
+        in_bbox[0] + 1, in_bbox[1], in_bbox[2] + 1, in_bbox[3]
+    )
+
+    # For compact context images, tdriz flags the pixels this input lands
+    # on in a single-bit context array that only covers the output window
+    ctx_uniqid = uniqid
+    if outctx is None:
+        ny, nx = outsci.shape
+        x0, y0 = out_origin
+        window = (x0, x0 + nx, y0, y0 + ny) if bbox is None else (
+            max(bbox[0], x0), min(bbox[1], x0 + nx),
+            max(bbox[2], y0), min(bbox[3], y0 + ny)
+        )
+        outctx = np.zeros(
+            (max(window[3] - window[2], 0), max(window[1] - window[0], 0)),
+            dtype=np.int32
+        )
+        uniqid = 1
 
     _shift_fr = "output"
     _shift_un = "output"
@@ -1612,8 +2622,8 @@ def do_driz(
         outctx,
         uniqid,
         ystart,
-        1,
-        1,
+        out_origin[0] + 1,
+        out_origin[1] + 1,
         _dny,
         pix_ratio,
         1.0,
@@ -1628,10 +2638,18 @@ def do_driz(
         nmiss,
         nskip,
         1,
-        mapping,
+        pixmap,
+        in_window=in_window,
+        out_window=out_window,
+        lut_resolution=lut_resolution or 0,
     )
 
-    if nmiss > 0:
+    if isinstance(outcon, context.ContextIndex):
+        outcon.add(
+            ctx_uniqid, outctx != 0, origin=(window[0] - x0, window[2] - y0)
+        )
+
+    if nmiss > 0 and report_misses:
         log.warning(f"! {nmiss} points were outside the output image.")
     if nskip > 0:
         log.debug(f"! Note, {nskip} input lines were skipped completely.")
@@ -1639,6 +2657,28 @@ def do_driz(
     return _vers
 
 
+def _get_driz_pixmap(input_wcs, output_wcs, shape, stepsize=10, wcsmap=None,
+                     stepsize_tolerance=None):
+    """Compute the ``(ny, nx, 2)`` input to output pixel map for ``tdriz``."""
+    if wcsmap is None and cdriz is not None:
+        log.info("Using WCSLIB-based coordinate transformation...")
+        log.info(f"stepsize = {stepsize}")
+        return wcs_functions.calc_pixmap(
+            input_wcs, output_wcs, shape=shape, stepsize=stepsize,
+            tolerance=stepsize_tolerance
+        )
+
+    #
+    # # Using the Python class for the WCS-based transformation
+    #
+    # Use user provided mapping function, evaluated for all pixels at once
+    log.info("Using coordinate transformation defined by user...")
+    if wcsmap is None:
+        wcsmap = wcs_functions.WCSMap
+    wmap = wcsmap(input_wcs, output_wcs)
+    return wcs_functions.calc_pixmap_from_mapping(wmap.forward, shape)
+
+
 def get_data(filename):
     fileroot, extn = fileutil.parseFilename(filename)
     extname = fileutil.parseExtn(extn)
@@ -41,9 +41,11 @@ from astropy.utils.decorators import deprecated_renamed_argument
 
 from . import adrizzle
 from . import ablot
+from . import checkpoint
 from . import createMedian
 from . import drizCR
 from . import processInput
+from . import refcache
 from . import sky
 from . import staticMask
 from . import util
@@ -227,6 +229,18 @@ def AstroDrizzle(
         using bilinear interpolation based on those pixels (i.e. every 10th pixel
         in the case of the default parameter setting) that were fully transformed.
 
+    stepsize_tolerance : float (Default = None)
+        Maximum interpolation error, in output pixels, allowed for the grid of
+        fully transformed pixels defined by ``stepsize``. When set, cells of
+        the grid where bilinear interpolation departs from the full ``WCS``
+        transformation by more than this value (typically near the detector
+        edges where the distortion varies fastest) are recursively halved
+        until the error is within the tolerance or the cells are one pixel
+        wide, and the maximum error achieved is reported in the log.
+        ``stepsize`` then sets the coarsest grid, so that larger values
+        (e.g., 64) reduce the number of full transformations. If `None`
+        (default), the uniform ``stepsize`` grid is used.
+
     resetbits : int (Default = 4096)
         This parameter allows the user to specify which DQ bits of each input
         image DQ array should be reset to a value of 0. This operation is
@@ -251,6 +265,55 @@ def AstroDrizzle(
         processing time by eliminating most of the disk activity.
         *Only* the products of the final drizzle step will get written out when
         this parameter gets specified as ``True``.
+        When running in parallel, products created by worker processes are
+        handed back through shared memory (``/dev/shm`` when available).
+
+    pixmap_cache_size : float (Default = None)
+        Maximum size, in megabytes, of the in-memory cache of pixel maps
+        (the mapping of each input pixel onto the output frame computed by
+        drizzle and blot). When the cache is enabled, the pixel map of a
+        chip is computed only once for separate drizzle, blot and final
+        drizzle whenever they share the same output ``WCS``. Pixel maps
+        of a 4k x 2k chip take about 128 MB each. A value of `None` or 0
+        disables the in-memory cache.
+
+    pixmap_cache_dir : str (Default = "")
+        Directory where pixel maps will be stored as ``.npy`` files so that
+        they can be re-used by worker processes and by later runs of
+        ``AstroDrizzle`` on the same data. No pixel maps are stored on disk
+        when this parameter is an empty string.
+
+    ref_cache_size : float (Default = 1024)
+        Maximum size, in megabytes, of the cache of reference file data
+        (flat fields, dark images and user-supplied IVM files). Each
+        reference file extension is read only once, as a memory-mapped,
+        read-only array, and shared by all the chips and exposures that
+        use it. The least recently used arrays are dropped when the cache
+        is full. A value of `None` or 0 disables the cache.
+
+    checkpoint_file : str (Default = "")
+        JSON file where the completion of each processing step gets recorded,
+        along with a content hash of its inputs (input exposures, parameters
+        of the step and of the previous steps, output ``WCS``) and the files
+        it wrote out. When ``AstroDrizzle`` is run again with the same
+        checkpoint file, the steps whose inputs did not change and whose
+        output files are still there get skipped. For instance, changing only
+        final drizzle parameters reuses the static masks, sky values, median
+        image and cosmic-ray masks of the previous run. This requires
+        ``in_memory`` to be turned off, and ``clean`` to be turned off for any
+        step other than the final drizzle to be reused. When the final
+        drizzle is reused, the cosmic rays are still flagged (with ``crbit``)
+        in the DQ arrays of the inputs. No checkpoints are kept when this
+        parameter is an empty string.
+
+    resource_report : bool (Default = No)
+        Write out the resources used by each processing step (wall-clock and
+        CPU time, peak resident memory, bytes read and written and number of
+        FITS files opened), and by each chip processed by the drizzle, blot
+        and ``driz_cr`` steps, to ``<trailer file root>_resources.json`` and
+        (as a table with one row per step or chip) to
+        ``<trailer file root>_resources.ecsv``. The CPU time of a step
+        includes that of its worker processes.
 
     rules_file : str (Default = "")
         Rules for how to blend the header keyword values for all the input
@@ -396,6 +459,20 @@ def AstroDrizzle(
     skyusigma : float (Default = 4.0)
         Upper clipping limit, in sigma, used when computing the sky value.
 
+    skyparallel : bool (Default = False)
+        Compute the sky of the images in the regions where they overlap, when
+        matching the sky (``skymethod`` set to ``'match'`` or
+        ``'globalmin+match'``), and solve for the sky offsets of the images,
+        with :py:mod:`drizzlepac.skyoverlap`, in parallel, instead of
+        ``stsci.skypac``.
+
+    skysampling : int (Default = 1)
+        Sampling step, in pixels, of the regions where images overlap, used
+        when matching the sky with ``skyparallel`` enabled. The sky of each
+        image in each overlap region is computed from one pixel out of
+        ``skysampling`` along each axis. Values larger than 1 speed up sky
+        matching of large mosaics.
+
     skymask_cat : str (Default = '')
         File name of a catalog file listing user masks to be used with images.
 
@@ -972,6 +1049,38 @@ def AstroDrizzle(
         and can either be ``'counts'`` or ``'cps'``. It is passed through to
         ``drizzle`` in the final drizzle step.
 
+    final_memory_budget : float or None (Default = None)
+        Memory budget, in megabytes, for the final drizzle step. When set, the
+        output is drizzled in tiles of rows small enough for the output arrays
+        of each tile (and the working arrays of one input chip) to fit in this
+        budget. Each tile is written directly into the output file(s) on disk,
+        so the full output arrays are never held in memory, which allows
+        creating products larger than the available RAM. The default of
+        ``None`` drizzles the whole output in memory at once.
+
+    final_context_format : {'planes', 'compact'} (Default = 'planes')
+        Format of the context image of the final product. ``'planes'`` writes
+        out one bit per input image in as many 32-bit planes as needed.
+        ``'compact'`` instead keeps, and writes out, an index into a table of
+        the distinct combinations of input images found in the output: the
+        ``CTX`` image then holds (tile-compressed) indices into the ``CTXTAB``
+        binary table, whose ``CONTEXT`` column holds the context planes of
+        each combination. This takes much less memory and disk space for
+        large numbers of inputs. Use :py:func:`drizzlepac.context.read_context`
+        to read either format as context planes. Tiled drizzling (see
+        ``final_memory_budget``) always writes out context planes.
+
+    final_incremental : bool (Default = No)
+        Drizzle the input images into an already existing final product
+        instead of overwriting it. The product must have been drizzled onto
+        the same output WCS (e.g., by setting ``final_refimage`` to it) with
+        the same ``final_kernel``, ``final_pixfrac``, ``final_units`` and
+        ``final_fillval``. Only the input images not already recorded in the
+        drizzle keywords of the product get drizzled into it, adding to its
+        weight, context and exposure time, and their drizzle keywords
+        (``D###xxxx``) get appended to those of the product. Tiled drizzling
+        (see ``final_memory_budget``) is turned off in this mode.
+
 
     **STEP 7a: CUSTOM WCS FOR FINAL OUTPUT**
 
@@ -1215,7 +1324,18 @@ def run(configobj, wcsmap=None, input_dict=None):
     log.debug("AstroDrizzle log file: {}".format(logfile))
 
     clean = configobj["STATE OF INPUT FILES"]["clean"]
-    procSteps = util.ProcSteps()
+    procSteps = util.ProcSteps(resource_report=configobj.get("resource_report", False))
+    wcs_functions.pixmap_cache.configure(
+        max_size=configobj.get("pixmap_cache_size"),
+        directory=configobj.get("pixmap_cache_dir")
+    )
+    refcache.reference_cache.configure(
+        max_size=configobj.get("ref_cache_size", refcache.DEFAULT_SIZE)
+    )
+    if refcache.reference_cache.enabled:
+        procSteps.addCache("Reference files", refcache.reference_cache)
+    if wcs_functions.pixmap_cache.enabled:
+        procSteps.addCache("Pixel maps", wcs_functions.pixmap_cache)
 
     log.debug("AstroDrizzle Version {:s} started at: {:s}\n"
           .format(__version__, util._ptime()[0]))
@@ -1311,30 +1431,92 @@ def run(configobj, wcsmap=None, input_dict=None):
                 do_median = False
                 skip_median = True
 
+        # Steps whose inputs did not change since the last run recorded in
+        # the checkpoint file get skipped
+        checkpoints = checkpoint.CheckpointStore(configobj.get("checkpoint_file"))
+        if checkpoints.enabled and imgObjList[0].inmemory:
+            log.warning("Turning step checkpoints off as they are not "
+                        "supported with 'in_memory'.")
+            checkpoints = checkpoint.CheckpointStore(None)
+        step_key = None
+        if checkpoints.enabled:
+            if clean:
+                log.warning("Intermediate products are deleted with 'clean': "
+                            "only the final drizzle step can be reused.")
+            step_key = checkpoints.step_key(
+                checkpoint.config_digest(configobj),
+                checkpoint.hash_inputs(imgObjList),
+            )
+
+        def _step_key(stepnum, *extra):
+            nonlocal step_key
+            if not checkpoints.enabled:
+                return None
+            step_key = checkpoints.step_key(
+                step_key, checkpoint.config_digest(configobj, stepnum), *extra
+            )
+            return step_key
+
         # Call rest of MD steps...
         # create static masks for each image
-        staticMask.createStaticMask(imgObjList, configobj, procSteps=procSteps)
+        checkpoints.run_step(
+            staticMask.PROCSTEPS_NAME,
+            _step_key(staticMask.STEP_NUM),
+            lambda: staticMask.createStaticMask(
+                imgObjList, configobj, procSteps=procSteps
+            ),
+            imgObjList,
+            active=configobj[util.getSectionName(configobj, staticMask.STEP_NUM)]["static"],
+            procSteps=procSteps,
+            chip_outputs=["staticMask"],
+        )
 
         # subtract the sky
-        sky.subtractSky(imgObjList, configobj, procSteps=procSteps)
+        checkpoints.run_step(
+            sky.PROCSTEPS_NAME,
+            _step_key(sky.STEP_NUM),
+            lambda: sky.subtractSky(imgObjList, configobj, procSteps=procSteps),
+            imgObjList,
+            active=configobj[util.getSectionName(configobj, sky.STEP_NUM)]["skysub"],
+            procSteps=procSteps,
+            chip_attrs=["subtractedSky", "computedSky"],
+        )
 
         #       _dbg_dump_virtual_outputs(imgObjList)
 
         # drizzle to separate images
-        adrizzle.drizSeparate(
+        checkpoints.run_step(
+            adrizzle.PROCSTEPS_NAME_SINGLE,
+            _step_key(adrizzle.STEP_NUM_SINGLE, _wcs_digest(outwcs.single_wcs)),
+            lambda: adrizzle.drizSeparate(
+                imgObjList,
+                outwcs,
+                configobj,
+                wcsmap=wcsmap,
+                logfile=logfile,
+                procSteps=procSteps,
+            ),
             imgObjList,
-            outwcs,
-            configobj,
-            wcsmap=wcsmap,
-            logfile=logfile,
+            active=do_single,
             procSteps=procSteps,
+            outputs=["outSingle", "outSWeight", "outSContext"],
         )
 
         #       _dbg_dump_virtual_outputs(imgObjList)
 
         # create the median images from the driz sep images
         try:
-            createMedian.createMedian(imgObjList, configobj, procSteps=procSteps)
+            checkpoints.run_step(
+                createMedian.PROCSTEPS_NAME,
+                _step_key(createMedian.STEP_NUM),
+                lambda: createMedian.createMedian(
+                    imgObjList, configobj, procSteps=procSteps
+                ),
+                imgObjList,
+                active=do_median,
+                procSteps=procSteps,
+                outputs=["outMedian"],
+            )
 
             if skip_median:
                 procSteps.endStep(createMedian.PROCSTEPS_NAME, reason="skipped")
@@ -1363,27 +1545,58 @@ def run(configobj, wcsmap=None, input_dict=None):
                 raise e
 
         # blot the images back to the original reference frame
-        ablot.runBlot(imgObjList, outwcs, configobj, wcsmap=wcsmap, procSteps=procSteps)
+        checkpoints.run_step(
+            ablot.PROCSTEPS_NAME,
+            _step_key(ablot.STEP_NUM),
+            lambda: ablot.runBlot(
+                imgObjList, outwcs, configobj, wcsmap=wcsmap, procSteps=procSteps
+            ),
+            imgObjList,
+            active=do_blot,
+            procSteps=procSteps,
+            chip_outputs=["blotImage"],
+        )
         if skip_blot:
             procSteps.endStep(ablot.PROCSTEPS_NAME, reason="skipped")
         elif not do_blot:
             procSteps.endStep(ablot.PROCSTEPS_NAME, reason="off")
 
         # look for cosmic rays
-        drizCR.rundrizCR(imgObjList, configobj, procSteps=procSteps)
+        checkpoints.run_step(
+            drizCR.PROCSTEPS_NAME,
+            _step_key(drizCR.STEP_NUM),
+            lambda: drizCR.rundrizCR(imgObjList, configobj, procSteps=procSteps),
+            imgObjList,
+            active=do_crrej,
+            procSteps=procSteps,
+            outputs=["crcorImage"] if configobj[step_name_crrej]["driz_cr_corr"] else [],
+            chip_outputs=["crmaskImage"],
+        )
         if skip_crrej:
             procSteps.endStep(drizCR.PROCSTEPS_NAME, reason="skipped")
         elif not do_crrej:
             procSteps.endStep(drizCR.PROCSTEPS_NAME, reason="off")
 
         # Make your final drizzled image
-        adrizzle.drizFinal(
+        step_name_final = util.getSectionName(configobj, adrizzle.STEP_NUM_FINAL)
+        checkpoints.run_step(
+            adrizzle.PROCSTEPS_NAME_FINAL,
+            _step_key(adrizzle.STEP_NUM_FINAL, _wcs_digest(outwcs.final_wcs)),
+            lambda: adrizzle.drizFinal(
+                imgObjList,
+                outwcs,
+                configobj,
+                wcsmap=wcsmap,
+                logfile=logfile,
+                procSteps=procSteps,
+            ),
             imgObjList,
-            outwcs,
-            configobj,
-            wcsmap=wcsmap,
-            logfile=logfile,
+            active=configobj[step_name_final]["driz_combine"],
             procSteps=procSteps,
+            outputs=(["outFinal"] if configobj["build"]
+                     else ["outSci", "outWeight", "outContext"]),
+            # the CR bits of the input DQ arrays get reset by every run
+            on_reuse=lambda: adrizzle.updateInputDQ(imgObjList, configobj["crbit"]),
         )
 
         log.debug("AstroDrizzle Version {:s} is finished processing at {:s}.\n"
@@ -1400,6 +1613,17 @@ def run(configobj, wcsmap=None, input_dict=None):
 
     finally:
         procSteps.reportTimes()
+        if configobj.get("resource_report"):
+            report_name = os.path.splitext(logfile)[0] + "_resources"
+            # do not replace the exception of a failed step, if any
+            try:
+                procSteps.writeReport(report_name)
+            except OSError as e:
+                log.error(f"Could not write resource usage report "
+                          f"{report_name}: {e}")
+            else:
+                log.info(f"Resource usage report written to: "
+                         f"{report_name}.json and {report_name}.ecsv")
         if imgObjList:
             for image in imgObjList:
                 if clean:
@@ -1412,6 +1636,11 @@ def run(configobj, wcsmap=None, input_dict=None):
 _fidx = 0
 
 
+def _wcs_digest(wcs):
+    """ Return the description of an output WCS used in step checkpoints. """
+    return [wcs.wcs.to_header(), list(wcs.array_shape)]
+
+
 def _dbg_dump_virtual_outputs(imgObjList):
     """dump some helpful information.  strictly for debugging"""
     global _fidx
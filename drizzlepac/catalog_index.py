@@ -0,0 +1,183 @@
+"""
+Spatial index of source catalogs for cross-matching.
+
+:py:class:`CatalogIndex` holds the ``(x, y)`` positions of a (reference)
+catalog in a k-d tree, built once and queried with as many other catalogs
+as needed.  Queries find all the pairs of sources within a box or a radius
+of each other in ``O(N log N)`` time instead of comparing every source of
+one catalog with every source of the other, and return the same pairs, in
+the same order, as the sweep-based matching functions they replace
+(``xymatch`` in :py:mod:`~drizzlepac.haputils.hla_flag_filter`,
+``boxMatch`` and ``catMatch`` in
+:py:mod:`~drizzlepac.haputils.starmatch_hist`): the tree only narrows down
+the candidate pairs, which then go through the very same tests.
+
+:License: :doc:`/LICENSE`
+
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+
+__all__ = ['CatalogIndex']
+
+
+class CatalogIndex:
+    """ k-d tree index of the positions of a catalog.
+
+    Parameters
+    ----------
+    xy : array-like
+        ``(N, 2)`` array of the ``(x, y)`` positions of the sources.
+
+    """
+    def __init__(self, xy):
+        self.xy = _as_xy(xy)
+        # Sources with undefined positions never match any other
+        self._finite = np.flatnonzero(np.isfinite(self.xy).all(axis=1))
+        self.tree = cKDTree(self.xy[self._finite])
+        # Rank of each source in the catalog sorted by y
+        self._yrank = _rank(self.xy[:, 1])
+
+    def __len__(self):
+        return self.xy.shape[0]
+
+    def box_pairs(self, xy, sep):
+        """ Find all the pairs of sources within a box of half-size ``sep``.
+
+        Parameters
+        ----------
+        xy : array-like
+            ``(M, 2)`` array of the positions to match with the catalog.
+        sep : float
+            Half-size of the box.
+
+        Returns
+        -------
+        p1, p2 : ndarray of int
+            Indices in ``xy`` and in the catalog of the matching pairs,
+            sorted by the ``y`` position of ``xy`` and then by the ``y``
+            position of the catalog.
+
+        """
+        xy = _as_xy(xy)
+        p1, p2 = self._candidates(xy, sep)
+        x1, y1 = xy[p1].T
+        x2, y2 = self.xy[p2].T
+        good = ((y2 >= y1 - sep) & (y2 <= y1 + sep) &
+                (np.abs(x2 - x1) <= sep))
+        return self._sorted(xy, p1[good], p2[good])
+
+    def radius_pairs(self, xy, sep):
+        """ Find all the pairs of sources within a distance ``sep``.
+
+        Takes the same parameters, and returns pairs in the same order, as
+        :py:meth:`box_pairs`.
+        """
+        xy = _as_xy(xy)
+        p1, p2 = self.box_pairs(xy, sep)
+        x1, y1 = xy[p1].T
+        x2, y2 = self.xy[p2].T
+        good = (x1 - x2)**2 + (y1 - y2)**2 <= sep**2
+        return p1[good], p2[good]
+
+    def neighbors(self, xy, sep):
+        """ Find the groups of catalog sources within a distance ``sep`` of
+        each position in ``xy`` (e.g., swarms of sources around bright
+        sources).
+
+        Returns
+        -------
+        p1 : list of int
+            Indices in ``xy`` of the positions with at least one neighbor.
+        p2 : list of ndarray of int
+            Indices in the catalog of the neighbors of each position in
+            ``p1``.
+
+        """
+        p1, p2 = self.radius_pairs(xy, sep)
+        if p1.size == 0:
+            return [], []
+        starts = np.flatnonzero(np.diff(p1, prepend=-1))
+        return p1[starts].tolist(), np.split(p2, starts[1:])
+
+    def nearest(self, xy, sep):
+        """ Find the nearest catalog source within a distance ``sep`` of each
+        position in ``xy``.
+
+        Returns
+        -------
+        idx : ndarray of int
+            Index in the catalog of the nearest source of each position,
+            or ``-N-1`` (with ``N`` the size of the catalog) for positions
+            with no source within ``sep``, so that ``IndexError`` gets
+            raised when used as indices.
+
+        """
+        xy = _as_xy(xy)
+        idx = np.full(xy.shape[0], -len(self) - 1, dtype=int)
+        p1, p2 = self.radius_pairs(xy, sep)
+        if p1.size:
+            x1, y1 = xy[p1].T
+            x2, y2 = self.xy[p2].T
+            distsq = (x1 - x2)**2 + (y1 - y2)**2
+            # Closest pair of each position, the first one in y order on ties
+            order = np.lexsort((np.arange(p1.size), distsq, p1))
+            first = np.flatnonzero(np.diff(p1[order], prepend=-1))
+            idx[p1[order[first]]] = p2[order[first]]
+        return idx
+
+    def offset_histogram(self, xy, r):
+        """ Compute the 2D histogram of the offsets ``xy - catalog`` of all
+        pairs of sources, in 1-pixel bins centered on integer offsets from
+        ``-r`` to ``r`` (``r`` being rounded up to an integer).
+
+        Returns
+        -------
+        hist : ndarray
+            ``(2r+1, 2r+1)`` histogram, the first axis being the ``y``
+            offsets.
+
+        """
+        xy = _as_xy(xy)
+        r = int(np.ceil(r))
+        p1, p2 = self._candidates(xy, r + 0.5)
+        dx = xy[p1, 0] - self.xy[p2, 0]
+        dy = xy[p1, 1] - self.xy[p2, 1]
+        idx = np.where((dx < r + 0.5) & (dx >= -r - 0.5) &
+                       (dy < r + 0.5) & (dy >= -r - 0.5))
+        h = np.histogram2d(dx[idx], dy[idx], 2 * r + 1,
+                           [[-r - 0.5, r + 0.5], [-r - 0.5, r + 0.5]])
+        return h[0].T
+
+    def _candidates(self, xy, sep):
+        """ Pairs of sources within a box slightly larger than ``sep``, so
+        that rounding errors never leave out pairs passing the exact tests.
+        """
+        finite = np.flatnonzero(np.isfinite(xy).all(axis=1))
+        if finite.size == 0 or self._finite.size == 0 or not sep >= 0:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+        scale = max(np.abs(xy[finite]).max(), np.abs(self.tree.data).max(), sep)
+        pairs = cKDTree(xy[finite]).sparse_distance_matrix(
+            self.tree, sep + 1e-9 * scale, p=np.inf, output_type='ndarray'
+        )
+        return finite[pairs['i']], self._finite[pairs['j']]
+
+    def _sorted(self, xy, p1, p2):
+        order = np.lexsort((self._yrank[p2], _rank(xy[:, 1])[p1]))
+        return p1[order], p2[order]
+
+
+def _as_xy(xy):
+    xy = np.asarray(xy)
+    if not np.issubdtype(xy.dtype, np.floating):
+        xy = xy.astype(np.float64)
+    if xy.ndim != 2 or xy.shape[1] != 2:
+        raise ValueError("Positions must be given as a (N, 2) array")
+    return xy
+
+
+def _rank(values):
+    """ Rank of each element in ``values.argsort()``. """
+    rank = np.empty(values.size, dtype=int)
+    rank[values.argsort()] = np.arange(values.size)
+    return rank
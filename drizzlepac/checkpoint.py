@@ -0,0 +1,326 @@
+"""
+Checkpoints of the processing steps of AstroDrizzle runs.
+
+Each processing step of ``AstroDrizzle`` (static mask, sky subtraction,
+separate drizzle, median, blot, ``driz_cr`` and final drizzle) gets a key
+computed as a content hash of everything it depends on: the data and
+headers of the input exposures, the parameters of the step, the output
+``WCS`` and the key of the previous step.  Once a step finishes, its key
+is recorded in a :py:class:`CheckpointStore` file along with the size and
+modification time of the files it wrote out, and with the values it set on
+the chips of the input images (e.g., the sky values).
+
+When ``AstroDrizzle`` runs again, each step whose key is unchanged and
+whose output files are still there (and unchanged) is skipped, its chip
+values being restored from the checkpoint.  For instance, rerunning with
+different final drizzle parameters only redoes the final drizzle, reusing
+the median image and the cosmic-ray masks of the previous run.
+
+:License: :doc:`/LICENSE`
+
+"""
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+from astropy.io import fits
+from stsci.tools import fileutil
+
+from . import util
+
+__all__ = ['CheckpointStore', 'config_digest', 'hash_file', 'hash_inputs']
+
+# Version of the layout of checkpoint files
+CHECKPOINT_VERSION = 1
+
+# Header keywords updated in the input files by AstroDrizzle itself
+VOLATILE_KEYWORDS = {'MDRIZSKY', 'CHECKSUM', 'DATASUM'}
+
+# Global parameters that do not change the results of any step
+EXECUTION_PARS = {
+    'input', 'runfile', 'num_cores', 'pixmap_cache_size', 'pixmap_cache_dir',
+    'ref_cache_size', 'checkpoint_file',
+}
+
+_CHUNK_SIZE = 1 << 22
+
+log = logging.getLogger(__name__)
+
+
+class CheckpointStore:
+    """ Record of the processing steps completed by an AstroDrizzle run.
+
+    Parameters
+    ----------
+    filename : str, None
+        JSON file the checkpoints get saved to (and read from, if it
+        exists). No checkpoints are kept when `None` or blank, in which
+        case :py:meth:`run_step` always runs the step.
+
+    """
+    def __init__(self, filename=None):
+        self.filename = None if util.is_blank(filename) else filename
+        self.steps = {}
+        if self.filename is None or not os.path.exists(self.filename):
+            return
+
+        try:
+            with open(self.filename) as f:
+                record = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f"Ignoring unreadable checkpoint file {self.filename}: {e}")
+            return
+        if record.get('version') == CHECKPOINT_VERSION:
+            self.steps = record.get('steps', {})
+        else:
+            log.warning(f"Ignoring checkpoint file {self.filename} written "
+                        "by another version of drizzlepac")
+
+    @property
+    def enabled(self):
+        return self.filename is not None
+
+    @staticmethod
+    def step_key(*parts):
+        """ Compute a step key as a hash of ``parts`` (JSON-serializable
+        values, typically the key of the previous step and digests of
+        parameters and input files).
+        """
+        return hashlib.sha256(
+            json.dumps(parts, sort_keys=True, default=_json_default).encode()
+        ).hexdigest()
+
+    def is_current(self, name, key):
+        """ Whether step ``name`` completed with ``key`` and all its output
+        files are still there, unchanged.
+        """
+        step = self.steps.get(name)
+        if step is None or step['key'] != key:
+            return False
+        for filename, (size, mtime) in step['outputs'].items():
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                return False
+            if stat.st_size != size or stat.st_mtime_ns != mtime:
+                return False
+        return True
+
+    def record(self, name, key, outputs=(), state=None):
+        """ Record that step ``name`` completed with ``key``, writing the
+        files in ``outputs`` and setting the chip values in ``state``, and
+        save the checkpoints.
+        """
+        files = {}
+        for filename in outputs:
+            if filename is not None and os.path.isfile(filename):
+                stat = os.stat(filename)
+                files[filename] = [stat.st_size, stat.st_mtime_ns]
+        self.steps[name] = {'key': key, 'outputs': files, 'state': state or {}}
+        self.save()
+
+    def save(self):
+        """ Write out the checkpoints, replacing the checkpoint file at once
+        so that an interrupted run never leaves a partial file behind.
+        """
+        if not self.enabled:
+            return
+        tmpname = self.filename + '.tmp'
+        with open(tmpname, 'w') as f:
+            json.dump({'version': CHECKPOINT_VERSION, 'steps': self.steps}, f,
+                      indent=1, default=_json_default)
+        os.replace(tmpname, self.filename)
+
+    def run_step(self, name, key, func, imageObjectList, active=True,
+                 procSteps=None, outputs=(), chip_outputs=(), chip_attrs=(),
+                 on_reuse=None):
+        """ Run step ``name`` by calling ``func()``, unless it can be reused.
+
+        Parameters
+        ----------
+        name : str
+            Name of the step (as reported by ``procSteps``).
+        key : str
+            Key of the step (see :py:meth:`step_key`).
+        func : callable
+            Function running the step.
+        imageObjectList : list of `~drizzlepac.imageObject.imageObject`
+            Input images.
+        active : bool, optional
+            Whether the step is turned on. Steps turned off are always run
+            (to report them as such) and never recorded.
+        procSteps : `~drizzlepac.util.ProcSteps`, optional
+            Processing steps tracker, used to report reused steps.
+        outputs : list of str, optional
+            Names in the ``outputNames`` of the images of the files the
+            step writes out.
+        chip_outputs : list of str, optional
+            Names in the ``outputNames`` of the chips of the files the
+            step writes out. They get restored when the step is reused.
+        chip_attrs : list of str, optional
+            Attributes of the chips the step sets. They get restored when
+            the step is reused.
+        on_reuse : callable, optional
+            Function called when the step is reused, to redo any update of
+            the input files done by the step, which are not outputs of the
+            step and may have been reset since.
+
+        Returns
+        -------
+        reused : bool
+            `True` when the step was skipped.
+
+        """
+        if self.enabled and active and self.is_current(name, key):
+            log.info(f"Reusing the results of step '{name}' from checkpoint "
+                     f"file {self.filename}")
+            _set_chip_state(imageObjectList, self.steps[name]['state'])
+            if on_reuse is not None:
+                on_reuse()
+            if procSteps is not None:
+                procSteps.addStep(name)
+                procSteps.endStep(name, reason="reused")
+            return True
+
+        func()
+
+        if self.enabled and active:
+            files = set()
+            for img in imageObjectList:
+                files.update(img.outputNames.get(k) for k in outputs)
+                for chip in img.returnAllChips(extname=img.scienceExt):
+                    files.update(chip.outputNames.get(k) for k in chip_outputs)
+            files.discard(None)
+            state = _get_chip_state(imageObjectList, chip_outputs, chip_attrs)
+            self.record(name, key, outputs=sorted(files), state=state)
+        return False
+
+
+def hash_file(filename, digest=None):
+    """ Compute the content hash of a file.
+
+    The headers of FITS files are hashed without the keywords AstroDrizzle
+    updates in its input files (see ``VOLATILE_KEYWORDS``), so that an
+    input file keeps its hash when it gets processed.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file.
+    digest : hashlib hash object, optional
+        Hash to update, instead of a new SHA-256 hash.
+
+    Returns
+    -------
+    digest : hashlib hash object
+        Updated hash.
+
+    """
+    h = hashlib.sha256() if digest is None else digest
+    try:
+        with fits.open(filename, memmap=False, lazy_load_hdus=False) as hdul:
+            spans = []
+            for k, hdu in enumerate(hdul):
+                for card in hdu.header.cards:
+                    if card.keyword not in VOLATILE_KEYWORDS:
+                        h.update(card.image.encode())
+                info = hdul.fileinfo(k)
+                spans.append((info['datLoc'], info['datSpan']))
+    except OSError:
+        # Not a FITS file
+        spans = [(0, os.path.getsize(filename))]
+
+    with open(filename, 'rb') as f:
+        for offset, size in spans:
+            f.seek(offset)
+            while size > 0:
+                chunk = f.read(min(size, _CHUNK_SIZE))
+                if not chunk:
+                    break
+                h.update(chunk)
+                size -= len(chunk)
+    return h
+
+
+def hash_inputs(imageObjectList):
+    """ Compute the content hash of the input files of the images (including
+    separate DQ files and IVM files).
+    """
+    h = hashlib.sha256()
+    for img in imageObjectList:
+        filenames = [img._filename]
+        for chip in img.returnAllChips(extname=img.scienceExt):
+            filenames.append(getattr(chip, 'dqfile', None))
+        filenames.append(img.outputNames.get('ivmFile'))
+        for filename in dict.fromkeys(filenames):
+            if filename is not None and os.path.isfile(filename):
+                h.update(os.path.basename(filename).encode())
+                hash_file(filename, digest=h)
+    return h.hexdigest()
+
+
+def config_digest(configObj, stepnum=None):
+    """ Compute the digest of the parameters of a processing step.
+
+    With ``stepnum`` set, the parameters of the ``STEP <stepnum>`` section
+    (and of its ``STEP <stepnum>a`` section, if any) are used; otherwise,
+    the global and instrument parameters. Parameters naming existing files
+    (such as reference images or sky files) contribute the content hash
+    of those files.
+    """
+    if stepnum is None:
+        pars = {k: v for k, v in configObj.items()
+                if not isinstance(v, dict) and k not in EXECUTION_PARS}
+        pars['INSTRUMENT PARAMETERS'] = dict(
+            configObj.get('INSTRUMENT PARAMETERS', {})
+        )
+    else:
+        prefixes = (f'STEP {stepnum}:', f'STEP {stepnum}a:')
+        pars = {k: dict(v) for k, v in configObj.items()
+                if k.startswith(prefixes)}
+
+    files = {}
+    for section in [pars] + [v for v in pars.values() if isinstance(v, dict)]:
+        for par, value in section.items():
+            if not isinstance(value, str) or util.is_blank(value):
+                continue
+            filename = fileutil.parseFilename(value.lstrip('@'))[0]
+            if os.path.isfile(filename):
+                files[par] = hash_file(filename).hexdigest()
+
+    return CheckpointStore.step_key(_strip_private(pars), files)
+
+
+def _strip_private(pars):
+    return {k: _strip_private(v) if isinstance(v, dict) else v
+            for k, v in pars.items() if not k.startswith('_')}
+
+
+def _get_chip_state(imageObjectList, names, attrs):
+    state = {}
+    for img in imageObjectList:
+        for chip in img.returnAllChips(extname=img.scienceExt):
+            values = {f'outputNames.{k}': chip.outputNames.get(k) for k in names}
+            values.update((k, getattr(chip, k, None)) for k in attrs)
+            state[chip.outputNames['data']] = values
+    return state
+
+
+def _set_chip_state(imageObjectList, state):
+    for img in imageObjectList:
+        for chip in img.returnAllChips(extname=img.scienceExt):
+            for k, value in state.get(chip.outputNames['data'], {}).items():
+                if k.startswith('outputNames.'):
+                    chip.outputNames[k.split('.', 1)[1]] = value
+                else:
+                    setattr(chip, k, value)
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    return str(value)
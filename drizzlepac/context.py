@@ -0,0 +1,240 @@
+"""
+Compact encoding of drizzle context images.
+
+The context image records which inputs contributed to each output pixel,
+as one bit per input in 32-bit planes, so that the context image of a
+product made of 200 exposures takes 7 planes the size of the output.  The
+output pixels however only ever see a few distinct combinations of inputs
+(one per region where the footprints of the inputs overlap in the same
+way), which :py:class:`ContextIndex` stores just once in a table, along
+with an image of (usually 16-bit) indices into that table.  This image is
+written out as a tile-compressed ``CTX`` extension, next to a ``CTXTAB``
+binary table holding the context planes of each combination, typically
+taking orders of magnitude less memory and disk space than the context
+planes themselves.
+
+:py:func:`read_context` decodes either format back to context planes.
+
+:License: :doc:`/LICENSE`
+
+"""
+import threading
+
+import numpy as np
+from astropy.io import fits
+
+__all__ = ['ContextIndex', 'read_context', 'read_context_index']
+
+# Name of the table of distinct contexts in compact context products
+CTX_TABLE_EXTNAME = 'CTXTAB'
+
+
+class ContextIndex:
+    """ Drizzle context image stored as an index into a table of contexts.
+
+    Row 0 of the table is the empty context of pixels that no input
+    contributed to.  Inputs are identified by the same ``uniqid`` values
+    ``cdriz.tdriz`` uses to set context bits.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape ``(ny, nx)`` of the output image.
+    nplanes : int, optional
+        Number of 32-bit context planes the contexts are made of.
+
+    """
+    def __init__(self, shape, nplanes=1):
+        self.shape = tuple(shape)
+        self.nplanes = int(nplanes)
+        self.index = np.zeros(self.shape, dtype=np.uint16)
+        self._table = np.zeros((64, self.nplanes), dtype=np.int32)
+        self._ntable = 1
+        self._rows = {self._table[0].tobytes(): 0}
+        self._lock = threading.Lock()
+
+    @property
+    def table(self):
+        """ Context planes of each distinct context, as ``(n, nplanes)`` array. """
+        return self._table[:self._ntable]
+
+    @property
+    def nbytes(self):
+        return self.index.nbytes + self.table.nbytes
+
+    @classmethod
+    def from_planes(cls, planes, nplanes=None):
+        """ Encode a ``(nplanes, ny, nx)`` or ``(ny, nx)`` context image.
+
+        Set ``nplanes`` to make room for more planes than ``planes`` has.
+        """
+        planes = np.asarray(planes, dtype=np.int32)
+        if planes.ndim == 2:
+            planes = planes[np.newaxis]
+        table, index = np.unique(
+            planes.reshape(planes.shape[0], -1).T, axis=0, return_inverse=True
+        )
+        return cls.from_table(index.reshape(planes.shape[1:]), table, nplanes)
+
+    @classmethod
+    def from_table(cls, index, table, nplanes=None):
+        """ Build from an index image and the ``(n, nplanes)`` table it indexes.
+
+        Set ``nplanes`` to make room for more planes than ``table`` has.
+        """
+        table = np.asarray(table, dtype=np.int32)
+        ctx = cls(index.shape, max(nplanes or 0, table.shape[1]))
+        remap = np.array(
+            [ctx._add_row(np.pad(row, (0, ctx.nplanes - row.size))) for row in table]
+        )
+        ctx._reserve_index()
+        ctx.index[...] = remap[index]
+        return ctx
+
+    def add(self, uniqid, mask, origin=(0, 0)):
+        """ Record that input ``uniqid`` contributed to the pixels in ``mask``.
+
+        Parameters
+        ----------
+        uniqid : int
+            ID of the input (1 for the first bit of the first plane).
+        mask : ndarray of bool
+            Pixels the input contributed to, in a sub-window of the output
+            image.
+        origin : tuple of int, optional
+            Position ``(x, y)`` (0-based) of the first pixel of ``mask`` in
+            the output image.
+
+        Calls for different inputs can safely run in concurrent threads.
+        """
+        plane, bit = divmod(int(uniqid) - 1, 32)
+        if not 0 <= plane < self.nplanes:
+            raise IndexError("Not enough planes in drizzle context image")
+        bitval = np.array(1 << bit, dtype=np.uint32).view(np.int32)
+
+        x0, y0 = origin
+        window = np.s_[y0:y0 + mask.shape[0], x0:x0 + mask.shape[1]]
+        with self._lock:
+            old = self.index[window][mask]
+            if old.size == 0:
+                return
+
+            # Each context found in the window gets this input added to it
+            remap = np.arange(self._ntable)
+            for k in np.flatnonzero(np.bincount(old, minlength=self._ntable)):
+                row = self._table[k].copy()
+                row[plane] |= bitval
+                remap[k] = self._add_row(row)
+            self._reserve_index()
+            self.index[window][mask] = remap[old]
+
+    def to_planes(self):
+        """ Decode to a ``(nplanes, ny, nx)`` ``int32`` context image. """
+        planes = np.empty((self.nplanes,) + self.shape, dtype=np.int32)
+        for k in range(self.nplanes):
+            np.take(self.table[:, k], self.index, out=planes[k])
+        return planes
+
+    def to_hdus(self, header=None, name='CTX'):
+        """ Build the tile-compressed index image and the context table HDUs.
+
+        The index image HDU gets the ``CTXFORM`` keyword set to ``'INDEX'``
+        and the number of context planes in ``CTXPLANE``.
+        """
+        hdu = fits.CompImageHDU(
+            data=self.index, header=header, name=name, compression_type='RICE_1'
+        )
+        hdu.header['CTXFORM'] = ('INDEX', 'Context is an index into the CTXTAB table')
+        hdu.header['CTXPLANE'] = (self.nplanes, 'Number of 32-bit context planes')
+        tabhdu = fits.BinTableHDU.from_columns(
+            [fits.Column(name='CONTEXT', format=f'{self.nplanes:d}J',
+                         array=self.table)],
+            name=CTX_TABLE_EXTNAME
+        )
+        return hdu, tabhdu
+
+    def _add_row(self, row):
+        """ Return the index of context ``row``, adding it to the table if new. """
+        key = row.tobytes()
+        k = self._rows.get(key)
+        if k is None:
+            if self._ntable == self._table.shape[0]:
+                self._table = np.concatenate([self._table, np.zeros_like(self._table)])
+            k = self._ntable
+            self._table[k] = row
+            self._rows[key] = k
+            self._ntable += 1
+        return k
+
+    def _reserve_index(self):
+        """ Switch to 32-bit indices once 16 bits are no longer enough. """
+        if self._ntable > np.iinfo(self.index.dtype).max + 1:
+            self.index = self.index.astype(np.int32)
+
+
+def read_context(hdulist, ext=None):
+    """ Read a context image as a ``(nplanes, ny, nx)`` ``int32`` array.
+
+    Both plain context images and compact ones (see
+    :py:class:`ContextIndex`) are read.
+
+    Parameters
+    ----------
+    hdulist : str or `~astropy.io.fits.HDUList`
+        Drizzle product or context image file.
+    ext : int or str, optional
+        Extension holding the context image.  By default, the ``CTX``
+        extension if present, otherwise the first one with data.
+
+    """
+    if isinstance(hdulist, str):
+        with fits.open(hdulist) as hdul:
+            return read_context(hdul, ext=ext)
+
+    hdu = _find_context_hdu(hdulist, ext)
+    if _is_compact(hdu):
+        return ContextIndex.from_table(
+            hdu.data, _read_context_table(hdulist)
+        ).to_planes()
+
+    planes = np.asarray(hdu.data, dtype=np.int32)
+    if planes.ndim == 2:
+        planes = planes[np.newaxis]
+    return planes
+
+
+def read_context_index(hdulist, ext=None, nplanes=None):
+    """ Read a context image as a :py:class:`ContextIndex`.
+
+    Takes the same parameters as :py:func:`read_context`, and ``nplanes``
+    to make room for more context planes than the image has.
+    """
+    if isinstance(hdulist, str):
+        with fits.open(hdulist) as hdul:
+            return read_context_index(hdul, ext=ext, nplanes=nplanes)
+
+    hdu = _find_context_hdu(hdulist, ext)
+    if _is_compact(hdu):
+        return ContextIndex.from_table(
+            hdu.data, _read_context_table(hdulist), nplanes=nplanes
+        )
+    return ContextIndex.from_planes(hdu.data, nplanes=nplanes)
+
+
+def _find_context_hdu(hdulist, ext):
+    if ext is None:
+        if 'CTX' in hdulist:
+            ext = 'CTX'
+        else:
+            ext = next(k for k, hdu in enumerate(hdulist)
+                       if hdu.is_image and hdu.data is not None)
+    return hdulist[ext]
+
+
+def _is_compact(hdu):
+    return hdu.header.get('CTXFORM', '').upper() == 'INDEX'
+
+
+def _read_context_table(hdulist):
+    table = np.asarray(hdulist[CTX_TABLE_EXTNAME].data['CONTEXT'], dtype=np.int32)
+    return table.reshape(table.shape[0], -1)
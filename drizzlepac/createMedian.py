@@ -10,7 +10,9 @@ Create a median image from the singly drizzled images.
 import os
 import sys
 import math
+import queue
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from astropy.io import fits
 from astropy.utils import deprecated
@@ -229,6 +231,7 @@ def createMedian(imgObjList, configObj, procSteps=None):
 
     paramDict = configObj[step_name]
     paramDict["proc_unit"] = configObj["proc_unit"]
+    paramDict["num_cores"] = configObj.get("num_cores")
 
     # include whether or not compression was performed
     driz_sep_name = util.getSectionName(configObj, STEP_NUM_SINGLE)
@@ -471,7 +474,15 @@ def _median(imageObjectList, paramDict):
     # within minmed.
     overlap = 2 * grow
     buffsize = BUFSIZE if bufsizeMB is None else (BUFSIZE * bufsizeMB)
-    section_nrows = min(imrows, int(buffsize / (imcols * data_item_size)))
+
+    # Sections are combined in threads which share the buffer size, as
+    # long as their share still spans more rows than the overlap between
+    # sections.
+    nbufrows = int(buffsize / (imcols * data_item_size))
+    pool_size = util.get_pool_size(
+        paramDict.get("num_cores"), max(1, nbufrows // (overlap + 1))
+    )
+    section_nrows = min(imrows, nbufrows // pool_size)
 
     if section_nrows == 0:
         buffsize = imcols * data_item_size
@@ -496,6 +507,7 @@ def _median(imageObjectList, paramDict):
     if (imrows - overlap) % nbr > 0:
         nsec += 1
 
+    sections = []
     for k in range(nsec):
         e1 = k * nbr
         e2 = e1 + section_nrows
@@ -510,20 +522,39 @@ def _median(imageObjectList, paramDict):
             e1 = min(e1, e2 - overlap - 1)
             u2 = e2 - e1
 
-        imdrizSectionsList = np.empty(
-            (len(singleDrizList), e2 - e1, imcols),
-            dtype=single_data_dtype
-        )
-        for i, w in enumerate(singleDrizList):
-            imdrizSectionsList[i, :, :] = w[e1:e2]
+        sections.append((e1, e2, u1, u2))
+
+    # Single drizzled images on disk are opened once and memory-mapped, so
+    # that sections are sliced straight from the mapped files by any thread.
+    for img in singleDrizList + singleWeightList:
+        if not img.inmemory:
+            img.handle = fits.open(img.fname, mode="readonly", memmap=True)
+    singleDrizData = [img.open().data for img in singleDrizList]
+    singleWeightData = [img.open().data for img in singleWeightList]
+
+    # Stack buffers are reused between sections, one set per worker thread
+    stack_dtype = single_data_dtype.newbyteorder("=")
+    free_buffers = queue.SimpleQueue()
+
+    def _get_stack(buf, nimages, nrows):
+        return buf[: nimages * nrows * imcols].reshape((nimages, nrows, imcols))
+
+    def _combine_section(section):
+        e1, e2, u1, u2 = section
+        try:
+            sci_buf, wht_buf = free_buffers.get_nowait()
+        except queue.Empty:
+            sci_buf = np.empty(len(singleDrizList) * section_nrows * imcols, dtype=stack_dtype)
+            wht_buf = np.empty(len(singleWeightList) * section_nrows * imcols, dtype=stack_dtype)
+
+        imdrizSectionsList = _get_stack(sci_buf, len(singleDrizList), e2 - e1)
+        for i, data in enumerate(singleDrizData):
+            imdrizSectionsList[i] = data[e1:e2]
 
         if singleWeightList:
-            weightSectionsList = np.empty(
-                (len(singleWeightList), e2 - e1, imcols),
-                dtype=single_data_dtype
-            )
-            for i, w in enumerate(singleWeightList):
-                weightSectionsList[i, :, :] = w[e1:e2]
+            weightSectionsList = _get_stack(wht_buf, len(singleWeightList), e2 - e1)
+            for i, data in enumerate(singleWeightData):
+                weightSectionsList[i] = data[e1:e2]
         else:
             weightSectionsList = None
 
@@ -575,8 +606,20 @@ def _median(imageObjectList, paramDict):
                 lower=lthresh,
             )
 
-        # Write out the processed image sections to the final output array:
+        # Write out the processed image sections to the final output array.
+        # Only the rows outside of the overlap are used, so sections
+        # never write to the same rows.
         medianImageArray[e1 + u1 : e1 + u2, :] = result[u1:u2, :]
+        free_buffers.put((sci_buf, wht_buf))
+
+    pool_size = min(pool_size, len(sections))
+    if pool_size > 1:
+        log.info(f"Combining {len(sections):d} sections in {pool_size:d} threads")
+        with ThreadPoolExecutor(max_workers=pool_size) as executor:
+            list(executor.map(_combine_section, sections))
+    else:
+        for section in sections:
+            _combine_section(section)
 
     # Write out the combined image
     # use the header from the first single drizzled image in the list
@@ -599,6 +642,7 @@ def _median(imageObjectList, paramDict):
     # Always close any files opened to produce median image; namely,
     # single drizzle images and singly-drizzled weight images
     #
+    del singleDrizData, singleWeightData
     for img in singleDrizList:
         if not virtual:
             img.close()
@@ -10,9 +10,9 @@ image and the derivative of the model image.
 import os
 import re
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
-from scipy import signal
 from astropy.io import fits
 from astropy.utils import deprecated
 from astropy.utils.decorators import deprecated_renamed_argument
@@ -34,6 +34,9 @@ __taskname__ = "drizCR"  # looks in drizzlepac for sky.cfg
 STEP_NUM = 6  # this relates directly to the syntax in the cfg file
 PROCSTEPS_NAME = "Driz_CR"
 
+# Number of image rows processed at once when computing the CR mask:
+CR_BLOCK_ROWS = 256
+
 
 log = logging.getLogger(__name__)
 
@@ -188,24 +191,34 @@ def rundrizCR(imgObjList, configObj, procSteps=None):
 
     # if we have the cpus and s/w, ok, but still allow user to set pool size
     pool_size = util.get_pool_size(configObj.get('num_cores'), len(imgObjList))
-    if imgObjList[0].inmemory:
-        pool_size = 1  # reason why is output in drizzle step
 
     subprocs = []
-    if pool_size > 1:
+    if pool_size > 1 and imgObjList[0].inmemory:
+        # Virtual outputs cannot be returned from subprocesses without
+        # copying them through a manager, so use threads instead: the CR
+        # detection itself is done in NumPy, which releases the GIL.
+        log.debug(f'Executing {pool_size:d} parallel threads')
+        with ThreadPoolExecutor(max_workers=pool_size) as executor:
+            futures = [
+                executor.submit(_driz_cr, image, image.virtualOutputs,
+                                paramDict)
+                for image in imgObjList
+            ]
+            for future in futures:
+                future.result()
+
+    elif pool_size > 1:
+        # Outputs are written to disk, so nothing needs to be handed back
+        # from the subprocesses.
         log.debug('Executing {:d} parallel workers'.format(pool_size))
         mp_ctx = multiprocessing.get_context('fork')
         for image in imgObjList:
-            manager = mp_ctx.Manager()
-            mgr = manager.dict({})
-
             p = mp_ctx.Process(
                 target=_driz_cr,
                 name='drizCR._driz_cr()',  # for err msgs
-                args=(image, mgr, paramDict.dict())
+                args=(image, image.virtualOutputs, paramDict.dict())
             )
             subprocs.append(p)
-            image.virtualOutputs.update(mgr)
         mputil.launch_and_wait(subprocs, pool_size)  # blocks till all done
 
     else:
@@ -258,13 +271,17 @@ def _driz_cr(sciImage, virtual_outputs, paramDict):
     crcorr_list = []
     cr_mask_dict = {}
 
-    for chip in range(1, sciImage._numchips + 1, 1):
+    def _sci_chip(chip):
+        return sciImage[sciImage.scienceExt + ',' + str(chip)]
+
+    chips = [chip for chip in range(1, sciImage._numchips + 1, 1)
+             if _sci_chip(chip).group_member]
+    for chip in util.iter_chip_usage(
+            PROCSTEPS_NAME, chips,
+            name=lambda chip: _sci_chip(chip).outputNames['data']):
         exten = sciImage.scienceExt + ',' + str(chip)
         sci_chip = sciImage[exten]
 
-        if not sci_chip.group_member:
-            continue
-
         blot_image_name = sci_chip.outputNames['blotImage']
 
         if sciImage.inmemory:
@@ -315,63 +332,12 @@ def _driz_cr(sciImage, virtual_outputs, paramDict):
         # already been accounted for in blotted image
         # expmult = 1.
 
-        # #################   COMPUTATION PART I    ###################
-        # Create a temporary array mask
-        t1 = np.absolute(input_image - blot_data)
-        # ta = np.sqrt(gain * np.abs((blot_data + backg) * expmult) + rn**2)
-        ta = np.sqrt(gain * np.abs(blot_data + backg) + rn**2)
-        t2 = (mult1 * blot_deriv + snr1 * ta / gain)  # / expmult
-        tmp1 = t1 <= t2
-
-        # Create a convolution kernel that is 3 x 3 of 1's
-        kernel = np.ones((3, 3), dtype=np.uint16)
-        # Convolve the mask with the kernel
-        tmp2 = signal.convolve2d(tmp1, kernel, boundary='symm', mode='same')
-
-        # #################   COMPUTATION PART II    ###################
-        # Create the CR Mask
-        t2 = (mult2 * blot_deriv + snr2 * ta / gain)  # / expmult
-        cr_mask = (t1 <= t2) | (tmp2 >= 9)
-
-        # #################   COMPUTATION PART III    ##################
-        # flag additional cte 'radial' and 'tail' pixels surrounding CR pixels
-        # as CRs
-
-        # In both the 'radial' and 'length' kernels below, 0->good and 1->bad,
-        # so that upon convolving the kernels with cr_mask, the convolution
-        # output will have low->bad and high->good from which 2 new arrays are
-        # created having 0->bad and 1->good. These 2 new arrays are then
-        # 'anded' to create a new cr_mask.
-
-        # make radial convolution kernel and convolve it with original cr_mask
-        cr_grow_kernel = np.ones((grow, grow), dtype=np.uint16)
-        cr_grow_kernel_conv = signal.convolve2d(
-            cr_mask, cr_grow_kernel, boundary='symm', mode='same'
-        )
-
-        # make tail convolution kernel and convolve it with original cr_mask
-        cr_ctegrow_kernel = np.zeros((2 * ctegrow + 1, 2 * ctegrow + 1))
-
-        # which pixels are masked by tail kernel depends on sign of
-        # sci_chip.cte_dir (i.e.,readout direction):
-        if sci_chip.cte_dir == 1:
-            # 'positive' direction:  HRC: amp C or D; WFC: chip = sci,1; WFPC2
-            cr_ctegrow_kernel[0:ctegrow, ctegrow] = 1
-        elif sci_chip.cte_dir == -1:
-            # 'negative' direction:  HRC: amp A or B; WFC: chip = sci,2
-            cr_ctegrow_kernel[ctegrow+1:2*ctegrow+1, ctegrow] = 1
-
-        # do the convolution
-        cr_ctegrow_kernel_conv = signal.convolve2d(
-            cr_mask, cr_ctegrow_kernel, boundary='symm', mode='same'
+        cr_mask = _driz_cr_mask(
+            input_image, blot_data, blot_deriv, gain=gain, rn=rn,
+            backg=backg, snr=(snr1, snr2), scale=(mult1, mult2), grow=grow,
+            ctegrow=ctegrow, cte_dir=sci_chip.cte_dir
         )
 
-        # select high pixels from both convolution outputs;
-        # then 'and' them to create new cr_mask
-        cr_grow_mask = cr_grow_kernel_conv >= grow**2  # radial
-        cr_ctegrow_mask = cr_ctegrow_kernel_conv >= ctegrow  # length
-        cr_mask = cr_grow_mask & cr_ctegrow_mask
-
         # Apply CR mask to the DQ array in place
         dq_mask &= cr_mask
 
@@ -411,11 +377,116 @@ def _driz_cr(sciImage, virtual_outputs, paramDict):
             util.createFile(cr_mask.astype(np.uint8),
                             outfile=cr_mask_image, header=None)
 
+        del input_image
+        sciImage.releaseData(exten)
+
     if paramDict['driz_cr_corr']:
         createCorrFile(sciImage.outputNames["crcorImage"], crcorr_list,
                        sciImage._filename)
 
 
+def _driz_cr_mask(input_image, blot_data, blot_deriv, gain, rn, backg,
+                  snr, scale, grow=1, ctegrow=0, cte_dir=0,
+                  block_rows=CR_BLOCK_ROWS):
+    """ Compute the cosmic-ray mask of one chip (``True`` for good pixels).
+
+    ``input_image``, ``blot_data`` and ``backg`` must be in electrons and
+    ``blot_deriv`` is the absolute derivative of the blotted image.
+    The noise model and thresholds are evaluated in a single pass over
+    blocks of ``block_rows`` rows, and the neighbor tests are done with
+    separable boolean erosions (with symmetric boundary conditions), so
+    only a few full-chip boolean arrays are allocated. The function works
+    on NumPy arrays only and may be called concurrently from several
+    threads.
+    """
+    snr1, snr2 = snr
+    mult1, mult2 = scale
+    ny = input_image.shape[0]
+
+    # #################   COMPUTATION PART I & II    ###################
+    # Pixels that pass the first (looser) test, and the CR Mask of
+    # pixels that pass the second (tighter) test:
+    tmp1 = np.empty(input_image.shape, dtype=bool)
+    cr_mask = np.empty(input_image.shape, dtype=bool)
+    for y1 in range(0, ny, block_rows):
+        rows = slice(y1, y1 + block_rows)
+        blot = blot_data[rows]
+        deriv = blot_deriv[rows]
+        t1 = np.absolute(input_image[rows] - blot)
+        # ta = np.sqrt(gain * np.abs((blot_data + backg) * expmult) + rn**2)
+        ta = np.sqrt(gain * np.abs(blot + backg) + rn**2)
+        t2 = (mult1 * deriv + snr1 * ta / gain)  # / expmult
+        np.less_equal(t1, t2, out=tmp1[rows])
+        t2 = (mult2 * deriv + snr2 * ta / gain)  # / expmult
+        np.less_equal(t1, t2, out=cr_mask[rows])
+
+    # A pixel also passes when all pixels in the 3 x 3 box around it have
+    # passed the first test:
+    cr_mask |= _erode(_erode(tmp1, -1, 1, axis=0), -1, 1, axis=1)
+    del tmp1
+
+    # #################   COMPUTATION PART III    ##################
+    # flag additional cte 'radial' and 'tail' pixels surrounding CR pixels
+    # as CRs: keep only pixels whose 'radial' (grow x grow box) and 'tail'
+    # neighborhoods in the original cr_mask are free of CRs.
+    if grow > 1:
+        lo, hi = -(grow // 2), (grow - 1) // 2
+        cr_grow_mask = _erode(_erode(cr_mask, lo, hi, axis=0), lo, hi, axis=1)
+    elif grow < 1:
+        cr_grow_mask = np.ones_like(cr_mask)
+    else:
+        cr_grow_mask = cr_mask
+
+    # which pixels are masked by tail kernel depends on sign of
+    # cte_dir (i.e.,readout direction):
+    if ctegrow > 0:
+        if cte_dir == 1:
+            # 'positive' direction:  HRC: amp C or D; WFC: chip = sci,1; WFPC2
+            cr_grow_mask &= _erode(cr_mask, 1, ctegrow, axis=0)
+        elif cte_dir == -1:
+            # 'negative' direction:  HRC: amp A or B; WFC: chip = sci,2
+            cr_grow_mask &= _erode(cr_mask, -ctegrow, -1, axis=0)
+        else:
+            cr_grow_mask[...] = False
+
+    return cr_grow_mask
+
+
+def _erode(mask, start, stop, axis):
+    """ Return a boolean array that is ``True`` where ``mask`` is ``True``
+    for all of the pixels from ``start`` to ``stop`` (inclusive) relative
+    to the pixel along ``axis``. The image is extended past its edges by
+    symmetric reflection (as with ``boundary='symm'`` in
+    `scipy.signal.convolve2d`).
+    """
+    def _rows(arr, first, n):
+        idx = [slice(None)] * arr.ndim
+        idx[axis] = slice(first, first + n)
+        return arr[tuple(idx)]
+
+    pad = [(0, 0)] * mask.ndim
+    pad[axis] = (max(0, -start), max(0, stop))
+    padded = np.pad(mask, pad, mode='symmetric')
+    offset = pad[axis][0] + start
+
+    # AND over windows of doubling width until ``span`` covers at least
+    # half of the window; the full window is then the AND of two
+    # (overlapping) windows of width ``span``:
+    width = stop - start + 1
+    span = 1
+    out = padded
+    while 2 * span <= width:
+        n = out.shape[axis] - span
+        out = _rows(out, 0, n) & _rows(out, span, n)
+        span *= 2
+
+    n = mask.shape[axis]
+    if span == width:
+        return _rows(out, offset, n).copy()
+
+    return _rows(out, offset, n) & _rows(out, offset + width - span, n)
+
+
 def createCorrFile(outfile, arrlist, template):
     """
     Create a _cor file with the same format as the original input image.
@@ -9,6 +9,7 @@ A suite of functions for finding sources in images.
 import math
 
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from scipy import ndimage
 
 import stsci.imagestats as imagestats
@@ -17,9 +18,9 @@ from . import cdriz
 
 __all__ = ['gaussian1', 'gausspars', 'gaussian', 'moments', 'errfunc',
            'findstars', 'apply_nsigma_separation', 'xy_round',
-           'precompute_sharp_round', 'sharp_round', 'roundness', 'immoments',
-           'nmoment', 'centroid', 'cmoment', 'central_moments', 'covmat',
-           'help']
+           'precompute_sharp_round', 'sharp_round', 'sharp_round_batch',
+           'roundness', 'immoments', 'nmoment', 'centroid', 'cmoment',
+           'central_moments', 'covmat', 'help']
 
 
 #def gaussian(amplitude, xcen, ycen, xsigma, ysigma):
@@ -27,6 +28,9 @@ __all__ = ['gaussian1', 'gausspars', 'gaussian', 'moments', 'errfunc',
 
 FWHM2SIG = 2*np.sqrt(2*np.log(2))
 
+# Number of candidate sources processed at once by findstars
+FINDSTARS_BATCH_SIZE = 8192
+
 #def gaussian1(height, x0, y0, fwhm, nsigma=1.5, ratio=1., theta=0.0):
 def gaussian1(height, x0, y0, a, b, c):
     """
@@ -199,93 +203,86 @@ def findstars(jdata, fwhm, threshold, skymode,
         return fitind,fluxes
 
     # determine center of each source, while removing spurious sources or
-    # applying limits defined by the user
-    ninit  = 0
-    ninit2 = 0
-
+    # applying limits defined by the user. Sources are processed in batches,
+    # with the cutouts around all the sources of a batch stacked together.
     s2m, s4m = precompute_sharp_round(nx, ny, xc, yc)
 
-    satur  = False # Default assumption if use_sharp_round=False
-    sharp  = None
-    round1 = None
-    round2 = None
-
-    for ss,n in zip(fobjects,range(len(fobjects))):
-        ssx = ss[1].stop - ss[1].start
-        ssy = ss[0].stop - ss[0].start
-        if ssx >= tdata.shape[1]-1 or ssy >= tdata.shape[0]-1:
-            continue
+    bbox = np.array([(ss[0].start, ss[0].stop, ss[1].start, ss[1].stop)
+                     for ss in fobjects])
+    for b0 in range(0, nobj, FINDSTARS_BATCH_SIZE):
+        sy0, sy1, sx0, sx1 = bbox[b0:b0 + FINDSTARS_BATCH_SIZE].T
+        good = ((sx1 - sx0 < tdata.shape[1] - 1) &
+                (sy1 - sy0 < tdata.shape[0] - 1))
 
-        yr0 = ss[0].start - gry
-        yr1 = ss[0].stop  + gry + 1
-        if yr0 <= 0 or yr1 >= img_ny: continue # ignore sources within ny//2 of edge
+        # ignore sources within ny//2 (nx//2) of edge
+        yr0 = sy0 - gry
+        yr1 = sy1 + gry + 1
+        xr0 = sx0 - grx
+        xr1 = sx1 + grx + 1
+        good &= (yr0 > 0) & (yr1 < img_ny) & (xr0 > 0) & (xr1 < img_nx)
+        yr0, yr1, xr0, xr1 = yr0[good], yr1[good], xr0[good], xr1[good]
 
-        xr0 = ss[1].start - grx
-        xr1 = ss[1].stop  + grx + 1
-        if xr0 <= 0 or xr1 >= img_nx: continue # ignore sources within nx//2 of edge
-
-        ssnew = (slice(yr0,yr1),slice(xr0,xr1))
-        region = tdata[ssnew]
-
-        cntr = centroid(region)
+        xcen, ycen = _box_centroids(tdata, yr0, xr0, yr1 - yr0, xr1 - xr0)
 
         # Define region centered on max value in object (slice)
         # This region will be bounds-checked to insure that it only accesses
         # a valid section of the image (not off the edge)
-        maxpos = (int(cntr[1]+0.5)+ssnew[0].start,int(cntr[0]+0.5)+ssnew[1].start)
-        yr0 = maxpos[0] - gry
-        yr1 = maxpos[0] + gry + 1
-        if yr0 < 0 or yr1 > img_ny:
-            continue
-        xr0 = maxpos[1] - grx
-        xr1 = maxpos[1] + grx + 1
-        if xr0 < 0 or xr1 > img_nx:
+        good = np.isfinite(xcen) & np.isfinite(ycen)
+        yr0 = (ycen[good] + 0.5).astype(int) + yr0[good] - gry
+        xr0 = (xcen[good] + 0.5).astype(int) + xr0[good] - grx
+        good = (yr0 >= 0) & (yr0 + ny <= img_ny) & (xr0 >= 0) & (xr0 + nx <= img_nx)
+        yr0, xr0 = yr0[good], xr0[good]
+        if yr0.size == 0:
             continue
 
         # Simple Centroid on the region from the input image
-        jregion = jdata[yr0:yr1,xr0:xr1]
-        src_flux = jregion.sum()
-        src_peak = jregion.max()
-
-        if (peakmax is not None and src_peak >= peakmax):
-            continue
-        if (peakmin is not None and src_peak <= peakmin):
-            continue
-
-        if fluxmin and src_flux <= fluxmin:
-            continue
-        if fluxmax and src_flux >= fluxmax:
-            continue
-
-        datamin = jregion.min()
-        datamax = jregion.max()
+        jregions = sliding_window_view(jdata, (ny, nx))[yr0, xr0]
+        src_flux = jregions.reshape(yr0.size, -1).sum(axis=1)
+        src_peak = jregions.max(axis=(1, 2))
+        datamin = jregions.min(axis=(1, 2))
+        datamax = src_peak
+
+        good = np.ones(yr0.size, dtype=bool)
+        if peakmax is not None:
+            good &= ~(src_peak >= peakmax)
+        if peakmin is not None:
+            good &= ~(src_peak <= peakmin)
+        if fluxmin:
+            good &= ~(src_flux <= fluxmin)
+        if fluxmax:
+            good &= ~(src_flux >= fluxmax)
 
         if use_sharp_round:
             # Compute sharpness and first estimate of roundness:
-            dregion = convdata[yr0:yr1,xr0:xr1]
-            satur, round1, sharp = \
-                sharp_round(jregion, dregion, xyrmask, xc, yc,
-                            s2m, s4m, nx, ny, datamin, datamax)
+            dregions = sliding_window_view(convdata, (ny, nx))[yr0, xr0]
+            satur, round1, sharp = sharp_round_batch(
+                jregions, dregions, xyrmask, xc, yc, s2m, s4m, datamin, datamax
+            )
             # Filter sources:
-            if sharp is None or (sharp < sharplo or sharp > sharphi):
-                continue
-            if round1 is None or (round1 < roundlo or round1 > roundhi):
-                continue
+            good &= ~(np.ma.getmaskarray(sharp) |
+                      (sharp.data < sharplo) | (sharp.data > sharphi))
+            good &= ~(np.ma.getmaskarray(round1) |
+                      (round1.data < roundlo) | (round1.data > roundhi))
+            sharp, round1 = sharp.data, round1.data
 
-        px, py, round2 = xy_round(jregion, grx, gry, skymode,
-                                  kernel, xsigsq, ysigsq, datamin, datamax)
+        for k in np.flatnonzero(good):
+            px, py, round2 = xy_round(jregions[k], grx, gry, skymode, kernel,
+                                      xsigsq, ysigsq, datamin[k], datamax[k])
 
-        # Filter sources:
-        if px is None:
-            continue
+            # Filter sources:
+            if px is None:
+                continue
 
-        if use_sharp_round and not satur and \
-           (round2 is None or round2 < roundlo or round2 > roundhi):
-            continue
+            if use_sharp_round and not satur[k] and \
+               (round2 is None or round2 < roundlo or round2 > roundhi):
+                continue
 
-        fitind.append((px + xr0, py + yr0, sharp, round1, round2))
-        # compute a source flux value
-        fluxes.append(src_flux)
+            if use_sharp_round:
+                fitind.append((px + xr0[k], py + yr0[k], sharp[k], round1[k], round2))
+            else:
+                fitind.append((px + xr0[k], py + yr0[k], None, None, round2))
+            # compute a source flux value
+            fluxes.append(src_flux[k])
 
     fitindc, fluxesc = apply_nsigma_separation(fitind, fluxes, fwhm*nsigma / 2)
 
@@ -416,6 +413,60 @@ def sharp_round(data, density, kskip, xc, yc, s2m, s4m, nxk, nyk,
     return satur, round, sharp
 
 
+def sharp_round_batch(data, density, kskip, xc, yc, s2m, s4m,
+                      datamin, datamax):
+    """
+    Vectorized version of 'sharp_round' for a stack of sources: 'data' and
+    'density' are (nsources, nyk, nxk) arrays of cutouts around each source
+    and 'datamin' and 'datamax' arrays of their limits.
+
+    Returns the 'satur' flags, and the roundness and sharpness of each
+    source as masked arrays, masked where 'sharp_round' returns None.
+    Values are the same as those computed by 'sharp_round'.
+    """
+    nsrc = data.shape[0]
+
+    # Compute the first estimate of roundness:
+    sum2 = (s2m*density).reshape(nsrc, -1).sum(axis=1)
+    sum4 = (s4m*abs(density)).reshape(nsrc, -1).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        round = np.where(sum2 == 0.0, 0.0, 2.0 * sum2 / sum4).astype(sum2.dtype)
+    round = np.ma.masked_array(round, mask=(sum2 != 0.0) & (sum4 <= 0.0))
+
+    mid_data_pix = data[:, yc, xc]
+    mid_dens_pix = density[:, yc, xc]
+
+    ########################
+    # Sharpness statistics:
+
+    satur = (kskip*data).max(axis=(1, 2)) > datamax
+
+    # Exclude pixels (create a mask) outside the [datamin, datamax] range:
+    uskip = np.where((data >= datamin[:, None, None]) &
+                     (data <= datamax[:, None, None]), 1, 0)
+    # Update the mask with the "skipped" values from the convolution kernel:
+    uskip *= kskip
+    # Also, exclude central pixel:
+    uskip[:, yc, xc] = 0
+
+    npixels = uskip.reshape(nsrc, -1).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharp = (mid_data_pix - (uskip*data).reshape(nsrc, -1).sum(axis=1) /
+                 npixels) / mid_dens_pix
+    sharp = np.ma.masked_array(
+        sharp, mask=(npixels < 1) | (mid_dens_pix <= 0.0)
+    )
+
+    # Eliminate the sharpness test if the central pixel is bad:
+    high = mid_data_pix > datamax
+    low = ~high & (mid_data_pix < datamin)
+    satur[high] = True
+    satur[low] = False
+    sharp[high | low] = np.ma.masked
+
+    return satur, round, sharp
+
+
 def roundness(im):
     """
     from astropy.io import fits as pyfits
@@ -475,6 +526,38 @@ def centroid(im):
     return xcen, ycen
 
 
+def _box_centroids(im, y0, x0, ny, nx):
+    """
+    Computes the centroids of the boxes of ``im`` of sizes ``(ny, nx)`` at
+    positions ``(y0, x0)`` (arrays with one value per box), returned as
+    (xcen, ycen) arrays.
+
+    The moments are accumulated in the same order and precision as in
+    'cdriz.arrmoments', giving the same centroids as 'centroid'.
+    """
+    im = np.asarray(im, dtype=np.float32)
+    xcen = np.empty(y0.size)
+    ycen = np.empty(y0.size)
+
+    # Boxes of each shape are processed together:
+    shapes, shape_index = np.unique(np.stack([ny, nx], axis=1), axis=0,
+                                    return_inverse=True)
+    shape_index = shape_index.ravel()
+    for k, shape in enumerate(shapes):
+        idx = np.flatnonzero(shape_index == k)
+        boxes = sliding_window_view(im, tuple(shape))[y0[idx], x0[idx]]
+        boxes = boxes.reshape(idx.size, -1).astype(np.float64)
+        i, j = np.indices(shape, dtype=np.float64).reshape(2, -1)
+        m00 = np.cumsum(boxes, axis=1)[:, -1]
+        m10 = np.cumsum(i * boxes, axis=1)[:, -1]
+        m01 = np.cumsum(j * boxes, axis=1)[:, -1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ycen[idx] = m10 / m00
+            xcen[idx] = m01 / m00
+
+    return xcen, ycen
+
+
 def cmoment(im,p,q):
     xcen,ycen = centroid(im)
     #x,y=np.meshgrid(range(403,412),range(423,432))
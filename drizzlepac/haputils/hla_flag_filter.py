@@ -51,6 +51,8 @@ from stsci.tools import logutil
 from stsci.tools import fileutil
 from stwcs import wcsutil
 
+from drizzlepac.catalog_index import CatalogIndex
+
 
 __taskname__ = 'hla_flag_filter'
 
@@ -1481,77 +1483,24 @@ def xymatch(cat1, cat2, sep, multiple=False, stack=True, verbose=True):
         log.error("catalog 2 must be a [N, 2] array")
         raise ValueError("cat2 must be a [N, 2] array")
 
-    x1 = cat1[:, 0]
-    y1 = cat1[:, 1]
-    x2 = cat2[:, 0]
-    y2 = cat2[:, 1]
-
-    # Sort the arrays by increasing y-coordinate
-    is1 = y1.argsort()
-    x1 = x1[is1]
-    y1 = y1[is1]
-    is2 = y2.argsort()
-    x2 = x2[is2]
-    y2 = y2[is2]
-    # find search limits in y2 for each object in y1
-    kvlo = y2.searchsorted(y1-sep, 'left').clip(0, len(y2))
-    kvhi = y2.searchsorted(y1+sep, 'right').clip(kvlo, len(y2))
-
-    nnomatch = 0
-    n1 = len(x1)
-    if multiple:
-        # build lists of array segments for matches
-        p1 = []
-        p2 = []
-    else:
-        p2 = numpy.zeros(n1, dtype='int') - len(x2) - 1
+    # Pairs within sep are looked up with a k-d tree of cat2
     t0 = time.time()
-    sepsq = sep**2
-    for i in range(n1):
-        y = y1[i]
-        x = x1[i]
-        klo = kvlo[i]
-        khi = kvhi[i]
-        dx = numpy.abs(x2[klo:khi] - x)
-        w = (dx <= sep).nonzero()[0]
-        if len(w) == 0:
-            # Nothing matched
-            nnomatch += 1
+    index = CatalogIndex(cat2)
+    if multiple:
+        if stack:
+            p1, p2 = index.radius_pairs(cat1, sep)
+            nmatched = numpy.unique(p1).size
         else:
-            distsq = (x - x2[klo+w])**2 + (y - y2[klo+w])**2
-
-            if multiple:
-                ww = (distsq <= sepsq).nonzero()[0]
-                if len(ww) == 0:
-                    nnomatch += 1
-                else:
-                    if stack:
-                        p1.append(numpy.zeros(len(ww), dtype='int')+is1[i])
-                    else:
-                        p1.append(is1[i])
-                    p2.append(is2[klo + w[ww]])
-
-            else:
-                if dist.min() <= sep:
-                    p2[is1[i]] = is2[klo+w[dist.argmin()]]
-                else:
-                    nnomatch += 1
-
-        if verbose and (i+1) % 10000 == 0:
-            log.info("%.1f s: Finished %d of %d (%d unmatched)" % (time.time()-t0, i+1, n1, nnomatch))
+            p1, p2 = index.neighbors(cat1, sep)
+            nmatched = len(p1)
+    else:
+        p2 = index.nearest(cat1, sep)
+        nmatched = numpy.count_nonzero(p2 >= 0)
 
     if verbose:
-        log.info("%.1f s: Finished %d (%d unmatched)" % (time.time()-t0, n1, nnomatch))
+        log.info("%.1f s: Finished %d (%d unmatched)" % (time.time()-t0, len(cat1), len(cat1) - nmatched))
     if multiple:
-        if stack:
-            if len(p1) == 0:
-                # no matches found
-                # return empty integer arrays that are still usable as indices
-                return numpy.array([], dtype=int), numpy.array([], dtype=int)
-            else:
-                return numpy.concatenate(p1), numpy.concatenate(p2)
-        else:
-            return (p1, p2)
+        return p1, p2
     else:
         return p2
 
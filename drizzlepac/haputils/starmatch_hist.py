@@ -27,6 +27,7 @@ import astropy.io.fits as pyfits
 from astropy.table import Table
 
 from drizzlepac import util
+from drizzlepac.catalog_index import CatalogIndex
 from drizzlepac.haputils import infrot
 from stsci.tools import logutil
 
@@ -745,39 +746,8 @@ def catMatch(x1,y1, x2,y2, sep, offset=None, rotangle=None):
         x1 = x1*crot + y1*srot - offset[0]
         y1 = y1*crot - x1*srot - offset[1]
 
-    # Sort the arrays by increasing y-coordinate
-    is1 = y1.argsort()
-    x1 = x1[is1]
-    y1 = y1[is1]
-    is2 = y2.argsort()
-    x2 = x2[is2]
-    y2 = y2[is2]
-    # find search limits in y2 for each object in y1
-    # note this is designed to include the points that are exactly equal to maxdiff
-    kvlo = y2.searchsorted(y1-sep,'left').clip(0, len(y2))
-    kvhi = y2.searchsorted(y1+sep,'right').clip(kvlo, len(y2))
-
-    nnomatch = 0
-    n1 = len(x1)
-    p2 = numpy.zeros(n1, dtype='int') - len(x2) - 1
-    sepsq = sep**2
-    for i in range(n1):
-        y = y1[i]
-        x = x1[i]
-        klo = kvlo[i]
-        khi = kvhi[i]
-        dx = numpy.abs(x2[klo:khi] - x)
-        w = (dx <= sep).nonzero()[0]
-        if len(w) == 0:
-            # Nothing matched
-            nnomatch += 1
-        else:
-            distsq = (x - x2[klo+w])**2 + (y - y2[klo+w])**2
-            if distsq.min() <= sepsq:
-                p2[is1[i]] = is2[klo+w[distsq.argmin()]]
-            else:
-                nnomatch += 1
-    return p2
+    # find the nearest source of catalog 2 with a k-d tree
+    return CatalogIndex(numpy.column_stack([x2, y2])).nearest(numpy.column_stack([x1, y1]), sep)
 
 
 def boxMatch(x1,y1, x2,y2, sep):
@@ -808,35 +778,8 @@ def boxMatch(x1,y1, x2,y2, sep):
     if len(x1) != len(y1) or len(x2) != len(y2):
         raise ValueError("x and y arrays must be of equal length")
 
-    # Sort the arrays by increasing y-coordinate
-    is1 = y1.argsort()
-    x1 = x1[is1]
-    y1 = y1[is1]
-    is2 = y2.argsort()
-    x2 = x2[is2]
-    y2 = y2[is2]
-    # find search limits in y2 for each object in y1
-    # note this is designed to include the points that are exactly equal to maxdiff
-    kvlo = y2.searchsorted(y1-sep,'left').clip(0, len(y2))
-    kvhi = y2.searchsorted(y1+sep,'right').clip(kvlo, len(y2))
-
-    p1 = []
-    p2 = []
-    n1 = len(x1)
-    for i in range(n1):
-        y = y1[i]
-        x = x1[i]
-        klo = kvlo[i]
-        khi = kvhi[i]
-        dx = numpy.abs(x2[klo:khi] - x)
-        w = (dx <= sep).nonzero()[0]
-        if w.size > 0:
-            p1.append(numpy.zeros(w.size,dtype=int)+is1[i])
-            p2.append(is2[klo+w])
-    if p1:
-        return (numpy.hstack(p1), numpy.hstack(p2))
-    else:
-        return (numpy.array([],dtype=int), numpy.array([],dtype=int))
+    # find all the pairs within the box with a k-d tree
+    return CatalogIndex(numpy.column_stack([x2, y2])).box_pairs(numpy.column_stack([x1, y1]), sep)
 
 
 if __name__ == '__main__':
@@ -17,6 +17,7 @@ from astropy.io import fits
 from . import util
 from . import wcs_functions
 from . import buildmask
+from .refcache import reference_cache
 from . import __version__
 
 __all__ = ['baseImageObject', 'imageObject', 'WCSObject']
@@ -54,6 +55,13 @@ class baseImageObject:
         self.createContext = True
 
         self.inmemory = False # flag for all in-memory operations
+
+        # memory-mapped handles (one per file) used by getData/getHeader,
+        # opened on first use, and the data arrays and headers read from them
+        self._handles = {}
+        self._loaded = set()
+        self._headers = {}
+
         #this is the number of science chips to be processed in the file
         self._numchips=1
         self._nextend=0
@@ -98,6 +106,9 @@ class baseImageObject:
             the data array returned for future use. You can use
             putData to reattach a new data array to the imageObject.
         """
+        self._close_handles()
+        self._loaded.clear()
+
         if self._image is None:
             return
 
@@ -130,8 +141,11 @@ class baseImageObject:
         #     self._image.data= None # np.array(0,dtype=self.getNumpyType(self._image.header["BITPIX"]))
 
     def clean(self):
-        """ Deletes intermediate products generated for this imageObject.
+        """ Deletes intermediate products generated for this imageObject
+            and releases the data arrays read with getData.
         """
+        self.releaseData()
+
         clean_files = ['blotImage','crmaskImage','finalMask',
                         'staticMask','singleDrizMask','outSky',
                         'outSContext','outSWeight','outSingle',
@@ -151,6 +165,12 @@ class baseImageObject:
         """ Return just the data array from the specified extension
             fileutil is used instead of fits to account for non-
             FITS input images. openImage returns a fits object.
+
+            The data are memory-mapped from the input file, which is opened
+            only once, so that they are paged in only as they are used. The
+            array is kept by this object (and returned by later calls) until
+            it is released by ``releaseData`` (or ``close``/``clean``).
+            Changes made to the array are never written to the file.
         """
         if exten.lower().find('sci') > -1:
             # For SCI extensions, the current file will have the data
@@ -165,30 +185,90 @@ class baseImageObject:
             fname = sci_chip.dqfile
 
         extnum = self._interpretExten(exten)
-        if self._image[extnum].data is None:
-            if os.path.exists(fname):
-                _image=fileutil.openImage(fname, clobber=False, memmap=False)
-                _data=fileutil.getExtn(_image, extn=exten).data
-                _image.close()
-                del _image
-                self._image[extnum].data = _data
-            else:
-                _data = None
-        else:
-            _data = self._image[extnum].data
+        hdu = self._image[extnum]
+        # Data may have been attached to the HDU already, either by a
+        # previous call or with putData:
+        if hdu._data_loaded and hdu.data is not None:
+            return hdu.data
+
+        handle = self._getHandle(fname)
+        if handle is None:
+            return None
 
+        _data = fileutil.getExtn(handle, extn=exten).data
+        hdu.data = _data
+        self._loaded.add(extnum)
         return _data
 
+    def releaseData(self, exten=None):
+        """ Release the data array of the specified extension (or of all
+            extensions, by default) read with getData. Memory used by the
+            arrays is returned to the system once no other reference to them
+            is held. The memory-mapped input files are closed when no data
+            remain in use, and opened again by the next call to getData.
+        """
+        if exten is None:
+            extnums = list(self._loaded)
+        else:
+            extnums = [self._interpretExten(exten)]
+
+        for extnum in extnums:
+            self._loaded.discard(extnum)
+            hdu = self._image[extnum]
+            if hdu._data_loaded:
+                del hdu.data
+
+        if not self._loaded:
+            self._close_handles()
+
     def getHeader(self,exten=None):
         """ Return just the specified header extension fileutil
             is used instead of fits to account for non-FITS
             input images. openImage returns a fits object.
+
+            Headers are cached until the input file is modified.
         """
-        _image=fileutil.openImage(self._filename, clobber=False, memmap=False)
-        _header=fileutil.getExtn(_image,extn=exten).header
-        _image.close()
-        del _image
-        return _header
+        handle = self._getHandle(self._filename)
+        if handle is None:
+            raise OSError(f"Unable to open file: {self._filename}")
+        key = (self._filename, str(exten).upper())
+        if key not in self._headers:
+            _header = fileutil.getExtn(handle, extn=exten).header
+            self._headers[key] = _header
+        return self._headers[key].copy()
+
+    def _getHandle(self, fname):
+        """ Return a memory-mapped, read-only handle for the file ``fname``
+            (or `None` if the file does not exist), opening it if needed.
+        """
+        try:
+            stat = os.stat(fname)
+        except (OSError, TypeError):
+            return None
+
+        # Re-open files that have been modified since they were opened:
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if fname in self._handles:
+            handle, handle_signature = self._handles[fname]
+            if handle_signature == signature:
+                return handle
+            handle.close()
+            self._headers = {
+                k: v for k, v in self._headers.items() if k[0] != fname
+            }
+
+        handle = fileutil.openImage(fname, mode='readonly', memmap=True,
+                                    clobber=False)
+        self._handles[fname] = (handle, signature)
+        return handle
+
+    def _close_handles(self):
+        # Memory maps remain valid (until garbage-collected) for any arrays
+        # still referenced elsewhere.
+        for handle, _ in self._handles.values():
+            handle.close()
+        self._handles = {}
+        self._headers = {}
 
     def _interpretExten(self,exten):
         #check if the exten is a string or number and translate to the correct chip
@@ -237,7 +317,7 @@ class baseImageObject:
         if data is None:
             log.warning("No data supplied")
         else:
-            extnum = _interpretExten(exten)
+            extnum = self._interpretExten(exten)
             ext = self._image[extnum]
             # update the bitpix to the current datatype, this aint fancy and
             # ignores bscale
@@ -546,10 +626,8 @@ class baseImageObject:
         # jref$, used in the specification of the reference filename
         if flat_file is None:
             flat_file = fileutil.osfn(self._image["PRIMARY"].header[self.flatkey])
-        hdulist = None
         try:
-            hdulist = fileutil.openImage(flat_file, mode='readonly', memmap=False)
-            data = hdulist[(flat_ext, chip)].data
+            data = reference_cache.getdata(flat_file, (flat_ext, chip))
 
             if data.shape[0] != sci_chip.image_shape[0]:
                 ltv2 = int(np.round(sci_chip.ltv2))
@@ -563,17 +641,14 @@ class baseImageObject:
                 ltv1 = 0
             size1 = sci_chip.image_shape[1] + ltv1
 
-            flat = data[ltv2:size2, ltv1:size1]
+            # a copy, since cached reference data are read-only
+            flat = data[ltv2:size2, ltv1:size1].copy()
 
         except FileNotFoundError:
             flat = np.ones(sci_chip.image_shape, dtype=sci_chip.image_dtype)
             log.warning("Cannot find flat field file '{}'".format(flat_file))
             log.warning("Treating flatfield as a constant value of '1'.")
 
-        finally:
-            if hdulist is not None:
-                hdulist.close()
-
         return flat
 
     def getReadNoiseImage(self, chip):
@@ -717,8 +792,10 @@ class baseImageObject:
         are camera dependent? these are not defined in the DQ masks, but
         should be masked out to get the best results in multidrizzle.
         """
-        dqarr = self.getData(exten=self.maskExt+','+str(chip))
+        dqext = self.maskExt+','+str(chip)
+        dqarr = self.getData(exten=dqext)
         dqmask = buildmask.buildMask(dqarr,bits)
+        self.releaseData(dqext)
 
         if write:
             phdu = fits.PrimaryHDU(data=dqmask,header=self._image[self.maskExt,chip].header)
@@ -755,17 +832,8 @@ class baseImageObject:
 
         if ivmname is not None:
             log.debug(f"Applying user supplied IVM files for chip {chip}")
-            #Parse the input file name to get the extension we are working on
-            extn = "IVM,{}".format(chip)
-
-            #Open the mask image for updating and the IVM image
-            ivm =  fileutil.openImage(ivmname, mode='readonly', memmap=False)
-            ivmfile = fileutil.getExtn(ivm, extn)
-
-            # Multiply the IVM file by the input mask in place.
-            ivmarr = ivmfile.data * dqarr
-
-            ivm.close()
+            # Multiply the IVM file by the input mask.
+            ivmarr = reference_cache.getdata(ivmname, ('IVM', chip)) * dqarr
 
         else:
             log.debug(f"Automatically creating IVM files for chip {chip}")
@@ -805,7 +873,8 @@ class baseImageObject:
         if self.errExt is not None:
             try:
                 # Attempt to open the ERR image.
-                err = self.getData(exten=self.errExt+','+str(chip))
+                errext = self.errExt+','+str(chip)
+                err = self.getData(exten=errext)
 
                 log.debug(f"Applying ERR weighting to DQ mask for chip {chip}")
 
@@ -819,6 +888,7 @@ class baseImageObject:
                 sci_chip._wtscl = 1.0/pow(scale,4)
 
                 del err
+                self.releaseData(errext)
 
             except:
                 # We cannot find an 'ERR' extension and the data isn't WFPC2.
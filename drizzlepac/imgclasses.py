@@ -30,6 +30,7 @@ from stsci.tools.bitmask import interpret_bit_flags
 
 
 from . import catalogs
+from .catalog_index import CatalogIndex
 from . import linearfit
 from . import updatehdr
 from . import util
@@ -162,6 +163,7 @@ class Image:
             if extnum is None:
                 extnum = 0
             chip_filenames[sci_extn] = "{:s}[{:d}]".format(self.filename, extnum)
+        self.chip_filenames = chip_filenames
 
         for sci_extn in range(1,self.nvers+1):
             chip_filename = chip_filenames[sci_extn]
@@ -300,6 +302,16 @@ class Image:
         # close file handle... for now.
         self.close()
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # WCS objects do not keep their CD matrix through pickling (as done
+        # when images are built by worker processes): read them again
+        for sci_extn, chip in self.chip_catalogs.items():
+            wcs = stwcs.wcsutil.HSTWCS(self.chip_filenames[sci_extn])
+            wcs.extname = chip['wcs'].extname
+            chip['wcs'] = wcs
+            chip['catalog'].wcs = wcs
+
     def close(self):
         """ Close any open file handles and flush updates to disk
         """
@@ -515,7 +527,7 @@ class Image:
             if matchpars['use2dhist']:
                 xsh, ysh, maxval, flux, zpmat, qual = _estimate_2dhist_shift(
                     self.outxy,
-                    ref_outxy,
+                    refimage.get_outxy_index(),
                     searchrad=radius
                 )
                 xyoff = (xsh, ysh)
@@ -1231,6 +1243,7 @@ class RefImage:
                         "a string, a list, or a numpy.ndarray")
 
         self.outxy = None
+        self._outxy_index = None
         self.origin = 1
         if self.all_radec is not None:
             # convert sky positions to X,Y positions on reference tangent plane
@@ -1254,6 +1267,15 @@ class RefImage:
         else:
             self.skyline = SphericalPolygon([])
 
+    def get_outxy_index(self):
+        """ Return a `~drizzlepac.catalog_index.CatalogIndex` of the
+        reference positions (``outxy``), built once and reused for all
+        the images matched to this reference catalog until it changes.
+        """
+        if self._outxy_index is None or self._outxy_index.xy is not self.outxy:
+            self._outxy_index = CatalogIndex(self.outxy)
+        return self._outxy_index
+
     def clear_dirty_flag(self):
         self.dirty = False
 
@@ -1547,22 +1569,20 @@ def _is_cd_unitary(wcs):
 
 def _xy_2dhist(imgxy, refxy, r):
     # This code replaces the C version (arrxyzero) from carrutils.c
-    # It is about 5-8 times slower than the C version.
-    dx = np.subtract.outer(imgxy[:, 0], refxy[:, 0]).ravel()
-    dy = np.subtract.outer(imgxy[:, 1], refxy[:, 1]).ravel()
-    r = int(np.ceil(r))
-    idx = np.where((dx < r + 0.5) & (dx >= -r - 0.5) &
-                   (dy < r + 0.5) & (dy >= -r - 0.5))
-    r = int(np.ceil(r))
-    h = np.histogram2d(dx[idx], dy[idx], 2 * r + 1,
-                       [[-r - 0.5, r + 0.5], [-r - 0.5, r + 0.5]])
-    return h[0].T
+    # Offsets are only computed for the pairs of sources found within the
+    # search box by a k-d tree of the reference catalog, not for all pairs.
+    if not isinstance(refxy, CatalogIndex):
+        refxy = CatalogIndex(refxy)
+    return refxy.offset_histogram(imgxy, r)
 
 
 def _estimate_2dhist_shift(imgxy, refxy, searchrad=3.0):
     """ Create a 2D matrix-histogram which contains the delta between each
         XY position and each UV position. Then estimate initial offset
         between catalogs.
+
+        ``refxy`` can be given as a `~drizzlepac.catalog_index.CatalogIndex`
+        of the reference positions, to reuse it for several catalogs.
     """
     print("Computing initial guess for X and Y shifts...")
 
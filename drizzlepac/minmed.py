@@ -30,6 +30,9 @@ from scipy import signal
 from stsci.image.numcombine import numCombine, num_combine
 from . import __version__
 
+# Default maximum number of stack pixels processed at once by min_med
+BLOCK_SIZE = 4 * 1024 * 1024
+
 class minmed:
     """ **DEPRECATED** Create a median array, rejecting the highest pixel and
     computing the lowest valid pixel after mask application
@@ -348,7 +351,8 @@ class minmed:
 
 def min_med(images, weight_images, readnoise_list, exptime_list,
             background_values, weight_masks=None, combine_grow=1,
-            combine_nsigma1=4, combine_nsigma2=3, fillval=False):
+            combine_nsigma1=4, combine_nsigma2=3, fillval=False,
+            block_size=BLOCK_SIZE):
     """ Create a median array, rejecting the highest pixel and
     computing the lowest valid pixel after mask application.
 
@@ -356,6 +360,11 @@ def min_med(images, weight_images, readnoise_list, exptime_list,
         In this version of the mimmed algorithm we assume that the units of
         all input data is electons.
 
+    The input stack is processed in blocks of rows so that the temporary
+    arrays built from the whole stack (masked copies, scaled weights, etc.)
+    never exceed ``block_size`` pixels, while all other intermediate
+    arrays have the size of a single image.
+
     Parameters
     ----------
     images : list of numpy.ndarray
@@ -389,11 +398,134 @@ def min_med(images, weight_images, readnoise_list, exptime_list,
     fillval : bool
         Turn on use of imedian/imean. (Default: ``False``)
 
+    block_size : int
+        Maximum number of stack pixels (number of images times number of
+        pixels per image) processed at once. (Default: `BLOCK_SIZE`)
+
     Returns
     -------
     combined_array : numpy.ndarray
         Combined array.
 
+    """
+    if weight_masks is not None and sum(map(np.size, weight_masks)) == 0:
+        weight_masks = None
+
+    nimages = len(images)
+    ny, nx = np.shape(images[0])
+    boxsize = int(2 * combine_grow + 1)
+
+    if combine_grow != 0:
+        # If the boxcar convolution has failed it is potentially for
+        # two reasons:
+        #   1) The kernel size for the boxcar is bigger than the actual image.
+        #   2) The grow parameter was specified with a value < 0.  This would
+        #      result in an illegal boxshape kernel. The dimensions of the
+        #      kernel box *MUST* be integer and greater than zero.
+        #
+        #   If the boxcar convolution has failed, try to give a meaningfull
+        #   explanation as to why based upon the conditionals described above.
+        if boxsize <= 0:
+            errormsg1 = "############################################################\n"
+            errormsg1 += "# The boxcar convolution in minmed has failed.  The 'grow' #\n"
+            errormsg1 += "# parameter must be greater than or equal to zero. You     #\n"
+            errormsg1 += "# specified an input value for the 'grow' parameter of:    #\n"
+            errormsg1 += "        combine_grow: " + str(combine_grow)+'\n'
+            errormsg1 += "############################################################\n"
+            raise ValueError(errormsg1)
+
+        if boxsize > ny:
+            errormsg2 = "############################################################\n"
+            errormsg2 += "# The boxcar convolution in minmed has failed.  The 'grow' #\n"
+            errormsg2 += "# parameter specified has resulted in a boxcar kernel that #\n"
+            errormsg2 += "# has dimensions larger than the actual image.  You        #\n"
+            errormsg2 += "# specified an input value for the 'grow' parameter of:    #\n"
+            errormsg2 += "        combine_grow: " + str(combine_grow) + '\n'
+            errormsg2 += "############################################################\n"
+            print((ny, nx))
+            raise ValueError(errormsg2)
+
+    # Compute the median and minimum images, and the SNR thresholds on
+    # them, one block of rows at a time:
+    nrows = max(1, block_size // max(1, nimages * nx))
+    results = None
+    for y1 in range(0, ny, nrows):
+        y2 = min(y1 + nrows, ny)
+        block = _min_med_block(
+            _stack_rows(images, y1, y2),
+            _stack_rows(weight_images, y1, y2),
+            (None if weight_masks is None else
+             _stack_rows(weight_masks, y1, y2, dtype=bool)),
+            readnoise_list, exptime_list, background_values, fillval
+        )
+        if results is None:
+            results = [np.empty((ny, nx), dtype=arr.dtype) for arr in block]
+        for arr, res in zip(block, results):
+            res[y1:y2] = arr
+        del block
+
+    (median_file, minimum_file, minimum_file_weighted, median_file_weighted,
+     rms_file, all_bad) = results
+    del results
+
+    # For the median array, calculate the n-sigma lower threshold to the array
+    # and incorporate that into the pixel values.
+    median_rms_file = median_file_weighted - rms_file * combine_nsigma1
+
+    if combine_grow != 0:
+        # Do a more sophisticated rejection: For all cases where the minimum
+        # pixel will be accepted instead of the median, set a lower threshold
+        # for that pixel and the ones around it (ie become less conservative
+        # in rejecting the median). This is because in cases of
+        # triple-incidence cosmic rays, quite often the low-lying outliers
+        # of the CRs can influence the median for the initial relatively high
+        # value of sigma, so a lower threshold must be used to mnake sure that
+        # the minimum is selected.
+        #
+        # This is done as follows:
+        # 1) make an image which is zero everywhere except where the minimum
+        #    will be accepted
+        # 2) grow these regions by a box of (2 * grow + 1) pixels on a side.
+        # 3) In the file "median_rms_file_electrons", replace these pixels
+        #     by median - combine_nsigma2 * rms
+        #
+        # Then use this image in the final replacement, in the same way as for
+        # the case where this option is not selected.
+        minimum_flag_file = np.less(minimum_file_weighted, median_rms_file)
+
+        # A box-car smoothing of the flags is non-zero exactly where a box
+        # around the pixel contains a flagged pixel, i.e., on a (binary)
+        # dilation of the flags:
+        minimum_grow_file = _box_dilate(minimum_flag_file, combine_grow)
+
+        median_rms_file = np.where(
+            minimum_grow_file,
+            median_file_weighted - rms_file * combine_nsigma2,
+            median_file_weighted - rms_file * combine_nsigma1
+        )
+        del rms_file, minimum_grow_file
+
+    # Finally decide whether to use the minimim or the median (in counts/s),
+    # based on whether the median is more than 3 sigma above the minimum.
+    combined_array = np.where(
+        np.less(minimum_file_weighted, median_rms_file),
+        minimum_file,
+        median_file
+    )
+    # Set fill regions to a pixel value of 0.
+    combined_array[all_bad] = 0
+
+    return combined_array
+
+
+def _min_med_block(images, weight_images, weight_masks, readnoise_list,
+                   exptime_list, background_values, fillval):
+    """ Compute the per-pixel quantities needed by `min_med` for a block
+    of rows of the input stack.
+
+    Returns the median and minimum images, their values scaled by the total
+    weight, the 1-sigma r.m.s. image and a mask of pixels that are masked
+    in all input images.
     """
     # In this case we want to calculate two things:
     #   1) the median array, rejecting the highest pixel (thus running
@@ -418,18 +550,12 @@ def min_med(images, weight_images, readnoise_list, exptime_list,
 
     nimages = len(images)
     combtype_median = 'imedian' if fillval else 'median'
-    images = np.asarray(images)
-    weight_images = np.asarray(weight_images)
 
-    if weight_masks is None or np.size(weight_masks) == 0:
-        weight_masks = None
-        mask_sum = np.zeros(images.shape[1:], dtype=np.int16)
-        all_bad_idx = np.array([], dtype=int)
-        all_bad_idy = np.array([], dtype=int)
+    if weight_masks is None:
+        all_bad = np.zeros(images.shape[1:], dtype=bool)
     else:
-        weight_masks = np.asarray(weight_masks, dtype=bool)
         mask_sum = np.sum(weight_masks, axis=0, dtype=np.int16)
-        all_bad_idx, all_bad_idy = np.where(mask_sum == nimages)
+        all_bad = mask_sum == nimages
 
     # Create a different median image based upon the number of images in the
     # input list.
@@ -496,7 +622,7 @@ def min_med(images, weight_images, readnoise_list, exptime_list,
         # argument:
         images = images.copy()
         images[weight_masks] = np.nan
-        images[:, all_bad_idx, all_bad_idy] = 0
+        images[:, all_bad] = 0
         minimum_file = np.nanmin(images, axis=0)
     else:
         minimum_file = np.amin(images, axis=0)
@@ -543,91 +669,30 @@ def min_med(images, weight_images, readnoise_list, exptime_list,
         np.zeros_like(median_file_weighted)
     )
     rms_file = np.sqrt(rms_file2)
-    del bkgd_file, readnoise_file
-
-    # For the median array, calculate the n-sigma lower threshold to the array
-    # and incorporate that into the pixel values.
-    median_rms_file = median_file_weighted - rms_file * combine_nsigma1
-
-    if combine_grow != 0:
-        # Do a more sophisticated rejection: For all cases where the minimum
-        # pixel will be accepted instead of the median, set a lower threshold
-        # for that pixel and the ones around it (ie become less conservative
-        # in rejecting the median). This is because in cases of
-        # triple-incidence cosmic rays, quite often the low-lying outliers
-        # of the CRs can influence the median for the initial relatively high
-        # value of sigma, so a lower threshold must be used to mnake sure that
-        # the minimum is selected.
-        #
-        # This is done as follows:
-        # 1) make an image which is zero everywhere except where the minimum
-        #    will be accepted
-        # 2) box-car smooth this image, to make these regions grow.
-        # 3) In the file "median_rms_file_electrons", replace these pixels
-        #     by median - combine_nsigma2 * rms
-        #
-        # Then use this image in the final replacement, in the same way as for
-        # the case where this option is not selected.
-        minimum_flag_file = np.less(minimum_file_weighted,
-                                    median_rms_file).astype(np.float64)
-
-        # The box size value must be an integer. This is not a problem since
-        # __combine_grow should always be an integer type. The combine_grow
-        # column in the MDRIZTAB should also be an integer type.
-        boxsize = int(2 * combine_grow + 1)
-        boxshape = (boxsize, boxsize)
-        minimum_grow_file = np.zeros_like(images[0])
-
-        # If the boxcar convolution has failed it is potentially for
-        # two reasons:
-        #   1) The kernel size for the boxcar is bigger than the actual image.
-        #   2) The grow parameter was specified with a value < 0.  This would
-        #      result in an illegal boxshape kernel. The dimensions of the
-        #      kernel box *MUST* be integer and greater than zero.
-        #
-        #   If the boxcar convolution has failed, try to give a meaningfull
-        #   explanation as to why based upon the conditionals described above.
-        if boxsize <= 0:
-            errormsg1 = "############################################################\n"
-            errormsg1 += "# The boxcar convolution in minmed has failed.  The 'grow' #\n"
-            errormsg1 += "# parameter must be greater than or equal to zero. You     #\n"
-            errormsg1 += "# specified an input value for the 'grow' parameter of:    #\n"
-            errormsg1 += "        combine_grow: " + str(combine_grow)+'\n'
-            errormsg1 += "############################################################\n"
-            raise ValueError(errormsg1)
 
-        if boxsize > images.shape[1]:
-            errormsg2 = "############################################################\n"
-            errormsg2 += "# The boxcar convolution in minmed has failed.  The 'grow' #\n"
-            errormsg2 += "# parameter specified has resulted in a boxcar kernel that #\n"
-            errormsg2 += "# has dimensions larger than the actual image.  You        #\n"
-            errormsg2 += "# specified an input value for the 'grow' parameter of:    #\n"
-            errormsg2 += "        combine_grow: " + str(combine_grow) + '\n'
-            errormsg2 += "############################################################\n"
-            print(images.shape[1:])
-            raise ValueError(errormsg2)
+    return (median_file, minimum_file, minimum_file_weighted,
+            median_file_weighted, rms_file, all_bad)
 
-        # Attempt the boxcar convolution using the boxshape based upon the user
-        # input value of "grow"
-        ker = np.ones((boxsize, boxsize)) / float(boxsize**2)
-        minimum_grow_file = signal.convolve2d(minimum_flag_file, ker,
-                                              boundary='fill', mode='same')
 
-        median_rms_file = np.where(
-            np.equal(minimum_grow_file, 0),
-            median_file_weighted - rms_file * combine_nsigma1,
-            median_file_weighted - rms_file * combine_nsigma2
-        )
-        del rms_file, minimum_grow_file
+def _stack_rows(arrays, y1, y2, dtype=None):
+    """ Stack rows ``y1:y2`` of each of the input 2D ``arrays``. """
+    return np.asarray([a[y1:y2] for a in arrays], dtype=dtype)
 
-    # Finally decide whether to use the minimim or the median (in counts/s),
-    # based on whether the median is more than 3 sigma above the minimum.
-    combined_array = np.where(
-        np.less(minimum_file_weighted, median_rms_file),
-        minimum_file,
-        median_file
-    )
-    # Set fill regions to a pixel value of 0.
-    combined_array[all_bad_idx, all_bad_idy] = 0
 
-    return combined_array
+def _box_dilate(mask, radius):
+    """ Dilate a boolean ``mask`` with a square box of ``2 * radius + 1``
+    pixels on a side, treating pixels outside of the image as unset.
+    """
+    out = mask
+    for axis in (0, 1):
+        src = out
+        out = src.copy()
+        n = src.shape[axis]
+        for shift in range(1, min(radius, n - 1) + 1):
+            lo = [slice(None)] * 2
+            hi = [slice(None)] * 2
+            lo[axis] = slice(0, n - shift)
+            hi[axis] = slice(shift, n)
+            out[tuple(lo)] |= src[tuple(hi)]
+            out[tuple(hi)] |= src[tuple(lo)]
+    return out
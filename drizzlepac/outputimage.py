@@ -6,12 +6,18 @@ This module manages the creation of the output image FITS file.
 :License: :doc:`/LICENSE`
 
 """
+import io
+import re
 import time
 import logging
+
+import numpy as np
 from astropy.io import fits
+from astropy.table import Table, vstack
 from stsci.tools import fileutil, logutil
 
 from . import wcs_functions
+from .context import ContextIndex
 from . import __version__
 from . import updatehdr
 
@@ -26,6 +32,12 @@ RESERVED_KEYS = ['NAXIS', 'NAXIS1', 'NAXIS2', 'EXTEND',
 
 EXTLIST = ('SCI', 'WHT', 'CTX')
 
+# Big-endian (FITS) data types for each supported BITPIX value
+BITPIX_DTYPES = {8: '>u1', 16: '>i2', 32: '>i4', 64: '>i8', -32: '>f4', -64: '>f8'}
+
+# FITS files are written in blocks of 2880 bytes
+FITS_BLOCK_SIZE = 2880
+
 WCS_KEYWORDS = ['CD1_1', 'CD1_2', 'CD2_1', 'CD2_2', 'CRPIX1',
 'CRPIX2', 'CRVAL1', 'CRVAL2', 'CTYPE1', 'CTYPE2', 'WCSNAME']
 
@@ -111,6 +123,9 @@ class OutputImage:
         self.bunit = None
         self.units = 'cps'
         self.blot = blot
+        self.prior_header = None
+        self.prior_hdrtab = None
+        self.nprior = 0
 
         if PYFITS_COMPRESSION and 'compress' in input_pars:
             self.compress = input_pars['compress']  # Control creation of compressed FITS files
@@ -179,6 +194,16 @@ class OutputImage:
         """
         self.units = units
 
+    def set_prior_product(self, header, hdrtab=None):
+        """
+        Method used to record the header (and header table) of an existing
+        product the inputs were drizzled into, so that the provenance of
+        the inputs already in that product gets carried over.
+        """
+        self.prior_header = header
+        self.prior_hdrtab = hdrtab
+        self.nprior = header.get('NDRIZIM', 0)
+
     def writeFITS(self, template, sciarr, whtarr, ctxarr=None,
                 versions=None, overwrite=yes, blend=True, virtual=False,
                 rules_file=None, logfile=None):
@@ -253,6 +278,8 @@ class OutputImage:
 
         newhdrs, newtab = getTemplates(template, blend=blend,
                                         rules_file=rules_file)
+        if newtab is not None and self.prior_hdrtab is not None:
+            newtab = mergeHeaderTables(self.prior_hdrtab, newtab)
         if newtab is not None: nextend += 1  # account for new table extn
 
         prihdr = newhdrs[0]
@@ -301,7 +328,7 @@ class OutputImage:
         if 'DITHCORR' in prihdu.header:
             prihdu.header['DITHCORR'] = 'COMPLETE'
 
-        prihdu.header['NDRIZIM'] = (len(self.parlist),
+        prihdu.header['NDRIZIM'] = (self.nprior + len(self.parlist),
                                    'Drizzle, No. images drizzled onto output')
 
         # Only a subset of these keywords makes sense for the new WCS based
@@ -382,15 +409,19 @@ class OutputImage:
 
             # Build CTX extension here
             # If there is only 1 plane, write it out as a 2-D extension
+            ctxtab = None
             if self.outcontext:
-                if ctxarr.shape[0] == 1:
-                    _ctxarr = ctxarr[0]
-                else:
+                if isinstance(ctxarr, ContextIndex) or ctxarr.shape[0] > 1:
                     _ctxarr = ctxarr
+                else:
+                    _ctxarr = ctxarr[0]
             else:
                 _ctxarr = None
 
-            if self.single and self.compress:
+            if isinstance(_ctxarr, ContextIndex):
+                # compact context: index image plus table of contexts
+                hdu, ctxtab = _ctxarr.to_hdus(header=dqhdr, name=EXTLIST[2])
+            elif self.single and self.compress:
                 hdu = fits.CompImageHDU(data=_ctxarr, header=dqhdr, name=EXTLIST[2])
             else:
                 hdu = fits.ImageHDU(data=_ctxarr, header=dqhdr, name=EXTLIST[2])
@@ -405,6 +436,9 @@ class OutputImage:
                 addWCSKeywords(self.wcs, hdu.header, blot=self.blot,
                                single=self.single, after=pre_wcs_kw)
             fo.append(hdu)
+            if ctxtab is not None:
+                fo.append(ctxtab)
+                fo[0].header['NEXTEND'] += 1
 
             # remove all alternate WCS solutions from headers of this product
             wcs_functions.removeAllAltWCS(fo, [1])
@@ -536,12 +570,20 @@ class OutputImage:
                 fctx = fits.HDUList()
 
                 # If there is only 1 plane, write it out as a 2-D extension
-                if ctxarr.shape[0] == 1:
-                    _ctxarr = ctxarr[0]
-                else:
+                ctxtab = None
+                if isinstance(ctxarr, ContextIndex) or ctxarr.shape[0] > 1:
                     _ctxarr = ctxarr
+                else:
+                    _ctxarr = ctxarr[0]
 
-                if self.compress:
+                ctx_wcs_ext = wcs_ext
+                if isinstance(_ctxarr, ContextIndex):
+                    # compact context: index image plus table of contexts,
+                    # which both need to be extensions
+                    hdu, ctxtab = _ctxarr.to_hdus(header=prihdu.header)
+                    fctx.append(fits.PrimaryHDU())
+                    ctx_wcs_ext = [1]
+                elif self.compress:
                     hdu = fits.CompImageHDU(data=_ctxarr, header=prihdu.header)
                 else:
                     hdu = fits.PrimaryHDU(data=_ctxarr, header=prihdu.header)
@@ -570,8 +612,10 @@ class OutputImage:
                 hdu.header.set('filetype', 'CTX', before='TELESCOP', comment='Type of data in array')
 
                 fctx.append(hdu)
+                if ctxtab is not None:
+                    fctx.append(ctxtab)
                 # remove all alternate WCS solutions from headers of this product
-                wcs_functions.removeAllAltWCS(fctx, wcs_ext)
+                wcs_functions.removeAllAltWCS(fctx, ctx_wcs_ext)
                 if not virtual:
                     print('Writing out image to disk:', self.outcontext)
                     fctx.writeto(self.outcontext, overwrite=True)
@@ -583,6 +627,51 @@ class OutputImage:
 
         return outputFITS
 
+    def createFITS(self, template, shape, nplanes=1, versions=None,
+                   blend=True, rules_file=None, logfile=None):
+        """
+        Create the output FITS file(s) on disk without writing the arrays
+        and return writable memory-mapped views of the SCI, WHT and CTX data.
+
+        The files get the same headers :py:meth:`writeFITS` would write for
+        arrays of the given ``shape`` (with ``nplanes`` context planes), but
+        their data sections are left unwritten so that they can be filled in
+        piece by piece without ever holding the full arrays in memory.
+
+        Returns a dictionary with keys ``'SCI'``, ``'WHT'`` and ``'CTX'``
+        (only for products with a context image).  The context array always
+        has shape ``(nplanes, ny, nx)``.
+        """
+        if self.compress:
+            raise ValueError("Compressed output products can not be "
+                             "written in place.")
+
+        # Let writeFITS build the headers for 1x1 placeholder arrays...
+        outputFITS = self.writeFITS(
+            template,
+            np.zeros((1, 1), dtype=np.float32),
+            np.zeros((1, 1), dtype=np.float32),
+            ctxarr=np.zeros((nplanes, 1, 1), dtype=np.int32),
+            versions=versions, blend=blend, virtual=True,
+            rules_file=rules_file, logfile=logfile
+        )
+
+        # ... then write them out with data sections sized for the real arrays
+        arrays = {}
+        for filename, fo in outputFITS.items():
+            if fo is None:
+                continue
+            for kind, (offset, dtype, dshape) in _writeFITSSkeleton(
+                    filename, fo, shape, self.build).items():
+                arrays[kind] = np.memmap(filename, dtype=dtype, mode='r+',
+                                         offset=offset, shape=dshape)
+            fo.close()
+
+        if 'CTX' in arrays and arrays['CTX'].ndim == 2:
+            arrays['CTX'] = arrays['CTX'].reshape((1,) + shape)
+
+        return arrays
+
     def find_kwupdate_location(self, hdr, keyword):
         """
         Find the last keyword in the output header that comes before the new
@@ -623,7 +712,14 @@ class OutputImage:
         # Extract some global information for the keywords
         _geom = 'User parameters'
 
-        _imgnum = 0
+        # Keep the keywords of the inputs of a prior product first
+        _imgnum = self.nprior
+        if self.prior_header is not None:
+            for _card in self.prior_header.cards:
+                match = re.match(r'D(\d{3})[A-Z]{3,4}$', _card.keyword)
+                if match and int(match.group(1)) <= self.nprior:
+                    hdr[_card.keyword] = (_card.value, _card.comment)
+
         for pl in self.parlist:
 
             # Start by building up the keyword prefix based
@@ -686,6 +782,49 @@ class OutputImage:
                 hdr.add_history(ver_str)
 
 
+def _writeFITSSkeleton(filename, fo, shape, build):
+    """
+    Write ``fo`` to ``filename`` with each image extension resized to
+    ``shape`` and its data section left unwritten (zero-filled).
+
+    Returns a dictionary mapping the type of each image ('SCI', 'WHT' or
+    'CTX') to the byte offset, data type and shape of its data section.
+    """
+    # Serialize the HDUs first, so that the headers are exactly as astropy
+    # writes them out, and then copy them over with the new dimensions.
+    buf = io.BytesIO()
+    fo.writeto(buf)
+    buf.seek(0)
+
+    layout = {}
+    with fits.open(buf) as written, open(filename, 'wb') as fout:
+        for hdu in written:
+            info = hdu.fileinfo()
+            hdr = hdu.header
+            if not hdu.is_image or hdr['NAXIS'] == 0:
+                # Copy tables and data-less headers as-is
+                buf.seek(info['hdrLoc'])
+                fout.write(buf.read(info['datLoc'] + info['datSpan'] - info['hdrLoc']))
+                continue
+
+            hdr = hdr.copy()
+            hdr['NAXIS1'] = shape[1]
+            hdr['NAXIS2'] = shape[0]
+            dshape = tuple(hdr[f'NAXIS{n}'] for n in range(hdr['NAXIS'], 0, -1))
+            dtype = np.dtype(BITPIX_DTYPES[hdr['BITPIX']])
+            fout.write(hdr.tostring().encode('ascii'))
+
+            kind = hdr.get('EXTNAME') if build else hdr.get('FILETYPE')
+            layout[kind] = (fout.tell(), dtype, dshape)
+
+            nbytes = int(np.prod(dshape)) * dtype.itemsize
+            nbytes += -nbytes % FITS_BLOCK_SIZE
+            fout.seek(nbytes, io.SEEK_CUR)
+        fout.truncate()
+
+    return layout
+
+
 def cleanTemplates(scihdr, errhdr, dqhdr):
 
     # Now, safeguard against having BSCALE and BZERO
@@ -724,6 +863,24 @@ def getTemplates(fnames, blend=True, rules_file=None):
     return newhdrs, newtab
 
 
+def mergeHeaderTables(prior, new):
+    """ Append the rows of header table ``new`` to those of ``prior``.
+
+    Columns found in only one of the tables are filled with blank strings,
+    NaN or 0 in the rows of the other one.
+    """
+    merged = vstack([Table.read(prior), Table.read(new)], join_type='outer')
+    for name in merged.colnames:
+        col = merged[name]
+        if getattr(col, 'mask', None) is not None:
+            kind = col.dtype.kind
+            merged[name] = col.filled('' if kind in 'SU' else
+                                      np.nan if kind == 'f' else 0)
+    tabhdu = fits.table_to_hdu(merged)
+    tabhdu.name = new.name
+    return tabhdu
+
+
 def addWCSKeywords(wcs, hdr, blot=False, single=False, after=None):
     """ Update input header 'hdr' with WCS keywords.
     """
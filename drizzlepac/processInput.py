@@ -1191,6 +1191,8 @@ def _setDefaults(input_dict={}):
         'skyclip':5,
         'skylsigma':4.0,
         'skyusigma':4.0,
+        'skyparallel':False,
+        'skysampling':1,
         "skymask_cat":"",
         "use_static":True,
         "sky_bits":0,
@@ -16,58 +16,44 @@ import numpy as np
 from . import __version__
 
 def qderiv(array): # TAKE THE ABSOLUTE DERIVATIVE OF A NUMARRY OBJECT
-    """Take the absolute derivate of an image in memory."""
-
-    #Create 2 empty arrays in memory of the same dimensions as 'array'
-    tmpArray = np.zeros(array.shape,dtype=np.float64)
-    outArray = np.zeros(array.shape, dtype=np.float64)
-
-    # Get the length of an array side
-    (naxis1,naxis2) = array.shape
-    #print "The input image size is (",naxis1,",",naxis2,")."
-
-#Main derivate loop:
-    #Shift images +/- 1 in Y.
-    for y in range(-1,2,2):
-        if y == -1:
-            #shift input image 1 pixel right
-            tmpArray[0:(naxis1-1),1:(naxis2-1)] = array[0:(naxis1-1),0:(naxis2-2)]
-            #print "Y shift = 1"
-        else:
-            #shift input image 1 pixel left
-            tmpArray[0:(naxis1-1),0:(naxis2-2)] = array[0:(naxis1-1),1:(naxis2-1)]
-            #print "Y shift = -1"
-        #print "call _absoluteSubtract()"
-        (tmpArray,outArray) = _absoluteSubtract(array,tmpArray,outArray)
-
-    #Shift images +/- 1 in X.
-    for x in range(-1,2,2):
-        if x == -1:
-            #shift input image 1 pixel right
-            tmpArray[1:(naxis1-1),0:(naxis2-1)] = array[0:(naxis1-2),0:(naxis2-1)]
-            #print "X shift = 1"
-        else:
-            #shift input image 1 pixel left
-            tmpArray[0:(naxis1-2),0:(naxis2-1)] = array[1:(naxis1-1),0:(naxis2-1)]
-            #print "X shift = -1"
-        #print "call _absoluteSubtract()"
-        (tmpArray,outArray) = _absoluteSubtract(array,tmpArray,outArray)
-
-
-
-    return outArray.astype(np.float32)
-
-
-def _absoluteSubtract(array,tmpArray,outArray):
-    #subtract shifted image from imput image
-    tmpArray = array - tmpArray
-    #take the absolute value of tmpArray
-    tmpArray = np.fabs(tmpArray)
-    #save maximum value of outArray or tmpArray and save in outArray
-    outArray = np.maximum(tmpArray,outArray)
-    #zero out tmpArray before reuse
-    tmpArray = tmpArray * 0.
-
-    return (tmpArray,outArray)
+    """Take the absolute derivate of an image in memory.
+
+    For each pixel, the result is the largest absolute difference between
+    the pixel and its (up to four) nearest neighbors along the X and Y axes.
+    Neighbors are taken to be 0 in the last row and column of the image,
+    next to its edges, and in the next-to-last row and column.
+    """
+    # Differences of two float32 numbers are computed exactly enough in
+    # single precision to round to the same float32 result as in double:
+    if array.dtype == np.float32:
+        dtype = np.float32
+    else:
+        dtype = np.float64
+    array = np.asarray(array, dtype=dtype)
+    (naxis1, naxis2) = array.shape
+
+    # Start with the absolute value of the pixels that have at least one
+    # neighbor outside of the shifted regions below:
+    outArray = np.fabs(array)
+    outArray[1:(naxis1-2), 1:(naxis2-2)] = 0
+
+    # Shift images +/- 1 in Y (both shifts share the same differences).
+    diff = np.fabs(array[0:(naxis1-1), 1:(naxis2-1)] -
+                   array[0:(naxis1-1), 0:(naxis2-2)])
+    _maximum(outArray[0:(naxis1-1), 1:(naxis2-1)], diff)
+    _maximum(outArray[0:(naxis1-1), 0:(naxis2-2)], diff)
+
+    # Shift images +/- 1 in X.
+    diff = np.fabs(array[1:(naxis1-1), 0:(naxis2-1)] -
+                   array[0:(naxis1-2), 0:(naxis2-1)])
+    _maximum(outArray[1:(naxis1-1), 0:(naxis2-1)], diff)
+    _maximum(outArray[0:(naxis1-2), 0:(naxis2-1)], diff)
+
+    return outArray.astype(np.float32, copy=False)
+
+
+def _maximum(outArray, tmpArray):
+    # save maximum value of outArray or tmpArray and save in outArray
+    np.maximum(tmpArray, outArray, out=outArray)
 
 # END MODULE
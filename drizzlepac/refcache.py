@@ -0,0 +1,150 @@
+"""
+Process-wide cache of reference file data (flat fields, darks, IVM files).
+
+The weight masks and the error model of every chip of every exposure are
+built from the same few reference files (``PFLTFILE``, ``DARKFILE``, ...).
+Rather than re-opening and re-reading those files for each chip, the data
+of each extension is read once, as a memory-mapped and read-only array,
+and kept in a cache with a memory budget, evicting the least recently used
+arrays first.  Sub-array sections (e.g., for subarray exposures with
+``LTV`` offsets) are returned as views of the cached array.
+
+:License: :doc:`/LICENSE`
+
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from stsci.tools import fileutil
+
+__all__ = ['ReferenceFileCache', 'reference_cache']
+
+# Default memory budget (in MB) of the reference file cache
+DEFAULT_SIZE = 1024.0
+
+log = logging.getLogger(__name__)
+
+
+class ReferenceFileCache:
+    """ Cache of the data of reference file extensions.
+
+    Arrays are keyed on the resolved path of the file, its modification time
+    and size, and the extension, so a reference file replaced on disk is
+    read again.
+
+    Parameters
+    ----------
+    max_size : float, None, optional
+        Maximum size (in MB) of the cached arrays. A value of `None` or 0
+        disables the cache.
+
+    """
+    def __init__(self, max_size=DEFAULT_SIZE):
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.configure(max_size=max_size)
+
+    def configure(self, max_size=DEFAULT_SIZE):
+        """ Change the size of the cache. """
+        with self._lock:
+            self.max_size = float(max_size) if max_size else 0.0
+            self._evict(0)
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    @staticmethod
+    def make_key(filename, ext):
+        """ Build the cache key for extension ``ext`` of ``filename``.
+
+        Raises `FileNotFoundError` if the file does not exist.
+        """
+        filename, _ = fileutil.parseFilename(fileutil.osfn(filename))
+        filename = os.path.realpath(filename)
+        stat = os.stat(filename)
+        if isinstance(ext, str):
+            ext = ext.upper()
+        elif isinstance(ext, tuple):
+            ext = (ext[0].upper(), int(ext[1]))
+        return (filename, stat.st_mtime_ns, stat.st_size, ext)
+
+    def getdata(self, filename, ext, section=None):
+        """ Return the data of extension ``ext`` of ``filename``.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the reference file. IRAF-style environment variables
+            (e.g., ``jref$``) are expanded.
+        ext : int, str, tuple
+            Extension number, name or (name, version) tuple.
+        section : tuple of slice, None, optional
+            Section of the data to return.
+
+        Returns
+        -------
+        data : numpy.ndarray
+            Read-only (memory-mapped when possible) data array, or a view of
+            it when ``section`` is given. When the cache is disabled, a new
+            (writable) array is returned.
+
+        """
+        if not self.enabled:
+            data = self._read(filename, ext, memmap=False)
+            return data if section is None else data[section]
+
+        key = self.make_key(filename, ext)
+        with self._lock:
+            data = self._data.get(key)
+            if data is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if data is None:
+            log.debug(f"Reading extension {ext} of reference file '{key[0]}'.")
+            data = self._read(key[0], ext, memmap=True)
+            data.flags.writeable = False
+            self._add(key, data)
+
+        return data if section is None else data[section]
+
+    def clear(self):
+        """ Remove all arrays from the cache. """
+        with self._lock:
+            self._data.clear()
+            self._nbytes = 0
+
+    @staticmethod
+    def _read(filename, ext, memmap):
+        hdulist = fileutil.openImage(filename, mode='readonly', memmap=memmap)
+        try:
+            # Memory-mapped data remain valid after the file is closed.
+            return hdulist[ext].data
+        finally:
+            hdulist.close()
+
+    def _add(self, key, data):
+        with self._lock:
+            if key in self._data or data.nbytes > self.max_size * 1024**2:
+                return
+            self._evict(data.nbytes)
+            self._data[key] = data
+            self._nbytes += data.nbytes
+
+    def _evict(self, nbytes):
+        # Drop least recently used arrays until ``nbytes`` more bytes fit.
+        while self._data and self._nbytes + nbytes > self.max_size * 1024**2:
+            _, data = self._data.popitem(last=False)
+            self._nbytes -= data.nbytes
+
+
+# Reference file cache used by the image classes.
+reference_cache = ReferenceFileCache()
@@ -0,0 +1,239 @@
+"""
+Hand in-memory (virtual) output products created by worker processes back
+to the parent process through shared memory.
+
+When ``in_memory=True``, products such as single-drizzled images and
+weights or CR masks are kept as FITS objects in
+``imageObject.virtualOutputs``.  Worker processes started with
+`multiprocessing` get a copy of the parent's ``imageObject``, so the
+products they create need to be sent back to the parent.  Instead of
+pickling each product through a `multiprocessing.Manager`, a worker
+writes the data arrays into files in a shared-memory (``tmpfs``) directory
+and records their layout and FITS headers in a small index.  The parent
+then memory-maps those files, so that the arrays are shared with (rather
+than copied from) the worker. Outputs that do not fit in shared memory are
+written to a temporary directory on disk instead, and errors raised in a
+worker are raised again in the parent when its outputs are collected.
+
+:License: :doc:`/LICENSE`
+
+"""
+import glob
+import json
+import logging
+import os
+import shutil
+import tempfile
+import traceback
+
+import numpy as np
+from astropy.io import fits
+
+__all__ = ['SharedOutputs']
+
+# Directory backed by shared memory, if available. Otherwise files are
+# created in the default temporary directory.
+SHM_DIR = '/dev/shm' if os.access('/dev/shm', os.W_OK) else None
+
+log = logging.getLogger(__name__)
+
+
+class SharedOutputs:
+    """ Registry of virtual output products exported by worker processes.
+
+    Typical use is::
+
+        shared = SharedOutputs()
+        p = mp_ctx.Process(target=shared.run,
+                           args=(key, img, run_driz_img, arg1, ...))
+        ...  # start the processes and wait for them
+        img.virtualOutputs.update(shared.collect(key))
+        shared.close()
+
+    where ``key`` is a string (e.g., the index of the image) identifying
+    the products of each worker.
+
+    Parameters
+    ----------
+    path : str, None, optional
+        Directory where to create the registry. By default, a new directory
+        is created in shared memory (``/dev/shm``) when it is available.
+
+    disk_path : str, None, optional
+        Directory where to create the registry of the outputs that cannot be
+        written to ``path`` (for instance, because shared memory is full).
+        By default, a new temporary directory on disk is used when the
+        registry is in shared memory, and there is no such fallback
+        otherwise.
+
+    """
+    def __init__(self, path=None, disk_path=None):
+        self.path = tempfile.mkdtemp(prefix='drizzlepac_shm_',
+                                     dir=SHM_DIR if path is None else path)
+        if disk_path is None and path is None and SHM_DIR is not None:
+            disk_path = tempfile.gettempdir()
+        self.disk_path = None
+        if disk_path is not None:
+            self.disk_path = tempfile.mkdtemp(prefix='drizzlepac_shm_',
+                                              dir=disk_path)
+
+    def run(self, key, img, target, *args, **kwargs):
+        """ Call ``target(img, *args, **kwargs)`` and export any entry of
+        ``img.virtualOutputs`` that has been added or replaced by it.
+
+        This is meant to be used as the ``target`` of a worker process. Any
+        error is recorded, to be raised again by `collect`, before being
+        raised in the worker.
+        """
+        try:
+            before = dict(img.virtualOutputs)
+            target(img, *args, **kwargs)
+            self.export(key, {
+                name: value for name, value in img.virtualOutputs.items()
+                if value is not None and value is not before.get(name)
+            })
+        except BaseException:
+            self._record_error(key, traceback.format_exc())
+            raise
+
+    def export(self, key, outputs):
+        """ Write the data of the FITS objects in the ``outputs`` dictionary
+        to shared memory and register them under ``key``.
+
+        ``outputs`` values may be `~astropy.io.fits.HDUList` or single
+        image HDUs. Other values are ignored. When they cannot be written
+        to shared memory, they are written to ``disk_path`` instead.
+        """
+        try:
+            self._export(key, outputs, self.path)
+        except OSError as e:
+            if self.disk_path is None:
+                raise
+            log.warning(f"Could not write outputs to '{self.path}' ({e}); "
+                        f"writing them to '{self.disk_path}' instead.")
+            for filename in glob.glob(os.path.join(self.path, f'{key}[._]*')):
+                os.remove(filename)
+            self._export(key, outputs, self.disk_path)
+
+    def _export(self, key, outputs, path):
+        index = {}
+        for name, value in outputs.items():
+            if isinstance(value, fits.HDUList):
+                hdus = list(value)
+            elif isinstance(value, (fits.PrimaryHDU, fits.ImageHDU)):
+                hdus = [value]
+            else:
+                log.debug(f"Virtual output '{name}' cannot be shared.")
+                continue
+
+            entries = []
+            for hdu in hdus:
+                entries.append(self._export_hdu(key, hdu, path))
+            index[name] = {
+                'hdulist': isinstance(value, fits.HDUList),
+                'hdus': entries,
+            }
+
+        # Write the index last (and atomically), since its presence marks
+        # the outputs as complete.
+        index_name = self._index_name(key, path)
+        with open(index_name + '.tmp', 'w') as f:
+            json.dump(index, f)
+        os.replace(index_name + '.tmp', index_name)
+
+    def collect(self, key):
+        """ Return a dictionary of the FITS objects registered under ``key``.
+
+        Data arrays are memory-mapped from shared memory and the backing
+        files are removed right away, so that the memory is released as
+        soon as the returned objects are discarded. An empty dictionary is
+        returned when nothing was registered under ``key``.
+
+        Raises
+        ------
+        RuntimeError
+            If the worker that was to create the outputs failed.
+
+        """
+        for path in self._paths:
+            error_name = self._index_name(key, path, ext='err')
+            if os.path.isfile(error_name):
+                with open(error_name) as f:
+                    msg = f.read()
+                raise RuntimeError(
+                    f"Worker '{key}' failed to create its outputs:\n{msg}"
+                )
+
+        for path in self._paths:
+            index_name = self._index_name(key, path)
+            if os.path.isfile(index_name):
+                break
+        else:
+            return {}
+
+        with open(index_name) as f:
+            index = json.load(f)
+        os.remove(index_name)
+
+        outputs = {}
+        for name, entry in index.items():
+            hdus = [self._import_hdu(hdu) for hdu in entry['hdus']]
+            if entry['hdulist']:
+                outputs[name] = fits.HDUList(hdus)
+            else:
+                outputs[name] = hdus[0]
+        return outputs
+
+    def close(self):
+        """ Remove the registry and any outputs that were not collected. """
+        for path in self._paths:
+            shutil.rmtree(path, ignore_errors=True)
+
+    @property
+    def _paths(self):
+        return [p for p in (self.path, self.disk_path) if p is not None]
+
+    def _index_name(self, key, path, ext='json'):
+        return os.path.join(path, f'{key}.{ext}')
+
+    def _record_error(self, key, msg):
+        for path in self._paths:
+            try:
+                with open(self._index_name(key, path, ext='err'), 'w') as f:
+                    f.write(msg)
+                return
+            except OSError:
+                continue
+
+    def _export_hdu(self, key, hdu, path):
+        entry = {
+            'class': type(hdu).__name__,
+            'header': hdu.header.tostring(),
+            'data': None,
+        }
+        if hdu.data is not None:
+            data = np.ascontiguousarray(hdu.data)
+            fd, filename = tempfile.mkstemp(prefix=f'{key}_', suffix='.dat',
+                                            dir=path)
+            with os.fdopen(fd, 'wb') as f:
+                data.tofile(f)
+            entry['data'] = {
+                'file': filename,
+                'dtype': data.dtype.str,
+                'shape': data.shape,
+            }
+        return entry
+
+    def _import_hdu(self, entry):
+        header = fits.Header.fromstring(entry['header'])
+        data = entry['data']
+        if data is not None:
+            shape = tuple(data['shape'])
+            if np.prod(shape) > 0:
+                arr = np.memmap(data['file'], dtype=data['dtype'], mode='r+',
+                                shape=shape)
+            else:
+                arr = np.empty(shape, dtype=data['dtype'])
+            os.remove(data['file'])
+            data = arr
+        return getattr(fits, entry['class'])(data=data, header=header)
@@ -11,6 +11,7 @@ input image while recording the subtracted value in the image header.
 """
 import os
 import logging
+import functools
 
 import numpy as np
 from astropy.utils import deprecated
@@ -21,11 +22,13 @@ from stsci.tools.bitmask import interpret_bit_flags
 import stsci.imagestats as imagestats
 
 from stsci.skypac.skymatch import skymatch
+from stsci.skypac.skystatistics import SkyStats
 from stsci.skypac.utils import MultiFileLog, ext2str, \
      file_name_components, in_memory_mask, temp_mask_file, openImageEx
 from stsci.skypac.parseat import FileExtMaskInfo, parse_at_file
 
 from . import processInput
+from . import skyoverlap
 
 from . import util
 from . import __version__
@@ -125,6 +128,8 @@ def sky(input=None,outExt=None,configObj=None, group=None, editpars=False, **inp
         skyclip           Number of clipping iterations
         skylsigma         Lower side clipping factor (in sigma)
         skyusigma         Upper side clipping factor (in sigma)
+        skyparallel       Compute the sky of overlap regions with drizzlepac.skyoverlap (in parallel)?
+        skysampling       Sampling step (in pixels) of overlap regions for sky matching
         skymask_cat       Catalog file listing image masks
         use_static        Use static mask for skymatch computations?
         sky_bits          Bit flags for identifying bad pixels in DQ array
@@ -225,6 +230,25 @@ def sky(input=None,outExt=None,configObj=None, group=None, editpars=False, **inp
         Upper clipping limit, in sigma, used when computing the sky value.
 
 
+    skyparallel : bool, optional (Default Value = False)
+        Compute the sky of the images in the regions where they overlap, when
+        matching the sky (``skymethod`` set to ``'match'`` or
+        ``'globalmin+match'``), with :py:mod:`drizzlepac.skyoverlap` instead
+        of ``stsci.skypac``: only pairs of images whose footprints may overlap
+        are considered, overlap regions are found by mapping pixels through
+        the WCS of the images, and pairs are processed in parallel (up to
+        ``num_cores`` processes). The sky offsets of the images are then
+        solved for in the same way as by ``stsci.skypac``.
+
+
+    skysampling : int, optional (Default Value = 1)
+        Sampling step, in pixels, of the regions where images overlap, used
+        when matching the sky with ``skyparallel`` enabled. The sky of each
+        image in each overlap region is computed from one pixel out of
+        ``skysampling`` along each axis. Values larger than 1 speed up sky
+        matching of large mosaics.
+
+
     skymask_cat : str, optional (Default Value = '')
         File name of a catalog file listing user masks to be used with images.
 
@@ -585,13 +609,15 @@ def subtractSky(imageObjList,configObj,saveFile=False,procSteps=None):
         else:
             clean = True
 
-        _skymatch(imageObjList, paramDict, inmemory, clean, log)
+        _skymatch(imageObjList, paramDict, inmemory, clean, log,
+                  num_cores=configObj.get('num_cores'))
 
     if procSteps is not None:
         procSteps.endStep(PROCSTEPS_NAME)
 
 
-def _skymatch(imageList, paramDict, in_memory, clean, logfile):
+def _skymatch(imageList, paramDict, in_memory, clean, logfile,
+              num_cores=None):
     # '_skymatch' converts input imageList and other parameters to
     # data structures accepted by the "skymatch" package.
     # It also creates a temporary mask by combining 'static' mask,
@@ -718,27 +744,37 @@ def _skymatch(imageList, paramDict, in_memory, clean, logfile):
 
         new_fi.append(fi)
 
+    if paramDict.get('skyparallel', False):
+        # sky in overlap regions is computed by 'skyoverlap' (in parallel,
+        # for the overlapping pairs only):
+        run_skymatch = functools.partial(
+            _skymatch_parallel, imageList, num_cores=num_cores,
+            sampling=paramDict.get('skysampling', 1)
+        )
+    else:
+        run_skymatch = skymatch
+
     try:
         # Run skymatch algorithm:
-        skymatch(new_fi,
-                 skymethod   = paramDict['skymethod'],
-                 skystat     = paramDict['skystat'],
-                 lower       = paramDict['skylower'],
-                 upper       = paramDict['skyupper'],
-                 nclip       = paramDict['skyclip'],
-                 lsigma      = paramDict['skylsigma'],
-                 usigma      = paramDict['skyusigma'],
-                 binwidth    = paramDict['skywidth'],
-                 skyuser_kwd = skyKW,
-                 units_kwd   = 'BUNIT',
-                 readonly    = not paramDict['skysub'],
-                 dq_bits     = None,
-                 optimize    = 'inmemory' if in_memory else 'balanced',
-                 clobber     = True,
-                 clean       = clean,
-                 verbose     = True,
-                 flog        = MultiFileLog(console = True, enableBold = False),
-                 _taskname4history = 'AstroDrizzle')
+        run_skymatch(new_fi,
+                     skymethod   = paramDict['skymethod'],
+                     skystat     = paramDict['skystat'],
+                     lower       = paramDict['skylower'],
+                     upper       = paramDict['skyupper'],
+                     nclip       = paramDict['skyclip'],
+                     lsigma      = paramDict['skylsigma'],
+                     usigma      = paramDict['skyusigma'],
+                     binwidth    = paramDict['skywidth'],
+                     skyuser_kwd = skyKW,
+                     units_kwd   = 'BUNIT',
+                     readonly    = not paramDict['skysub'],
+                     dq_bits     = None,
+                     optimize    = 'inmemory' if in_memory else 'balanced',
+                     clobber     = True,
+                     clean       = clean,
+                     verbose     = True,
+                     flog        = MultiFileLog(console = True, enableBold = False),
+                     _taskname4history = 'AstroDrizzle')
     except Exception:
         if 'match' in paramDict['skymethod']:  # This catches 'match' and 'globalmin+match'
             new_method = 'globalmin' if 'globalmin' in paramDict['skymethod'] else 'localmin'
@@ -788,6 +824,62 @@ def _skymatch(imageList, paramDict, in_memory, clean, logfile):
     for fi in new_fi:
         fi.release_all_images()
 
+def _skymatch_parallel(imageList, input, num_cores=None, sampling=1,
+                       **pars):
+    # '_skymatch_parallel' is called like 'skymatch' (with the same 'input'
+    # and parameters) and matches the sky with 'skyoverlap' instead,
+    # recording the sky values in the headers of the input images as
+    # 'skymatch' does. Methods without matching are left to 'skymatch'.
+    skymethod = pars['skymethod']
+    if 'match' not in skymethod:
+        return skymatch(input, **pars)
+
+    skystat = SkyStats(skystat=pars['skystat'], lower=pars['lower'],
+                       upper=pars['upper'], nclip=pars['nclip'],
+                       lsig=pars['lsigma'], usig=pars['usigma'],
+                       binwidth=pars['binwidth'])
+
+    images = []
+    for img, fi in zip(imageList, input):
+        chips = []
+        for k in range(fi.count):
+            if fi.mask_images[k].closed:
+                mask = None
+            else:
+                mask = (fi.mask_images[k].hdu, fi.maskext[k])
+            chips.append(skyoverlap.SkyChip(
+                fi.image.hdu, fi.fext[k], img[fi.fext[k]].wcs,
+                conv=_brightness_conv(img[fi.fext[k]]), mask=mask
+            ))
+        images.append(chips)
+
+    skyvals = skyoverlap.match_sky(images, skystat, skymethod=skymethod,
+                                   num_cores=num_cores, sampling=sampling)
+
+    for img, fi, chip_skyvals in zip(imageList, input, skyvals):
+        if chip_skyvals[0] is None:
+            log.warning("Sky of image '{}' could not be matched: {} is "
+                        "left unchanged.".format(img._filename,
+                                                 pars['skyuser_kwd']))
+            continue
+        for ext, value in zip(fi.fext, chip_skyvals):
+            log.info("   *   {}[{}]  {} = {:G}".format(
+                img._filename, ext2str(ext), pars['skyuser_kwd'], value))
+            if not pars['readonly']:
+                fi.image.hdu[ext].header[pars['skyuser_kwd']] = (
+                    value, 'Sky value computed by AstroDrizzle'
+                )
+
+
+def _brightness_conv(sci_chip):
+    # conversion factor of the data of a chip to brightness units
+    # (data units per second, per square arcsec), as used by 'skymatch'
+    conv = 1.0 / sci_chip.wcs.pscale**2
+    if sci_chip.in_units == 'counts' and sci_chip._exptime:
+        conv /= sci_chip._exptime
+    return conv
+
+
 def _buildStaticDQUserMask(img, ext, sky_bits, use_static, umask,
                            umaskext, in_memory):
     # creates a temporary mask by combining 'static' mask,
@@ -1055,11 +1147,12 @@ def _skySub(imageSet,paramDict,saveFile=False):
         for chip in range(1,numchips+1,1):
             myext=sciExt+","+str(chip)
 
-            #add the data back into the chip, leave it there til the end of this function
+            #add the data back into the chip only while computing its sky
             imageSet[myext].data=imageSet.getData(myext)
 
             image=imageSet[myext]
             _skyValue= _computeSky(image, paramDict, memmap=False)
+            imageSet.releaseData(myext)
             #scale the sky value by the area on sky
             # account for the case where no IDCSCALE has been set, due to a
             # lack of IDCTAB or to 'coeffs=False'.
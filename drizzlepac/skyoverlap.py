@@ -0,0 +1,450 @@
+"""
+Sky matching of images from the sky in their overlap regions, computed in
+parallel.
+
+With the ``skyparallel`` parameter enabled, the sky step matches the sky of
+the input images (``skymethod`` set to ``'match'`` or ``'globalmin+match'``)
+with :py:func:`match_sky` instead of `stsci.skypac.skymatch`.  The sky of
+each image is computed in the regions it has in common with every other
+image and the sky offsets of all images are then solved for at once, as by
+`stsci.skypac.skymatch`, but:
+
+* the pairs of images whose footprints overlap are found first from the
+  circles enclosing the footprints, so that overlap regions are computed
+  only for pairs of images that may overlap;
+* the statistics of the overlap regions of these pairs are computed by a
+  pool of worker processes;
+* the pixels of an image in its overlap with another image are found by
+  mapping them through the WCS of both images, and only the bounding box of
+  the overlap region is read from the (memory mapped) data and masks,
+  optionally keeping only one pixel out of ``sampling`` in each direction,
+  so that each worker only holds the data of the overlap region it is
+  working on.
+
+As with `stsci.skypac.skymatch`, sky values are compared in brightness
+units (data units per second, when the data are in counts, per square
+arcsec) and statistics of the data are computed with
+`stsci.skypac.skystatistics.SkyStats`.
+
+:License: :doc:`/LICENSE`
+
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from astropy.io import fits
+
+from . import util
+
+if util.can_parallel:
+    import multiprocessing
+
+__all__ = ['SkyChip', 'match_sky', 'overlap_matrix', 'overlap_pairs',
+           'solve_sky_deltas']
+
+log = logging.getLogger(__name__)
+
+# Number of (sampled) rows of an overlap region mapped at once
+BLOCK_ROWS = 256
+
+# Step, in pixels, of the points of the edges of a chip used to find
+# the bounding box of its overlap with another chip
+_EDGE_STEP = 32
+
+# Files opened by each process to read the data of the overlap regions,
+# keyed on the process ID and file name
+_files = {}
+
+# Images, sky statistics and sampling shared with the worker processes
+_shared = None
+
+
+class SkyChip:
+    """ A chip of an image whose sky is to be matched.
+
+    Parameters
+    ----------
+    hdulist : astropy.io.fits.HDUList
+        The (memory mapped) file containing the data of the chip.
+
+    ext : int, str or tuple
+        Extension of ``hdulist`` with the data of the chip.
+
+    wcs : astropy.wcs.WCS
+        Full (distorted) WCS of the chip.
+
+    conv : float, optional
+        Conversion factor of the data to brightness units.
+
+    mask : tuple, None, optional
+        ``(hdulist, ext)`` of the mask of the chip, whose non-zero values
+        flag the pixels to use.
+
+    """
+    def __init__(self, hdulist, ext, wcs, conv=1.0, mask=None):
+        self.hdulist = hdulist
+        self.ext = ext
+        self.wcs = wcs
+        self.conv = conv
+        self.mask = mask
+        self.shape = tuple(hdulist[ext].shape)
+        self.edges = _edge_world(wcs, self.shape)
+
+    @property
+    def data(self):
+        return _hdu_data(self.hdulist, self.ext)
+
+    @property
+    def mask_data(self):
+        if self.mask is None:
+            return None
+        return _hdu_data(*self.mask)
+
+
+def overlap_pairs(images):
+    """ Find the pairs of images whose footprints may overlap.
+
+    Each footprint is enclosed in a circle (on the sky) centered on the mean
+    of the points of the edges of its chips, and pairs of images are kept
+    when their circles intersect.
+
+    Parameters
+    ----------
+    images : list of list of SkyChip
+
+    Returns
+    -------
+    pairs : list of tuple
+        Indices ``(i, j)``, with ``i < j``, of the images that may overlap.
+
+    """
+    ns = len(images)
+    centers = np.zeros((ns, 3))
+    radii = np.zeros(ns)
+    for k, chips in enumerate(images):
+        points = _unit_vectors(*np.hstack([c.edges for c in chips]))
+        center = points.mean(axis=0)
+        center /= np.linalg.norm(center)
+        centers[k] = center
+        radii[k] = np.arccos(np.clip(np.dot(points, center), -1.0, 1.0)).max()
+
+    sep = np.arccos(np.clip(np.dot(centers, centers.T), -1.0, 1.0))
+    # make sure rounding errors never leave out touching footprints
+    maxsep = radii[:, None] + radii[None, :] + 1e-8
+    i, j = np.nonzero(np.triu(sep <= maxsep, k=1))
+    return list(zip(i.tolist(), j.tolist()))
+
+
+def overlap_matrix(images, skystat, num_cores=None, sampling=1):
+    """ Compute the sky of each image in its overlap with each other image.
+
+    Parameters
+    ----------
+    images : list of list of SkyChip
+        The chips of the images to match.
+
+    skystat : `~stsci.skypac.skystatistics.SkyStats`
+        Sky statistics.
+
+    num_cores : int, None, optional
+        Maximum number of worker processes (`None` to use all the cores).
+
+    sampling : int, optional
+        Sampling step of the pixels of the overlap regions.
+
+    Returns
+    -------
+    A, W : numpy.ndarray
+        ``A[j, i]`` and ``W[j, i]`` are the sky of image ``i`` (in
+        brightness units) in its overlap with image ``j`` and its weight
+        (number of pixels).
+
+    """
+    global _shared
+
+    ns = len(images)
+    A = np.zeros((ns, ns), dtype=float)
+    W = np.zeros((ns, ns), dtype=float)
+    pairs = overlap_pairs(images)
+    npairs = ns * (ns - 1) // 2
+    log.info(f"Computing sky in the overlaps of {len(pairs):d} pairs of "
+             f"images (out of {npairs:d})")
+
+    pool_size = util.get_pool_size(num_cores, len(pairs))
+    _shared = (images, skystat, max(1, int(sampling)))
+    try:
+        if pool_size < 2:
+            results = _pair_skies(pairs)
+        else:
+            # hand out pairs in several small chunks to balance the load
+            nchunks = min(len(pairs), 4 * pool_size)
+            chunks = [pairs[k::nchunks] for k in range(nchunks)]
+            results = []
+            mp_ctx = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=pool_size,
+                                     mp_context=mp_ctx) as executor:
+                futures = [executor.submit(_pair_skies, chunk)
+                           for chunk in chunks]
+                try:
+                    for future in as_completed(futures):
+                        results.extend(future.result())
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+    finally:
+        _shared = None
+        _close_files()
+
+    for i, j, s1, w1, s2, w2 in results:
+        if s1 is None or s2 is None:
+            continue
+        A[j, i] = s1
+        W[j, i] = w1
+        A[i, j] = s2
+        W[i, j] = w2
+    return A, W
+
+
+def solve_sky_deltas(A, W):
+    """ Solve for the sky offsets of images that best match the sky in their
+    overlap regions, weighted by the number of pixels of these regions.
+
+    Parameters
+    ----------
+    A, W : numpy.ndarray
+        Sky and weights computed by :py:func:`overlap_matrix`.
+
+    Returns
+    -------
+    deltas : numpy.ndarray
+        Sky offsets of the images (in brightness units), `numpy.nan` for
+        images that do not overlap any other image.
+
+    """
+    ns = A.shape[0]
+    valid = (W > 0) & (W.T > 0)
+    i, j = np.nonzero(np.triu(valid, k=1))
+    deltas = np.full(ns, np.nan)
+    if i.size == 0:
+        log.warning("Unable to compute sky: No valid data in common "
+                    "image areas")
+        return deltas
+
+    wm = 0.5 * (W[i, j] + W[j, i])
+    K = np.zeros((i.size, ns))
+    K[np.arange(i.size), i] = wm
+    K[np.arange(i.size), j] = -wm
+    F = wm * (A[j, i] - A[i, j])
+
+    rank = np.linalg.matrix_rank(K, 1.0e-12)
+    if rank < ns - 1:
+        log.warning(f"There are more unknown sky values ({ns}) to be "
+                    "solved for than there are independent equations "
+                    f"available (matrix rank={rank}). Sky matching (delta) "
+                    "values will be computed only for a subset (or more "
+                    "independent subsets) of input images.")
+
+    matched = np.zeros(ns, dtype=bool)
+    matched[i] = True
+    matched[j] = True
+    deltas[matched] = np.dot(np.linalg.pinv(K, rcond=1.0e-12), F)[matched]
+    return deltas
+
+
+def match_sky(images, skystat, skymethod='match', num_cores=None, sampling=1):
+    """ Compute the sky of images matched in their overlap regions.
+
+    Parameters
+    ----------
+    images : list of list of SkyChip
+        The chips of the images to match.
+
+    skystat : `~stsci.skypac.skystatistics.SkyStats`
+        Sky statistics.
+
+    skymethod : {'match', 'globalmin+match'}, optional
+        With ``'match'``, the sky of the image with the lowest sky is set to
+        0; with ``'globalmin+match'``, the minimum of the sky of all chips,
+        once matched, is added to the sky of all images.
+
+    num_cores : int, None, optional
+        Maximum number of worker processes (`None` to use all the cores).
+
+    sampling : int, optional
+        Sampling step of the pixels of the overlap regions.
+
+    Returns
+    -------
+    sky : list of list
+        Sky of each chip of each image, in data units, or `None` for the
+        images whose sky could not be matched with ``'match'``.
+
+    """
+    A, W = overlap_matrix(images, skystat, num_cores=num_cores,
+                          sampling=sampling)
+    deltas = solve_sky_deltas(A, W)
+    good = np.isfinite(deltas)
+    deltas[good] -= np.amin(deltas[good], initial=0.0)
+
+    if skymethod == 'globalmin+match':
+        # images that could not be matched get the global sky only
+        deltas[~good] = 0.0
+        minsky = None
+        for chips, delta in zip(images, deltas):
+            for chip in chips:
+                sky = _chip_sky(chip, skystat)
+                if sky is not None and (minsky is None or sky - delta < minsky):
+                    minsky = sky - delta
+        if minsky is None:
+            minsky = 0.0
+        log.info(f'"Global" sky value: {minsky} (brightness units)')
+        deltas += minsky
+    elif skymethod != 'match':
+        raise ValueError(f"Unsupported sky method '{skymethod}'")
+
+    return [[None if np.isnan(delta) else delta / chip.conv for chip in chips]
+            for chips, delta in zip(images, deltas)]
+
+
+def _pair_skies(pairs):
+    images, skystat, sampling = _shared
+    try:
+        return [
+            (i, j)
+            + _image_sky(images[i], images[j], skystat, sampling)
+            + _image_sky(images[j], images[i], skystat, sampling)
+            for i, j in pairs
+        ]
+    finally:
+        _close_files()
+
+
+def _image_sky(chips, others, skystat, sampling):
+    """ Weighted average of the sky (in brightness units) of the chips of an
+    image in their overlap with the chips of another image, and its weight.
+    """
+    wsky = 0.0
+    weight = 0
+    for chip in chips:
+        sky, npix = _overlap_sky(chip, others, skystat, sampling)
+        if sky is not None and npix > 0:
+            wsky += sky * npix
+            weight += npix
+    if weight == 0:
+        return (None, 0)
+    return (wsky / weight, weight * sampling**2)
+
+
+def _overlap_sky(chip, others, skystat, sampling):
+    """ Sky (in brightness units) and number of pixels of a chip within the
+    footprints of the chips ``others``, computed from the pixels of the
+    bounding box of the overlap, sampled every ``sampling`` pixels.
+    """
+    ny, nx = chip.shape
+    # bounding box of the edges of the other chips on this chip:
+    x, y = chip.wcs.all_world2pix(*np.hstack([o.edges for o in others]), 0,
+                                  quiet=True)
+    good = np.isfinite(x) & np.isfinite(y)
+    if not np.any(good):
+        return (None, 0)
+    x0 = max(int(np.floor(x[good].min())), 0)
+    x1 = min(int(np.ceil(x[good].max())) + 1, nx)
+    y0 = max(int(np.floor(y[good].min())), 0)
+    y1 = min(int(np.ceil(y[good].max())) + 1, ny)
+    # align the box on the sampling grid:
+    x0 = -(-x0 // sampling) * sampling
+    y0 = -(-y0 // sampling) * sampling
+    if x1 <= x0 or y1 <= y0:
+        return (None, 0)
+
+    data = chip.data
+    mask = chip.mask_data
+    xs = np.arange(x0, x1, sampling)
+    rows = np.arange(y0, y1, sampling)
+    values = []
+    for start in range(0, rows.size, BLOCK_ROWS):
+        ys = rows[start:start + BLOCK_ROWS]
+        px, py = np.meshgrid(xs, ys)
+        inside = _inside(chip.wcs.all_pix2world(px, py, 0), others)
+        box = (slice(ys[0], ys[-1] + 1, sampling),
+               slice(xs[0], xs[-1] + 1, sampling))
+        if mask is not None:
+            inside &= np.asarray(mask[box], dtype=bool)
+        values.append(data[box][inside])
+
+    try:
+        sky, npix = skystat.calc_sky(np.concatenate(values))
+    except ValueError:
+        return (None, 0)
+    return (sky * chip.conv, npix)
+
+
+def _inside(radec, chips):
+    """ Flag the points ``radec`` that fall on any of ``chips``. """
+    ra, dec = radec
+    inside = np.zeros(ra.shape, dtype=bool)
+    for chip in chips:
+        ny, nx = chip.shape
+        x, y = chip.wcs.all_world2pix(ra, dec, 0, quiet=True)
+        with np.errstate(invalid='ignore'):
+            inside |= (x > -0.5) & (x < nx - 0.5) & (y > -0.5) & (y < ny - 0.5)
+    return inside
+
+
+def _chip_sky(chip, skystat):
+    """ Sky of the (masked) data of a chip, in brightness units. """
+    data = chip.data
+    mask = chip.mask_data
+    if mask is not None:
+        data = data[np.asarray(mask, dtype=bool)]
+    try:
+        sky, npix = skystat.calc_sky(data)
+    except ValueError:
+        return None
+    finally:
+        _close_files()
+    if npix < 1:
+        return None
+    return sky * chip.conv
+
+
+def _edge_world(wcs, shape):
+    """ Sky coordinates of points along the edges of a chip. """
+    ny, nx = shape
+    xs = np.append(np.arange(0, nx - 1, _EDGE_STEP), nx - 1) - 0.5
+    ys = np.append(np.arange(0, ny - 1, _EDGE_STEP), ny - 1) - 0.5
+    x = np.concatenate([xs, np.full(ys.size, nx - 0.5), xs, np.full(ys.size, -0.5)])
+    y = np.concatenate([np.full(xs.size, -0.5), ys, np.full(xs.size, ny - 0.5), ys])
+    return np.array(wcs.all_pix2world(x, y, 0))
+
+
+def _unit_vectors(ra, dec):
+    ra = np.deg2rad(ra)
+    dec = np.deg2rad(dec)
+    return np.column_stack([np.cos(dec) * np.cos(ra),
+                            np.cos(dec) * np.sin(ra),
+                            np.sin(dec)])
+
+
+def _hdu_data(hdulist, ext):
+    """ Data of an extension: already loaded data or else a memory-mapped
+    array from a file opened by the current process, so that worker
+    processes never share file handles.
+    """
+    hdu = hdulist[ext]
+    filename = hdulist.filename()
+    if hdu._data_loaded or filename is None or not os.path.isfile(filename):
+        return hdu.data
+    key = (os.getpid(), filename)
+    if key not in _files:
+        _files[key] = fits.open(filename, mode='readonly', memmap=True)
+    return _files[key][ext].data
+
+
+def _close_files():
+    pid = os.getpid()
+    for key in [k for k in _files if k[0] == pid]:
+        _files.pop(key).close()
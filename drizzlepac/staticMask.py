@@ -295,6 +295,7 @@ class staticMask:
                                np.logical_not(np.less(chipimage, sky_rms_diff)),
                                self.masklist[signature])
             del chipimage
+            imagePtr.releaseData(chipid)
 
     def _buildMaskArray(self,signature):
         """ Creates empty  numpy array for static mask array signature. """
@@ -10,6 +10,7 @@ data.
 from stsci.tools import fileutil
 import numpy as np
 from .imageObject import imageObject
+from .refcache import reference_cache
 
 
 class STISInputImage (imageObject):
@@ -32,7 +33,7 @@ class STISInputImage (imageObject):
 
         """
         sci_chip = self._image[self.scienceExt,chip]
-        exten = self.errExt+','+str(chip)
+        exten = (self.errExt, chip)
 
         # The keyword for STIS flat fields in the primary header of the flt
 
@@ -41,9 +42,7 @@ class STISInputImage (imageObject):
 
         # Try to open the file in the location specified by LFLTFILE.
         try:
-            handle = fileutil.openImage(lflatfile, mode='readonly', memmap=False)
-            hdu = fileutil.getExtn(handle,extn=exten)
-            lfltdata = hdu.data
+            lfltdata = reference_cache.getdata(lflatfile, exten)
             if lfltdata.shape != self.full_shape:
                 lfltdata = expand_image(lfltdata, self.full_shape)
         except IOError:
@@ -53,9 +52,7 @@ class STISInputImage (imageObject):
 
         # Try to open the file in the location specified by PFLTFILE.
         try:
-            handle = fileutil.openImage(pflatfile, mode='readonly', memmap=False)
-            hdu = fileutil.getExtn(handle,extn=exten)
-            pfltdata = hdu.data
+            pfltdata = reference_cache.getdata(pflatfile, exten)
         except IOError:
             pfltdata = np.ones(self.full_shape, dtype=sci_chip.data.dtype)
             print("Cannot find file '{:s}'. Treating flatfield constant value "
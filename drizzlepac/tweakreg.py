@@ -5,10 +5,15 @@
 :License: :doc:`/LICENSE`
 
 """
+import io
 import os
+import sys
+import time
 import logging
+import contextlib
 import numpy as np
 from copy import copy
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from astropy.utils.decorators import deprecated_renamed_argument
 
 from stsci.tools import teal
@@ -30,6 +35,9 @@ from . import imagefindpars
 from . import refimagefindpars
 from . import __version__
 
+if util.can_parallel:
+    import multiprocessing
+
 __taskname__ = 'tweakreg'
 __all__ = ['TweakReg']
 
@@ -237,6 +245,7 @@ def run(configobj):
     # define default value for 'xyunits' assuming sources to be derived from image directly
     catfile_kwargs['xyunits'] = 'pixels' # initialized here, required by Image class
     del catfile_kwargs['exclusions']
+    num_cores = catfile_kwargs.pop('num_cores', None)
 
     if use_catfile:
         # reset parameters based on parameter settings in this section
@@ -274,21 +283,12 @@ def run(configobj):
     try:
         minsources = max(1, catfit_pars['minobj'])
         omitted_images = []
-        all_input_images = []
-        for imgnum in range(len(filenames)):
-            # Create Image instances for all input images
-            try:
-                regexcl = exclusion_dict[os.path.basename(filenames[imgnum])]
-            except KeyError:
-                regexcl = None
-                pass
-
-            img = imgclasses.Image(filenames[imgnum],
-                                   input_catalogs=catdict[filenames[imgnum]],
-                                   exclusions=regexcl,
-                                   **catfile_kwargs)
-
-            all_input_images.append(img)
+        # Create Image instances for all input images
+        all_input_images = _build_images(
+            filenames, catdict, exclusion_dict, catfile_kwargs,
+            num_cores=num_cores
+        )
+        for img in all_input_images:
             if img.num_sources < minsources:
                 warn_str = "Image '{}' will not be aligned " \
                            "since it contains fewer than {} sources." \
@@ -667,6 +667,77 @@ def run(configobj):
         return
 
 
+def _build_images(filenames, catdict, exclusion_dict, kwargs, num_cores=None):
+    """ Create the `~drizzlepac.imgclasses.Image` instances of the input
+    images, finding the sources of all their chips.
+
+    Images are handed out to a pool of up to ``num_cores`` worker processes.
+    They are returned in the order of ``filenames``, and the source finding
+    messages of each image are printed in that order as well, whatever the
+    order in which the workers complete.
+    """
+    nimages = len(filenames)
+    pool_size = util.get_pool_size(num_cores, nimages)
+    # Leave out TEAL sections (such as '_RULES_'), which cannot be pickled
+    kwargs = {k: v for k, v in kwargs.items() if not k.startswith('_')}
+    tasks = []
+    for filename in filenames:
+        regexcl = exclusion_dict.get(os.path.basename(filename))
+        tasks.append((filename, catdict[filename], regexcl, kwargs))
+
+    def report(imgnum, img, elapsed):
+        print(f"===  Catalogs for image '{img.name:s}' built in "
+              f"{elapsed:.2f} s ({imgnum + 1:d}/{nimages:d})")
+        log.info(f"Built catalogs for image '{img.name:s}' "
+                 f"({img.num_sources:d} sources) in {elapsed:.2f} s")
+
+    images = []
+    if pool_size < 2:
+        for imgnum, task in enumerate(tasks):
+            img, _, elapsed = _build_image(*task)
+            report(imgnum, img, elapsed)
+            images.append(img)
+        return images
+
+    log.info(f"Finding sources in {nimages:d} images using "
+             f"{pool_size:d} processes")
+    results = nimages * [None]
+    mp_ctx = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=pool_size, mp_context=mp_ctx) as executor:
+        futures = {executor.submit(_build_image, *task, capture=True): imgnum
+                   for imgnum, task in enumerate(tasks)}
+        try:
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                # Print out the images completed so far, in input order
+                while len(images) < nimages and results[len(images)] is not None:
+                    imgnum = len(images)
+                    img, output, elapsed = results[imgnum]
+                    print(output, end='')
+                    report(imgnum, img, elapsed)
+                    images.append(img)
+                    results[imgnum] = None
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return images
+
+
+def _build_image(filename, input_catalogs, exclusions, kwargs, capture=False):
+    """ Create the `~drizzlepac.imgclasses.Image` instance of an input image.
+
+    Returns the image, the messages printed while building it (when
+    ``capture`` is set) and the time it took.
+    """
+    start = time.perf_counter()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output if capture else sys.stdout):
+        img = imgclasses.Image(filename, input_catalogs=input_catalogs,
+                               exclusions=exclusions, **kwargs)
+    return img, output.getvalue(), time.perf_counter() - start
+
+
 def _overlap_matrix(images):
     nimg = len(images)
     m = np.zeros((nimg,nimg), dtype=float)
@@ -933,6 +1004,12 @@ def TweakReg(files=None, editpars=False, configobj=None, imagefindcfg=None,
     runfile : str (Default = 'tweakreg.log')
         Specify the filename of the processing log.
 
+    num_cores : int (Default = None)
+        Maximum number of processes to use for finding the sources in the
+        input images, each process building the catalogs of one image at a
+        time. Values less than 2 turn off parallel processing, and `None`
+        uses all available CPU cores. Results do not depend on this value.
+
     .. rubric:: UPDATE HEADER
 
     updatehdr : bool (Default = False)
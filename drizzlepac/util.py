@@ -8,14 +8,24 @@ A library of utility functions
 :License: :doc:`/LICENSE`
 
 """
-from enum import Enum
-import logging
+import errno
 import functools
+import json
+import logging
 import os
-import sys
-import string
-import errno
 import platform
+import string
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from enum import Enum
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 import numpy as np
 import astropy
@@ -69,6 +79,7 @@ class StepStatus(Enum):
     STEP_ABORTED = 3
     STEP_SKIPPED = 4
     STEP_OFF = 5
+    STEP_REUSED = 6
 
 
 class StepAbortedError(RuntimeError):
@@ -312,6 +323,229 @@ def print_pkg_versions(packages=None, git=False, svn=False, log=None):
         output(vstr)
 
 
+# File name extensions of the files counted as FITS file opens
+_FITS_SUFFIXES = ('.fits', '.fit', '.fts', '.fits.gz', '.fits.fz', '.fz')
+
+# Per-thread I/O counters (Linux)
+_THREAD_IO_FILE = '/proc/thread-self/io'
+
+
+class _FitsOpenCounter:
+    """ Count the FITS files opened by the process, and by each thread,
+    through an audit hook on the ``open`` event, between calls to `start`
+    and `stop`.
+
+    Audit hooks can not be removed: the hook is installed by the first
+    call to `start` and does nothing once counting is stopped.
+    """
+    def __init__(self):
+        self.count = 0
+        self.active = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._installed = False
+
+    def start(self):
+        with self._lock:
+            if not self._installed:
+                sys.addaudithook(self._hook)
+                self._installed = True
+            self.active = True
+
+    def stop(self):
+        self.active = False
+
+    @property
+    def thread_count(self):
+        return getattr(self._local, 'count', 0)
+
+    def _hook(self, event, args):
+        if event != 'open' or not self.active:
+            return
+        try:
+            path = os.fsdecode(args[0])
+        except TypeError:  # file descriptor
+            return
+        if path.lower().endswith(_FITS_SUFFIXES):
+            with self._lock:
+                self.count += 1
+            self._local.count = self.thread_count + 1
+
+
+fits_open_counter = _FitsOpenCounter()
+
+
+class _ChipUsageLog:
+    """ Usage records of the chips processed during a run.
+
+    Records made in forked worker processes are appended to a spool file,
+    collected by the process that started the log.
+    """
+    def __init__(self):
+        self.pid = None
+        self.records = []
+        self.spool = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.pid is not None
+
+    def start(self):
+        self.pid = os.getpid()
+        self.records = []
+        self.spool = os.path.join(
+            tempfile.gettempdir(), f'drizzlepac_chips_{self.pid}_{id(self)}.jsonl'
+        )
+
+    def stop(self):
+        """ Stop recording and return (and forget) all the records. """
+        records = self.collect()
+        self.pid = None
+        self.spool = None
+        return records
+
+    def record(self, entry):
+        if os.getpid() == self.pid:
+            with self._lock:
+                self.records.append(entry)
+        else:
+            line = (json.dumps(entry) + '\n').encode()
+            fd = os.open(self.spool, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def collect(self):
+        """ Return (and forget) all the records made so far. """
+        with self._lock:
+            records, self.records = self.records, []
+        if self.spool is not None and os.path.exists(self.spool):
+            with open(self.spool) as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+            os.remove(self.spool)
+        return records
+
+
+chip_usage_log = _ChipUsageLog()
+
+
+def _io_counters(filename='/proc/self/io'):
+    """ Return the bytes read and written so far by the process (or thread,
+    with ``filename`` set to the thread I/O file), or `None` if unknown.
+    """
+    try:
+        with open(filename) as f:
+            counters = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(counters['rchar']), int(counters['wchar'])
+    except (OSError, KeyError, ValueError):
+        pass
+    if filename == '/proc/self/io' and resource is not None:
+        # Block counts are all that is available on some platforms
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_inblock * 512, usage.ru_oublock * 512
+    return None
+
+
+def _reset_peak_rss():
+    """ Reset the peak resident set size of the process (Linux). """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss():
+    """ Return the peak resident set size (in bytes) of the process. """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def _process_usage():
+    """ Snapshot of the resources used so far by the process, including
+    its (finished) worker processes.
+    """
+    cpu_time = time.process_time()
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_time += children.ru_utime + children.ru_stime
+    return {
+        'cpu_time': cpu_time,
+        'io': _io_counters(),
+        'fits_opens': fits_open_counter.count,
+    }
+
+
+def _usage_delta(start, end):
+    """ Difference of two usage snapshots, as report entries. """
+    delta = {'cpu_time': end['cpu_time'] - start['cpu_time']}
+    if start['io'] is None or end['io'] is None:
+        delta['read_bytes'] = delta['write_bytes'] = None
+    else:
+        delta['read_bytes'] = end['io'][0] - start['io'][0]
+        delta['write_bytes'] = end['io'][1] - start['io'][1]
+    delta['fits_opens'] = end['fits_opens'] - start['fits_opens']
+    return delta
+
+
+@contextmanager
+def chip_usage(step, chip):
+    """ Context manager recording the resources used to process a chip.
+
+    The wall-clock and CPU time, bytes read and written and FITS files
+    opened by the current thread are recorded under the name of the step
+    (as known to `ProcSteps`) and of the chip, when a `ProcSteps` object
+    tracks the run.
+    """
+    if not chip_usage_log.active:
+        yield
+        return
+
+    wall_start = time.perf_counter()
+    start = {
+        'cpu_time': time.thread_time(),
+        'io': _io_counters(_THREAD_IO_FILE),
+        'fits_opens': fits_open_counter.thread_count,
+    }
+    try:
+        yield
+    finally:
+        end = {
+            'cpu_time': time.thread_time(),
+            'io': _io_counters(_THREAD_IO_FILE),
+            'fits_opens': fits_open_counter.thread_count,
+        }
+        entry = {'step': step, 'chip': chip,
+                 'wall_time': time.perf_counter() - wall_start}
+        entry.update(_usage_delta(start, end))
+        entry['worker'] = os.getpid() != chip_usage_log.pid
+        chip_usage_log.record(entry)
+
+
+def iter_chip_usage(step, chips, name=None):
+    """ Iterate over ``chips``, recording the resources used by the body of
+    the loop for each chip as `chip_usage` does.
+
+    ``name`` is a function returning the name of a chip; by default, the
+    ``outputNames['data']`` of the chip is used.
+    """
+    for chip in chips:
+        chip_name = chip.outputNames['data'] if name is None else name(chip)
+        with chip_usage(step, chip_name):
+            yield chip
+
+
 class ProcSteps:
     """ This class allows MultiDrizzle to keep track of the
         start and end times of each processing step that gets run
@@ -323,6 +557,17 @@ class ProcSteps:
 
         The 'reportTimes()' method can then be used to provide a summary
         of all the elapsed times and total run time.
+
+        Caches used during processing can be registered with the
+        'addCache()' method so that the number of hits and misses of each
+        cache during the run is included in the summary.
+
+        With 'resource_report' set, the CPU time, peak memory (resident
+        set size), bytes read and written and number of FITS files opened
+        are recorded for each step too, along with the usage of each chip
+        processed by the code wrapped in 'chip_usage()', until
+        'reportTimes()' is called. The 'writeReport()' method writes them
+        all out as JSON and ECSV files.
     """
     __report_header = '\n   %20s          %s\n' % ('-' * 20, '-' * 20)
     __report_header += '   %20s          %s\n' % ('Step', 'Elapsed time')
@@ -333,14 +578,20 @@ class ProcSteps:
         "aborted": (StepStatus.STEP_ABORTED, "aborted"),
         "skipped": (StepStatus.STEP_SKIPPED, "skipped"),
         "ended": (StepStatus.STEP_ENDED, "finished"),
+        "reused": (StepStatus.STEP_REUSED, "reused from checkpoint"),
     }
-
-    def __init__(self):
+    def __init__(self, resource_report=False):
         self.steps = {}
         self.order = []
         self.start = _ptime()
         self.end = None
         self.delayed_msg = None
+        self.caches = {}
+        self.chips = []
+        self.resource_report = resource_report
+        if resource_report:
+            fits_open_counter.start()
+            chip_usage_log.start()
 
     def addStep(self, key):
         """
@@ -356,8 +607,12 @@ class ProcSteps:
             'end': ptime,
             'elapsed': 0,
             'status': StepStatus.STEP_STARTED,
+            'usage_start': _process_usage() if self.resource_report else None,
+            'usage': {},
         }
         self.order.append(key)
+        if self.resource_report:
+            _reset_peak_rss()
 
     def endStep(self, key, reason="ended", delay_msg=False):
         """
@@ -370,6 +625,11 @@ class ProcSteps:
         if key is not None:
             self.steps[key]['end'] = ptime
             self.steps[key]['elapsed'] = ptime[1] - self.steps[key]['start'][1]
+            if self.resource_report:
+                self.steps[key]['usage'] = _usage_delta(
+                    self.steps[key]['usage_start'], _process_usage()
+                )
+                self.steps[key]['usage']['peak_rss'] = _peak_rss()
         else:
             key = self.order[-1]
 
@@ -387,6 +647,14 @@ class ProcSteps:
             self.delayed_msg = None
             log.info(msg)
 
+    def addCache(self, name, cache):
+        """
+        Register a cache (an object with 'hits' and 'misses' counters) so
+        that the hits and misses since this call are reported by
+        'reportTimes()'.
+        """
+        self.caches[name] = (cache, cache.hits, cache.misses)
+
     def flush(self):
         if self.delayed_msg is not None:
             log.info(self.delayed_msg)
@@ -399,6 +667,9 @@ class ProcSteps:
         performed steps.
         """
         self.flush()  # print any delayed messages
+        if self.resource_report and chip_usage_log.active:
+            self.chips.extend(chip_usage_log.stop())
+            fits_open_counter.stop()
         log.info(ProcSteps.__report_header)
 
         self.end = _ptime()
@@ -414,6 +685,8 @@ class ProcSteps:
                 note = "(skipped)"
             elif self.steps[step]['status'] == StepStatus.STEP_OFF:
                 note = "(off)"
+            elif self.steps[step]['status'] == StepStatus.STEP_REUSED:
+                note = "(reused)"
             else:
                 note = ''
             log.info(f"   {step:20s}          {_time:0.4f} sec {note}")
@@ -421,6 +694,91 @@ class ProcSteps:
         log.info(f"   {'Total':20s}          {total_time:0.4f} sec")
         log.info("")
 
+        if self.caches:
+            log.info(f"   {'-' * 20:20s}          {'-' * 20:s}")
+            log.info(f"   {'Cache':20s}          {'Hits':>8s}  {'Misses':>8s}")
+            log.info(f"   {'-' * 20:20s}          {'-' * 20:s}")
+            for name, (cache, hits, misses) in self.caches.items():
+                log.info(f"   {name:20s}          {cache.hits - hits:8d}  "
+                         f"{cache.misses - misses:8d}")
+            log.info("")
+
+    def writeReport(self, rootname):
+        """
+        Write out the resources used by each step, and by each chip
+        processed in these steps, to '<rootname>.json' and, as a table
+        with one row per step or chip, to '<rootname>.ecsv'.
+
+        Call 'reportTimes()' first to collect the usage of the chips.
+        """
+        from astropy.table import Table
+
+        chips = {}
+        for entry in self.chips:
+            chips.setdefault(entry['step'], []).append(entry)
+
+        status_names = {status: reason
+                        for reason, (status, _) in self._status_map.items()}
+        steps = []
+        for key in self.order:
+            step = self.steps[key]
+            entry = {
+                'step': key,
+                'status': status_names.get(step['status'], 'started'),
+                'start': step['start'][1],
+                'end': step['end'][1],
+                'wall_time': step['elapsed'],
+            }
+            entry.update(step['usage'])
+            # FITS files opened by worker processes are only known per chip
+            if 'fits_opens' in entry:
+                entry['fits_opens'] += sum(c['fits_opens'] for c in chips.get(key, [])
+                                           if c['worker'])
+            entry['chips'] = [
+                {k: v for k, v in c.items() if k not in ('step', 'worker')}
+                for c in chips.get(key, [])
+            ]
+            steps.append(entry)
+
+        report = {
+            'start': self.start[1],
+            'end': self.end[1] if self.end is not None else None,
+            'total_time': sum(step['wall_time'] for step in steps),
+            'steps': steps,
+            'caches': {
+                name: {'hits': cache.hits - hits, 'misses': cache.misses - misses}
+                for name, (cache, hits, misses) in self.caches.items()
+            },
+        }
+        with open(rootname + '.json', 'w') as f:
+            json.dump(report, f, indent=1)
+
+        columns = ['step', 'chip', 'status', 'wall_time', 'cpu_time', 'peak_rss',
+                   'read_bytes', 'write_bytes', 'fits_opens']
+        units = {'wall_time': 's', 'cpu_time': 's', 'peak_rss': 'byte',
+                 'read_bytes': 'byte', 'write_bytes': 'byte'}
+        rows = []
+        for step in steps:
+            rows.append(dict(step, chip=''))
+            rows.extend(dict(chip, step=step['step'], status='')
+                        for chip in step['chips'])
+        table = Table(masked=True)
+        for name in columns:
+            values = [row.get(name) for row in rows]
+            mask = [v is None for v in values]
+            if name in ('step', 'chip', 'status'):
+                values = [str(v or '') for v in values]
+            elif name in ('wall_time', 'cpu_time'):
+                values = [np.nan if v is None else float(v) for v in values]
+            else:
+                values = [-1 if v is None else int(v) for v in values]
+            table[name] = values
+            table[name].mask = mask
+            table[name].unit = units.get(name)
+        table.meta['start'] = report['start']
+        table.meta['total_time'] = report['total_time']
+        table.write(rootname + '.ecsv', format='ascii.ecsv', overwrite=True)
+
 
 def _ptime():
     import time
@@ -6,7 +6,13 @@
 
 """
 import copy
+import hashlib
 import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
 import numpy as np
 from numpy import linalg
 
@@ -20,6 +26,7 @@ from stsci.tools import fileutil, logutil
 from stsci.tools.fileutil import countExtn
 
 from drizzlepac import util
+from drizzlepac.version import __version__
 from drizzlepac.haputils import processing_utils as proc_utils
 
 DEFAULT_WCS_PARS = {'ra': None, 'dec': None, 'scale': None, 'rot': None,
@@ -252,6 +259,296 @@ def build_pixel_transform(chip, output_wcs):
 
     return driz_pars
 
+
+# Number of pixel-map rows transformed per call to the mapping function;
+# bounds the size of the temporary coordinate arrays.
+PIXMAP_BLOCK_ROWS = 256
+
+
+def calc_pixmap(first_wcs, second_wcs, shape=None, stepsize=None,
+                tolerance=None):
+    """ Compute the pixel map from ``first_wcs`` to ``second_wcs``.
+
+    The pixel map is a ``(ny, nx, 2)`` array where ``pixmap[j, i]`` holds the
+    (1-based) position in ``second_wcs`` of the center of the (1-based) pixel
+    ``(i + 1, j + 1)`` of ``first_wcs``. The full distortion model of
+    ``first_wcs`` (SIP, NPOL and D2IM) is applied while ``second_wcs`` is
+    treated as a linear WCS, exactly like `WCSMap.forward` and
+    ``cdriz.DefaultWCSMapping``. The result can be passed directly to
+    ``cdriz.tdriz`` and ``cdriz.tblot`` in place of a mapping callback.
+
+    Parameters
+    ----------
+    first_wcs : `~stwcs.wcsutil.HSTWCS`
+        WCS of the pixels being mapped.
+    second_wcs : `~stwcs.wcsutil.HSTWCS`
+        WCS of the frame the pixels are mapped onto.
+    shape : tuple, optional
+        ``(ny, nx)`` shape of the pixel map. Defaults to
+        ``first_wcs.array_shape``.
+    stepsize : int, optional
+        If set to a positive value, the WCS is evaluated exactly only on a
+        grid spaced ``stepsize`` pixels apart and bilinearly interpolated
+        in-between (as done by ``cdriz.DefaultWCSMapping``). Otherwise the
+        WCS is evaluated exactly at every pixel.
+    tolerance : float, optional
+        Maximum interpolation error (in pixels of ``second_wcs``) allowed
+        when ``stepsize`` is set. Cells of the ``stepsize`` grid where the
+        error is larger are subdivided until the error is within
+        ``tolerance`` or the grid spacing reaches one pixel. By default, a
+        uniform grid is used.
+
+    Returns
+    -------
+    pixmap : numpy.ndarray
+        ``float32`` array of shape ``(ny, nx, 2)``. Output positions are
+        held to within 2**-24 of their value (better than 1e-3 pixels for
+        outputs up to 16384 pixels across). When `pixmap_cache` is enabled,
+        the (read-only) pixel map may come from the cache.
+
+    """
+    if shape is None:
+        shape = first_wcs.array_shape
+
+    if pixmap_cache.enabled:
+        key = pixmap_cache.make_key(first_wcs, second_wcs, shape, stepsize,
+                                    tolerance)
+        pixmap = pixmap_cache.get(key)
+        if pixmap is not None:
+            return pixmap
+
+    if stepsize:
+        from drizzlepac import cdriz
+        mapping = cdriz.DefaultWCSMapping(
+            first_wcs, second_wcs, shape[1], shape[0], stepsize,
+            tolerance or 0.0
+        )
+        if tolerance:
+            log.info(f"Adaptive WCS grid: {mapping.refined_cells} cells "
+                     f"refined, max. interpolation error "
+                     f"{mapping.max_error:.3g} pixels.")
+    else:
+        def mapping(pixx, pixy):
+            skyx, skyy = first_wcs.all_pix2world(pixx, pixy, 1)
+            return second_wcs.wcs_world2pix(skyx, skyy, 1)
+
+    pixmap = calc_pixmap_from_mapping(mapping, shape)
+    if pixmap_cache.enabled:
+        pixmap_cache.put(key, pixmap)
+    return pixmap
+
+
+def calc_pixmap_from_mapping(mapping, shape):
+    """ Evaluate a drizzle mapping callable over a full grid of pixels.
+
+    Parameters
+    ----------
+    mapping : callable
+        Function with the signature ``mapping(xin, yin) -> (xout, yout)``
+        operating on 1-D arrays of 1-based pixel positions, such as
+        `WCSMap.forward`.
+    shape : tuple
+        ``(ny, nx)`` shape of the grid of input pixels.
+
+    Returns
+    -------
+    pixmap : numpy.ndarray
+        ``float32`` array of shape ``(ny, nx, 2)``; see `calc_pixmap`.
+
+    """
+    ny, nx = shape
+    pixmap = np.empty((ny, nx, 2), dtype=np.float32)
+    xcoord = np.arange(1, nx + 1, dtype=np.float64)
+
+    for y0 in range(0, ny, PIXMAP_BLOCK_ROWS):
+        y1 = min(y0 + PIXMAP_BLOCK_ROWS, ny)
+        pixx, pixy = np.meshgrid(
+            xcoord, np.arange(y0 + 1, y1 + 1, dtype=np.float64)
+        )
+        xout, yout = mapping(pixx.ravel(), pixy.ravel())
+        pixmap[y0:y1, :, 0] = np.reshape(xout, (y1 - y0, nx))
+        pixmap[y0:y1, :, 1] = np.reshape(yout, (y1 - y0, nx))
+
+    return pixmap
+
+
+def wcs_hash(w):
+    """ Return a hex digest identifying the full transformation of a WCS.
+
+    The digest covers the linear WCS (``wcs.wcs``) as well as the SIP
+    polynomials and the NPOL and D2IM lookup tables, so that any change
+    to the distortion model results in a different value.
+    """
+    h = hashlib.sha256()
+
+    def _update(*values):
+        for value in values:
+            if value is None:
+                h.update(b'None')
+            else:
+                arr = np.ascontiguousarray(value)
+                h.update(repr((arr.dtype.str, arr.shape)).encode())
+                h.update(arr.tobytes())
+
+    wcsprm = w.wcs
+    # Make sure derived values (e.g., LONPOLE) are the ones used when the
+    # WCS is evaluated:
+    wcsprm.set()
+    h.update(repr((
+        list(wcsprm.ctype), list(wcsprm.cunit), wcsprm.has_cd(),
+        wcsprm.get_pv(), wcsprm.get_ps()
+    )).encode())
+    _update(wcsprm.crpix, wcsprm.crval, [wcsprm.lonpole, wcsprm.latpole])
+    if wcsprm.has_cd():
+        _update(wcsprm.cd)
+    else:
+        _update(wcsprm.cdelt, wcsprm.pc)
+
+    sip = w.sip
+    if sip is None:
+        _update(None)
+    else:
+        _update(sip.crpix, sip.a, sip.b, sip.ap, sip.bp)
+
+    for table in (w.cpdis1, w.cpdis2, w.det2im1, w.det2im2):
+        if table is None:
+            _update(None)
+        else:
+            _update(table.data, table.crpix, table.crval, table.cdelt)
+
+    return h.hexdigest()
+
+
+class PixmapCache:
+    """ Cache of pixel maps computed by `calc_pixmap`.
+
+    Pixel maps are keyed on a hash of both WCS (see `wcs_hash`), the shape
+    of the map, the ``stepsize`` and its ``tolerance``, so the same
+    chip-to-output mapping used by separate drizzle, blot and final drizzle
+    (or by repeated runs of AstroDrizzle) is computed only once. Pixel maps
+    are kept in memory up to ``max_size`` megabytes, evicting the least
+    recently used maps first, and are optionally also saved as ``.npy``
+    files in ``directory``. Files in ``directory`` can be shared between processes
+    and are memory-mapped when read.
+
+    Parameters
+    ----------
+    max_size : float, None, optional
+        Maximum size (in MB) of the pixel maps kept in memory. A value of
+        `None` or 0 disables the in-memory cache.
+    directory : str, None, optional
+        Directory where pixel maps are stored as ``.npy`` files. A value of
+        `None` or an empty string disables the on-disk store.
+
+    """
+    def __init__(self, max_size=None, directory=None):
+        self._lock = threading.Lock()
+        self._maps = OrderedDict()
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.configure(max_size=max_size, directory=directory)
+
+    def configure(self, max_size=None, directory=None):
+        """ Change the size of the in-memory cache and the on-disk store. """
+        with self._lock:
+            self.max_size = float(max_size) if max_size else 0.0
+            self.directory = directory if directory else None
+            self._evict(0)
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 or self.directory is not None
+
+    @staticmethod
+    def make_key(first_wcs, second_wcs, shape, stepsize=None, tolerance=None):
+        """ Build the cache key for a pixel map (see `calc_pixmap`). """
+        key = hashlib.sha256()
+        key.update(wcs_hash(first_wcs).encode())
+        key.update(wcs_hash(second_wcs).encode())
+        key.update(repr((tuple(shape), stepsize or 0,
+                         (tolerance or 0) if stepsize else 0,
+                         __version__)).encode())
+        return key.hexdigest()
+
+    def get(self, key):
+        """ Return the cached pixel map for ``key`` or `None`. """
+        with self._lock:
+            pixmap = self._maps.get(key)
+            if pixmap is not None:
+                self._maps.move_to_end(key)
+                self.hits += 1
+                log.debug("Using cached pixel map.")
+                return pixmap
+
+        filename = self._filename(key)
+        if filename is not None and os.path.isfile(filename):
+            try:
+                pixmap = np.load(filename, mmap_mode='r')
+            except (OSError, ValueError) as e:
+                log.warning(f"Unable to read cached pixel map '{filename}': {e}")
+            else:
+                log.debug(f"Using pixel map stored in '{filename}'.")
+                with self._lock:
+                    self.hits += 1
+                self._add(key, pixmap)
+                return pixmap
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, pixmap):
+        """ Add ``pixmap`` to the cache. The array is made read-only. """
+        pixmap.flags.writeable = False
+        self._add(key, pixmap)
+
+        filename = self._filename(key)
+        if filename is not None and not os.path.isfile(filename):
+            # Write to a temporary file first so that other processes never
+            # see a partially written pixel map:
+            fd, tmpname = tempfile.mkstemp(suffix='.npy.tmp',
+                                           dir=self.directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, pixmap)
+                os.replace(tmpname, filename)
+            except OSError as e:
+                log.warning(f"Unable to store pixel map in '{filename}': {e}")
+                if os.path.exists(tmpname):
+                    os.remove(tmpname)
+
+    def clear(self):
+        """ Remove all pixel maps from memory (the on-disk store is kept). """
+        with self._lock:
+            self._maps.clear()
+            self._nbytes = 0
+
+    def _filename(self, key):
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, f'pixmap_{key}.npy')
+
+    def _add(self, key, pixmap):
+        with self._lock:
+            if key in self._maps or pixmap.nbytes > self.max_size * 1024**2:
+                return
+            self._evict(pixmap.nbytes)
+            self._maps[key] = pixmap
+            self._nbytes += pixmap.nbytes
+
+    def _evict(self, nbytes):
+        # Drop least recently used maps until ``nbytes`` more bytes fit.
+        while self._maps and self._nbytes + nbytes > self.max_size * 1024**2:
+            _, pixmap = self._maps.popitem(last=False)
+            self._nbytes -= pixmap.nbytes
+
+
+# Pixel map cache used by `calc_pixmap` (disabled by default).
+pixmap_cache = PixmapCache()
+
 #
 # Possibly need to generate a stand-alone interface for this function.
 #
@@ -447,6 +744,55 @@ def calcNewEdges(wcs, shape):
     return edges
 
 
+def calc_output_bbox(input_wcs, output_wcs, shape=None, margin=0.0):
+    """ Compute the bounding box of the footprint of an image on an output frame.
+
+    The pixels around the edge of the image are mapped onto ``output_wcs``
+    the same way as by `calc_pixmap`, so the bounding box encloses the
+    position of every pixel of the image without having to map them all.
+
+    Parameters
+    ----------
+    input_wcs : `~stwcs.wcsutil.HSTWCS`
+        WCS of the input image.
+    output_wcs : `~stwcs.wcsutil.HSTWCS`
+        WCS of the output frame.
+    shape : tuple, optional
+        ``(ny, nx)`` shape of the input image. Defaults to
+        ``input_wcs.array_shape``.
+    margin : float, optional
+        Number of output pixels by which to grow the footprint on each side,
+        e.g. to account for the size of the drizzle kernel.
+
+    Returns
+    -------
+    bbox : tuple, None
+        ``(xmin, xmax, ymin, ymax)`` 0-based, half-open ranges of the output
+        pixels covered by the footprint, clipped to the output frame, or
+        `None` when the footprint does not overlap the output frame. When
+        the edges cannot be mapped onto the output frame, the whole output
+        frame is returned.
+
+    """
+    if shape is None:
+        shape = input_wcs.array_shape
+    ny, nx = output_wcs.array_shape
+
+    edges = calcNewEdges(input_wcs, shape)
+    x, y = output_wcs.wcs_world2pix(edges[0], edges[1], 1)
+    if not (np.all(np.isfinite(x)) and np.all(np.isfinite(y))):
+        return (0, nx, 0, ny)
+
+    # Output pixel (i, j) spans [i + 0.5, i + 1.5) in 1-based coordinates
+    xmin = max(int(np.floor(x.min() - margin - 0.5)), 0)
+    xmax = min(int(np.floor(x.max() + margin - 0.5)) + 1, nx)
+    ymin = max(int(np.floor(y.min() - margin - 0.5)), 0)
+    ymax = min(int(np.floor(y.max() + margin - 0.5)) + 1, ny)
+    if xmin >= xmax or ymin >= ymax:
+        return None
+    return (xmin, xmax, ymin, ymax)
+
+
 def computeEdgesCenter(edges):
     alpha = np.deg2rad(edges[0])
     dec = np.deg2rad(edges[1])
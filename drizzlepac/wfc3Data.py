@@ -8,6 +8,7 @@
 """
 from stsci.tools import fileutil
 from .imageObject import imageObject
+from .refcache import reference_cache
 import numpy as np
 
 class WFC3InputImage(imageObject):
@@ -251,9 +252,12 @@ class WFC3IRInputImage(WFC3InputImage):
         # keyword in the primary keyword of the science data.
         try:
             filename = self.header["DARKFILE"]
-            handle = fileutil.openImage(filename, mode='readonly', memmap=False)
-            hdu = fileutil.getExtn(handle,extn="sci,1")
-            darkobj = hdu.data[sci_chip.ltv2:sci_chip.size2,sci_chip.ltv1:sci_chip.size1]
+            # a copy, since cached reference data are read-only
+            darkobj = reference_cache.getdata(
+                filename, ('SCI', 1),
+                section=np.s_[sci_chip.ltv2:sci_chip.size2,
+                              sci_chip.ltv1:sci_chip.size1]
+            ).copy()
 
         # If the darkfile cannot be located, create the dark image from
         # what we know about the detector dark current and assume a
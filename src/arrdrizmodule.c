@@ -21,6 +21,9 @@
 
 static PyObject *gl_Error;
 
+/* Version string reported by tdriz and recorded in output headers */
+#define TDRIZ_VERSION "Callable C-based DRIZZLE Version 0.8 (20th May 2009)"
+
 
 /*
  A mapping callback that delegates to a Python-based drizzle
@@ -167,6 +170,7 @@ PyWCSMap_init(PyWCSMap *self, PyObject *args, PyObject *kwds)
   PyObject *output_obj = NULL;
   int nx, ny;
   double factor;
+  double tolerance = 0.0;
   int status = -1;
 
   /* Other miscellaneous local variables */
@@ -176,8 +180,9 @@ PyWCSMap_init(PyWCSMap *self, PyObject *args, PyObject *kwds)
   driz_error_init(&error);
 
   /* TODO: Make factor a kwarg */
-  if (! PyArg_ParseTuple(args, "OOiid:DefaultWCSMapping.__init__",
-                         &input_obj, &output_obj, &nx, &ny, &factor)){
+  if (! PyArg_ParseTuple(args, "OOiid|d:DefaultWCSMapping.__init__",
+                         &input_obj, &output_obj, &nx, &ny, &factor,
+                         &tolerance)){
     goto exit;
   }
 
@@ -185,7 +190,7 @@ PyWCSMap_init(PyWCSMap *self, PyObject *args, PyObject *kwds)
   istat = default_wcsmap_init(
       &self->m,
       &((Wcs*)input_obj)->x, &((Wcs*)output_obj)->x,
-      nx, ny, factor,
+      nx, ny, factor, tolerance,
       &error);
 
   if (istat || driz_error_is_set(&error)) {
@@ -281,6 +286,38 @@ PyWCSMap_call(PyWCSMap* self, PyObject* args, PyObject* kwargs)
   return result;
 }
 
+static PyObject*
+PyWCSMap_get_max_error(PyWCSMap* self, void* closure)
+{
+  return PyFloat_FromDouble(self->m.max_error);
+}
+
+static PyObject*
+PyWCSMap_get_refined_cells(PyWCSMap* self, void* closure)
+{
+  int k;
+  long count = 0;
+
+  if (self->m.cell_level != NULL) {
+    for (k = 0; k < (self->m.snx - 1) * (self->m.sny - 1); ++k) {
+      if (self->m.cell_level[k]) ++count;
+    }
+  }
+
+  /* Cells of the table are half the size of the cells of the grid
+     that was refined */
+  return PyLong_FromLong(count / 4);
+}
+
+static PyGetSetDef PyWCSMap_getset[] = {
+  {"max_error", (getter)PyWCSMap_get_max_error, NULL,
+   "Largest interpolation error (in output pixels) measured on the "
+   "adaptive grid, or NaN when no tolerance was given.", NULL},
+  {"refined_cells", (getter)PyWCSMap_get_refined_cells, NULL,
+   "Number of grid cells that have been subdivided.", NULL},
+  {NULL}  /* Sentinel */
+};
+
 static PyTypeObject WCSMapType = {
   PyVarObject_HEAD_INIT(NULL, 0)
   (char *) "cdriz.DefaultWCSMapping",              /*tp_name*/
@@ -302,7 +339,8 @@ static PyTypeObject WCSMapType = {
   0,                                               /*tp_setattro*/
   0,                                               /*tp_as_buffer*/
   (long) Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE, /*tp_flags*/
-  (char *) "DefaultWCSMapping(input,output)",      /* tp_doc */
+  (char *) "DefaultWCSMapping(input, output, nx, ny, stepsize[, tolerance])",
+                                                   /* tp_doc */
   0,                                               /* tp_traverse */
   0,                                               /* tp_clear */
   0,                                               /* tp_richcompare */
@@ -311,7 +349,7 @@ static PyTypeObject WCSMapType = {
   0,                                               /* tp_iternext */
   0,                                               /* tp_methods */
   0,                                               /* tp_members */
-  0,                                               /* tp_getset */
+  PyWCSMap_getset,                                 /* tp_getset */
   0,                                               /* tp_base */
   0,                                               /* tp_dict */
   0,                                               /* tp_descr_get */
@@ -322,8 +360,84 @@ static PyTypeObject WCSMapType = {
   PyWCSMap_new,                                    /* tp_new */
 };
 
+/*
+ Set up the precomputed pixel-map mapping from a (ny, nx, 2) array.
+
+ The returned array reference (if any) must be released by the caller
+ once drizzling or blotting is done.
+*/
+static PyArrayObject*
+pixmap_from_array(PyObject* pixmap_obj, const integer_t nx, const integer_t ny,
+                  /* Output parameters */
+                  struct pixmap_param_t* m,
+                  struct driz_error_t* error) {
+  PyArrayObject* pixmap = NULL;
+
+  /* The pixel map is only read, so read-only (e.g. cached or memory-mapped)
+     float32 arrays are used as they are; others are converted */
+  pixmap = (PyArrayObject *)PyArray_FROMANY(pixmap_obj, NPY_FLOAT32, 3, 3,
+                                            NPY_ARRAY_IN_ARRAY |
+                                            NPY_ARRAY_FORCECAST);
+  if (!pixmap) {
+    driz_error_set_message(error, "Invalid pixel map array");
+    return NULL;
+  }
+
+  if (PyArray_DIMS(pixmap)[2] != 2 ||
+      PyArray_DIMS(pixmap)[1] != nx ||
+      PyArray_DIMS(pixmap)[0] != ny) {
+    driz_error_format_message(error,
+        "Pixel map must have shape (%d, %d, 2), got (%d, %d, %d)",
+        (int)ny, (int)nx, (int)PyArray_DIMS(pixmap)[0],
+        (int)PyArray_DIMS(pixmap)[1], (int)PyArray_DIMS(pixmap)[2]);
+    Py_DECREF(pixmap);
+    return NULL;
+  }
+
+  pixmap_param_init(m);
+  m->table = (const float*)PyArray_DATA(pixmap);
+  m->nx = nx;
+  m->ny = ny;
+
+  return pixmap;
+}
+
+/*
+ Intersect an optional (xmin, xmax, ymin, ymax) window (1-based,
+ inclusive) with the given extent, which is also the default window.
+
+ Returns non-zero (with the error set) if the window is not a sequence of
+ four integers.  An empty intersection has xmax < xmin or ymax < ymin.
+*/
+static int
+window_from_object(PyObject* window_obj, const char* name,
+                   /* Input/output parameters */
+                   integer_t* xmin, integer_t* xmax,
+                   integer_t* ymin, integer_t* ymax,
+                   struct driz_error_t* error) {
+  long w[4];
+
+  if (window_obj == NULL || window_obj == Py_None) {
+    return 0;
+  }
+
+  if (!PyArg_ParseTuple(window_obj, "llll", &w[0], &w[1], &w[2], &w[3])) {
+    PyErr_Clear();
+    driz_error_format_message(error,
+        "Invalid %s (must be a tuple (xmin, xmax, ymin, ymax))", name);
+    return 1;
+  }
+
+  *xmin = MAX(*xmin, (integer_t)w[0]);
+  *xmax = MIN(*xmax, (integer_t)w[1]);
+  *ymin = MAX(*ymin, (integer_t)w[2]);
+  *ymax = MIN(*ymax, (integer_t)w[3]);
+
+  return 0;
+}
+
 static PyObject *
-tdriz(PyObject *obj UNUSED_PARAM, PyObject *args)
+tdriz(PyObject *obj UNUSED_PARAM, PyObject *args, PyObject *keywds)
 {
   /* Arguments in the order they appear */
   PyObject *oimg, *owei, *oout, *owht, *ocon;
@@ -336,9 +450,13 @@ tdriz(PyObject *obj UNUSED_PARAM, PyObject *args)
   char *fillstr;
   integer_t nmiss, nskip, vflag;
   PyObject *callback_obj;
+  PyObject *in_window_obj = NULL, *out_window_obj = NULL;
+  long lut_resolution = 0;
 
   /* Derived values */
   PyArrayObject *img = NULL, *wei = NULL, *out = NULL, *wht = NULL, *con = NULL;
+  PyArrayObject *pixmap = NULL;
+  struct pixmap_param_t pixmap_param;
   enum e_align_t align;
   enum e_kernel_t kernel;
   enum e_unit_t inun;
@@ -348,6 +466,7 @@ tdriz(PyObject *obj UNUSED_PARAM, PyObject *args)
   float fill_value;
   mapping_callback_t callback = NULL;
   void* callback_state = NULL;
+  bool_t release_gil = FALSE;
   int istat = 0;
   struct driz_error_t error;
   struct driz_param_t p;
@@ -358,12 +477,22 @@ tdriz(PyObject *obj UNUSED_PARAM, PyObject *args)
 
   driz_error_init(&error);
 
-  if (!PyArg_ParseTuple(args,"OOOOOllllldddsdssffsiiiO:tdriz",
+  static char *kwlist[] = {"image", "weight", "output", "outweight",
+                           "context", "uniqid", "ystart", "xmin", "ymin",
+                           "dny", "scale", "xscale", "yscale", "align",
+                           "pfract", "kernel", "inun", "expin", "wtscl",
+                           "fill", "nmiss", "nskip", "vflag",
+                           "callback_or_pixmap", "in_window", "out_window",
+                           "lut_resolution", NULL};
+
+  if (!PyArg_ParseTupleAndKeywords(args, keywds,
+                        "OOOOOllllldddsdssffsiiiO|OOl:tdriz", kwlist,
                         &oimg, &owei, &oout, &owht, &ocon, &uniqid, &ystart,
                         &xmin, &ymin, &dny, &scale, &xscale, &yscale,
                         &align_str, &pfract, &kernel_str, &inun_str,
                         &expin, &wtscl, &fillstr, &nmiss,&nskip, &vflag,
-                        &callback_obj)) {
+                        &callback_obj, &in_window_obj, &out_window_obj,
+                        &lut_resolution)) {
     return PyErr_Format(gl_Error, "cdriz.tdriz: Invalid Parameters.");
   }
 
@@ -383,25 +512,47 @@ tdriz(PyObject *obj UNUSED_PARAM, PyObject *args)
     goto _exit;
   }
 
-  if (PyObject_TypeCheck(callback_obj, &WCSMapType)) {
+  /* Convert strings to enumerations */
+  if (align_str2enum(align_str, &align, &error) ||
+      kernel_str2enum(kernel_str, &kernel, &error) ||
+      unit_str2enum(inun_str, &inun, &error)) {
+    goto _exit;
+  }
+
+  /* Get raw C-array data.  The input is divided by the exposure time in
+     place unless it is already in counts per second. */
+  img = (PyArrayObject *)PyArray_FROMANY(oimg, NPY_FLOAT32, 2, 2,
+      (inun == unit_cps) ? NPY_ARRAY_IN_ARRAY : NPY_ARRAY_DEFAULT);
+  if (!img) {
+    driz_error_set_message(&error, "Invalid input array");
+    goto _exit;
+  }
+
+  if (PyArray_Check(callback_obj)) {
+    /* A precomputed pixel map is read directly by the C kernels */
+    pixmap = pixmap_from_array(callback_obj, PyArray_DIMS(img)[1],
+                               PyArray_DIMS(img)[0], &pixmap_param, &error);
+    if (!pixmap) {
+      goto _exit;
+    }
+    callback = pixmap_mapping;
+    callback_state = (void *)&pixmap_param;
+    release_gil = TRUE;
+  } else if (PyObject_TypeCheck(callback_obj, &WCSMapType)) {
     /* If we're using the default mapping, we can set things up to avoid
        the Python/C bridge */
     callback = default_wcsmap;
     callback_state = (void *)&(((PyWCSMap *)callback_obj)->m);
+    /* Only the interpolated table is free of WCS object access */
+    release_gil = ((PyWCSMap *)callback_obj)->m.factor > 0;
     /*scale = ((PyWCSMap *)callback_obj)->m.scale; */
   } else {
     callback = py_mapping_callback;
     callback_state = (void *)callback_obj;
   }
 
-  /* Get raw C-array data */
-  img = (PyArrayObject *)PyArray_ContiguousFromAny(oimg, NPY_FLOAT32, 2, 2);
-  if (!img) {
-    driz_error_set_message(&error, "Invalid input array");
-    goto _exit;
-  }
-
-  wei = (PyArrayObject *)PyArray_ContiguousFromAny(owei, NPY_FLOAT32, 2, 2);
+  wei = (PyArrayObject *)PyArray_FROMANY(owei, NPY_FLOAT32, 2, 2,
+                                         NPY_ARRAY_IN_ARRAY);
   if (!wei) {
     driz_error_set_message(&error, "Invalid weights array");
     goto _exit;
@@ -425,12 +576,6 @@ tdriz(PyObject *obj UNUSED_PARAM, PyObject *args)
     goto _exit;
   }
 
-  /* Convert strings to enumerations */
-  if (align_str2enum(align_str, &align, &error) ||
-      kernel_str2enum(kernel_str, &kernel, &error) ||
-      unit_str2enum(inun_str, &inun, &error)) {
-    goto _exit;
-  }
   if (pfract <= 0.001){
     printf("kernel reset to POINT due to pfract being set to 0.0...\n");
     kernel_str2enum("point", &kernel, &error);
@@ -481,6 +626,49 @@ tdriz(PyObject *obj UNUSED_PARAM, PyObject *args)
   p.ny = dny;
   p.onx = p.xmax = onx;
   p.ony = p.ymax = ony;
+
+  /* The output arrays start at (xmin, ymin) in the output frame; by
+     default the whole of them is resampled onto, and all the input
+     lines from ystart on are drizzled. */
+  p.out_xoff = xmin - 1;
+  p.out_yoff = ymin - 1;
+  p.out_xmin = xmin;
+  p.out_xmax = xmin + onx - 1;
+  p.out_ymin = ymin;
+  p.out_ymax = ymin + ony - 1;
+  p.in_xmin = 1;
+  p.in_xmax = nx;
+  p.in_ymin = ystart + 1;
+  p.in_ymax = ystart + dny;
+  if (window_from_object(out_window_obj, "out_window",
+                         &p.out_xmin, &p.out_xmax, &p.out_ymin, &p.out_ymax,
+                         &error) ||
+      window_from_object(in_window_obj, "in_window",
+                         &p.in_xmin, &p.in_xmax, &p.in_ymin, &p.in_ymax,
+                         &error)) {
+    goto _exit;
+  }
+  if (p.out_xmin > p.out_xmax || p.out_ymin > p.out_ymax ||
+      p.in_xmin > p.in_xmax || p.in_ymin > p.in_ymax) {
+    p.no_over = TRUE;
+  }
+
+  /* The context array covers either the whole output arrays or just the
+     (clipped) output sub-window */
+  p.ctx_nx = PyArray_DIMS(con)[1];
+  p.ctx_ny = PyArray_DIMS(con)[0];
+  if (p.ctx_nx == onx && p.ctx_ny == ony) {
+    p.ctx_xoff = p.out_xoff;
+    p.ctx_yoff = p.out_yoff;
+  } else if (p.ctx_nx == p.out_xmax - p.out_xmin + 1 &&
+             p.ctx_ny == p.out_ymax - p.out_ymin + 1) {
+    p.ctx_xoff = p.out_xmin - 1;
+    p.ctx_yoff = p.out_ymin - 1;
+  } else if (!p.no_over) {
+    driz_error_set_message(&error,
+        "Context array must have the shape of the output arrays or of out_window");
+    goto _exit;
+  }
   p.scale = scale;
   p.x_scale = xscale;
   p.y_scale = yscale;
@@ -493,14 +681,26 @@ tdriz(PyObject *obj UNUSED_PARAM, PyObject *args)
   p.mapping_callback = callback;
   p.mapping_callback_state = callback_state;
 
-  /* Setup reasonable defaults for drizzling */
-  p.no_over = FALSE;
+  /* The kernel look-up tables are shared by all calls, and created while
+     holding the GIL */
+  p.kernel_lut = get_kernel_lut(kernel, (integer_t)lut_resolution, &error);
+  if (driz_error_is_set(&error)) {
+    goto _exit;
+  }
 
   /*
   start_t = clock();
   */
-  /* Do the drizzling */
-  if (dobox(&p, ystart, &nmiss, &nskip, &error)) {
+  /* Do the drizzling.  Mappings that never call back into Python (or
+     touch the Python WCS objects) let other threads run meanwhile. */
+  if (release_gil) {
+    Py_BEGIN_ALLOW_THREADS
+    istat = dobox(&p, ystart, &nmiss, &nskip, &error);
+    Py_END_ALLOW_THREADS
+  } else {
+    istat = dobox(&p, ystart, &nmiss, &nskip, &error);
+  }
+  if (istat) {
     goto _exit;
   }
   /*
@@ -527,13 +727,14 @@ tdriz(PyObject *obj UNUSED_PARAM, PyObject *args)
   Py_XDECREF(wei);
   Py_XDECREF(out);
   Py_XDECREF(wht);
+  Py_XDECREF(pixmap);
 
   if (istat || driz_error_is_set(&error)) {
     if (strcmp(driz_error_get_message(&error), "<PYTHON>") != 0)
       PyErr_SetString(PyExc_Exception, driz_error_get_message(&error));
     return NULL;
   } else {
-    return Py_BuildValue("sii", "Callable C-based DRIZZLE Version 0.8 (20th May 2009)", nmiss, nskip);
+    return Py_BuildValue("sii", TDRIZ_VERSION, nmiss, nskip);
   }
 }
 
@@ -623,7 +824,7 @@ twdriz(PyObject *obj, PyObject *args)
 
 
 static PyObject *
-tblot(PyObject *obj, PyObject *args)
+tblot(PyObject *obj, PyObject *args, PyObject *keywds)
 {
   /* Arguments in the order they appear */
   PyObject *oimg, *oout;
@@ -635,12 +836,15 @@ tblot(PyObject *obj, PyObject *args)
   float ef, misval, sinscl;
   long vflag;
   PyObject *callback_obj = NULL;
+  PyObject *out_window_obj = NULL;
 
-  PyArrayObject *img = NULL, *out = NULL;
+  PyArrayObject *img = NULL, *out = NULL, *pixmap = NULL;
+  struct pixmap_param_t pixmap_param;
   enum e_align_t align;
   enum e_interp_t interp;
   mapping_callback_t callback = NULL;
   void *callback_state = NULL;
+  bool_t release_gil = FALSE;
   long nx,ny,onx,ony;
   int istat = 0;
   struct driz_error_t error;
@@ -648,10 +852,16 @@ tblot(PyObject *obj, PyObject *args)
 
   driz_error_init(&error);
 
-  if (!PyArg_ParseTuple(args,"OOlllldfddssffflO:tblot", &oimg, &oout, &xmin,
+  static char *kwlist[] = {"image", "output", "xmin", "xmax", "ymin", "ymax",
+                           "scale", "kscale", "xscale", "yscale", "align",
+                           "interp", "ef", "misval", "sinscl", "vflag",
+                           "callback_or_pixmap", "out_window", NULL};
+
+  if (!PyArg_ParseTupleAndKeywords(args, keywds, "OOlllldfddssffflO|O:tblot",
+                        kwlist, &oimg, &oout, &xmin,
                         &xmax, &ymin, &ymax, &scale, &kscale, &xscale,
                         &yscale, &align_str, &interp_str, &ef, &misval,
-                        &sinscl, &vflag, &callback_obj)){
+                        &sinscl, &vflag, &callback_obj, &out_window_obj)){
     return PyErr_Format(gl_Error, "cdriz.tblot: Invalid Parameters.");
   }
 
@@ -666,10 +876,8 @@ tblot(PyObject *obj, PyObject *args)
     goto _exit;
   }
 
-  callback = py_mapping_callback;
-  callback_state = (void *)callback_obj;
-
-  img = (PyArrayObject *)PyArray_ContiguousFromAny(oimg, NPY_FLOAT32, 2, 2);
+  img = (PyArrayObject *)PyArray_FROMANY(oimg, NPY_FLOAT32, 2, 2,
+                                         NPY_ARRAY_IN_ARRAY);
   if (!img) {
     driz_error_set_message(&error, "Invalid input array");
     goto _exit;
@@ -680,6 +888,25 @@ tblot(PyObject *obj, PyObject *args)
     goto _exit;
   }
 
+  if (PyArray_Check(callback_obj)) {
+    /* For blotting the pixel map is defined on the output (blotted) grid */
+    pixmap = pixmap_from_array(callback_obj, PyArray_DIMS(out)[1],
+                               PyArray_DIMS(out)[0], &pixmap_param, &error);
+    if (!pixmap) {
+      goto _exit;
+    }
+    callback = pixmap_mapping;
+    callback_state = (void *)&pixmap_param;
+    release_gil = TRUE;
+  } else if (PyObject_TypeCheck(callback_obj, &WCSMapType)) {
+    callback = default_wcsmap;
+    callback_state = (void *)&(((PyWCSMap *)callback_obj)->m);
+    release_gil = ((PyWCSMap *)callback_obj)->m.factor > 0;
+  } else {
+    callback = py_mapping_callback;
+    callback_state = (void *)callback_obj;
+  }
+
   if (align_str2enum(align_str, &align, &error) ||
       interp_str2enum(interp_str, &interp, &error)) {
     goto _exit;
@@ -702,6 +929,22 @@ tblot(PyObject *obj, PyObject *args)
   p.dny = ny;
   p.onx = onx;
   p.ony = ony;
+
+  /* Only the output pixels in the window are blotted; the others are
+     left untouched. */
+  p.out_xmin = 1;
+  p.out_xmax = onx;
+  p.out_ymin = 1;
+  p.out_ymax = ony;
+  if (window_from_object(out_window_obj, "out_window",
+                         &p.out_xmin, &p.out_xmax, &p.out_ymin, &p.out_ymax,
+                         &error)) {
+    goto _exit;
+  }
+  if (p.out_xmin > p.out_xmax || p.out_ymin > p.out_ymax) {
+    goto _exit;
+  }
+
   p.scale = scale;
   p.kscale = kscale;
   p.x_scale = xscale;
@@ -715,11 +958,18 @@ tblot(PyObject *obj, PyObject *args)
   p.mapping_callback = callback;
   p.mapping_callback_state = callback_state;
 
-  istat = doblot(&p, &error);
+  if (release_gil) {
+    Py_BEGIN_ALLOW_THREADS
+    istat = doblot(&p, &error);
+    Py_END_ALLOW_THREADS
+  } else {
+    istat = doblot(&p, &error);
+  }
 
  _exit:
-  Py_DECREF(img);
-  Py_DECREF(out);
+  Py_XDECREF(img);
+  Py_XDECREF(out);
+  Py_XDECREF(pixmap);
 
   if (istat || driz_error_is_set(&error)) {
     if (strcmp(driz_error_get_message(&error), "<PYTHON>") != 0)
@@ -740,15 +990,10 @@ void cdriz_log_func(const char *format, ...) {
   char msg[256];
   int n;
 
-  va_start(args, format);
-
-  if (logging == NULL) {
-    logging = PyImport_ImportModule("logging");
-    if (logging == NULL) return;
-  }
+  PyGILState_STATE gstate;
 
+  va_start(args, format);
   n = PyOS_vsnprintf(msg, sizeof(msg), format, args);
-
   va_end(args);
 
   if (n < 0) {
@@ -756,21 +1001,32 @@ void cdriz_log_func(const char *format, ...) {
     return;
   }
 
+  /* The drizzle loops may run with the interpreter lock released */
+  gstate = PyGILState_Ensure();
+
+  if (logging == NULL) {
+    logging = PyImport_ImportModule("logging");
+    if (logging == NULL) goto _exit;
+  }
+
   /* XXX: Provide a way to specify the log level to use */
   string = Py_BuildValue("s", msg);
-  if (string == NULL) return;
+  if (string == NULL) goto _exit;
 
   logger = PyObject_CallMethod(logging, "getLogger", "s",
                                "drizzlepac.cdriz");
   if (logger == NULL) {
       Py_XDECREF(string);
-      return;
+      goto _exit;
   }
 
-  PyObject_CallMethod(logger, "info", "O", string);
+  Py_XDECREF(PyObject_CallMethod(logger, "info", "O", string));
 
   Py_XDECREF(logger);
   Py_XDECREF(string);
+
+ _exit:
+  PyGILState_Release(gstate);
   return;
 }
 
@@ -1164,9 +1420,9 @@ arrxyzero(PyObject *obj, PyObject *args)
 
 static PyMethodDef cdriz_methods[] =
   {
-    {"tdriz",  tdriz, METH_VARARGS, "tdriz(image, weight, output, outweight, context, uniqid, ystart, xmin, ymin, dny, scale, xscale, yscale, align, pfrace, kernel, inun, expin, wtscl, fill, nmiss, nskip, vflag, callback)"},
+    {"tdriz",  (PyCFunction)tdriz, METH_VARARGS|METH_KEYWORDS, "tdriz(image, weight, output, outweight, context, uniqid, ystart, xmin, ymin, dny, scale, xscale, yscale, align, pfrace, kernel, inun, expin, wtscl, fill, nmiss, nskip, vflag, callback_or_pixmap, in_window=None, out_window=None, lut_resolution=0)"},
     /*{"twdriz",  tdriz, METH_VARARGS, "triz(image, weight, output, outweight, ystart, xmin, ymin, dny, wcsin, wcsout,pxg,pyg,pfract, kernel, coeffs, fillstr,nmiss,nskip,vflag)"},*/
-    {"tblot",  tblot, METH_VARARGS, "tblot(image, output, xmin, xmax, ymin, ymax, scale, kscale, xscale, yscale, align, interp, ef, misval, sinscl, vflag, callback)"},
+    {"tblot",  (PyCFunction)tblot, METH_VARARGS|METH_KEYWORDS, "tblot(image, output, xmin, xmax, ymin, ymax, scale, kscale, xscale, yscale, align, interp, ef, misval, sinscl, vflag, callback_or_pixmap, out_window=None)"},
     {"arrmoments", arrmoments, METH_VARARGS, "arrmoments(image, p, q)"},
     {"arrxyround", arrxyround, METH_VARARGS, "arrxyround(data,x0,y0,skymode,ker2d,xsigsq,ysigsq,datamin,datamax)"},
     {"arrxyzero", arrxyzero, METH_VARARGS, "arrxyzero(imgxy,refxy,searchrad,zpmat)"},
@@ -1203,6 +1459,7 @@ PyObject *PyInit_cdriz(void)
 
   Py_INCREF(&WCSMapType);
   PyModule_AddObject(m, "DefaultWCSMapping", (PyObject *)&WCSMapType);
+  PyModule_AddStringConstant(m, "TDRIZ_VERSION", TDRIZ_VERSION);
 
   return m;
 }
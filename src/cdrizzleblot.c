@@ -983,7 +983,7 @@ doblot(struct driz_param_t* p,
   double yv;
   float xo, yo, v;
   /*float nx, ny;*/
-  integer_t i, j;
+  integer_t i, j, n;
   interp_function* interpolate;
   struct sinc_param_t sinc;
   void* state = NULL;
@@ -1091,27 +1091,28 @@ doblot(struct driz_param_t* p,
 
   /* Set the X and Y start positions -- most of these don't change
      between iterations. */
-  xin[0] = 1.0;
+  xin[0] = (double)p->out_xmin;
   xin[1] = 0.0;
   yin[1] = 0.0;
   v = 1.0;
+  n = p->out_xmax - p->out_xmin + 1;
 
-  /* Outer look over output image pixels (X, Y) */
-  for (j = 0; j < p->ony; ++j) {
+  /* Outer look over the output sub-window pixels (X, Y) */
+  for (j = p->out_ymin - 1; j < p->out_ymax; ++j) {
     yv = (double)j+1;
 
     yin[0] = yv;
 
     /* Transform this vector */
-    if (map_value(p, TRUE, p->onx,
+    if (map_value(p, TRUE, n,
                   xin, yin, xtmp, ytmp, xout, yout, error)) {
       goto doblot_exit_;
     }
 
     /* Loop through the output positions and do the interpolation */
-    for (i = 0; i < p->onx; ++i) {
-      xo = (float)(xout[i] - dx);
-      yo = (float)(yout[i] - dy);
+    for (i = p->out_xmin - 1; i < p->out_xmax; ++i) {
+      xo = (float)(xout[i - p->out_xmin + 1] - dx);
+      yo = (float)(yout[i - p->out_xmin + 1] - dy);
 
       /* Check it is on the input image */
       if (xo >= 0.0 && xo <= p->dnx &&
@@ -12,6 +12,7 @@
 #include <math.h>
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
 
 static inline_macro double*
 mapping_4_ptr(struct driz_param_t* p, double* arr, integer_t i0, integer_t i1) {
@@ -53,7 +54,7 @@ check_over(struct driz_param_t* p, const integer_t y, const integer_t margin,
   integer_t logo[CHECK_OVER_NPOINT];
   integer_t step, first, last;
   integer_t nhit, nmiss;
-  integer_t i, np;
+  integer_t i, np, nx;
 
   assert(p);
   assert(ofrac);
@@ -61,12 +62,14 @@ check_over(struct driz_param_t* p, const integer_t y, const integer_t margin,
   assert(x2);
   assert(error);
 
-  if (p->dnx < npoint)
+  /* Only the part of the line inside the input sub-window is checked */
+  nx = p->in_xmax - p->in_xmin + 1;
+  if (nx < npoint)
     step = 1;
   else
-    step = p->dnx / (npoint / 2);
+    step = nx / (npoint / 2);
 
-  for (i = 1, np = 0; i <= p->dnx; i += step, ++np) {
+  for (i = p->in_xmin, np = 0; i <= p->in_xmax; i += step, ++np) {
     assert(np < npoint);
     xval[np] = (double)i;
     yval[np] = (double)y;
@@ -74,8 +77,8 @@ check_over(struct driz_param_t* p, const integer_t y, const integer_t margin,
   assert(np < npoint);
 
   /* Check end point */
-  if (xval[np - 1] < (double)p->dnx) {
-    xval[np] = (double)p->dnx;
+  if (xval[np - 1] < (double)p->in_xmax) {
+    xval[np] = (double)p->in_xmax;
     yval[np] = (double)y;
     ++np;
   }
@@ -90,10 +93,10 @@ check_over(struct driz_param_t* p, const integer_t y, const integer_t margin,
   }
 
   for (i = 0; i < np - 1; ++i) {
-    if (MAX(xout[i], xout[i+1]) >= 1.0 - (double)margin &&
-        MIN(xout[i], xout[i+1]) < (double)(p->onx + margin) &&
-        MAX(yout[i], yout[i+1]) >= 1.0 - (double)margin &&
-        MIN(yout[i], yout[i+1]) < (double)(p->ony + margin)) {
+    if (MAX(xout[i], xout[i+1]) >= (double)p->out_xmin - (double)margin &&
+        MIN(xout[i], xout[i+1]) < (double)(p->out_xmax + margin) &&
+        MAX(yout[i], yout[i+1]) >= (double)p->out_ymin - (double)margin &&
+        MIN(yout[i], yout[i+1]) < (double)(p->out_ymax + margin)) {
       logo[i] = 1;
       logo[i+1] = 1;
     }
@@ -208,8 +211,8 @@ update_context_image(struct driz_param_t* p, const integer_t ii, const integer_t
   assert(oldcon);
   assert(newcon);
   assert(error);
-  assert(ii >= 0 && ii < p->nsx);
-  assert(jj >= 0 && jj < p->nsy);
+  assert(ii >= p->out_xmin - 1 && ii < p->out_xmax);
+  assert(jj >= p->out_ymin - 1 && jj < p->out_ymax);
 
   /* Look up the current context value */
   icon = *output_context_ptr(p, ii, jj);
@@ -529,17 +532,17 @@ do_kernel_point(struct driz_param_t* p, const integer_t j,
   double dx, dy;
   integer_t xarr,yarr;
 
-  dx = (double)(p->xmin);
-  dy = (double)(p->ymin);
+  dx = 1.0;
+  dy = 1.0;
 
-  /* Offset within the subset */
+  /* Offset within the output frame */
   for (i = x1; i <= x2; ++i) {
     ii = fortran_round(*mapping_ptr(p, xo, i) - dx);
     jj = fortran_round(*mapping_ptr(p, yo, i) - dy);
 
-    /* Check it is on the output image */
-    if (ii >= 0 && ii < p->nsx &&
-        jj >= 0 && jj < p->nsy) {
+    /* Check it is on the output sub-window */
+    if (ii >= p->out_xmin - 1 && ii < p->out_xmax &&
+        jj >= p->out_ymin - 1 && jj < p->out_ymax) {
       vc = *output_counts_ptr(p, ii, jj);
     /* Convert i,j 1-based pixel positions into 0-based
        indices for accessing data array. */
@@ -585,11 +588,11 @@ do_kernel_tophat(struct driz_param_t* p, const integer_t j,
   double xx, yy, xxi, xxa, yyi, yya, dx, dy, ddx, ddy, r2;
   integer_t xarr,yarr;
 
-  dx = (double)(p->xmin);
-  dy = (double)(p->ymin);
+  dx = 1.0;
+  dy = 1.0;
 
   for (i = x1; i <= x2; ++i) {
-    /* Offset within the subset */
+    /* Offset within the output frame */
     xx = *mapping_ptr(p, xo, i) - dx;
     yy = *mapping_ptr(p, yo, i) - dy;
 
@@ -598,10 +601,10 @@ do_kernel_tophat(struct driz_param_t* p, const integer_t j,
     yyi = yy - p->pfo;
     yya = yy + p->pfo;
 
-    nxi = MAX(fortran_round(xxi), 0);
-    nxa = MIN(fortran_round(xxa), p->nsx - 1);
-    nyi = MAX(fortran_round(yyi), 0);
-    nya = MIN(fortran_round(yya), p->nsy - 1);
+    nxi = MAX(fortran_round(xxi), p->out_xmin - 1);
+    nxa = MIN(fortran_round(xxa), p->out_xmax - 1);
+    nyi = MAX(fortran_round(yyi), p->out_ymin - 1);
+    nya = MIN(fortran_round(yya), p->out_ymax - 1);
 
     nhit = 0;
     /* Convert i,j 1-based pixel positions into 0-based
@@ -665,13 +668,19 @@ do_kernel_gaussian(struct driz_param_t* p, const integer_t j,
                    struct driz_error_t* error) {
   integer_t i, ii, jj, nxi, nxa, nyi, nya, nhit;
   float vc, d, dow;
-  double xx, yy, xxi, xxa, yyi, yya, w, dx, dy, ddx, ddy, r2, dover;
+  double xx, yy, xxi, xxa, yyi, yya, w, dx, dy, dover, sefac;
+  double *wx, *wy;
   integer_t xarr,yarr;
 
-  dx = (double)(p->xmin);
-  dy = (double)(p->ymin);
+  dx = 1.0;
+  dy = 1.0;
+
+  /* Scale from output pixel offsets to the coordinate of the tabulated
+     profile, exp(-s^2) */
+  sefac = sqrt(p->gaussian.efac);
 
   for (i = x1; i <= x2; ++i) {
+    /* Offset within the output frame */
     xx = *mapping_ptr(p, xo, i) - dx;
     yy = *mapping_ptr(p, yo, i) - dy;
 
@@ -680,10 +689,10 @@ do_kernel_gaussian(struct driz_param_t* p, const integer_t j,
     yyi = yy - p->pfo;
     yya = yy + p->pfo;
 
-    nxi = MAX(fortran_round(xxi), 0);
-    nxa = MIN(fortran_round(xxa), p->nsx - 1);
-    nyi = MAX(fortran_round(yyi), 0);
-    nya = MIN(fortran_round(yya), p->nsy - 1);
+    nxi = MAX(fortran_round(xxi), p->out_xmin - 1);
+    nxa = MIN(fortran_round(xxa), p->out_xmax - 1);
+    nyi = MAX(fortran_round(yyi), p->out_ymin - 1);
+    nya = MIN(fortran_round(yya), p->out_ymax - 1);
 
     nhit = 0;
     /* Convert i,j 1-based pixel positions into 0-based
@@ -703,17 +712,23 @@ do_kernel_gaussian(struct driz_param_t* p, const integer_t j,
       w = 1.0;
     }
 
+    /* Weight is a scaled Gaussian function of radial distance, i.e.,
+       the product of the Gaussian profiles of the X and Y offsets, which
+       are looked up once per column and row */
+    wx = p->kernel_wx - nxi;
+    wy = p->kernel_wy - nyi;
+    for (ii = nxi; ii <= nxa; ++ii) {
+      wx[ii] = kernel_lut_hermite(p->kernel_lut, fabs(xx - (double)ii) * sefac);
+    }
+    for (jj = nyi; jj <= nya; ++jj) {
+      wy[jj] = p->gaussian.es *
+        kernel_lut_hermite(p->kernel_lut, fabs(yy - (double)jj) * sefac);
+    }
+
     /* Loop over output pixels which could be affected */
     for (jj = nyi; jj <= nya; ++jj) {
-      ddy = yy - (double)jj;
       for (ii = nxi; ii <= nxa; ++ii) {
-        ddx = xx - (double)ii;
-        /* Radial distance */
-        r2 = ddx*ddx + ddy*ddy;
-
-        /* Weight is a scaled Gaussian function of radial
-           distance */
-        dover = p->gaussian.es * exp(-r2 * p->gaussian.efac);
+        dover = wy[jj] * wx[ii];
 
         /* Count the hits */
         ++nhit;
@@ -738,6 +753,15 @@ do_kernel_gaussian(struct driz_param_t* p, const integer_t j,
   return 0;
 }
 
+/* Lanczos function value of an offset (in output pixels) from the nearest
+   table sample, with the index offset of one sample of the original code */
+static inline_macro double
+lanczos_lut_value(const struct driz_param_t* p, const double offset) {
+  const size_t ix = (size_t)fortran_round(offset * p->lanczos.sdp) + 1;
+
+  return (ix < p->kernel_lut->nlut) ? p->kernel_lut->lut[ix] : 0.0;
+}
+
 static int
 do_kernel_lanczos(struct driz_param_t* p, const integer_t j,
                   const integer_t x1, const integer_t x2,
@@ -745,15 +769,17 @@ do_kernel_lanczos(struct driz_param_t* p, const integer_t j,
                   /* Input/output parameters */
                   integer_t* oldcon, integer_t* newcon, integer_t* nmiss,
                   struct driz_error_t* error) {
-  integer_t i, ii, jj, nxi, nxa, nyi, nya, nhit, ix, iy;
+  integer_t i, ii, jj, nxi, nxa, nyi, nya, nhit;
   float vc, d, dow;
   double xx, yy, xxi, xxa, yyi, yya, w, dx, dy, dover;
+  double *wx, *wy;
   integer_t xarr,yarr;
 
-  dx = (double)(p->xmin);
-  dy = (double)(p->ymin);
+  dx = 1.0;
+  dy = 1.0;
 
   for (i = x1; i <= x2; ++i) {
+    /* Offset within the output frame */
     xx = *mapping_ptr(p, xo, i) - dx;
     yy = *mapping_ptr(p, yo, i) - dy;
 
@@ -762,10 +788,10 @@ do_kernel_lanczos(struct driz_param_t* p, const integer_t j,
     yyi = yy - p->pfo;
     yya = yy + p->pfo;
 
-    nxi = MAX(fortran_round(xxi), 0);
-    nxa = MIN(fortran_round(xxa), p->nsx - 1);
-    nyi = MAX(fortran_round(yyi), 0);
-    nya = MIN(fortran_round(yya), p->nsy - 1);
+    nxi = MAX(fortran_round(xxi), p->out_xmin - 1);
+    nxa = MIN(fortran_round(xxa), p->out_xmax - 1);
+    nyi = MAX(fortran_round(yyi), p->out_ymin - 1);
+    nya = MIN(fortran_round(yya), p->out_ymax - 1);
 
     nhit = 0;
     /* Convert i,j 1-based pixel positions into 0-based
@@ -785,15 +811,22 @@ do_kernel_lanczos(struct driz_param_t* p, const integer_t j,
       w = 1.0;
     }
 
+    /* Lanczos function values of the X and Y offsets, looked up once
+       per column and row */
+    wx = p->kernel_wx - nxi;
+    wy = p->kernel_wy - nyi;
+    for (ii = nxi; ii <= nxa; ++ii) {
+      wx[ii] = lanczos_lut_value(p, fabs(xx - (double)ii));
+    }
+    for (jj = nyi; jj <= nya; ++jj) {
+      wy[jj] = lanczos_lut_value(p, fabs(yy - (double)jj));
+    }
+
     /* Loop over output pixels which could be affected */
     for (jj = nyi; jj <= nya; ++jj) {
       for (ii = nxi; ii <= nxa; ++ii) {
-        /* X and Y offsets */
-        ix = fortran_round(fabs(xx - (double)ii) * p->lanczos.sdp) + 1;
-        iy = fortran_round(fabs(yy - (double)jj) * p->lanczos.sdp) + 1;
-
         /* Weight is product of Lanczos function values in X and Y */
-        dover = p->lanczos.lut[ix] * p->lanczos.lut[iy];
+        dover = (float)wx[ii] * (float)wy[jj];
 
         /* Count the hits */
         ++nhit;
@@ -832,13 +865,13 @@ do_kernel_turbo(struct driz_param_t* p, const integer_t j,
   double xxi, xxa, yyi, yya, w, dx, dy, dover,xoi,yoi;
   integer_t xarr,yarr;
 
-  dx = (double)(p->xmin);
-  dy = (double)(p->ymin);
+  dx = 1.0;
+  dy = 1.0;
 
   nhit = 0;
 
   for (i = x1; i <= x2; ++i) {
-    /* Offset within the subset */
+    /* Offset within the output frame */
     xoi = *mapping_ptr(p, xo, i);
     yoi = *mapping_ptr(p, yo, i);
     xxi = xoi - dx - p->pfo;
@@ -850,10 +883,11 @@ do_kernel_turbo(struct driz_param_t* p, const integer_t j,
     nxa = fortran_round(xxa);
     nyi = fortran_round(yyi);
     nya = fortran_round(yya);
-    iis = MAX(nxi, 0);  /* Needed to be set to 0 to avoid edge effects */
-    iie = MIN(nxa, p->nsx - 1);
-    jjs = MAX(nyi, 0);  /* Needed to be set to 0 to avoid edge effects */
-    jje = MIN(nya, p->nsy - 1);
+    /* Needed to be clipped to the sub-window to avoid edge effects */
+    iis = MAX(nxi, p->out_xmin - 1);
+    iie = MIN(nxa, p->out_xmax - 1);
+    jjs = MAX(nyi, p->out_ymin - 1);
+    jje = MIN(nya, p->out_ymax - 1);
 
     nhit = 0;
 
@@ -909,31 +943,59 @@ do_kernel_turbo(struct driz_param_t* p, const integer_t j,
   return 0;
 }
 
+/**
+Map the corners of the pixels of an input line onto the output for the
+square kernel.
+
+The corners are those of the line of pixels shrunk by the pixel
+fraction, in clockwise order from the top left corner.  When the
+pixels are not shrunk (pixfrac = 1) and are one unit apart, the
+corners are shared by neighbouring pixels, and each of the n+1 corners
+of the top and bottom edges of the line only needs to be mapped once.
+The top edge of a line is then also the bottom edge of the next one,
+and is reused as such if the previous line (from last_x1 to last_x2)
+covers the current one.  The corners of pixel i are then at
+(xo[i], xo[i+1], xo[s+i+1], xo[s+i]) with a stride s of dnx + 2, and
+otherwise at the corner rows of mapping_4_ptr.
+*/
 static int
-do_kernel_square(struct driz_param_t* p,
-                 const integer_t j, double y,
-                 const integer_t x1, const integer_t x2,
-                 const integer_t last_x1, const integer_t last_x2,
-                 /* Input/output parameters */
-                 double* xi, double* yi,
-                 double* xtmp, double* ytmp,
-                 double* xo, double* yo,
-                 integer_t* oldcon, integer_t* newcon, integer_t* nmiss,
-                 struct driz_error_t* error) {
-  integer_t i, nhit, ii, jj, min_ii, max_ii, min_jj, max_jj, n;
-  float vc, d, dow;
-  double dh, jaco, tem, dover, dx, dy, w;
-  double xout[4], yout[4];
+map_square_corners(struct driz_param_t* p,
+                   const double y, const bool_t shared,
+                   const integer_t x1, const integer_t x2,
+                   const integer_t last_x1, const integer_t last_x2,
+                   /* Input/output parameters */
+                   double* xi, double* yi,
+                   double* xtmp, double* ytmp,
+                   double* xo, double* yo,
+                   struct driz_error_t* error) {
+  integer_t i, n, stride;
+  double dh;
 
-  /* TODO: These are constant across calls -- perhaps cache??? */
   dh = 0.5 * p->pixel_fraction;
-  dx = (double)(p->xmin) - 1;
-  dy = (double)(p->ymin) - 1;
   n = x2 - x1 + 1;
 
-  /* Next the "classic" drizzle square kernel...  this is different
-     because we have to transform all four corners of the shrunken
-     pixel */
+  if (shared) {
+    stride = p->dnx + 2;
+
+    /* The bottom edge, unless it is the top one of the previous line */
+    if (last_x1 > x1 || last_x2 < x2) {
+      xi[0] = (double)x1 - dh;
+      yi[0] = y - dh;
+      yi[1] = -dh;
+      if (map_value(p, TRUE, n + 1, xi, yi, xtmp, ytmp,
+                    xo + stride + x1, yo + stride + x1, error)) {
+        return 1;
+      }
+    }
+
+    /* The top edge */
+    xi[0] = (double)x1 - dh;
+    yi[0] = y + dh;
+    yi[1] = dh;
+    return map_value(p, TRUE, n + 1, xi, yi, xtmp, ytmp,
+                     xo + x1, yo + x1, error);
+  }
+
   /* Set the start corner positions */
 
   *mapping_4_ptr(p, xi, x1, 0) = (double)x1 - dh;
@@ -962,14 +1024,62 @@ do_kernel_square(struct driz_param_t* p,
     }
   }
 
+  return 0;
+}
+
+static int
+do_kernel_square(struct driz_param_t* p,
+                 const integer_t j, double y,
+                 const integer_t x1, const integer_t x2,
+                 const integer_t last_x1, const integer_t last_x2,
+                 /* Input/output parameters */
+                 double* xi, double* yi,
+                 double* xtmp, double* ytmp,
+                 double* xo, double* yo,
+                 integer_t* oldcon, integer_t* newcon, integer_t* nmiss,
+                 struct driz_error_t* error) {
+  integer_t i, nhit, ii, jj, min_ii, max_ii, min_jj, max_jj, stride;
+  float vc, d, dow;
+  double jaco, tem, dover, dx, dy, w;
+  double xout[4], yout[4];
+  bool_t shared;
+
+  dx = 0.0;
+  dy = 0.0;
+
+  /* Next the "classic" drizzle square kernel...  this is different
+     because we have to transform all four corners of the shrunken
+     pixel */
+  shared = (p->pixel_fraction == 1.0 && p->x_scale == 1.0);
+  stride = p->dnx + 2;
+  if (map_square_corners(p, y, shared, x1, x2, last_x1, last_x2,
+                         xi, yi, xtmp, ytmp, xo, yo, error)) {
+    return 1;
+  }
+
   for (i = x1; i <= x2; ++i) {
-    /* Offset within the subset */
+    /* Offset within the output frame */
+    if (shared) {
+      xout[0] = xo[i];
+      xout[1] = xo[i + 1];
+      xout[2] = xo[stride + i + 1];
+      xout[3] = xo[stride + i];
+      yout[0] = yo[i];
+      yout[1] = yo[i + 1];
+      yout[2] = yo[stride + i + 1];
+      yout[3] = yo[stride + i];
+    } else {
+      for (ii = 0; ii < 4; ++ii) {
+        xout[ii] = *mapping_4_ptr(p, xo, i, ii);
+        yout[ii] = *mapping_4_ptr(p, yo, i, ii);
+      }
+    }
     for (ii = 0; ii < 4; ++ii) {
       /* The offset by 1 here is needed to match the alignment in the
          output frame generated by the other kernels (such as turbo).
       */
-      xout[ii] = *mapping_4_ptr(p, xo, i, ii) - dx - 1;
-      yout[ii] = *mapping_4_ptr(p, yo, i, ii) - dy - 1;
+      xout[ii] = xout[ii] - dx - 1;
+      yout[ii] = yout[ii] - dy - 1;
     }
 
     /* Work out the area of the quadrilateral on the output grid.
@@ -997,10 +1107,10 @@ do_kernel_square(struct driz_param_t* p,
     }
 
     /* Loop over output pixels which could be affected */
-    min_jj = MAX(fortran_round(min_doubles(yout, 4)), 0);
-    max_jj = MIN(fortran_round(max_doubles(yout, 4)), p->nsy - 1);
-    min_ii = MAX(fortran_round(min_doubles(xout, 4)), 0);
-    max_ii = MIN(fortran_round(max_doubles(xout, 4)), p->nsx - 1);
+    min_jj = MAX(fortran_round(min_doubles(yout, 4)), p->out_ymin - 1);
+    max_jj = MIN(fortran_round(max_doubles(yout, 4)), p->out_ymax - 1);
+    min_ii = MAX(fortran_round(min_doubles(xout, 4)), p->out_xmin - 1);
+    max_ii = MIN(fortran_round(max_doubles(xout, 4)), p->out_xmax - 1);
 
     for (jj = min_jj; jj <= max_jj; ++jj) {
       for (ii = min_ii; ii <= max_ii; ++ii) {
@@ -1031,6 +1141,12 @@ do_kernel_square(struct driz_param_t* p,
     if (nhit == 0) ++(*nmiss);
   }
 
+  /* The top edge of this line is the bottom one of the next */
+  if (shared) {
+    memcpy(xo + stride + x1, xo + x1, (size_t)(x2 - x1 + 2) * sizeof(double));
+    memcpy(yo + stride + x1, yo + x1, (size_t)(x2 - x1 + 2) * sizeof(double));
+  }
+
   return 0;
 }
 
@@ -1063,8 +1179,6 @@ dobox(struct driz_param_t* p, const integer_t ystart,
       /* Output parameters */
       integer_t* nmiss, integer_t* nskip, struct driz_error_t* error) {
   const double nsig = 2.5;
-  const size_t nlut = 512;
-  const float del = 0.01;
   integer_t j, x1, x2, last_x1, last_x2;
   double y, dh, ofrac;
   kernel_handler_t kernel_handler = NULL;
@@ -1079,7 +1193,7 @@ dobox(struct driz_param_t* p, const integer_t ystart,
   float inv_exposure_time;
   float* data_begin, *data_end;
   int kernel_order;
-  size_t new_buffer_size;
+  size_t new_buffer_size, nfoot;
   size_t bit_no;
 
   assert(p);
@@ -1107,11 +1221,12 @@ dobox(struct driz_param_t* p, const integer_t ystart,
 
   /* Before we start we can fill the X arrays as they don't change
      with Y */
-  new_buffer_size = (size_t)((p->kernel == kernel_square) ? p->dnx*4 : p->dnx);
+  new_buffer_size = (size_t)((p->kernel == kernel_square) ?
+                             (p->dnx + 2) * 4 : p->dnx);
 
-  /* Image subset size */
-  p->nsx = p->xmax - p->xmin + 1;
-  p->nsy = p->ymax - p->ymin + 1;
+  /* Output sub-window size */
+  p->nsx = p->out_xmax - p->out_xmin + 1;
+  p->nsy = p->out_ymax - p->out_ymin + 1;
   assert(p->pixel_fraction != 0.0);
   p->ac = 1.0 / (p->pixel_fraction * p->pixel_fraction);
 
@@ -1136,17 +1251,8 @@ dobox(struct driz_param_t* p, const integer_t ystart,
   case kernel_lanczos2:
   case kernel_lanczos3:
     kernel_order = (p->kernel == kernel_lanczos2) ? 2 : 3;
-    p->lanczos.nlut = nlut;
-    assert(p->lanczos.lut == NULL);
-    if ((p->lanczos.lut = malloc(nlut * sizeof(float))) == NULL) {
-      driz_error_set_message(error, "Out of memory");
-      goto dobox_exit_;
-    }
-    /* Set up a look-up-table for Lanczos-style interpolation
-       kernels */
-    create_lanczos_lut(kernel_order, nlut, del, p->lanczos.lut);
     p->pfo = (double)kernel_order * p->pixel_fraction / p->scale;
-    p->lanczos.sdp = p->scale / del / p->pixel_fraction;
+    p->lanczos.sdp = p->scale / p->kernel_lut->space / p->pixel_fraction;
     break;
 
   default:
@@ -1155,6 +1261,24 @@ dobox(struct driz_param_t* p, const integer_t ystart,
 
   p->pfo2 = p->pfo*p->pfo;
 
+  /* The Gaussian and Lanczos kernels use the shared look-up table of
+     their profile (see get_kernel_lut), and need room for the profile
+     values of the columns and rows of their footprint */
+  if (p->kernel == kernel_gaussian ||
+      p->kernel == kernel_lanczos2 || p->kernel == kernel_lanczos3) {
+    if (p->kernel_lut == NULL || p->kernel_lut->kernel != p->kernel) {
+      driz_error_set_message(error, "Missing kernel look-up table");
+      goto dobox_exit_;
+    }
+    nfoot = (size_t)(2.0 * ceil(p->pfo)) + 3;
+    p->kernel_wx = malloc(nfoot * sizeof(double));
+    p->kernel_wy = malloc(nfoot * sizeof(double));
+    if (p->kernel_wx == NULL || p->kernel_wy == NULL) {
+      driz_error_set_message(error, "Out of memory");
+      goto dobox_exit_;
+    }
+  }
+
   /* assert(p->output_done == NULL); */
   /* p->output_done = malloc(p->nsx * p->nsy * sizeof(integer_t)); */
   /* if (p->output_done == NULL) { */
@@ -1249,8 +1373,11 @@ dobox(struct driz_param_t* p, const integer_t ystart,
   y = (double)ystart;
   for (j = 0; j < p->ny; ++j) {
     y += 1.0;
-    /* Check the overlap with the output */
-    if (check_over(p, (integer_t)y, 5, &ofrac, &x1, &x2, error)) {
+    /* Check the overlap with the output, for lines of the input
+       sub-window only */
+    if (y < (double)p->in_ymin || y > (double)p->in_ymax) {
+      ofrac = 0.0;
+    } else if (check_over(p, (integer_t)y, 5, &ofrac, &x1, &x2, error)) {
       goto dobox_exit_;
     }
 
@@ -1310,6 +1437,8 @@ dobox(struct driz_param_t* p, const integer_t ystart,
  dobox_exit_:
   free(p->lanczos.lut); p->lanczos.lut = NULL;
   free(p->output_done); p->output_done = NULL;
+  free(p->kernel_wx); p->kernel_wx = NULL;
+  free(p->kernel_wy); p->kernel_wy = NULL;
   free(xi); xi = NULL;
   free(yi); yi = NULL;
   free(xo); xo = NULL;
@@ -369,6 +369,55 @@ default_wcsmap_direct(struct wcsmap_param_t* m,
   return 0;
 }
 
+/* Bilinear interpolation of the table node pairs surrounding the
+   position (xi + xf, yi + yf).  Node (i, j) is found at
+   table[(j * ystride + i * xstride) * 2]. */
+static inline_macro void
+interpolate_nodes(const double* table,
+                  const int xstride, const int ystride,
+                  const int xi, const int yi,
+                  const double xf, const double yf,
+                  /* Output parameters */
+                  double* xout, double* yout) {
+  double  ixf, iyf;
+  double  tabx00, tabx01, tabx10, tabx11;
+
+#define TABLE_X(x, y) (table[((y)*ystride + (x)*xstride)*2])
+#define TABLE_Y(x, y) (table[((y)*ystride + (x)*xstride)*2 + 1])
+
+  ixf = 1.0 - xf;
+  iyf = 1.0 - yf;
+
+  tabx00 = TABLE_X(xi, yi);
+  tabx10 = TABLE_X(xi+1, yi);
+  tabx01 = TABLE_X(xi, yi+1);
+  tabx11 = TABLE_X(xi+1, yi+1);
+
+  /* Account for interpolating across 360-0 boundary */
+  if ((tabx00 - tabx10) > 359) {
+    tabx00 -= 360.0;
+    tabx01 -= 360.0;
+  } else if ((tabx00 - tabx10) < -359) {
+    tabx10 -= 360.0;
+    tabx11 -= 360.0;
+  }
+
+  *xout =
+    tabx00 * ixf * iyf +
+    tabx10 * xf * iyf +
+    tabx01 * ixf * yf +
+    tabx11 * xf * yf;
+
+  *yout =
+    TABLE_Y(xi, yi)     * ixf * iyf +
+    TABLE_Y(xi+1, yi)   * xf * iyf +
+    TABLE_Y(xi, yi+1)   * ixf * yf +
+    TABLE_Y(xi+1, yi+1) * xf * yf;
+
+#undef TABLE_X
+#undef TABLE_Y
+}
+
 static int
 default_wcsmap_interpolate(struct wcsmap_param_t* m,
                            const double xd, const double yd,
@@ -379,66 +428,39 @@ default_wcsmap_interpolate(struct wcsmap_param_t* m,
                            struct driz_error_t* error) {
 
   int     i;
-  double *xiptr;
-  double *yiptr;
-  double *xoptr;
-  double *yoptr;
-  double *table;
   double  x, y;
   int     xi, yi;
-  double  xf, yf, ixf, iyf;
-  double  tabx00, tabx01, tabx10, tabx11;
+  int     k, ncell;
 
   /* do the bilinear interpolation */
-  xiptr = xin;
-  yiptr = yin;
-  xoptr = xout;
-  yoptr = yout;
-  table = m->table;
-
-#define TABLE_X(x, y) (table[((y)*m->snx + (x))*2])
-#define TABLE_Y(x, y) (table[((y)*m->snx + (x))*2 + 1])
-
   for (i = 0; i < n; ++i) {
-    x = *xiptr++ / m->factor;
-    y = *yiptr++ / m->factor;
+    x = xin[i] / m->factor;
+    y = yin[i] / m->factor;
     xi = (int)floor(x);
     yi = (int)floor(y);
-    xf = x - (double)xi;
-    yf = y - (double)yi;
-    ixf = 1.0 - xf;
-    iyf = 1.0 - yf;
 
-    tabx00 = TABLE_X(xi, yi);
-    tabx10 = TABLE_X(xi+1, yi);
-    tabx01 = TABLE_X(xi, yi+1);
-    tabx11 = TABLE_X(xi+1, yi+1);
-
-    /* Account for interpolating across 360-0 boundary */
-    if ((tabx00 - tabx10) > 359) {
-      tabx00 -= 360.0;
-      tabx01 -= 360.0;
-    } else if ((tabx00 - tabx10) < -359) {
-      tabx10 -= 360.0;
-      tabx11 -= 360.0;
+    if (m->cell_level != NULL) {
+      /* Use the nodes of the cell if it has been subdivided */
+      k = CLAMP(yi, 0, m->sny - 2) * (m->snx - 1) + CLAMP(xi, 0, m->snx - 2);
+      if (m->cell_level[k]) {
+        /* The nodes of the cell are part of a [2 ncell + 1]**2 grid */
+        ncell = 1 << m->cell_level[k];
+        x = (x - (double)CLAMP(xi, 0, m->snx - 2)) * ncell;
+        y = (y - (double)CLAMP(yi, 0, m->sny - 2)) * ncell;
+        xi = CLAMP((int)floor(x), 0, ncell - 1);
+        yi = CLAMP((int)floor(y), 0, ncell - 1);
+        interpolate_nodes(m->refined + m->cell_offset[k], 1, 2 * ncell + 1,
+                          xi, yi, x - (double)xi, y - (double)yi,
+                          xout + i, yout + i);
+        continue;
+      }
     }
 
-    *xoptr++ =
-      tabx00 * ixf * iyf +
-      tabx10 * xf * iyf +
-      tabx01 * ixf * yf +
-      tabx11 * xf * yf;
-
-    *yoptr++ =
-      TABLE_Y(xi, yi)     * ixf * iyf +
-      TABLE_Y(xi+1, yi)   * xf * iyf +
-      TABLE_Y(xi, yi+1)   * ixf * yf +
-      TABLE_Y(xi+1, yi+1) * xf * yf;
+    interpolate_nodes(m->table, 1, m->snx,
+                      xi, yi, x - (double)xi, y - (double)yi,
+                      xout + i, yout + i);
   }
 
-#undef TABLE_X
-#undef TABLE_Y
-
   return 0;
 }
 
@@ -467,27 +489,280 @@ default_wcsmap(void* state,
   }
 }
 
+/* Transform the n (x, y) pairs of pixel coordinates in pixcrd through the
+   full input WCS and the linear output WCS. */
+static int
+wcsmap_eval(pipeline_t* input,
+            pipeline_t* output,
+            const int n,
+            double* pixcrd /*[n][2]*/,
+            /* Output parameters */
+            double* xyout /*[n][2]*/,
+            struct driz_error_t* error) {
+  double *tmp    = NULL;
+  double *phi    = NULL;
+  double *theta  = NULL;
+  double *imgcrd = NULL;
+  int    *stat   = NULL;
+  int     istat;
+  int     status = 1;
+
+  tmp = malloc(n * 2 * sizeof(double));
+  phi = malloc(n * sizeof(double));
+  theta = malloc(n * sizeof(double));
+  imgcrd = malloc(n * 2 * sizeof(double));
+  stat = malloc(n * sizeof(int));
+  if (tmp == NULL || phi == NULL || theta == NULL || imgcrd == NULL ||
+      stat == NULL) {
+    driz_error_set_message(error, "Out of memory");
+    goto exit;
+  }
+
+  wcsprm_python2c(input->wcs);
+  istat = pipeline_all_pixel2world(input, n, 2, pixcrd, tmp);
+  wcsprm_c2python(input->wcs);
+
+  if (istat) {
+    driz_error_set_message(error, wcslib_get_error_message(istat));
+    goto exit;
+  }
+
+  wcsprm_python2c(output->wcs);
+  istat = wcss2p(output->wcs, n, 2, tmp, phi, theta, imgcrd, xyout, stat);
+  wcsprm_c2python(output->wcs);
+
+  if (istat) {
+    driz_error_set_message(error, wcslib_get_error_message(istat));
+    goto exit;
+  }
+
+  status = 0;
+
+ exit:
+
+  free(tmp);
+  free(phi);
+  free(theta);
+  free(imgcrd);
+  free(stat);
+
+  return status;
+}
+
+/* Largest distance (in output pixels) between the odd nodes of a
+   [2n + 1][2n + 1] grid of exactly transformed positions and their
+   bilinear interpolation from the even nodes.  Positions that could not
+   be transformed (NaN) are ignored. */
+static double
+interpolation_error(const double* grid, const int stride, const int n) {
+  int     a, b;
+  int     xi, yi;
+  double  x, y;
+  double  err;
+  double  max_error = 0.0;
+
+  for (b = 0; b <= 2 * n; ++b) {
+    for (a = 0; a <= 2 * n; ++a) {
+      if (!(a & 1) && !(b & 1)) continue;
+
+      xi = CLAMP_BELOW(a / 2, n - 1);
+      yi = CLAMP_BELOW(b / 2, n - 1);
+      interpolate_nodes(grid, 2, 2 * stride,
+                        xi, yi, 0.5 * a - xi, 0.5 * b - yi, &x, &y);
+
+      err = hypot(x - grid[(b * stride + a) * 2],
+                  y - grid[(b * stride + a) * 2 + 1]);
+      if (err > max_error) max_error = err;
+    }
+  }
+
+  return max_error;
+}
+
+/* Maximum number of positions transformed at once while refining */
+#define REFINE_CHUNK_SIZE 65536
+#define REFINE_MAX_LEVEL 16
+
+/* Build the adaptive table.  The interpolation error of each cell of the
+   grid spaced by m->factor is measured at the nodes of a grid twice as
+   fine, and cells where it is larger than m->tolerance are subdivided
+   until it is not.  Since they have been computed anyway, the finer
+   nodes are the ones kept in the table; the error of the coarser grid
+   (stored in m->max_error) is a conservative estimate of their error.
+
+   On return, m->table is the grid spaced by m->factor / 2 and the cells
+   of that grid refer to the nodes of subdivided cells in m->refined. */
+static int
+default_wcsmap_refine(struct wcsmap_param_t* m,
+                      pipeline_t* input,
+                      pipeline_t* output,
+                      struct driz_error_t* error) {
+  const int ncx = m->snx - 1;
+  const int ncy = m->sny - 1;
+  const int lx = 2 * ncx + 1;
+  const int ly = 2 * ncy + 1;
+  double *pixcrd = NULL;
+  double *grid   = NULL;
+  double *ptr    = NULL;
+  double *nodes  = NULL;
+  int    *active = NULL;
+  int     nactive = 0;
+  int     nnext;
+  size_t  pool_size = 0;
+  size_t  pool_used = 0;
+  int     level, ncell, g, chunk, start, count;
+  int     i, j, a, b, c, k;
+  double  h, err;
+  int     status = 1;
+
+  m->cell_level = calloc((lx - 1) * (ly - 1), sizeof(unsigned char));
+  m->cell_offset = malloc((lx - 1) * (ly - 1) * sizeof(integer_t));
+  active = malloc(ncx * ncy * sizeof(int));
+  pixcrd = malloc(lx * ly * 2 * sizeof(double));
+  m->table = malloc(lx * ly * 2 * sizeof(double));
+  if (m->cell_level == NULL || m->cell_offset == NULL || active == NULL ||
+      pixcrd == NULL || m->table == NULL) {
+    driz_error_set_message(error, "Out of memory");
+    goto exit;
+  }
+
+  h = m->factor / 2.0;
+  ptr = pixcrd;
+  for (j = 0; j < ly; ++j) {
+    for (i = 0; i < lx; ++i) {
+      *ptr++ = (double)i * h;
+      *ptr++ = (double)j * h;
+    }
+  }
+
+  if (wcsmap_eval(input, output, lx * ly, pixcrd, m->table, error)) goto exit;
+
+  m->max_error = 0.0;
+  for (k = 0; k < ncx * ncy; ++k) {
+    i = k % ncx;
+    j = k / ncx;
+    err = interpolation_error(m->table + (2 * j * lx + 2 * i) * 2, lx, 1);
+    if (err > m->tolerance && h > 1.0) {
+      active[nactive++] = k;
+    } else if (err > m->max_error) {
+      m->max_error = err;
+    }
+  }
+
+  free(pixcrd);
+  pixcrd = NULL;
+
+  /* Subdivide the cells that are not accurate enough, one level at a
+     time. */
+  for (level = 1; nactive > 0; ++level) {
+    ncell = 1 << level;
+    g = 2 * ncell + 1;
+    h = m->factor / (2 * ncell);
+    chunk = CLAMP_ABOVE(REFINE_CHUNK_SIZE / (g * g), 1);
+    chunk = CLAMP_BELOW(chunk, nactive);
+
+    pixcrd = malloc(chunk * g * g * 2 * sizeof(double));
+    grid = malloc(chunk * g * g * 2 * sizeof(double));
+    if (pixcrd == NULL || grid == NULL) {
+      driz_error_set_message(error, "Out of memory");
+      goto exit;
+    }
+
+    nnext = 0;
+    for (start = 0; start < nactive; start += chunk) {
+      count = CLAMP_BELOW(chunk, nactive - start);
+
+      ptr = pixcrd;
+      for (c = 0; c < count; ++c) {
+        i = active[start + c] % ncx;
+        j = active[start + c] / ncx;
+        for (b = 0; b < g; ++b) {
+          for (a = 0; a < g; ++a) {
+            *ptr++ = (double)(2 * ncell * i + a) * h;
+            *ptr++ = (double)(2 * ncell * j + b) * h;
+          }
+        }
+      }
+
+      if (wcsmap_eval(input, output, count * g * g, pixcrd, grid, error))
+        goto exit;
+
+      for (c = 0; c < count; ++c) {
+        k = active[start + c];
+        err = interpolation_error(grid + c * g * g * 2, g, ncell);
+        if (err > m->tolerance && h > 1.0 && level < REFINE_MAX_LEVEL) {
+          /* nnext <= start + c, so this does not overwrite cells that
+             still need to be checked */
+          active[nnext++] = k;
+          continue;
+        }
+
+        if (pool_used + g * g * 2 > pool_size) {
+          pool_size = 2 * pool_size + g * g * 2;
+          nodes = realloc(m->refined, pool_size * sizeof(double));
+          if (nodes == NULL) {
+            driz_error_set_message(error, "Out of memory");
+            goto exit;
+          }
+          m->refined = nodes;
+        }
+        memcpy(m->refined + pool_used, grid + c * g * g * 2,
+               g * g * 2 * sizeof(double));
+
+        /* Each cell covers 2 x 2 cells of the table */
+        i = k % ncx;
+        j = k / ncx;
+        for (b = 0; b < 2; ++b) {
+          for (a = 0; a < 2; ++a) {
+            m->cell_level[(2 * j + b) * (lx - 1) + 2 * i + a] =
+              (unsigned char)level;
+            m->cell_offset[(2 * j + b) * (lx - 1) + 2 * i + a] =
+              (integer_t)(pool_used + (b * ncell * g + a * ncell) * 2);
+          }
+        }
+        pool_used += g * g * 2;
+
+        if (err > m->max_error) m->max_error = err;
+      }
+    }
+
+    nactive = nnext;
+    free(pixcrd);
+    free(grid);
+    pixcrd = grid = NULL;
+  }
+
+  m->snx = lx;
+  m->sny = ly;
+  m->factor /= 2.0;
+
+  status = 0;
+
+ exit:
+
+  free(pixcrd);
+  free(grid);
+  free(active);
+
+  return status;
+}
+
 int
 default_wcsmap_init(struct wcsmap_param_t* m,
                     pipeline_t* input,
                     pipeline_t* output,
                     int nx, int ny,
                     double factor,
+                    double tolerance,
                     struct driz_error_t* error) {
   int     n;
-  int     table_size;
   double *pixcrd = NULL;
   double *ptr    = NULL;
-  double *tmp    = NULL;
-  double *phi    = NULL;
-  double *theta  = NULL;
-  double *imgcrd = NULL;
-  int    *stat   = NULL;
   int     snx = nx + 2;
   int     sny = ny + 2;
   int     i;
   int     j;
-  int     istat;
+  int     status = 1;
 
   assert(m);
   assert(input);
@@ -499,102 +774,51 @@ default_wcsmap_init(struct wcsmap_param_t* m,
   if (factor > 0) {
     snx = (int)((double)nx / factor) + 2;
     sny = (int)((double)ny / factor) + 2;
+  }
 
-    n = (snx) * (sny);
-    table_size = n << 1;
-
-    pixcrd = malloc(table_size * sizeof(double));
-    if (pixcrd == NULL) {
-      driz_error_set_message(error, "Out of memory");
-      goto exit;
-    }
-
-    m->table = malloc(table_size * sizeof(double));
-    if (m->table == NULL) {
-      driz_error_set_message(error, "Out of memory");
-      goto exit;
-    }
-
-    tmp = malloc(table_size * sizeof(double));
-    if (tmp == NULL) {
-      driz_error_set_message(error, "Out of memory");
-      goto exit;
-    }
-
-    phi = malloc(n * sizeof(double));
-    if (phi == NULL) {
-      driz_error_set_message(error, "Out of memory");
-      goto exit;
-    }
-
-    theta = malloc(n * sizeof(double));
-    if (theta == NULL) {
-      driz_error_set_message(error, "Out of memory");
-      goto exit;
-    }
-
-    imgcrd = malloc(table_size * sizeof(double));
-    if (imgcrd == NULL) {
-      driz_error_set_message(error, "Out of memory");
-      goto exit;
-    }
+  m->nx = nx;
+  m->ny = ny;
+  m->snx = snx;
+  m->sny = sny;
+  m->factor = factor;
+  m->tolerance = tolerance;
 
-    stat = malloc(n * sizeof(int));
-    if (stat == NULL) {
-      driz_error_set_message(error, "Out of memory");
-      goto exit;
-    }
+  if (factor > 0) {
+    n = (snx) * (sny);
 
-    ptr = pixcrd;
-    for (j = 0; j < sny; ++j) {
-      for (i = 0; i < snx; ++i) {
-        *ptr++ = (double)i * factor;
-        *ptr++ = (double)j * factor;
+    if (tolerance > 0) {
+      if (default_wcsmap_refine(m, input, output, error)) goto exit;
+    } else {
+      m->table = malloc(n * 2 * sizeof(double));
+      pixcrd = malloc(n * 2 * sizeof(double));
+      if (m->table == NULL || pixcrd == NULL) {
+        driz_error_set_message(error, "Out of memory");
+        goto exit;
       }
-    }
-
-    wcsprm_python2c(input->wcs);
-    istat = pipeline_all_pixel2world(input, n, 2, pixcrd, tmp);
-    wcsprm_c2python(input->wcs);
 
-    if (istat) {
-      free(m->table);
-      m->table = NULL;
-      driz_error_set_message(error, wcslib_get_error_message(istat));
-      goto exit;
-    }
-
-    wcsprm_python2c(output->wcs);
-    istat = wcss2p(output->wcs, n, 2, tmp, phi, theta, imgcrd, m->table, stat);
-    wcsprm_c2python(output->wcs);
+      ptr = pixcrd;
+      for (j = 0; j < sny; ++j) {
+        for (i = 0; i < snx; ++i) {
+          *ptr++ = (double)i * factor;
+          *ptr++ = (double)j * factor;
+        }
+      }
 
-    if (istat) {
-      free(m->table);
-      m->table = NULL;
-      driz_error_set_message(error, wcslib_get_error_message(istat));
-      goto exit;
+      if (wcsmap_eval(input, output, n, pixcrd, m->table, error)) goto exit;
     }
   } /* End if_then for factor > 0 */
 
   m->input_wcs = input;
   m->output_wcs = output;
 
-  m->nx = nx;
-  m->ny = ny;
-  m->snx = snx;
-  m->sny = sny;
-  m->factor = factor;
+  status = 0;
 
  exit:
 
   free(pixcrd);
-  free(tmp);
-  free(phi);
-  free(theta);
-  free(imgcrd);
-  free(stat);
+  if (status) wcsmap_param_free(m);
 
-  return 0;
+  return status;
 }
 
 void
@@ -611,6 +835,9 @@ wcsmap_param_dump(struct wcsmap_param_t* m) {
 void
 wcsmap_param_free(struct wcsmap_param_t* m) {
   free(m->table);
+  free(m->refined);
+  free(m->cell_level);
+  free(m->cell_offset);
   wcsmap_param_init(m);
 }
 
@@ -622,6 +849,95 @@ wcsmap_param_init(struct wcsmap_param_t* m) {
   m->input_wcs = NULL;
   m->output_wcs = NULL;
   m->table = NULL;
+  m->tolerance = 0.0;
+  m->max_error = NAN;
+  m->refined = NULL;
+  m->cell_level = NULL;
+  m->cell_offset = NULL;
+}
+
+/*
+
+Precomputed pixel-map mapping code
+
+*/
+void
+pixmap_param_init(struct pixmap_param_t* m) {
+  assert(m);
+
+  m->table = NULL;
+  m->nx = 0;
+  m->ny = 0;
+}
+
+int
+pixmap_mapping(void* state,
+               const double xd UNUSED_PARAM, const double yd UNUSED_PARAM,
+               const integer_t n,
+               double* xin /*[n]*/, double* yin /*[n]*/,
+               /* Output parameters */
+               double* xout, double* yout,
+               struct driz_error_t* error) {
+
+  struct pixmap_param_t* m = (struct pixmap_param_t*)state;
+  const float*  table;
+  integer_t i;
+  integer_t xi, yi, xi1, yi1;
+  double    x, y, xf, yf, ixf, iyf;
+  double    w00, w10, w01, w11;
+
+  assert(m);
+  assert(m->table);
+
+  if (m->nx < 1 || m->ny < 1) {
+    driz_error_set_message(error, "Empty pixel map");
+    return 1;
+  }
+
+  table = m->table;
+
+#define PIXMAP_X(x, y) ((double)table[((y)*m->nx + (x))*2])
+#define PIXMAP_Y(x, y) ((double)table[((y)*m->nx + (x))*2 + 1])
+
+  for (i = 0; i < n; ++i) {
+    /* Pixel map nodes sit on (1-based) input pixel centers */
+    x = xin[i] - 1.0;
+    y = yin[i] - 1.0;
+
+    /* Clamping the cell index makes the bilinear interpolation fall back
+       to linear extrapolation beyond the first and last pixel centers */
+    xi = CLAMP((integer_t)floor(x), 0, MAX(m->nx - 2, 0));
+    yi = CLAMP((integer_t)floor(y), 0, MAX(m->ny - 2, 0));
+    xi1 = MIN(xi + 1, m->nx - 1);
+    yi1 = MIN(yi + 1, m->ny - 1);
+
+    xf = (xi1 == xi) ? 0.0 : x - (double)xi;
+    yf = (yi1 == yi) ? 0.0 : y - (double)yi;
+    ixf = 1.0 - xf;
+    iyf = 1.0 - yf;
+
+    w00 = ixf * iyf;
+    w10 = xf * iyf;
+    w01 = ixf * yf;
+    w11 = xf * yf;
+
+    xout[i] =
+      PIXMAP_X(xi, yi)   * w00 +
+      PIXMAP_X(xi1, yi)  * w10 +
+      PIXMAP_X(xi, yi1)  * w01 +
+      PIXMAP_X(xi1, yi1) * w11;
+
+    yout[i] =
+      PIXMAP_Y(xi, yi)   * w00 +
+      PIXMAP_Y(xi1, yi)  * w10 +
+      PIXMAP_Y(xi, yi1)  * w01 +
+      PIXMAP_Y(xi1, yi1) * w11;
+  }
+
+#undef PIXMAP_X
+#undef PIXMAP_Y
+
+  return 0;
 }
 
 /*
@@ -18,6 +18,17 @@ struct wcsmap_param_t {
   int         nx, ny;
   int         snx, sny;
   double      factor;
+  /* Adaptive grid: cells of table (spaced by factor) whose interpolation
+     error exceeds tolerance are subdivided 2**cell_level times.  The
+     nodes of a subdivided cell start at refined[cell_offset] and are part
+     of a [2**(level + 1) + 1][2**(level + 1) + 1][2] array.  max_error is
+     the largest interpolation error (in output pixels) estimated for any
+     cell, or NaN when tolerance is not used. */
+  double         tolerance;
+  double         max_error;
+  double*        refined;
+  unsigned char* cell_level;
+  integer_t*     cell_offset;
 };
 
 /**
@@ -43,16 +54,56 @@ default_wcsmap(void* state,
                 /* Output parameters */
                 double* xout, double* yout,
                 struct driz_error_t* error);
+
+/**
+Set up the mapping from input to output pixels.  When factor > 0, the
+WCS is evaluated on a grid spaced by factor pixels and interpolated
+bilinearly in-between.  When tolerance > 0 as well, grid cells where the
+interpolation error exceeds tolerance (in output pixels) are halved
+until the error is within tolerance or the spacing reaches one pixel.
+*/
 int
 default_wcsmap_init(struct wcsmap_param_t* m,
                     pipeline_t* input,
                     pipeline_t* output,
                     int nx, int ny, double factor,
+                    double tolerance,
                     /* Output parameters */
                     struct driz_error_t* error);
 
 /**
 
+Declarations for supporting precomputed pixel-map transformations.
+
+The pixel map is a [ny][nx][2] array holding, for each (1-based)
+input pixel center (i+1, j+1), the (1-based) output pixel coordinates
+it maps to.  Positions between pixel centers (such as the corners of
+the square kernel footprint) are bilinearly interpolated, and
+positions past the edges are linearly extrapolated from the nearest
+two pixel centers.  The map is stored in single precision, which holds
+output positions to within 2**-24 of their value, i.e. better than
+1e-3 pixels for outputs up to 16384 pixels across.
+
+*/
+struct pixmap_param_t {
+  const float*  table; /* [ny][nx][2] */
+  integer_t     nx, ny;
+};
+
+void
+pixmap_param_init(struct pixmap_param_t* m);
+
+int
+pixmap_mapping(void* state,
+               const double xd, const double yd,
+               const integer_t n,
+               double* xin /*[n]*/, double* yin /*[n]*/,
+               /* Output parameters */
+               double* xout, double* yout,
+               struct driz_error_t* error);
+
+/**
+
 Declarations for supporting the DefaultMapping (pixel-based)
 transformations.
 
@@ -171,8 +171,28 @@ driz_param_init(struct driz_param_t* p) {
   p->output_context = NULL;
   p->output_done = NULL;
 
+  /* Sub-windows, set by the callers */
+  p->out_xmin = 0;
+  p->out_xmax = 0;
+  p->out_ymin = 0;
+  p->out_ymax = 0;
+  p->out_xoff = 0;
+  p->out_yoff = 0;
+  p->ctx_xoff = 0;
+  p->ctx_yoff = 0;
+  p->ctx_nx = 0;
+  p->ctx_ny = 0;
+  p->in_xmin = 0;
+  p->in_xmax = 0;
+  p->in_ymin = 0;
+  p->in_ymax = 0;
+  p->no_over = FALSE;
+
   p->lanczos.lut = NULL;
   p->lanczos.space = 1.0;
+  p->kernel_lut = NULL;
+  p->kernel_wx = NULL;
+  p->kernel_wy = NULL;
 
   for (i = 0; i < MAXEN * MAXIM; ++i)
     p->intab[i] = 0;
@@ -372,18 +392,113 @@ create_lanczos_lut(const int kernel_order, const size_t npix,
   }
 }
 
+/* Cached kernel look-up tables */
+#define MAX_KERNEL_LUTS 16
+static struct kernel_lut_t kernel_luts[MAX_KERNEL_LUTS];
+static integer_t n_kernel_luts = 0;
+
+/* Kernel coordinate beyond which the Gaussian profile, exp(-s^2), is
+   negligible: the weights underflow single precision */
+static const double gaussian_lut_extent = 14.0;
+
+const struct kernel_lut_t*
+get_kernel_lut(const enum e_kernel_t kernel, const integer_t resolution,
+               struct driz_error_t* error) {
+  struct kernel_lut_t* lut;
+  float* lanczos_lut = NULL;
+  integer_t i, kernel_order, nsamples;
+  double s;
+
+  assert(error);
+
+  if (kernel != kernel_gaussian &&
+      kernel != kernel_lanczos2 && kernel != kernel_lanczos3) {
+    return NULL;
+  }
+
+  if (resolution < 0) {
+    driz_error_format_message(error, "Invalid kernel LUT resolution %d "
+                              "(must be positive, or 0 for the default)",
+                              (int)resolution);
+    return NULL;
+  }
+  if (resolution > 0) {
+    nsamples = resolution;
+  } else if (kernel == kernel_gaussian) {
+    nsamples = KERNEL_LUT_GAUSSIAN_RESOLUTION;
+  } else {
+    nsamples = KERNEL_LUT_LANCZOS_RESOLUTION;
+  }
+
+  lut = &kernel_luts[0];
+  for (i = 0; i < n_kernel_luts; ++i, ++lut) {
+    if (lut->kernel == kernel && lut->resolution == nsamples) {
+      return lut;
+    }
+  }
+
+  if (n_kernel_luts >= MAX_KERNEL_LUTS) {
+    driz_error_set_message(error, "Too many kernel look-up tables");
+    return NULL;
+  }
+
+  lut->kernel = kernel;
+  lut->resolution = nsamples;
+  lut->dlut = NULL;
+
+  if (kernel == kernel_gaussian) {
+    /* Gaussian profile exp(-s^2) and its derivative, for Hermite
+       interpolation */
+    lut->space = 1.0 / (double)nsamples;
+    lut->nlut = (size_t)ceil(gaussian_lut_extent / lut->space) + 2;
+    lut->lut = malloc(lut->nlut * sizeof(double));
+    lut->dlut = malloc(lut->nlut * sizeof(double));
+    if (lut->lut == NULL || lut->dlut == NULL) {
+      goto kernel_lut_error_;
+    }
+    for (i = 0; i < (integer_t)lut->nlut; ++i) {
+      s = (double)i * lut->space;
+      lut->lut[i] = exp(-s * s);
+      lut->dlut[i] = -2.0 * s * lut->lut[i];
+    }
+  } else {
+    /* Lanczos profile sampled as in create_lanczos_lut, with the
+       spacing rounded to single precision like the historical table */
+    kernel_order = (kernel == kernel_lanczos2) ? 2 : 3;
+    lut->space = (float)(1.0 / (double)nsamples);
+    lut->nlut = (size_t)ceil((double)kernel_order / lut->space) + 2;
+    lut->lut = malloc(lut->nlut * sizeof(double));
+    lanczos_lut = malloc(lut->nlut * sizeof(float));
+    if (lut->lut == NULL || lanczos_lut == NULL) {
+      goto kernel_lut_error_;
+    }
+    create_lanczos_lut(kernel_order, lut->nlut, (float)lut->space,
+                       lanczos_lut);
+    for (i = 0; i < (integer_t)lut->nlut; ++i) {
+      lut->lut[i] = (double)lanczos_lut[i];
+    }
+    free(lanczos_lut);
+  }
+
+  ++n_kernel_luts;
+  return lut;
+
+ kernel_lut_error_:
+  free(lut->lut); lut->lut = NULL;
+  free(lut->dlut); lut->dlut = NULL;
+  free(lanczos_lut);
+  driz_error_set_message(error, "Out of memory");
+  return NULL;
+}
+
 void
 put_fill(struct driz_param_t* p, const float fill_value) {
   integer_t i, j;
-  integer_t onx, ony;
 
   assert(p);
 
-  onx = p->xmax - p->xmin + 1;
-  ony = p->ymax - p->ymin + 1;
-
-  for (j = 0; j < ony; ++j) {
-    for (i = 0; i < onx; ++i) {
+  for (j = p->out_ymin - 1; j < p->out_ymax; ++j) {
+    for (i = p->out_xmin - 1; i < p->out_xmax; ++i) {
       if (*output_counts_ptr(p, i, j) == 0.0) {
         *output_data_ptr(p, i, j) = fill_value;
       }
@@ -138,6 +138,23 @@ struct lanczos_param_t {
   float misval;
 };
 
+/* Look-up table of the one-dimensional profile of a drizzle kernel.
+
+   The Gaussian and Lanczos kernels are separable, so their weights are
+   products of the profile values for the X and Y offsets.  The profile is
+   tabulated as a function of a kernel coordinate independent of the scale
+   and pixfrac (offset / sigma / sqrt(2) for the Gaussian, offset in units of
+   the Lanczos support), so one table serves all the chips and calls with
+   the same kernel and resolution (see get_kernel_lut). */
+struct kernel_lut_t {
+  enum e_kernel_t kernel;
+  integer_t resolution; /* Samples per unit of the kernel coordinate */
+  double space;         /* Sample spacing */
+  size_t nlut;
+  double* lut;          /* [nlut] profile values */
+  double* dlut;         /* [nlut] profile derivatives (Gaussian only) */
+};
+
 typedef int (*mapping_callback_t) \
   (void* state,
    const double, const double,
@@ -202,6 +219,31 @@ struct driz_param_t {
   integer_t ymin;
   integer_t ymax;
 
+  /* Sub-window of the output frame to resample onto (1-based,
+     inclusive) and position (0-based) of the first pixel of the output
+     arrays in the output frame.  The output arrays may hold just a tile
+     of the output frame. */
+  integer_t out_xmin;
+  integer_t out_xmax;
+  integer_t out_ymin;
+  integer_t out_ymax;
+  integer_t out_xoff;
+  integer_t out_yoff;
+
+  /* Position (0-based) of the first pixel of the context array in the
+     output frame and its size.  The context array may cover just the
+     sub-window resampled onto. */
+  integer_t ctx_xoff;
+  integer_t ctx_yoff;
+  integer_t ctx_nx;
+  integer_t ctx_ny;
+
+  /* Sub-window of the input image to drizzle (1-based, inclusive) */
+  integer_t in_xmin;
+  integer_t in_xmax;
+  integer_t in_ymin;
+  integer_t in_ymax;
+
   bool_t sub;
   bool_t no_over;
 
@@ -225,6 +267,10 @@ struct driz_param_t {
     double es;
   } gaussian;
   struct lanczos_param_t lanczos;
+  /* Shared kernel profile and scratch space for the X and Y weights */
+  const struct kernel_lut_t* kernel_lut;
+  double* kernel_wx;
+  double* kernel_wy;
 
   /* Scaling */
   enum e_align_t align;
@@ -266,10 +312,13 @@ weights_ptr(struct driz_param_t* p, integer_t x, integer_t y) {
   return (p->weights + (y * p->dnx) + x);
 }
 
+/* The output accessors take (0-based) positions in the output frame */
 static inline_macro float*
 output_data_ptr(struct driz_param_t* p, integer_t x, integer_t y) {
   assert(p);
   assert(p->output_data);
+  x -= p->out_xoff;
+  y -= p->out_yoff;
   assert(x >= 0 && x < p->onx);
   assert(y >= 0 && y < p->ony);
   return (p->output_data + (y * p->onx) + x);
@@ -279,6 +328,8 @@ static inline_macro float*
 output_counts_ptr(struct driz_param_t* p, integer_t x, integer_t y) {
   assert(p);
   assert(p->output_counts);
+  x -= p->out_xoff;
+  y -= p->out_yoff;
   assert(x >= 0 && x < p->onx);
   assert(y >= 0 && y < p->ony);
   return (p->output_counts + (y * p->onx) + x);
@@ -288,15 +339,19 @@ static inline_macro integer_t*
 output_context_ptr(struct driz_param_t* p, integer_t x, integer_t y) {
   assert(p);
   assert(p->output_context);
-  assert(x >= 0 && x < p->onx);
-  assert(y >= 0 && y < p->ony);
-  return (p->output_context + (y * p->onx) + x);
+  x -= p->ctx_xoff;
+  y -= p->ctx_yoff;
+  assert(x >= 0 && x < p->ctx_nx);
+  assert(y >= 0 && y < p->ctx_ny);
+  return (p->output_context + (y * p->ctx_nx) + x);
 }
 
 static inline_macro integer_t*
 output_done_ptr(struct driz_param_t* p, integer_t x, integer_t y) {
   assert(p);
   assert(p->output_done);
+  x -= p->out_xoff;
+  y -= p->out_yoff;
   assert(x >= 0 && x < p->onx);
   assert(y >= 0 && y < p->ony);
   return (p->output_done + (y * p->onx) + x);
@@ -368,6 +423,60 @@ void
 create_lanczos_lut(const int kernel_order, const size_t npix,
                    const float del, float* lanczos_lut);
 
+/**
+Default resolution of the kernel look-up tables (samples per unit of the
+kernel coordinate).
+
+Gaussian profile values are interpolated with cubic Hermite polynomials,
+with an error of at most space^4 * 12 / 384 = 1 / (32 * resolution^4) of
+the peak (7e-12 for the default resolution).  Lanczos profile values are
+the nearest sample, with an index offset of one sample as in the original
+Fortran code, for an error of at most 1.5 * space * max|L'|, i.e.,
+1.5 / resolution for the Lanczos kernels: the default of 100 samples per
+unit reproduces the historical table spacing of 0.01.
+*/
+#define KERNEL_LUT_GAUSSIAN_RESOLUTION 256
+#define KERNEL_LUT_LANCZOS_RESOLUTION 100
+
+/**
+Return the look-up table of the profile of a kernel, creating it on first
+use.  Tables are cached for the lifetime of the process and must not be
+freed by the caller.
+
+@param kernel the drizzle kernel.  Only the Gaussian and Lanczos kernels
+   use a table; NULL is returned (without error) for the others.
+
+@param resolution the number of samples per unit of the kernel coordinate,
+   or 0 for the default resolution of the kernel.
+
+Creating a table is not thread-safe: callers must serialize the calls
+(the Python module holds the GIL).
+*/
+const struct kernel_lut_t*
+get_kernel_lut(const enum e_kernel_t kernel, const integer_t resolution,
+               struct driz_error_t* error);
+
+/**
+Evaluate the (Gaussian) kernel profile at s >= 0 by cubic Hermite
+interpolation of the table; zero beyond the end of the table.
+*/
+static inline_macro double
+kernel_lut_hermite(const struct kernel_lut_t* lut, const double s) {
+  const double t = s / lut->space;
+  size_t k;
+  double u, u1;
+
+  if (t >= (double)(lut->nlut - 1)) return 0.0;
+  k = (size_t)t;
+  u = t - (double)k;
+  u1 = 1.0 - u;
+
+  return (lut->lut[k] * (1.0 + 2.0 * u) +
+          lut->dlut[k] * lut->space * u) * u1 * u1 +
+         (lut->lut[k+1] * (3.0 - 2.0 * u) -
+          lut->dlut[k+1] * lut->space * u1) * u * u;
+}
+
 void
 put_fill(struct driz_param_t* p, const float fill_value);
 
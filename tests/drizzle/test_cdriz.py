@@ -2,6 +2,7 @@ import pytest
 import os
 import numpy as np
 import cdriz_setup
+from drizzlepac import cdriz
 
 
 @pytest.fixture
@@ -70,3 +71,261 @@ def test_lanczos3_kernel(kernel_pars, return_png=False):
     if return_png:
         cdriz_setup.generate_png(kernel_pars, output_fullpath)
     assert np.allclose(np.sum(kernel_pars.outsci), 9882.103, 1e-3)
+
+
+@pytest.mark.parametrize("kernel", ["square", "point", "turbo", "gaussian", "lanczos3"])
+def test_pixmap_matches_wcs_mapping(kernel):
+    """A precomputed pixel map gives the same result as the per-row mapping."""
+    from drizzlepac import wcs_functions
+
+    results = []
+    for use_pixmap in [False, True]:
+        pars = cdriz_setup.Get_Grid(inx=10, iny=10, outx=13, outy=13)
+        # Keep the input pixel centers off the output pixel edges, where the
+        # point kernel depends on the last bit of their position
+        pars.w2.wcs.crpix += 0.25
+        pars.w2.wcs.set()
+        pars.mapping = cdriz.DefaultWCSMapping(
+            pars.w1, pars.w2, pars.in_grid[0], pars.in_grid[1], 1
+        )
+        if use_pixmap:
+            pars.mapping = wcs_functions.calc_pixmap(
+                pars.w1, pars.w2, shape=pars.in_grid
+            )
+        cdriz_setup.cdriz_call(pars, kernel)
+        results.append((pars.outsci, pars.outwht))
+
+    assert np.allclose(results[0][0], results[1][0], atol=1e-6)
+    assert np.allclose(results[0][1], results[1][1], atol=1e-6)
+
+
+@pytest.mark.parametrize("kernel", ["square", "point", "turbo", "gaussian", "lanczos3"])
+def test_bbox_matches_full_output(kernel):
+    """Drizzling onto the planned bounding box of the input only gives the
+    same result as drizzling onto the whole output."""
+    from astropy.io import fits
+    from stwcs.wcsutil import HSTWCS
+
+    from drizzlepac import adrizzle, wcs_functions
+
+    pars = cdriz_setup.Get_Grid(inx=20, iny=12, outx=30, outy=50)
+    pars.w1.wcs.crpix = [10.0, -8.0]
+    pars.w1.wcs.set()
+    pars.w1.pixel_shape = (20, 12)
+    pars.w2.pixel_shape = (30, 50)
+    outwcs = HSTWCS(fits.HDUList([fits.PrimaryHDU(header=pars.w2.to_header())]))
+    pixmap = wcs_functions.calc_pixmap(pars.w1, pars.w2, shape=pars.in_grid)
+
+    margin = adrizzle._kernel_margin({"kernel": kernel, "pixfrac": 1.0}, 1.0)
+    bbox = wcs_functions.calc_output_bbox(pars.w1, pars.w2, margin=margin)
+    assert bbox[2] > 0 and bbox[3] < 50
+
+    results = []
+    for drizzle_bbox in [None, bbox]:
+        outsci = np.full(pars.out_grid, -1, dtype=np.float32)
+        outwht = np.zeros(pars.out_grid, dtype=np.float32)
+        outctx = np.zeros(pars.out_grid, dtype=np.int32)
+        adrizzle.do_driz(
+            pars.insci, None, pars.inwht, outwcs, outsci, outwht, outctx,
+            1.0, "cps", 1.0, wcslin_pscale=outwcs.pscale, kernel=kernel,
+            fillval=0, pixmap=pixmap, bbox=drizzle_bbox,
+        )
+        results.append((outsci, outwht, outctx))
+
+    (sci, wht, ctx), (box_sci, box_wht, box_ctx) = results
+    window = np.s_[bbox[2]:bbox[3], bbox[0]:bbox[1]]
+    assert np.any(wht > 0)
+    assert np.array_equal(box_sci[window], sci[window])
+    assert np.array_equal(box_wht, wht)
+    assert np.array_equal(box_ctx, ctx)
+    # Pixels outside of the bounding box are not even filled
+    box_sci[window] = -1
+    assert np.all(box_sci == -1)
+
+
+@pytest.mark.parametrize("kernel", ["square", "point", "turbo", "gaussian", "lanczos3"])
+def test_tiles_match_full_output(kernel):
+    """Drizzling the overlapping input rows onto tiles of the output gives
+    the same result as drizzling onto the whole output."""
+    pars = cdriz_setup.Get_Grid(inx=40, iny=40, outx=40, outy=40)
+    pars.insci[:] = np.arange(1600, dtype=np.float32).reshape(40, 40)
+    pixmap = np.dstack(np.indices(pars.in_grid, dtype=np.float64)[::-1])
+    pixmap = pixmap * 0.9 + 3.3
+    args = (1, 0, 1, 1, 40, 1.0, 1.0, 1.0, "center", 1.0, kernel, "cps",
+            1.0, 1.0, "INDEF", 0, 0, 1, pixmap)
+
+    cdriz.tdriz(pars.insci, pars.inwht, pars.outsci, pars.outwht,
+                pars.outctx, *args)
+
+    margin = 5
+    for y0 in range(0, 40, 16):
+        y1 = min(y0 + 16, 40)
+        rows = np.flatnonzero((pixmap[:, 0, 1] >= y0 + 1 - margin) &
+                              (pixmap[:, 0, 1] <= y1 + margin))
+        tile = [np.zeros((y1 - y0, 40), dtype=dtype)
+                for dtype in (np.float32, np.float32, np.int32)]
+        _, _, tile_nskip = cdriz.tdriz(
+            pars.insci, pars.inwht, *tile, 1, 0, 1, y0 + 1, 40, *args[5:],
+            in_window=(1, 40, rows[0] + 1, rows[-1] + 1),
+        )
+        assert tile_nskip >= 40 - rows.size
+        assert np.array_equal(tile[0], pars.outsci[y0:y1])
+        assert np.array_equal(tile[1], pars.outwht[y0:y1])
+        assert np.array_equal(tile[2], pars.outctx[y0:y1])
+
+
+def test_blot_out_window():
+    """Blotting onto a window of the output leaves the other pixels alone."""
+    pars = cdriz_setup.Get_Grid(inx=30, iny=30, outx=20, outy=20)
+    pars.insci[:] = np.arange(900, dtype=np.float32).reshape(30, 30)
+    pixmap = np.dstack(np.indices(pars.out_grid, dtype=np.float64)[::-1])
+    pixmap = pixmap * 1.1 + 2.0
+    args = (1, 30, 1, 30, 1.0, 1.0, 1.0, 1.0, "center", "poly5",
+            1.0, 0.0, 1.0, 0, pixmap)
+
+    full = np.zeros(pars.out_grid, dtype=np.float32)
+    cdriz.tblot(pars.insci, full, *args)
+
+    window = np.full(pars.out_grid, -1, dtype=np.float32)
+    cdriz.tblot(pars.insci, window, *args, out_window=(3, 12, 5, 20))
+    assert np.array_equal(window[4:20, 2:12], full[4:20, 2:12])
+    window[4:20, 2:12] = -1
+    assert np.all(window == -1)
+
+
+@pytest.mark.parametrize("kernel", ["gaussian", "lanczos3"])
+def test_kernel_lut_resolution(kernel):
+    """The kernel profile tables approach the exact kernel weights as their
+    resolution increases, within the documented bounds."""
+    pars = cdriz_setup.Get_Grid(inx=30, iny=30, outx=40, outy=40)
+    pixmap = np.dstack(np.indices(pars.in_grid, dtype=np.float64)[::-1])
+    pixmap = pixmap * 1.2 + 4.7
+
+    def drizzle(**kwargs):
+        out = [np.zeros(pars.out_grid, dtype=dtype)
+               for dtype in (np.float32, np.float32, np.int32)]
+        cdriz.tdriz(pars.insci, pars.inwht, *out, 1, 0, 1, 1, 30, 1.2, 1.0,
+                    1.0, "center", 0.8, kernel, "cps", 1.0, 1.0, "INDEF",
+                    0, 0, 1, pixmap, **kwargs)
+        return out[1]
+
+    wht = drizzle()
+    assert np.any(wht > 0)
+    if kernel == "gaussian":
+        # at most 1 / (32 * 4**4) of the peak weight per contribution:
+        coarse = drizzle(lut_resolution=4)
+        assert not np.array_equal(coarse, wht)
+        assert np.allclose(coarse, wht, rtol=0, atol=5e-4 * wht.max())
+        assert np.allclose(drizzle(lut_resolution=64), wht, rtol=1e-6)
+    else:
+        # the default matches the historical sampling of the table
+        assert np.array_equal(drizzle(lut_resolution=100), wht)
+        fine = drizzle(lut_resolution=10000)
+        assert np.allclose(fine, wht, rtol=0, atol=0.05 * wht.max())
+
+    with pytest.raises(Exception, match="resolution"):
+        drizzle(lut_resolution=-1)
+
+
+def _square_parity_pixmap(case, shape):
+    y, x = np.indices(shape, dtype=np.float64)
+    x -= shape[1] / 2
+    y -= shape[0] / 2
+    if case == "rotated":
+        # finer output grid, rotated by 17 degrees
+        t = np.deg2rad(17.0)
+        xo = 1.4 * (x * np.cos(t) - y * np.sin(t))
+        yo = 1.4 * (x * np.sin(t) + y * np.cos(t))
+    elif case == "distorted":
+        # coarser output grid with a quadratic distortion
+        xo = 0.6 * x + 2e-3 * x * y + 1e-3 * y**2
+        yo = 0.6 * y - 2e-3 * x**2 + 7e-4 * x * y
+    else:
+        # mirrored in x (negative Jacobian), partly off the output
+        xo = -1.1 * x + 0.05 * y + 9.3
+        yo = 0.02 * x + 1.1 * y + 6.8
+    return np.dstack([xo + 24.25, yo + 24.75])
+
+
+@pytest.mark.parametrize("case, pixfrac, scale", [
+    ("rotated", 1.0, 0.714),
+    ("distorted", 0.6, 1.667),
+    ("flipped", 1.0, 0.909),
+])
+def test_square_kernel_parity(case, pixfrac, scale):
+    """The square kernel reproduces, bit for bit, the output stored in the
+    truth files, which were made mapping the four corners of every input
+    pixel separately, from the single-precision pixel maps."""
+    pars = cdriz_setup.Get_Grid(inx=40, iny=40, outx=48, outy=48)
+    pars.inwht[:] = np.random.uniform(0.5, 2.0, pars.in_grid)
+    pars.inwht[::7, 3::5] = 0
+    pixmap = _square_parity_pixmap(case, pars.in_grid)
+
+    cdriz.tdriz(pars.insci, pars.inwht, pars.outsci, pars.outwht,
+                pars.outctx, 1, 0, 1, 1, 40, scale, 1.0, 1.0, "center",
+                pixfrac, "square", "cps", 1.0, 1.0, "INDEF", 0, 0, 1, pixmap)
+
+    truth_file = cdriz_setup.get_output_fullpath(
+        "truth_files", f"square_parity_{case}_truth.csv"
+    )
+    result = np.vstack([pars.outsci, pars.outwht])
+    truth = np.genfromtxt(truth_file, delimiter=",").astype(np.float32)
+    assert np.any(pars.outwht > 0)
+    assert np.array_equal(result, truth)
+    assert np.array_equal(pars.outctx, (pars.outwht > 0).astype(np.int32))
+
+
+def test_compact_context_matches_planes():
+    """Drizzling onto a compact context image gives the same context planes,
+    with or without a bounding box."""
+    from astropy.io import fits
+    from stwcs.wcsutil import HSTWCS
+
+    from drizzlepac import adrizzle, context, wcs_functions
+
+    pars = cdriz_setup.Get_Grid(inx=20, iny=12, outx=30, outy=50)
+    pars.w1.pixel_shape = (20, 12)
+    pars.w2.pixel_shape = (30, 50)
+    outwcs = HSTWCS(fits.HDUList([fits.PrimaryHDU(header=pars.w2.to_header())]))
+
+    planes = np.zeros((2,) + pars.out_grid, dtype=np.int32)
+    compact = context.ContextIndex(pars.out_grid, nplanes=2)
+    for uniqid, crpix in [(1, [10.0, -8.0]), (32, [5.0, -20.0]), (40, [10.0, -2.0])]:
+        pars.w1.wcs.crpix = crpix
+        pars.w1.wcs.set()
+        pixmap = wcs_functions.calc_pixmap(pars.w1, pars.w2, shape=pars.in_grid)
+        bbox = wcs_functions.calc_output_bbox(pars.w1, pars.w2, margin=3)
+        for outctx, drizzle_bbox in [(planes, None), (compact, bbox)]:
+            adrizzle.do_driz(
+                pars.insci, None, pars.inwht, outwcs,
+                np.zeros(pars.out_grid, dtype=np.float32),
+                np.zeros(pars.out_grid, dtype=np.float32), outctx,
+                1.0, "cps", 1.0, wcslin_pscale=outwcs.pscale, uniqid=uniqid,
+                pixmap=pixmap, bbox=drizzle_bbox,
+            )
+
+    assert np.any(planes[1] != 0) and planes[0].min() < 0
+    assert compact.table.shape[0] > 3
+    assert np.array_equal(compact.to_planes(), planes)
+
+
+def test_window_context_array():
+    """A context array covering just the output window gets the same bits."""
+    pars = cdriz_setup.Get_Grid(inx=20, iny=20, outx=30, outy=30)
+    pixmap = np.dstack(np.indices(pars.in_grid, dtype=np.float64)[::-1]) + 4.2
+    args = (5, 0, 1, 1, 20, 1.0, 1.0, 1.0, "center", 1.0, "square", "cps",
+            1.0, 1.0, "INDEF", 0, 0, 1, pixmap)
+    cdriz.tdriz(pars.insci, pars.inwht, pars.outsci, pars.outwht, pars.outctx,
+                *args, out_window=(3, 28, 8, 21))
+
+    ctx = np.zeros((14, 26), dtype=np.int32)
+    cdriz.tdriz(pars.insci, pars.inwht, np.zeros_like(pars.outsci),
+                np.zeros_like(pars.outwht), ctx, *args, out_window=(3, 28, 8, 21))
+    assert np.any(ctx != 0)
+    assert np.array_equal(ctx, pars.outctx[7:21, 2:28])
+    assert not np.any(np.delete(pars.outctx, np.s_[7:21], axis=0))
+
+    with pytest.raises(Exception, match="Context array must have the shape"):
+        cdriz.tdriz(pars.insci, pars.inwht, pars.outsci, pars.outwht,
+                    np.zeros((14, 25), dtype=np.int32), *args,
+                    out_window=(3, 28, 8, 21))
@@ -103,4 +103,87 @@ class TestGetEnvvarSwitch:
         assert result2 is False
 
 
-    
\ No newline at end of file
+    
+
+def test_procsteps_resource_report(tmp_path):
+    """Steps and chips get their resource usage written out."""
+    import json
+    import multiprocessing
+
+    import numpy as np
+    from astropy.io import fits
+    from astropy.table import Table
+
+    filename = str(tmp_path / 'img_flt.fits')
+    fits.PrimaryHDU(np.zeros((64, 64), dtype=np.float32)).writeto(filename)
+
+    def process_chip(chip):
+        with util.chip_usage('Blot', chip), open(filename, 'rb') as f:
+            f.read()
+
+    procsteps = util.ProcSteps(resource_report=True)
+    procsteps.addStep('Blot')
+    process_chip('img_flt.fits[sci,1]')
+    worker = multiprocessing.get_context('fork').Process(
+        target=process_chip, args=('img_flt.fits[sci,2]',)
+    )
+    worker.start()
+    worker.join()
+    procsteps.endStep('Blot')
+    procsteps.addStep('Final Drizzle')
+    procsteps.endStep('Final Drizzle', reason='off')
+    procsteps.reportTimes()
+
+    rootname = str(tmp_path / 'astrodrizzle_resources')
+    procsteps.writeReport(rootname)
+
+    with open(rootname + '.json') as f:
+        report = json.load(f)
+    blot, final = report['steps']
+    assert (blot['status'], final['status']) == ('ended', 'off')
+    assert blot['fits_opens'] == 2 and final['fits_opens'] == 0
+    assert blot['cpu_time'] >= 0 and blot['peak_rss'] > 0
+    chips = {chip['chip']: chip for chip in blot['chips']}
+    assert sorted(chips) == ['img_flt.fits[sci,1]', 'img_flt.fits[sci,2]']
+    assert all(chip['fits_opens'] == 1 for chip in chips.values())
+    if chips['img_flt.fits[sci,1]']['read_bytes'] is not None:
+        assert chips['img_flt.fits[sci,1]']['read_bytes'] >= 5760
+
+    table = Table.read(rootname + '.ecsv')
+    assert list(table['step']) == ['Blot', 'Blot', 'Blot', 'Final Drizzle']
+    assert table['peak_rss'].mask[1] and table['wall_time'].unit == 's'
+    assert not util.chip_usage_log.active
+
+
+def test_procsteps_no_resource_report(tmp_path):
+    """Resource usage is only tracked when a report is requested."""
+    procsteps = util.ProcSteps()
+    assert not util.chip_usage_log.active
+    assert not util.fits_open_counter.active
+
+    procsteps.addStep('Blot')
+    with util.chip_usage('Blot', 'img_flt.fits[sci,1]'):
+        open(tmp_path / 'img_flt.fits', 'w').close()
+    procsteps.endStep('Blot')
+    procsteps.reportTimes()
+    assert procsteps.steps['Blot']['usage'] == {}
+    assert procsteps.chips == []
+
+
+def test_iter_chip_usage(tmp_path):
+    """Each iteration of the loop is recorded under the name of its chip."""
+    from types import SimpleNamespace
+
+    chips = [SimpleNamespace(outputNames={'data': f'img_flt.fits[sci,{k}]'})
+             for k in (1, 2)]
+    procsteps = util.ProcSteps(resource_report=True)
+    procsteps.addStep('Blot')
+    for chip in util.iter_chip_usage('Blot', chips):
+        open(tmp_path / 'img_flt.fits', 'w').close()
+    for k in util.iter_chip_usage('Blot', [3], name=lambda k: f'chip{k}'):
+        pass
+    procsteps.endStep('Blot')
+    procsteps.reportTimes()
+    assert [chip['chip'] for chip in procsteps.chips] == [
+        'img_flt.fits[sci,1]', 'img_flt.fits[sci,2]', 'chip3'
+    ]
@@ -0,0 +1,161 @@
+import os
+import re
+import shutil
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from benchmarks.synthetic import write_inputs
+from drizzlepac import adrizzle, astrodrizzle, util
+
+# final drizzle only, straight from the (sky-free) synthetic inputs
+FINAL_ONLY = {
+    'build': True, 'preserve': False, 'in_memory': False, 'static': False,
+    'skysub': False, 'driz_separate': False, 'median': False, 'blot': False,
+    'driz_cr': False, 'final_wcs': True, 'final_rot': 0.0,
+    'final_wht_type': 'EXP',
+}
+
+
+@pytest.fixture(scope='module')
+def inputs(tmp_path_factory):
+    path = tmp_path_factory.mktemp('inputs')
+    return write_inputs('acs_wfc', str(path), nexp=3, shape=(64, 128))
+
+
+def _drizzle(path, inputs, **pars):
+    """ Run AstroDrizzle on copies of ``inputs`` in ``path`` and return the
+    data of all the extensions of the drizzled product.
+    """
+    os.makedirs(path, exist_ok=True)
+    filenames = []
+    for filename in inputs:
+        shutil.copy(filename, path)
+        filenames.append(os.path.join(path, os.path.basename(filename)))
+
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        astrodrizzle.AstroDrizzle(
+            [os.path.basename(f) for f in filenames], output='final',
+            **{**FINAL_ONLY, **pars}
+        )
+    finally:
+        os.chdir(cwd)
+
+    with fits.open(os.path.join(path, 'final_drz.fits')) as hdul:
+        # all but the table of the headers of the inputs
+        return {
+            (hdu.name, hdu.ver): np.array(hdu.data.tolist()) for hdu in hdul[1:]
+            if hdu.name != 'HDRTAB'
+        }
+
+
+def _assert_same_product(result, expected):
+    assert result.keys() == expected.keys()
+    for key in expected:
+        np.testing.assert_array_equal(result[key], expected[key], err_msg=key)
+
+
+@pytest.mark.parametrize('context_format', ['planes', 'compact'])
+def test_threaded_final_drizzle_matches_serial(tmp_path, inputs, monkeypatch,
+                                               context_format):
+    serial = _drizzle(tmp_path / 'serial', inputs, num_cores=1,
+                      final_context_format=context_format)
+
+    # force threads on single-CPU machines as well
+    monkeypatch.setattr(util, 'can_parallel', True)
+    pool_sizes = []
+    run_driz_threaded = adrizzle.run_driz_threaded
+
+    def _run_driz_threaded(*args, **kwargs):
+        pool_sizes.append(args[12])
+        return run_driz_threaded(*args, **kwargs)
+
+    monkeypatch.setattr(adrizzle, 'run_driz_threaded', _run_driz_threaded)
+    threaded = _drizzle(tmp_path / 'threaded', inputs, num_cores=3,
+                        final_context_format=context_format)
+
+    assert pool_sizes == [3]
+    _assert_same_product(threaded, serial)
+
+
+def test_tiled_final_drizzle_matches_in_memory(tmp_path, inputs):
+    in_memory = _drizzle(tmp_path / 'in_memory', inputs)
+    # about 20-row tiles: tile boundaries cross the 64-row chips
+    tiled = _drizzle(tmp_path / 'tiled', inputs, final_memory_budget=0.22)
+
+    with open(tmp_path / 'tiled' / 'astrodrizzle.log') as log:
+        ntiles, tile_rows = map(int, re.search(
+            r'in (\d+) tile\(s\) of (\d+) rows', log.read()
+        ).groups())
+    assert ntiles > 2 and tile_rows < 64
+    _assert_same_product(tiled, in_memory)
+
+
+# a fixed output grid, the same whatever the inputs
+FIXED_GRID = {'final_ra': 150.1, 'final_dec': 2.2, 'final_outnx': 140,
+              'final_outny': 140, 'final_scale': 0.05}
+
+
+@pytest.mark.parametrize('context_format', ['planes', 'compact'])
+def test_incremental_final_drizzle(tmp_path, inputs, context_format):
+    pars = dict(FIXED_GRID, final_context_format=context_format)
+    expected = _drizzle(tmp_path / 'all', inputs, **pars)
+
+    _drizzle(tmp_path / 'incremental', inputs[:2], **pars)
+    result = _drizzle(tmp_path / 'incremental', inputs,
+                      final_incremental=True, **pars)
+
+    _assert_same_product(result, expected)
+    assert (fits.getval(tmp_path / 'incremental' / 'final_drz.fits', 'NDRIZIM')
+            == fits.getval(tmp_path / 'all' / 'final_drz.fits', 'NDRIZIM')
+            == 6)
+
+
+@pytest.mark.parametrize('pars', [{'final_scale': 0.04},
+                                  {'final_kernel': 'gaussian'}],
+                         ids=['wcs', 'kernel'])
+def test_incremental_final_drizzle_mismatch(tmp_path, inputs, pars):
+    _drizzle(tmp_path, inputs[:2], **FIXED_GRID)
+    with pytest.raises(ValueError, match='new inputs can not be drizzled'):
+        _drizzle(tmp_path, inputs, final_incremental=True,
+                 **{**FIXED_GRID, **pars})
+
+
+def test_incremental_final_drizzle_flags_cosmic_rays(tmp_path, inputs):
+    # all the steps, for the CR masks the final drizzle flags in DQ arrays
+    pars = dict(FIXED_GRID, static=True, skysub=True, driz_separate=True,
+                median=True, blot=True, driz_cr=True, driz_sep_wcs=True,
+                driz_sep_rot=0.0, crbit=4096, resetbits=4096)
+    _drizzle(tmp_path / 'all', inputs, **pars)
+    _drizzle(tmp_path / 'incremental', inputs[:2], **pars)
+    _drizzle(tmp_path / 'incremental', inputs, final_incremental=True, **pars)
+
+    for filename in inputs:
+        name = os.path.basename(filename)
+        for k in (1, 2):
+            expected = fits.getdata(tmp_path / 'all' / name, ('DQ', k)) & 4096
+            assert np.any(expected)
+            np.testing.assert_array_equal(
+                fits.getdata(tmp_path / 'incremental' / name, ('DQ', k)) & 4096,
+                expected
+            )
+
+
+def test_threaded_final_drizzle_band_failure(tmp_path, inputs, monkeypatch):
+    # force threads on single-CPU machines as well
+    monkeypatch.setattr(util, 'can_parallel', True)
+    drizzle_chip_rows = adrizzle._drizzle_chip_rows
+
+    def _drizzle_chip_rows(chipinfo, outwcs, paramDict, outsci, outwht, outctx,
+                           y0, y1, **kwargs):
+        if y0 > 0:
+            raise RuntimeError('band failure')
+        return drizzle_chip_rows(chipinfo, outwcs, paramDict, outsci, outwht,
+                                 outctx, y0, y1, **kwargs)
+
+    monkeypatch.setattr(adrizzle, '_drizzle_chip_rows', _drizzle_chip_rows)
+    with pytest.raises(RuntimeError, match='band failure'):
+        _drizzle(tmp_path, inputs, num_cores=3)
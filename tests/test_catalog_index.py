@@ -0,0 +1,72 @@
+import numpy as np
+
+from drizzlepac.catalog_index import CatalogIndex
+
+
+def _catalogs(rng, n1=300, n2=250):
+    # integer positions give plenty of ties and separations right at sep
+    xy1 = np.round(rng.uniform(0, 60, (n1, 2)))
+    xy2 = np.round(rng.uniform(0, 60, (n2, 2)))
+    xy1[0] = np.nan
+    return xy1, xy2
+
+
+def test_pairs():
+    rng = np.random.default_rng(3)
+    xy1, xy2 = _catalogs(rng)
+    index = CatalogIndex(xy2)
+    d = np.abs(xy1[:, None, :] - xy2[None, :, :])
+
+    p1, p2 = index.box_pairs(xy1, 2.0)
+    expected = set(zip(*np.nonzero((d <= 2.0).all(axis=2))))
+    assert set(zip(p1, p2)) == expected
+    assert len(p1) == len(expected)
+    assert np.all(np.diff(xy1[p1, 1]) >= 0)
+
+    p1, p2 = index.radius_pairs(xy1, 2.0)
+    assert set(zip(p1, p2)) == set(zip(*np.nonzero((d**2).sum(axis=2) <= 4.0)))
+
+    groups1, groups2 = index.neighbors(xy1, 2.0)
+    assert groups1 == sorted(set(p1), key=list(p1).index)
+    for k, g in zip(groups1, groups2):
+        np.testing.assert_array_equal(g, p2[p1 == k])
+
+
+def test_nearest():
+    rng = np.random.default_rng(4)
+    xy1, xy2 = _catalogs(rng)
+    idx = CatalogIndex(xy2).nearest(xy1, 1.5)
+    distsq = ((xy1[:, None, :] - xy2[None, :, :])**2).sum(axis=2)
+    for k in range(len(xy1)):
+        if np.any(distsq[k] <= 2.25):
+            assert distsq[k, idx[k]] == np.nanmin(distsq[k])
+        else:
+            assert idx[k] == -len(xy2) - 1
+
+
+def test_offset_histogram():
+    rng = np.random.default_rng(5)
+    xy2 = rng.uniform(0, 500, (200, 2))
+    xy1 = xy2 + [2.2, -1.1]
+    h = CatalogIndex(xy2).offset_histogram(xy1, 3)
+    assert h.shape == (7, 7)
+    assert h[2, 5] == 200
+    dx = (xy1[:, None, 0] - xy2[None, :, 0]).ravel()
+    dy = (xy1[:, None, 1] - xy2[None, :, 1]).ravel()
+    expected = np.histogram2d(dx, dy, 7, [[-3.5, 3.5], [-3.5, 3.5]])[0].T
+    np.testing.assert_array_equal(h, expected)
+
+
+def test_xymatch_closest():
+    from drizzlepac.haputils.hla_flag_filter import xymatch
+
+    rng = np.random.default_rng(5)
+    xy1 = rng.uniform(0, 60, (200, 2))
+    xy2 = rng.uniform(0, 60, (150, 2))
+    distsq = ((xy1[:, None, :] - xy2[None, :, :])**2).sum(axis=2)
+
+    p2 = xymatch(xy1, xy2, 2.0, multiple=False, verbose=False)
+    matched = distsq.min(axis=1) <= 4.0
+    assert 0 < np.count_nonzero(matched) < len(xy1)
+    assert np.array_equal(p2[matched], distsq.argmin(axis=1)[matched])
+    assert np.all(p2[~matched] == -len(xy2) - 1)
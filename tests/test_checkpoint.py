@@ -0,0 +1,136 @@
+import os
+
+import numpy as np
+from astropy.io import fits
+
+from drizzlepac.checkpoint import CheckpointStore, config_digest, hash_file
+
+
+class _Chip:
+    def __init__(self, name):
+        self.outputNames = {'data': name, 'blotImage': None}
+        self.subtractedSky = 0.0
+
+
+class _Image:
+    scienceExt = 'SCI'
+
+    def __init__(self, rootname, nchips=2):
+        self.rootname = rootname
+        self.outputNames = {'outSingle': None}
+        self.chips = [_Chip(f'{rootname}_flt.fits[sci,{k}]')
+                      for k in range(1, nchips + 1)]
+
+    def returnAllChips(self, extname=None):
+        return self.chips
+
+
+def test_hash_file(tmp_path):
+    filename = str(tmp_path / 'img_flt.fits')
+    fits.HDUList([
+        fits.PrimaryHDU(),
+        fits.ImageHDU(np.arange(100, dtype=np.float32).reshape(10, 10), name='SCI'),
+    ]).writeto(filename)
+    digest = hash_file(filename).hexdigest()
+
+    # Sky values written by AstroDrizzle do not change the hash...
+    fits.setval(filename, 'MDRIZSKY', value=12.5, ext=1)
+    assert hash_file(filename).hexdigest() == digest
+
+    # ... but any other change does
+    fits.setval(filename, 'EXPTIME', value=100.0, ext=0)
+    digest = hash_file(filename).hexdigest()
+    with fits.open(filename, mode='update') as hdul:
+        hdul[1].data[3, 4] += 1
+    assert hash_file(filename).hexdigest() != digest
+
+    textfile = tmp_path / 'sky.txt'
+    textfile.write_text('img_flt.fits 1.0\n')
+    digest = hash_file(str(textfile)).hexdigest()
+    textfile.write_text('img_flt.fits 2.0\n')
+    assert hash_file(str(textfile)).hexdigest() != digest
+
+
+def test_config_digest():
+    configobj = {
+        'output': 'final', 'num_cores': 1,
+        'STEP 4: CREATE MEDIAN IMAGE': {'median': True, 'combine_type': 'minmed'},
+        'STEP 7: DRIZZLE FINAL COMBINED IMAGE': {'final_pixfrac': 1.0},
+        'STEP 7a: CUSTOM WCS FOR FINAL OUTPUT': {'final_scale': None},
+    }
+    digests = [config_digest(configobj, n) for n in (None, 4, 7)]
+
+    configobj['num_cores'] = 4
+    assert config_digest(configobj) == digests[0]
+    configobj['STEP 7a: CUSTOM WCS FOR FINAL OUTPUT']['final_scale'] = 0.05
+    assert config_digest(configobj, 7) != digests[2]
+    assert config_digest(configobj, 4) == digests[1]
+
+
+def test_checkpoint_run_step(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    images = [_Image('img0'), _Image('img1')]
+    calls = []
+
+    def blot():
+        calls.append(1)
+        for img in images:
+            for k, chip in enumerate(img.chips, start=1):
+                chip.outputNames['blotImage'] = f'{img.rootname}_sci{k}_blt.fits'
+                fits.PrimaryHDU(np.zeros((2, 2))).writeto(
+                    chip.outputNames['blotImage'], overwrite=True
+                )
+                chip.subtractedSky = 10.0 * k
+
+    def run(store, key='a', active=True):
+        for img in images:
+            for chip in img.chips:
+                chip.outputNames['blotImage'] = None
+                chip.subtractedSky = 0.0
+        return store.run_step('Blot', key, blot, images, active=active,
+                              chip_outputs=['blotImage'],
+                              chip_attrs=['subtractedSky'])
+
+    assert not run(CheckpointStore('ck.json'))
+    assert len(calls) == 1
+
+    # Reused from the checkpoint file, with the chip values restored
+    assert run(CheckpointStore('ck.json'))
+    assert len(calls) == 1
+    assert images[1].chips[1].outputNames['blotImage'] == 'img1_sci2_blt.fits'
+    assert images[1].chips[1].subtractedSky == 20.0
+
+    # Run again when the key or the outputs change, or the step is off
+    assert not run(CheckpointStore('ck.json'), key='b')
+    assert run(CheckpointStore('ck.json'), key='b')
+    os.remove('img0_sci1_blt.fits')
+    assert not run(CheckpointStore('ck.json'), key='b')
+    assert not run(CheckpointStore('ck.json'), key='b', active=False)
+    assert not run(CheckpointStore(None), key='b')
+    assert len(calls) == 5
+
+
+def test_reused_final_drizzle_keeps_dq_cr_bits(tmp_path, monkeypatch):
+    from benchmarks.synthetic import write_inputs
+    from drizzlepac import astrodrizzle
+
+    monkeypatch.chdir(tmp_path)
+    inputs = [os.path.basename(f) for f in
+              write_inputs('acs_wfc', str(tmp_path), nexp=3, shape=(64, 128))]
+
+    def run():
+        astrodrizzle.AstroDrizzle(
+            inputs, output='final', checkpoint_file='ck.json', build=True,
+            preserve=False, in_memory=False, num_cores=1, crbit=4096,
+            resetbits=4096, driz_sep_wcs=True, driz_sep_rot=0.0,
+            final_wcs=True, final_rot=0.0
+        )
+        return [fits.getdata(filename, ('DQ', k)) & 4096
+                for filename in inputs for k in (1, 2)]
+
+    cr_bits = run()
+    assert sum(np.count_nonzero(dq) for dq in cr_bits) > 0
+
+    assert [np.array_equal(dq, ref) for dq, ref in zip(run(), cr_bits)] == [True] * 6
+    with open('astrodrizzle.log') as log:
+        assert "Reusing the results of step 'Final Drizzle'" in log.read()
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from drizzlepac.context import ContextIndex, read_context, read_context_index
+
+
+def _random_planes(shape, ninputs, seed=0):
+    """Context planes of ``ninputs`` dithered exposures of 4 pointings."""
+    rng = np.random.default_rng(seed)
+    ny, nx = shape[0] // 2, shape[1] // 2
+    planes = np.zeros((ninputs // 32 + 1,) + shape, dtype=np.int32)
+    for k in range(ninputs):
+        y0 = (k % 2) * (ny - 10) + rng.integers(0, 10)
+        x0 = (k // 2 % 2) * (nx - 10) + rng.integers(0, 10)
+        y1, x1 = y0 + ny, x0 + nx
+        plane, bit = divmod(k, 32)
+        planes[plane, y0:y1, x0:x1] |= np.array(1 << bit, np.uint32).view(np.int32)
+    return planes
+
+
+def test_context_add_matches_planes():
+    planes = _random_planes((300, 400), 40)
+    ctx = ContextIndex((300, 400), nplanes=planes.shape[0])
+    for uniqid in range(1, 41):
+        plane, bit = divmod(uniqid - 1, 32)
+        mask = (planes[plane].view(np.uint32) >> np.uint32(bit)) & 1 == 1
+        ys, xs = np.nonzero(mask)
+        window = np.s_[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+        ctx.add(uniqid, mask[window], origin=(xs.min(), ys.min()))
+
+    assert ctx.index.dtype == np.uint16
+    assert np.array_equal(ctx.to_planes(), planes)
+    assert ctx.nbytes < planes.nbytes / 3
+
+    with pytest.raises(IndexError):
+        ctx.add(65, np.ones((2, 2), dtype=bool))
+
+
+def test_context_from_planes():
+    planes = _random_planes((50, 30), 70, seed=1)
+    ctx = ContextIndex.from_planes(planes)
+    assert ctx.nplanes == 3
+    assert np.array_equal(ctx.to_planes(), planes)
+    assert np.array_equal(ctx.table[0], [0, 0, 0])
+
+    # more than 2**16 distinct contexts need 32-bit indices:
+    planes = np.arange(300 * 300, dtype=np.int32).reshape(1, 300, 300)
+    ctx = ContextIndex.from_planes(planes)
+    assert ctx.index.dtype == np.int32
+    assert np.array_equal(ctx.to_planes(), planes)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_read_context(tmp_path, compact):
+    planes = _random_planes((200, 300), 100, seed=2)
+    filename = str(tmp_path / "ctx_drz.fits")
+    if compact:
+        hdus = ContextIndex.from_planes(planes).to_hdus()
+    else:
+        hdus = [fits.ImageHDU(planes, name="CTX")]
+    fits.HDUList([fits.PrimaryHDU(), *hdus]).writeto(filename)
+
+    assert np.array_equal(read_context(filename), planes)
+
+    # Room for more inputs, as when drizzling new inputs into the product
+    ctx = read_context_index(filename, nplanes=planes.shape[0] + 1)
+    ctx.add(32 * planes.shape[0] + 1, np.ones((2, 3), dtype=bool), origin=(5, 7))
+    extra = ctx.to_planes()
+    assert np.array_equal(extra[:-1], planes)
+    assert np.count_nonzero(extra[-1]) == 6 and extra[-1, 7, 5] == 1
+    if compact:
+        assert (tmp_path / "ctx_drz.fits").stat().st_size < planes.nbytes / 10
@@ -0,0 +1,75 @@
+import os
+import re
+import shutil
+from collections import Counter
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from benchmarks.synthetic import write_inputs
+from drizzlepac import astrodrizzle, createMedian, util
+
+
+@pytest.fixture(scope='module')
+def inputs(tmp_path_factory):
+    path = tmp_path_factory.mktemp('inputs')
+    return write_inputs('acs_wfc', str(path), nexp=3, shape=(64, 128))
+
+
+def _create_median(path, inputs, **pars):
+    """ Run AstroDrizzle up to the median step on copies of ``inputs`` in
+    ``path`` and return the median image.
+    """
+    os.makedirs(path, exist_ok=True)
+    for filename in inputs:
+        shutil.copy(filename, path)
+
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        astrodrizzle.AstroDrizzle(
+            [os.path.basename(f) for f in inputs], output='final',
+            preserve=False, in_memory=False, num_cores=1, static=False,
+            skysub=False, blot=False, driz_cr=False, driz_combine=False,
+            driz_sep_wcs=True, driz_sep_rot=0.0, **pars
+        )
+    finally:
+        os.chdir(cwd)
+    return fits.getdata(os.path.join(path, 'final_med.fits'))
+
+
+@pytest.mark.parametrize('combine_type', ['minmed', 'median'])
+def test_threaded_median_matches_serial(tmp_path, inputs, monkeypatch,
+                                        combine_type):
+    # buffer size of 39 rows: several sections, of 13 rows with 3 threads
+    pars = {'combine_type': combine_type, 'combine_bufsize': 0.02}
+    serial = _create_median(tmp_path / 'serial', inputs, **pars)
+
+    median = createMedian._median
+    fits_open = fits.open
+    opens = Counter()
+
+    def _open(name, *args, **kwargs):
+        opens[os.path.basename(str(name))] += 1
+        return fits_open(name, *args, **kwargs)
+
+    def _threaded_median(imageObjectList, paramDict):
+        with monkeypatch.context() as m:
+            # force threads on single-CPU machines as well
+            m.setattr(util, 'can_parallel', True)
+            m.setitem(paramDict, 'num_cores', 3)
+            m.setattr(fits, 'open', _open)
+            median(imageObjectList, paramDict)
+
+    monkeypatch.setattr(createMedian, '_median', _threaded_median)
+    threaded = _create_median(tmp_path / 'threaded', inputs, **pars)
+
+    with open(tmp_path / 'threaded' / 'astrodrizzle.log') as log:
+        nsections = re.search(r'Combining (\d+) sections in 3 threads',
+                              log.read())
+    assert nsections
+    np.testing.assert_array_equal(threaded, serial)
+    # inputs are not opened again for each section
+    assert len(opens) == 6
+    assert max(opens.values()) < int(nsections.group(1))
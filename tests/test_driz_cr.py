@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from scipy import signal
+
+from drizzlepac import quickDeriv
+from drizzlepac.drizCR import _driz_cr_mask
+
+
+def _convolve_cr_mask(input_image, blot_data, blot_deriv, gain, rn, backg,
+                      snr, scale, grow, ctegrow, cte_dir):
+    """ CR mask computed with boxcar convolutions, as in drizzlepac 3.11. """
+    t1 = np.absolute(input_image - blot_data)
+    ta = np.sqrt(gain * np.abs(blot_data + backg) + rn**2)
+    tmp1 = t1 <= scale[0] * blot_deriv + snr[0] * ta / gain
+    tmp2 = signal.convolve2d(tmp1, np.ones((3, 3), dtype=np.uint16),
+                             boundary='symm', mode='same')
+    cr_mask = (t1 <= scale[1] * blot_deriv + snr[1] * ta / gain) | (tmp2 >= 9)
+
+    grow_conv = signal.convolve2d(
+        cr_mask, np.ones((grow, grow), dtype=np.uint16),
+        boundary='symm', mode='same'
+    )
+    cte_kernel = np.zeros((2 * ctegrow + 1, 2 * ctegrow + 1))
+    if cte_dir == 1:
+        cte_kernel[0:ctegrow, ctegrow] = 1
+    elif cte_dir == -1:
+        cte_kernel[ctegrow + 1:2 * ctegrow + 1, ctegrow] = 1
+    cte_conv = signal.convolve2d(cr_mask, cte_kernel, boundary='symm',
+                                 mode='same')
+    return (grow_conv >= grow**2) & (cte_conv >= ctegrow)
+
+
+@pytest.mark.parametrize("shape", [(37, 23), (4, 5)])
+@pytest.mark.parametrize("grow", [0, 1, 2, 3])
+@pytest.mark.parametrize("ctegrow", [0, 1, 4])
+@pytest.mark.parametrize("cte_dir", [-1, 0, 1])
+def test_cr_mask_matches_convolution(shape, grow, ctegrow, cte_dir):
+    rng = np.random.default_rng(0)
+    blot = rng.normal(100, 10, shape).astype(np.float32)
+    image = blot + rng.normal(0, 12, shape).astype(np.float32)
+    image[rng.random(shape) < 0.05] += 500
+    deriv = quickDeriv.qderiv(blot)
+
+    pars = {'gain': 1.5, 'rn': 4.0, 'backg': 7.0, 'snr': (3.5, 3.0),
+            'scale': (1.2, 0.7), 'grow': grow, 'ctegrow': ctegrow,
+            'cte_dir': cte_dir}
+    expected = _convolve_cr_mask(image, blot, deriv, **pars)
+    result = _driz_cr_mask(image, blot, deriv, block_rows=3, **pars)
+    assert np.array_equal(result, expected)
+
+
+def test_qderiv():
+    image = np.zeros((5, 6), dtype=np.float32)
+    image[2, 2] = 4
+    image[4, 4] = 1
+    expected = np.zeros((5, 6), dtype=np.float32)
+    expected[1:4, 2] = 4
+    expected[2, 1:4] = 4
+    # the last row is not used as a neighbor of other pixels:
+    expected[4, 4] = 1
+    result = quickDeriv.qderiv(image)
+    assert result.dtype == np.float32
+    assert np.array_equal(result, expected)
@@ -0,0 +1,71 @@
+import numpy as np
+
+from drizzlepac import findobj
+
+
+def _star_field(rng, shape=(128, 128), nstars=60):
+    yy, xx = np.mgrid[:shape[0], :shape[1]]
+    data = rng.normal(5.0, 1.0, shape).astype(np.float32)
+    for x0, y0, flux in zip(rng.uniform(0, shape[1], nstars),
+                            rng.uniform(0, shape[0], nstars),
+                            10**rng.uniform(2, 4, nstars)):
+        data += (flux / 14.1 * np.exp(-((xx - x0)**2 + (yy - y0)**2) / 4.5)
+                 ).astype(np.float32)
+    return data
+
+
+def test_box_centroids():
+    rng = np.random.default_rng(1)
+    data = _star_field(rng)
+    y0 = rng.integers(0, 100, 50)
+    x0 = rng.integers(0, 100, 50)
+    ny = rng.integers(3, 20, 50)
+    nx = rng.integers(3, 20, 50)
+
+    xcen, ycen = findobj._box_centroids(data, y0, x0, ny, nx)
+    for k in range(50):
+        region = data[y0[k]:y0[k] + ny[k], x0[k]:x0[k] + nx[k]]
+        assert (xcen[k], ycen[k]) == findobj.centroid(region)
+
+
+def test_sharp_round_batch():
+    rng = np.random.default_rng(2)
+    nx, ny = findobj.gausspars(2.5)[:2]
+    xc, yc = nx // 2, ny // 2
+    kskip = np.ones((ny, nx), dtype=np.int16)
+    kskip[0, 0] = kskip[-1, -1] = 0
+    s2m, s4m = findobj.precompute_sharp_round(nx, ny, xc, yc)
+
+    data = rng.normal(10.0, 5.0, (40, ny, nx)).astype(np.float32)
+    data[:, yc, xc] += rng.uniform(-20, 50, 40).astype(np.float32)
+    density = rng.normal(1.0, 2.0, (40, ny, nx)).astype(np.float32)
+    density[0] = 0.0  # round = 0
+    density[1, yc, xc] = -1.0  # no sharpness
+    datamin = data.min(axis=(1, 2))
+    datamax = data.max(axis=(1, 2))
+    datamax[2] = data[2, yc, xc] - 1  # central pixel above datamax
+
+    satur, round1, sharp = findobj.sharp_round_batch(
+        data, density, kskip, xc, yc, s2m, s4m, datamin, datamax
+    )
+    for k in range(40):
+        ref = findobj.sharp_round(data[k], density[k], kskip, xc, yc, s2m, s4m,
+                                  nx, ny, datamin[k], datamax[k])
+        assert satur[k] == ref[0]
+        assert (round1[k] is np.ma.masked) == (ref[1] is None)
+        if ref[1] is not None:
+            assert round1[k] == ref[1]
+        assert (sharp[k] is np.ma.masked) == (ref[2] is None)
+        if ref[2] is not None:
+            assert sharp[k] == ref[2]
+    assert sharp[1] is np.ma.masked and sharp[2] is np.ma.masked and satur[2]
+
+
+def test_findstars_batches(monkeypatch):
+    data = _star_field(np.random.default_rng(3))
+    ref = findobj.findstars(data, 2.5, 20.0, 5.0, use_sharp_round=True)
+    assert len(ref[0]) > 20
+
+    # Results do not depend on how sources are batched
+    monkeypatch.setattr(findobj, 'FINDSTARS_BATCH_SIZE', 7)
+    assert findobj.findstars(data, 2.5, 20.0, 5.0, use_sharp_round=True) == ref
@@ -32,3 +32,65 @@ class TestimageObject():
         assert(image._naxis1 > 0)
         assert(image._naxis2 > 0)
         assert(image._instrument != '')
+
+
+@pytest.fixture
+def two_chip_image(tmp_path):
+    import numpy as np
+    from astropy import wcs
+    from astropy.io import fits
+
+    w = wcs.WCS(naxis=2)
+    w.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+    w.wcs.crpix = [16, 8]
+    w.wcs.crval = [5.63, -72.05]
+    w.wcs.cd = [[-1.1e-5, 0.0], [0.0, 1.1e-5]]
+    hdus = [fits.PrimaryHDU()]
+    for chip in (1, 2):
+        for extname, data in [('SCI', np.full((16, 32), chip, np.float32)),
+                              ('DQ', np.zeros((16, 32), np.int16))]:
+            hdu = fits.ImageHDU(data, header=w.to_header(), name=extname)
+            hdu.header['EXTVER'] = chip
+            hdu.header['EXPNAME'] = 'test'
+            hdus.append(hdu)
+    filename = str(tmp_path / 'test_flt.fits')
+    fits.HDUList(hdus).writeto(filename)
+    return filename
+
+
+def test_getData_memmap_and_release(two_chip_image):
+    img = imageObject.imageObject(two_chip_image)
+    assert not img._handles
+
+    data = img.getData('SCI,2')
+    assert not data.flags.owndata  # memory-mapped
+    assert img.getData('SCI,2') is data
+    assert len(img._handles) == 1
+
+    # changes are never written to the file and are lost once released:
+    data *= 3
+    img.releaseData('SCI,2')
+    assert not img._handles
+    assert img.getData('SCI,2')[0, 0] == 2
+
+    img.getData('SCI,1')
+    img.releaseData()
+    assert not img._handles and not img._loaded
+    img.close()
+
+
+def test_getHeader_cache(two_chip_image):
+    from astropy.io import fits
+
+    img = imageObject.imageObject(two_chip_image)
+    header = img.getHeader('SCI,1')
+    assert header['EXTVER'] == 1
+    header['TESTKW'] = 1
+    assert 'TESTKW' not in img.getHeader('SCI,1')
+
+    # headers are read again when the file is modified:
+    fits.setval(two_chip_image, 'TESTKW', value=2, extname='SCI', extver=1)
+    assert img.getHeader('SCI,1')['TESTKW'] == 2
+    img.close()
+    assert not img._handles
+
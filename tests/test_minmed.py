@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pytest
+from scipy import signal
+
+from drizzlepac.minmed import _box_dilate, min_med
+
+
+def _make_stack(nimages, shape=(41, 29), masked=True, seed=0):
+    rng = np.random.default_rng(seed)
+    images = rng.normal(100, 20, (nimages,) + shape).astype(np.float32)
+    images[rng.random(images.shape) < 0.02] += 5000
+    weights = rng.uniform(0.5, 1, images.shape).astype(np.float32)
+    masks = None
+    if masked:
+        masks = rng.random(images.shape) < 0.3
+        masks[:, :3, :4] = True
+    return {
+        'images': list(images),
+        'weight_images': list(weights),
+        'readnoise_list': [3.0 + k for k in range(nimages)],
+        'exptime_list': [100.0 + k for k in range(nimages)],
+        'background_values': [10.0 + k for k in range(nimages)],
+        'weight_masks': None if masks is None else list(masks),
+    }
+
+
+# (nimages, masked, combine_grow, fillval) of the reference outputs
+REFERENCE_CASES = [
+    (2, True, 1, False),
+    (2, False, 0, True),
+    (3, True, 2, True),
+    (3, False, 1, False),
+    (5, True, 0, False),
+    (5, True, 2, True),
+]
+
+
+@pytest.mark.parametrize("radius", [1, 2, 5])
+def test_box_dilate_matches_boxcar(radius):
+    rng = np.random.default_rng(radius)
+    mask = rng.random((23, 17)) < 0.05
+    boxsize = 2 * radius + 1
+    ker = np.ones((boxsize, boxsize)) / boxsize**2
+    boxcar = signal.convolve2d(mask.astype(np.float64), ker,
+                               boundary='fill', mode='same')
+    assert np.array_equal(_box_dilate(mask, radius), boxcar != 0)
+
+
+@pytest.mark.parametrize("nimages", [2, 3, 5])
+@pytest.mark.parametrize("masked", [False, True])
+@pytest.mark.parametrize("combine_grow", [0, 1, 2])
+@pytest.mark.parametrize("fillval", [False, True])
+def test_min_med_blocks(nimages, masked, combine_grow, fillval):
+    """ The combined image does not depend on the processing block size. """
+    kwargs = _make_stack(nimages, masked=masked)
+    expected = min_med(combine_grow=combine_grow, fillval=fillval,
+                       block_size=10**9, **kwargs)
+    for block_size in [1, 7 * 29 * nimages, 1000]:
+        result = min_med(combine_grow=combine_grow, fillval=fillval,
+                         block_size=block_size, **kwargs)
+        assert result.dtype == expected.dtype
+        assert np.array_equal(result, expected)
+
+    if masked:
+        assert np.all(expected[:3, :4] == 0)
+
+
+@pytest.mark.parametrize("nimages, masked, combine_grow, fillval",
+                         REFERENCE_CASES)
+@pytest.mark.parametrize("block_size", [1, 1000, None])
+def test_min_med_reference(nimages, masked, combine_grow, fillval,
+                           block_size):
+    """ The combined image is, bit for bit, the output stored in the truth
+    files, which were made with the whole-stack implementation of
+    ``min_med``. """
+    kwargs = _make_stack(nimages, masked=masked)
+    if block_size is not None:
+        kwargs['block_size'] = block_size
+    result = min_med(combine_grow=combine_grow, fillval=fillval, **kwargs)
+
+    truth_file = os.path.join(
+        os.path.dirname(__file__), "truth_files",
+        f"minmed_{nimages}_{int(masked)}_{combine_grow}_{int(fillval)}"
+        "_truth.csv"
+    )
+    truth = np.genfromtxt(truth_file, delimiter=",").astype(np.float32)
+    assert result.dtype == np.float32
+    assert np.array_equal(result, truth)
@@ -0,0 +1,61 @@
+import numpy as np
+from astropy.io import fits
+
+from drizzlepac.outputimage import _writeFITSSkeleton, mergeHeaderTables
+
+
+def test_fits_skeleton_memmap_roundtrip(tmp_path):
+    """Data written through the skeleton's memory maps reads back with astropy."""
+    shape = (37, 53)
+    hdus = fits.HDUList([fits.PrimaryHDU()])
+    for name, arr in [
+        ("SCI", np.zeros((1, 1), dtype=np.float32)),
+        ("WHT", np.zeros((1, 1), dtype=np.float32)),
+        ("CTX", np.zeros((2, 1, 1), dtype=np.int32)),
+    ]:
+        hdus.append(fits.ImageHDU(data=arr, name=name))
+        hdus[-1].header["CRPIX1"] = 12.5
+    hdus.append(fits.BinTableHDU.from_columns(
+        [fits.Column(name="ROOTNAME", format="9A", array=["a", "bb"])]
+    ))
+
+    filename = str(tmp_path / "skeleton_drz.fits")
+    layout = _writeFITSSkeleton(filename, hdus, shape, build=True)
+    assert sorted(layout) == ["CTX", "SCI", "WHT"]
+
+    rng = np.random.default_rng(0)
+    expected = {
+        "SCI": rng.normal(size=shape).astype(np.float32),
+        "WHT": rng.uniform(size=shape).astype(np.float32),
+        "CTX": rng.integers(0, 2**31, size=(2,) + shape, dtype=np.int32),
+    }
+    for kind, (offset, dtype, dshape) in layout.items():
+        arr = np.memmap(filename, dtype=dtype, mode="r+", offset=offset, shape=dshape)
+        arr[:] = expected[kind]
+        arr.flush()
+        del arr
+
+    with fits.open(filename) as result:
+        result.verify("exception")
+        for kind, data in expected.items():
+            assert np.array_equal(result[kind].data, data)
+            assert result[kind].header["CRPIX1"] == 12.5
+        assert list(result[4].data["ROOTNAME"]) == ["a", "bb"]
+
+
+def test_merge_header_tables():
+    """Header tables of incremental products keep the rows of prior inputs."""
+    prior = fits.BinTableHDU.from_columns([
+        fits.Column(name="ROOTNAME", format="9A", array=["a", "b"]),
+        fits.Column(name="EXPTIME", format="D", array=[10.0, 20.0]),
+    ], name="HDRTAB")
+    new = fits.BinTableHDU.from_columns([
+        fits.Column(name="ROOTNAME", format="9A", array=["c"]),
+        fits.Column(name="FILTER", format="5A", array=["F606W"]),
+    ], name="HDRTAB")
+
+    merged = mergeHeaderTables(prior, new)
+    assert merged.name == "HDRTAB"
+    assert list(merged.data["ROOTNAME"]) == ["a", "b", "c"]
+    assert list(merged.data["EXPTIME"][:2]) == [10.0, 20.0]
+    assert list(merged.data["FILTER"]) == ["", "", "F606W"]
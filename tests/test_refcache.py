@@ -0,0 +1,126 @@
+import logging
+import os
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from drizzlepac import util
+from drizzlepac.refcache import ReferenceFileCache
+
+
+def _write_flat(filename, value=1.0, shape=(32, 64), nchips=2):
+    hdus = [fits.PrimaryHDU()]
+    for chip in range(1, nchips + 1):
+        hdu = fits.ImageHDU(
+            np.full(shape, value * chip, dtype=np.float32), name='SCI'
+        )
+        hdu.header['EXTVER'] = chip
+        hdus.append(hdu)
+    fits.HDUList(hdus).writeto(filename, overwrite=True)
+    return str(filename)
+
+
+def test_refcache_hit(tmp_path, monkeypatch):
+    flat = _write_flat(tmp_path / 'flat.fits')
+    cache = ReferenceFileCache(max_size=1)
+
+    data = cache.getdata(flat, ('SCI', 2))
+    assert cache.misses == 1 and cache.hits == 0
+    assert not data.flags.writeable
+    assert np.all(data == 2)
+
+    # same file through a relative path and a differently spelled extension:
+    monkeypatch.chdir(tmp_path)
+    assert cache.getdata('flat.fits', ('sci', 2)) is data
+    assert cache.hits == 1
+
+    # sections are views of the cached array:
+    section = cache.getdata(flat, ('SCI', 2), section=np.s_[2:10, 4:20])
+    assert section.shape == (8, 16) and section.base is not None
+    assert cache.hits == 2
+
+    cache.getdata(flat, ('SCI', 1))
+    assert cache.misses == 2
+
+
+def test_refcache_lru_eviction(tmp_path):
+    # each extension takes 256 kB, so only 4 of them fit in 1 MB:
+    files = [_write_flat(tmp_path / f'flat{k}.fits', shape=(256, 256))
+             for k in range(3)]
+    cache = ReferenceFileCache(max_size=1)
+    for filename in files:
+        for chip in (1, 2):
+            cache.getdata(filename, ('SCI', chip))
+            # keep the first array in use:
+            cache.getdata(files[0], ('SCI', 1))
+    assert cache._nbytes <= 1024**2
+    assert cache.misses == 6
+
+    cache.getdata(files[0], ('SCI', 1))
+    cache.getdata(files[2], ('SCI', 2))
+    assert cache.misses == 6
+    cache.getdata(files[0], ('SCI', 2))
+    assert cache.misses == 7
+
+
+def test_refcache_file_updated(tmp_path):
+    flat = _write_flat(tmp_path / 'flat.fits')
+    cache = ReferenceFileCache()
+    assert np.all(cache.getdata(flat, ('SCI', 1)) == 1)
+
+    _write_flat(flat, value=3.0)
+    os.utime(flat, ns=(0, 0))
+    assert np.all(cache.getdata(flat, ('SCI', 1)) == 3)
+    assert cache.misses == 2
+
+
+def test_refcache_disabled(tmp_path):
+    flat = _write_flat(tmp_path / 'flat.fits')
+    cache = ReferenceFileCache(max_size=None)
+    data = cache.getdata(flat, ('SCI', 1))
+    assert data.flags.writeable
+    assert cache.getdata(flat, ('SCI', 1)) is not data
+    assert cache.hits == cache.misses == 0
+
+
+def test_refcache_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ReferenceFileCache().getdata(str(tmp_path / 'missing.fits'), 1)
+
+
+def test_procsteps_cache_report(tmp_path, caplog):
+    flat = _write_flat(tmp_path / 'flat.fits')
+    cache = ReferenceFileCache()
+    cache.getdata(flat, ('SCI', 1))
+
+    procsteps = util.ProcSteps()
+    procsteps.addCache('Reference files', cache)
+    for chip in (1, 2, 1):
+        cache.getdata(flat, ('SCI', chip))
+
+    with caplog.at_level(logging.INFO, logger='drizzlepac.util'):
+        procsteps.reportTimes()
+    report = [r.getMessage().split() for r in caplog.records]
+    assert ['Reference', 'files', '2', '1'] in report
+
+
+def test_getflat_returns_copy(tmp_path, monkeypatch):
+    from benchmarks.synthetic import write_inputs
+    from drizzlepac import imageObject
+    from drizzlepac.acsData import WFCInputImage
+
+    monkeypatch.setattr(imageObject, 'reference_cache', ReferenceFileCache())
+    flat = _write_flat(tmp_path / 'flat.fits', value=2.0, shape=(16, 32))
+    filename, = write_inputs('acs_wfc', str(tmp_path), nexp=1, shape=(16, 32))
+    fits.setval(filename, 'PFLTFILE', value=flat)
+
+    img = WFCInputImage(filename)
+    try:
+        data = img.getflat(2)
+        assert data.flags.writeable
+        data[...] = 0.0
+        assert np.all(img.getflat(2) == 4.0)
+        assert imageObject.reference_cache.hits == 1
+    finally:
+        img.close()
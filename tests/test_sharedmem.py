@@ -0,0 +1,104 @@
+import errno
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from drizzlepac.sharedmem import SharedOutputs
+
+
+class _Image:
+    def __init__(self):
+        self.virtualOutputs = {'a_sci.fits': None, 'a_mask.fits': None}
+
+
+def _make_outputs(img, value):
+    sci = fits.HDUList([
+        fits.PrimaryHDU(data=np.full((5, 4), value, dtype='>f4')),
+        fits.ImageHDU(data=np.arange(6, dtype=np.int16).reshape(2, 3),
+                      name='WHT'),
+    ])
+    sci[0].header['EXPTIME'] = 12.5
+    img.virtualOutputs['a_sci.fits'] = sci
+    img.virtualOutputs['a_mask.fits'] = fits.PrimaryHDU(
+        data=np.ones((5, 4), dtype=np.uint8)
+    )
+
+
+@pytest.mark.skipif(
+    'fork' not in multiprocessing.get_all_start_methods(),
+    reason='requires the fork start method'
+)
+def test_shared_outputs_from_subprocess(tmp_path):
+    img = _Image()
+    shared = SharedOutputs(path=str(tmp_path))
+    try:
+        p = multiprocessing.get_context('fork').Process(
+            target=shared.run, args=('0', img, _make_outputs, 7.0)
+        )
+        p.start()
+        p.join()
+        assert p.exitcode == 0
+        assert img.virtualOutputs['a_sci.fits'] is None
+
+        outputs = shared.collect('0')
+        assert shared.collect('1') == {}
+    finally:
+        shared.close()
+    assert not os.path.exists(shared.path)
+
+    sci = outputs['a_sci.fits']
+    assert isinstance(sci, fits.HDUList)
+    assert sci[0].header['EXPTIME'] == 12.5
+    assert np.array_equal(sci[0].data, np.full((5, 4), 7.0))
+    assert sci[0].data.dtype == np.dtype('>f4')
+    assert sci['WHT'].data.tolist() == [[0, 1, 2], [3, 4, 5]]
+    mask = outputs['a_mask.fits']
+    assert isinstance(mask, fits.PrimaryHDU)
+    assert np.all(mask.data == 1)
+
+
+def test_shared_outputs_fall_back_to_disk(tmp_path, monkeypatch):
+    shm_dir = tmp_path / 'shm'
+    disk_dir = tmp_path / 'disk'
+    shm_dir.mkdir()
+    disk_dir.mkdir()
+    shared = SharedOutputs(path=str(shm_dir), disk_path=str(disk_dir))
+
+    # shared memory is full
+    mkstemp = tempfile.mkstemp
+
+    def _mkstemp(*args, dir=None, **kwargs):
+        if dir == shared.path:
+            raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+        return mkstemp(*args, dir=dir, **kwargs)
+
+    monkeypatch.setattr(tempfile, 'mkstemp', _mkstemp)
+
+    img = _Image()
+    try:
+        shared.run('0', img, _make_outputs, 3.0)
+        assert os.listdir(shared.path) == []
+        outputs = shared.collect('0')
+    finally:
+        shared.close()
+    assert not os.path.exists(shared.disk_path)
+    assert np.array_equal(outputs['a_sci.fits'][0].data, np.full((5, 4), 3.0))
+    assert np.all(outputs['a_mask.fits'].data == 1)
+
+
+def test_shared_outputs_worker_error(tmp_path):
+    def _fail(img):
+        raise ValueError('cannot drizzle')
+
+    shared = SharedOutputs(path=str(tmp_path))
+    try:
+        with pytest.raises(ValueError):
+            shared.run('0', _Image(), _fail)
+        with pytest.raises(RuntimeError, match='ValueError: cannot drizzle'):
+            shared.collect('0')
+    finally:
+        shared.close()
@@ -0,0 +1,160 @@
+import importlib
+import multiprocessing
+import os
+import shutil
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from astropy.io import fits
+from astropy.wcs import WCS
+from spherical_geometry.polygon import SphericalPolygon
+from stsci.skypac.skymatch import skymatch
+from stsci.skypac.skystatistics import SkyStats
+
+from benchmarks.synthetic import write_inputs
+from drizzlepac import astrodrizzle, skyoverlap, util
+
+
+def _make_image(filename, k, rng):
+    # 2x2 mosaic of 200x200 images, overlapping by 80 pixels, with sky 10+3k
+    header = fits.Header({
+        'CTYPE1': 'RA---TAN', 'CTYPE2': 'DEC--TAN',
+        'CRPIX1': 100.0 - 120 * (k % 2), 'CRPIX2': 100.0 - 120 * (k // 2),
+        'CRVAL1': 150.0, 'CRVAL2': 2.0,
+        'CD1_1': -1.4e-5, 'CD1_2': 1.0e-6, 'CD2_1': 1.0e-6, 'CD2_2': 1.4e-5,
+        'BUNIT': 'ELECTRONS',
+    })
+    data = rng.normal(10.0 + 3 * k, 1.0, (200, 200)).astype(np.float32)
+    data[rng.integers(0, 200, 40), rng.integers(0, 200, 40)] = 1000.0
+    primary = fits.PrimaryHDU()
+    primary.header['EXPTIME'] = 1.0
+    fits.HDUList([primary, fits.ImageHDU(data, header, name='SCI', ver=1)]).writeto(filename)
+
+
+def _sky_chip(hdulist):
+    wcs = WCS(hdulist['SCI', 1].header)
+    # brightness units of stsci.skypac (EXPTIME = 1)
+    conv = 1.0 / (3600.0**2 * abs(np.linalg.det(wcs.wcs.cd)))
+    return skyoverlap.SkyChip(hdulist, ('SCI', 1), wcs, conv=conv)
+
+
+def test_overlap_pairs():
+    centers = [(10.0, 0.0), (10.8, 0.0), (11.6, 0.0), (10.0, 50.0)]
+    images = [
+        [SimpleNamespace(edges=np.array(next(iter(
+            SphericalPolygon.from_cone(ra, dec, 0.5).to_lonlat()
+        ))))] for ra, dec in centers
+    ]
+    assert skyoverlap.overlap_pairs(images) == [(0, 1), (1, 2)]
+
+
+def test_solve_sky_deltas():
+    sky = np.array([1.0, 4.0, 2.0, 7.0])
+    W = np.zeros((4, 4))
+    W[0, 1] = W[1, 0] = W[1, 2] = W[2, 1] = 100.0
+    A = np.where(W > 0, sky[None, :] + 5.0, 0.0)
+    deltas = skyoverlap.solve_sky_deltas(A, W)
+    assert np.isnan(deltas[3])
+    np.testing.assert_allclose(deltas[:3] - deltas[0], sky[:3] - sky[0])
+
+
+def test_match_sky(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(2)
+    filenames = [f'img{k}_flt.fits' for k in range(4)]
+    for k, filename in enumerate(filenames):
+        _make_image(filename, k, rng)
+    skystat = SkyStats(skystat='median')
+
+    hduls = [fits.open(filename, memmap=True) for filename in filenames]
+    try:
+        images = [[_sky_chip(hdul)] for hdul in hduls]
+        A, W = skyoverlap.overlap_matrix(images, skystat, num_cores=1)
+        sampled = skyoverlap.overlap_matrix(images, skystat, sampling=2)
+        with monkeypatch.context() as m:
+            m.setattr(util, 'can_parallel', True)
+            m.setattr(skyoverlap, 'multiprocessing', multiprocessing,
+                      raising=False)
+            parallel = skyoverlap.overlap_matrix(images, skystat, num_cores=2)
+        skyvals = skyoverlap.match_sky(images, skystat)
+    finally:
+        for hdul in hduls:
+            hdul.close()
+
+    # all pairs of images overlap, diagonally by 80x80 pixels
+    assert np.count_nonzero(W) == 12
+    assert W[0, 1] == 80 * 200 and W[0, 3] == 80 * 80
+    np.testing.assert_array_equal(parallel[0], A)
+    np.testing.assert_array_equal(parallel[1], W)
+    assert np.array_equal(sampled[1] > 0, W > 0)
+    np.testing.assert_allclose(sampled[0], A, rtol=0.01)
+    np.testing.assert_allclose(sampled[1], W, rtol=0.1)
+
+    # the same sky values and offsets as stsci.skypac
+    skymatch_module = importlib.import_module('stsci.skypac.skymatch')
+    overlap_matrix = skymatch_module._overlap_matrix
+    skypac = {}
+
+    def _overlap_matrix(skylines, skystat):
+        skypac['A'], skypac['W'] = overlap_matrix(skylines, skystat)
+        return skypac['A'], skypac['W']
+
+    monkeypatch.setattr(skymatch_module, '_overlap_matrix', _overlap_matrix)
+    if not hasattr(SphericalPolygon, 'iter_polygons_flat'):
+        # not available in recent spherical_geometry, used by stsci.skypac
+        monkeypatch.setattr(SphericalPolygon, 'iter_polygons_flat',
+                            lambda self: iter(self.polygons), raising=False)
+    skymatch(','.join(filenames), skymethod='match', skystat='median',
+             skyuser_kwd='MDRIZSKY', readonly=False, subtractsky=False,
+             verbose=False, clobber=True, flog=None)
+
+    np.testing.assert_array_equal(W > 0, skypac['W'] > 0)
+    # stsci.skypac also counts some pixels along the edges of the overlaps
+    np.testing.assert_allclose(W, skypac['W'], rtol=0.03)
+    np.testing.assert_allclose(A, skypac['A'], rtol=1e-3)
+    sky = [fits.getval(filename, 'MDRIZSKY', ext=1) for filename in filenames]
+    np.testing.assert_allclose(sky, [0.0, 3.0, 6.0, 9.0], atol=0.1)
+    np.testing.assert_allclose([s[0] for s in skyvals], sky, atol=0.01)
+
+
+@pytest.fixture(scope='module')
+def inputs(tmp_path_factory):
+    path = tmp_path_factory.mktemp('inputs')
+    return write_inputs('acs_wfc', str(path), nexp=3, shape=(64, 128))
+
+
+def _sky(path, inputs, **pars):
+    """ Run the sky step of AstroDrizzle on copies of ``inputs`` in ``path``
+    and return the MDRIZSKY values of the inputs.
+    """
+    os.makedirs(path, exist_ok=True)
+    for filename in inputs:
+        shutil.copy(filename, path)
+
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        astrodrizzle.AstroDrizzle(
+            [os.path.basename(f) for f in inputs], output='final',
+            preserve=False, static=False, use_static=False,
+            driz_separate=False, median=False, blot=False, driz_cr=False,
+            driz_combine=False, **pars
+        )
+    finally:
+        os.chdir(cwd)
+    return [[fits.getval(os.path.join(path, os.path.basename(f)), 'MDRIZSKY',
+                         ext=('SCI', k)) for k in (1, 2)] for f in inputs]
+
+
+def test_skyparallel(tmp_path, inputs):
+    expected = _sky(tmp_path / 'globalmin', inputs, skymethod='globalmin')
+    sky = _sky(tmp_path / 'skyparallel', inputs, skymethod='globalmin+match',
+               skyparallel=True)
+
+    with open(tmp_path / 'skyparallel' / 'astrodrizzle.log') as log:
+        text = log.read()
+    assert 'Computing sky in the overlaps of 3 pairs of images' in text
+    assert 'Reverting sky computation' not in text
+    # inputs with the same sky: matching leaves the global sky
+    np.testing.assert_allclose(sky, expected, rtol=0.01)
@@ -0,0 +1,58 @@
+import multiprocessing
+
+import numpy as np
+from astropy.io import fits
+
+from drizzlepac import tweakreg, util
+
+
+def _make_image(filename, shift, rng):
+    yy, xx = np.mgrid[:256, :256]
+    hdus = [fits.PrimaryHDU()]
+    for extver in (1, 2):
+        data = rng.normal(10.0, 1.0, (256, 256)).astype(np.float32)
+        for x, y in [(40, 50), (120, 200), (210, 90), (60, 160), (180, 30)]:
+            x0, y0 = x + shift + extver, y - shift
+            data += 500.0 * np.exp(-((xx - x0)**2 + (yy - y0)**2) / 4.5)
+        header = fits.Header({
+            'CTYPE1': 'RA---TAN', 'CTYPE2': 'DEC--TAN',
+            'CRPIX1': 128.0, 'CRPIX2': 128.0 + 300 * (extver - 1),
+            'CRVAL1': 150.0, 'CRVAL2': 2.0,
+            'CD1_1': -1.1e-5, 'CD1_2': 0.0, 'CD2_1': 0.0, 'CD2_2': 1.1e-5,
+            'WCSNAME': 'OPUS',
+        })
+        hdus.append(fits.ImageHDU(data, header, name='SCI', ver=extver))
+    fits.HDUList(hdus).writeto(filename)
+
+
+def test_build_images(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(7)
+    filenames = [f'img{k}_flt.fits' for k in range(3)]
+    for k, filename in enumerate(filenames):
+        _make_image(filename, 0.5 * k, rng)
+
+    kwargs = {
+        'dqbits': None, 'updatehdr': False, 'verbose': False, 'writecat': False,
+        'xyunits': 'pixels', 'computesig': True, 'skysigma': 0.0,
+        'conv_width': 3.5, 'threshold': 10.0, 'peakmin': None, 'peakmax': None,
+        'fluxmin': None, 'fluxmax': None, 'nsigma': 1.5, 'ratio': 1.0,
+        'theta': 0.0, 'sharplo': 0.2, 'sharphi': 1.0, 'roundlo': -1.0,
+        'roundhi': 1.0, 'use_sharp_round': False, '_RULES_': {},
+    }
+    catdict = dict.fromkeys(filenames)
+    serial = tweakreg._build_images(filenames, catdict, {}, kwargs, num_cores=1)
+
+    monkeypatch.setattr(util, 'can_parallel', True)
+    monkeypatch.setattr(tweakreg, 'multiprocessing', multiprocessing, raising=False)
+    parallel = tweakreg._build_images(filenames, catdict, {}, kwargs, num_cores=2)
+
+    assert [img.name for img in parallel] == filenames
+    for img, ref in zip(parallel, serial):
+        assert img.num_sources == ref.num_sources == 10
+        np.testing.assert_array_equal(img.all_radec[0], ref.all_radec[0])
+        np.testing.assert_array_equal(img.xy_catalog[3], ref.xy_catalog[3])
+        for chip in img.chip_catalogs.values():
+            assert chip['catalog'].wcs is chip['wcs']
+            np.testing.assert_array_equal(chip['wcs'].wcs.cd,
+                                          [[-1.1e-5, 0.0], [0.0, 1.1e-5]])
@@ -0,0 +1,192 @@
+import numpy as np
+import pytest
+from astropy import wcs
+
+from drizzlepac import cdriz, wcs_functions
+
+
+def _make_wcs(crval1=5.63, sip=False):
+    w = wcs.WCS(naxis=2)
+    w.wcs.ctype = ["RA---TAN", "DEC--TAN"]
+    w.wcs.crpix = [32.5, 24.5]
+    w.wcs.crval = [crval1, -72.05]
+    w.wcs.cd = [[-1.1e-5, 0.0], [0.0, 1.1e-5]]
+    if sip:
+        w.wcs.ctype = ["RA---TAN-SIP", "DEC--TAN-SIP"]
+        a = np.zeros((3, 3))
+        a[2, 0] = 1e-6
+        w.sip = wcs.Sip(a, np.zeros((3, 3)), None, None, w.wcs.crpix)
+    w.pixel_shape = (64, 48)
+    return w
+
+
+def _make_distorted_wcs(nx=512, ny=256):
+    # SIP polynomial plus an NPOL table varying quickly near x = 0
+    w = _make_wcs(sip=True)
+    w.wcs.crpix = [nx / 2, ny / 2]
+    a = np.zeros((4, 4))
+    b = np.zeros((4, 4))
+    a[2, 0], a[1, 1], a[3, 0] = 8.5e-6, -5.3e-6, 1e-9
+    b[1, 1], b[0, 2], b[0, 3] = 9.8e-6, -6e-6, 4e-9
+    w.sip = wcs.Sip(a, b, None, None, w.wcs.crpix)
+    gy, gx = np.mgrid[0:9, 0:17].astype(float)
+    table = (0.3 * np.exp(-gx / 1.5) + 0.02 * np.sin(gy)).astype(np.float32)
+    w.cpdis1 = wcs.DistortionLookupTable(table, (1, 1), (1, 1), (32, 32))
+    w.cpdis2 = wcs.DistortionLookupTable(0.5 * table, (1, 1), (1, 1), (32, 32))
+    w.pixel_shape = (nx, ny)
+    return w
+
+
+@pytest.fixture
+def pixmap_cache(monkeypatch):
+    cache = wcs_functions.PixmapCache(max_size=1)
+    monkeypatch.setattr(wcs_functions, "pixmap_cache", cache)
+    return cache
+
+
+def test_wcs_hash_tracks_distortion():
+    assert wcs_functions.wcs_hash(_make_wcs()) == wcs_functions.wcs_hash(_make_wcs())
+    assert wcs_functions.wcs_hash(_make_wcs()) != wcs_functions.wcs_hash(_make_wcs(5.64))
+    assert wcs_functions.wcs_hash(_make_wcs()) != wcs_functions.wcs_hash(_make_wcs(sip=True))
+
+
+@pytest.mark.parametrize("stepsize", [None, 10])
+def test_pixmap_cache_hit(pixmap_cache, stepsize):
+    first, second = _make_wcs(sip=True), _make_wcs(5.6301)
+    expected = wcs_functions.calc_pixmap(first, second, stepsize=stepsize)
+    assert pixmap_cache.misses == 1 and pixmap_cache.hits == 0
+
+    # A different (but equal) WCS instance must hit the cache:
+    pixmap = wcs_functions.calc_pixmap(_make_wcs(sip=True), second,
+                                       stepsize=stepsize)
+    assert pixmap_cache.hits == 1
+    assert pixmap is expected
+    assert not pixmap.flags.writeable
+
+    pixmap_cache.configure(max_size=None)
+    assert np.array_equal(
+        wcs_functions.calc_pixmap(first, second, stepsize=stepsize), expected
+    )
+
+
+def test_pixmap_cache_lru_eviction(pixmap_cache):
+    # Each 64x48 map takes 24 kB, so only 42 of them fit in 1 MB:
+    second = _make_wcs()
+    keys = []
+    for k in range(45):
+        first = _make_wcs(5.63 + 1e-5 * k)
+        wcs_functions.calc_pixmap(first, second)
+        keys.append(pixmap_cache.make_key(first, second, (48, 64)))
+        # keep the first map in use:
+        assert pixmap_cache.get(keys[0]) is not None
+    assert pixmap_cache._nbytes <= 1024**2
+    assert pixmap_cache.get(keys[1]) is None
+    assert pixmap_cache.get(keys[-1]) is not None
+
+
+def test_pixmap_cache_directory(pixmap_cache, tmp_path):
+    first, second = _make_wcs(sip=True), _make_wcs(5.6301)
+    pixmap_cache.configure(max_size=None, directory=str(tmp_path))
+    expected = wcs_functions.calc_pixmap(first, second, stepsize=10)
+    assert len(list(tmp_path.glob("pixmap_*.npy"))) == 1
+
+    # A new cache (e.g., in another process) reads the stored map:
+    cache = wcs_functions.PixmapCache(directory=str(tmp_path))
+    pixmap = cache.get(cache.make_key(first, second, (48, 64), 10))
+    assert isinstance(pixmap, np.memmap)
+    assert np.array_equal(pixmap, expected)
+
+
+@pytest.mark.parametrize("npol", [False, True])
+@pytest.mark.parametrize("tolerance", [0.01, 0.005])
+def test_adaptive_wcs_grid(npol, tolerance):
+    first, second = _make_distorted_wcs(), _make_wcs()
+    if not npol:
+        first.cpdis1 = first.cpdis2 = None
+    shape = first.array_shape
+    exact = wcs_functions.calc_pixmap(first, second)
+
+    def max_error(mapping):
+        pixmap = wcs_functions.calc_pixmap_from_mapping(mapping, shape)
+        return np.hypot(*np.moveaxis(pixmap - exact, -1, 0)).max()
+
+    uniform = cdriz.DefaultWCSMapping(first, second, shape[1], shape[0], 64)
+    assert max_error(uniform) > 0.01
+    assert np.isnan(uniform.max_error) and uniform.refined_cells == 0
+
+    mapping = cdriz.DefaultWCSMapping(
+        first, second, shape[1], shape[0], 64, tolerance
+    )
+    assert 0 < mapping.refined_cells <= 45
+    assert mapping.max_error <= tolerance
+    if npol:
+        # The NPOL tables are bilinearly interpolated too: the error estimate
+        # from the midpoints of the cells may miss their kinks.
+        assert max_error(mapping) <= 2 * tolerance
+    else:
+        assert max_error(mapping) <= mapping.max_error
+
+    # a zero tolerance gives the uniform grid
+    assert np.array_equal(
+        wcs_functions.calc_pixmap(first, second, stepsize=64, tolerance=0),
+        wcs_functions.calc_pixmap_from_mapping(uniform, shape)
+    )
+
+
+def test_pixmap_precision():
+    # single-precision pixel maps against the direct WCS mapping, for
+    # output positions near 16384 pixels
+    first = _make_distorted_wcs()
+    second = _make_wcs()
+    second.wcs.crpix = [16000.5, 150.5]
+    second.pixel_shape = (16384, 300)
+    ny, nx = first.array_shape
+    pixmap = wcs_functions.calc_pixmap(first, second, stepsize=10)
+    assert pixmap.dtype == np.float32
+
+    rng = np.random.default_rng(1)
+    insci = rng.normal(100.0, 10.0, (ny, nx)).astype(np.float32)
+    results = []
+    for mapping in [cdriz.DefaultWCSMapping(first, second, nx, ny, 10),
+                    pixmap]:
+        outsci = np.zeros(second.array_shape, dtype=np.float32)
+        outwht = np.zeros(second.array_shape, dtype=np.float32)
+        outctx = np.zeros(second.array_shape, dtype=np.int32)
+        cdriz.tdriz(insci, np.ones_like(insci), outsci, outwht, outctx,
+                    1, 0, 1, 1, ny, 1.0, 1.0, 1.0, "center", 1.0, "square",
+                    "cps", 1.0, 1.0, "INDEF", 0, 0, 1, mapping)
+        blotted = np.zeros((ny, nx), dtype=np.float32)
+        cdriz.tblot(outsci, blotted, 1, nx, 1, ny, 1.0, 1.0, 1.0, 1.0,
+                    "center", "poly5", 1.0, 0.0, 1.0, 1, mapping)
+        results.append((outsci, outwht, blotted))
+
+    (sci, wht, blot), (pix_sci, pix_wht, pix_blot) = results
+    np.testing.assert_allclose(pix_sci.sum(), sci.sum(), rtol=1e-6)
+    np.testing.assert_allclose(pix_wht, wht, atol=2e-3)
+    covered = wht > 0.5
+    assert covered.sum() > 0.9 * nx * ny
+    np.testing.assert_allclose(pix_sci[covered], sci[covered], rtol=1e-3)
+    np.testing.assert_allclose(pix_blot, blot, rtol=1e-3, atol=1e-3)
+
+
+def test_calc_output_bbox():
+    first = _make_distorted_wcs(nx=64, ny=48)
+    second = _make_wcs()
+    second.wcs.crpix = [16.5, 80.5]
+    second.pixel_shape = (200, 160)
+
+    bbox = wcs_functions.calc_output_bbox(first, second)
+    pixmap = wcs_functions.calc_pixmap(first, second)
+    # 0-based indices of the output pixels the input pixel centers land on
+    x = np.floor(pixmap[..., 0] - 0.5).astype(int)
+    y = np.floor(pixmap[..., 1] - 0.5).astype(int)
+    assert bbox == (max(x.min(), 0), x.max() + 1, y.min(), y.max() + 1)
+    assert x.min() < 0
+
+    xmin, xmax, ymin, ymax = wcs_functions.calc_output_bbox(first, second,
+                                                            margin=2)
+    assert (xmin, xmax, ymin, ymax) == (0, bbox[1] + 2, bbox[2] - 2,
+                                        bbox[3] + 2)
+
+    second.wcs.crpix = [500.0, 80.5]
+    assert wcs_functions.calc_output_bbox(first, second) is None